@@ -11,7 +11,7 @@ login_manager = LoginManager()
 migrate = Migrate()
 csrf = CSRFProtect()
 
-def create_app(config_name='default'):
+def create_app(config_name='default', config_overrides=None):
     """Factory pattern para crear la aplicación Flask"""
     app = Flask(__name__, 
                 template_folder='../../frontend/templates',
@@ -19,6 +19,8 @@ def create_app(config_name='default'):
     
     # Cargar configuración
     app.config.from_object(config[config_name])
+    if config_overrides:
+        app.config.update(config_overrides)
     
     # Inicializar extensiones
     db.init_app(app)
@@ -74,4 +76,28 @@ def create_app(config_name='default'):
     app.register_blueprint(nurse_bp, url_prefix='/nurse')
     app.register_blueprint(main_bp)
     
+    # Caché de disponibilidad (invalida con eventos de Appointment/WorkSchedule)
+    from app.utils.availability_cache import availability_cache
+    availability_cache.init_app(app)
+    
+    # Doctores y especialidades activos (invalida con eventos de User/Specialty)
+    from app.utils.reference_data import reference_data
+    reference_data.init_app(app)
+    
+    # Índice de búsqueda de pacientes (FTS5 en SQLite, trigramas en PostgreSQL)
+    from app.utils.patient_search import register_search_index
+    register_search_index()
+    
+    # Prefijos de DNI/teléfono en memoria para el autocompletado (eventos de Patient)
+    from app.utils.patient_prefix_index import patient_prefix_index
+    patient_prefix_index.init_app(app)
+    
+    # Contadores clínicos de pacientes (eventos de MedicalRecord)
+    from app.utils.clinical_counters import register_clinical_counters
+    register_clinical_counters()
+    
+    # Eventos en vivo de cambios de estado de citas (SSE de los dashboards)
+    from app.utils.live_events import register_live_events
+    register_live_events()
+    
     return app
@@ -8,3 +8,8 @@ from app.models.specialty import Specialty
 from app.models.triage import Triage
 from app.models.salary_configuration import SalaryConfiguration, CommissionRecord
 from app.models.work_schedule import WorkSchedule
+from app.models.appointment_slot import AppointmentSlot
+from app.models.schedule_template import ScheduleTemplate
+from app.models.waitlist import WaitlistEntry
+from app.models.housekeeping import HousekeepingRun
+from app.models.reminder import ReminderMessage
@@ -1,10 +1,41 @@
-from datetime import datetime
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload, load_only
+from sqlalchemy.orm.attributes import set_committed_value
 from app import db
 
+
+class SlotTakenError(Exception):
+    """El horario del doctor ya fue reservado (p. ej. por otra recepcionista al mismo tiempo)"""
+
+
 class Appointment(db.Model):
     """Modelo de cita médica"""
     __tablename__ = 'appointments'
+
+    # Estados que ocupan un horario del doctor
+    ACTIVE_STATUSES = ('scheduled', 'in_triage', 'ready_for_doctor', 'in_consultation')
     
+    # Un doctor no puede tener dos citas activas con el mismo inicio; la base de
+    # datos lo garantiza aunque dos reservas pasen la validación a la vez
+    ACTIVE_STATUS_CLAUSE = db.text("status IN ('scheduled', 'in_triage', 'ready_for_doctor', 'in_consultation')")
+    __table_args__ = (
+        db.Index('uq_appointments_doctor_active_slot', 'doctor_id', 'date_time', unique=True,
+                 sqlite_where=ACTIVE_STATUS_CLAUSE, postgresql_where=ACTIVE_STATUS_CLAUSE),
+        # Agendas y dashboards: doctor + rango de fechas (+ estado)
+        db.Index('ix_appointments_doctor_date_status', 'doctor_id', 'date_time', 'status'),
+        # Historial del paciente ordenado por fecha
+        db.Index('ix_appointments_patient_date', 'patient_id', 'date_time'),
+    )
+    
+    # Duración máxima de una cita; acota la búsqueda de solapamientos por rango.
+    # Los horarios, plantillas y especialidades no admiten duraciones mayores.
+    MAX_DURATION_MINUTES = 240
+    
+    # Tamaño de las listas IN al precargar factura y triage
+    PRELOAD_CHUNK = 500
+
     id = db.Column(db.Integer, primary_key=True)
     
     # Referencias
@@ -16,8 +47,9 @@ class Appointment(db.Model):
     date_time = db.Column(db.DateTime, nullable=False, index=True)
     duration = db.Column(db.Integer, default=30)  # duración en minutos
     
-    # Estado: 'scheduled', 'in_triage', 'ready_for_doctor', 'in_consultation', 'completed', 'cancelled', 'no_show'
-    status = db.Column(db.String(20), default='scheduled', nullable=False)
+    # Estado: 'scheduled', 'in_triage', 'ready_for_doctor', 'in_consultation', 'completed', 'cancelled', 'no_show', 'incomplete'
+    # (active_history: se conoce el estado anterior al publicar la transición en vivo)
+    status = db.column_property(db.Column(db.String(20), default='scheduled', nullable=False), active_history=True)
     
     # Información adicional
     reason = db.Column(db.Text)  # motivo de la consulta
@@ -41,12 +73,70 @@ class Appointment(db.Model):
         """Verificar si la cita puede ser cancelada"""
         return self.status in ['scheduled'] and self.date_time > datetime.utcnow()
     
+    @classmethod
+    def status_options(cls):
+        """Opciones de consulta que precargan factura y triage de cada cita
+        
+        Con ellas is_paid, payment_status, has_triage() y get_triage() leen los
+        valores ya cargados en lugar de lanzar una consulta por fila: se usan
+        dos consultas IN para toda la lista, sin importar su tamaño.
+        
+        Uso: Appointment.query.options(*Appointment.status_options())
+        """
+        from app.models.invoice import Invoice
+        return (
+            selectinload(cls.invoice).load_only(Invoice.id, Invoice.appointment_id, Invoice.status),
+            selectinload(cls.triage)
+        )
+    
+    @classmethod
+    def preload_status(cls, appointments):
+        """Precargar factura y triage de una lista de citas ya consultada
+        
+        Equivalente a status_options() para listas obtenidas por otra vía
+        (p. ej. paginadas o reunidas de varias consultas). Devuelve la lista.
+        """
+        from app.models.invoice import Invoice
+        from app.models.triage import Triage
+        
+        pending = [appointment for appointment in appointments
+                   if appointment.id is not None and not appointment._status_loaded()]
+        if not pending:
+            return appointments
+        
+        ids = [appointment.id for appointment in pending]
+        invoices, triages = {}, {}
+        for start in range(0, len(ids), cls.PRELOAD_CHUNK):
+            chunk = ids[start:start + cls.PRELOAD_CHUNK]
+            for invoice in Invoice.query.options(
+                load_only(Invoice.id, Invoice.appointment_id, Invoice.status)
+            ).filter(Invoice.appointment_id.in_(chunk)).all():
+                invoices.setdefault(invoice.appointment_id, []).append(invoice)
+            for triage in Triage.query.filter(Triage.appointment_id.in_(chunk)).all():
+                triages.setdefault(triage.appointment_id, []).append(triage)
+        
+        for appointment in pending:
+            set_committed_value(appointment, 'invoice', invoices.get(appointment.id, []))
+            set_committed_value(appointment, 'triage', triages.get(appointment.id, []))
+        return appointments
+
+    def _status_loaded(self):
+        """Factura y triage ya presentes en la instancia (precargados)"""
+        loaded = db.inspect(self).dict
+        return 'invoice' in loaded and 'triage' in loaded
+    
+    def _get_invoice(self):
+        """Factura de la cita: la precargada si existe, si no una consulta"""
+        if 'invoice' in db.inspect(self).dict:
+            return self.invoice[0] if self.invoice else None
+        from app.models.invoice import Invoice
+        return Invoice.query.filter_by(appointment_id=self.id).first()
+    
     @property
     def is_paid(self):
         """Verificar si la cita tiene pago confirmado"""
         # Buscar factura asociada a esta cita
-        from app.models.invoice import Invoice
-        invoice = Invoice.query.filter_by(appointment_id=self.id).first()
+        invoice = self._get_invoice()
         
         if not invoice:
             return False
@@ -57,20 +147,15 @@ class Appointment(db.Model):
     @property
     def payment_status(self):
         """Obtener estado de pago legible"""
-        from app.models.invoice import Invoice
-        invoice = Invoice.query.filter_by(appointment_id=self.id).first()
-        
-        if not invoice:
+        invoice = self._get_invoice()
+        return self.payment_label(invoice.status if invoice else None)
+    
+    @staticmethod
+    def payment_label(invoice_status):
+        """Estado de pago legible a partir del estado de la factura (None: sin factura)"""
+        if invoice_status is None:
             return 'Sin factura'
-        
-        if invoice.status == 'paid':
-            return 'Pagado'
-        elif invoice.status == 'pending':
-            return 'Pendiente'
-        elif invoice.status == 'overdue':
-            return 'Vencido'
-        else:
-            return 'Cancelado'
+        return {'paid': 'Pagado', 'pending': 'Pendiente', 'overdue': 'Vencido'}.get(invoice_status, 'Cancelado')
     
     def can_start_triage(self):
         """Verificar si se puede iniciar triage para esta cita"""
@@ -80,19 +165,22 @@ class Appointment(db.Model):
         is_today = self.date_time.date() == date.today()
         return self.status == 'scheduled' and self.is_paid and is_today
 
+    # Etiquetas legibles de cada estado
+    STATUS_LABELS = {
+        'scheduled': 'Programada',
+        'in_triage': 'En Triage',
+        'ready_for_doctor': 'Lista para Doctor',
+        'in_consultation': 'En Consulta',
+        'completed': 'Completada',
+        'cancelled': 'Cancelada',
+        'no_show': 'No asistió',
+        'incomplete': 'Atención incompleta'
+    }
+
     @property
     def status_label(self):
         """Etiqueta legible del estado de la cita"""
-        labels = {
-            'scheduled': 'Programada',
-            'in_triage': 'En Triage',
-            'ready_for_doctor': 'Lista para Doctor',
-            'in_consultation': 'En Consulta',
-            'completed': 'Completada',
-            'cancelled': 'Cancelada',
-            'no_show': 'No asistió'
-        }
-        return labels.get(self.status, 'Estado desconocido')
+        return self.STATUS_LABELS.get(self.status, 'Estado desconocido')
 
     @property
     def status_color(self):
@@ -104,7 +192,8 @@ class Appointment(db.Model):
             'in_consultation': 'primary',
             'completed': 'success',
             'cancelled': 'danger',
-            'no_show': 'dark'
+            'no_show': 'dark',
+            'incomplete': 'light'
         }
         return colors.get(self.status, 'secondary')
 
@@ -117,13 +206,163 @@ class Appointment(db.Model):
 
     def has_triage(self):
         """Verificar si la cita tiene triage asociado"""
-        from app.models.triage import Triage
-        return Triage.query.filter_by(appointment_id=self.id).first() is not None
+        return self.get_triage() is not None
 
     def get_triage(self):
         """Obtener el triage asociado a esta cita"""
+        if 'triage' in db.inspect(self).dict:
+            return self.triage[0] if self.triage else None
         from app.models.triage import Triage
         return Triage.query.filter_by(appointment_id=self.id).first()
 
+    @property
+    def end_time(self):
+        """Fin de la cita según su duración"""
+        return self.date_time + timedelta(minutes=self.duration or 30)
+    
+    @classmethod
+    def resolve_duration(cls, doctor_id, specialty_id, date_time):
+        """Duración de una nueva cita: la del horario del doctor, la de la especialidad o 30 min"""
+        from app.models.work_schedule import WorkSchedule
+        from app.models.specialty import Specialty
+        
+        for schedule in WorkSchedule.get_doctor_schedule(int(doctor_id), date_time.weekday(), for_date=date_time.date()):
+            if schedule.start_time <= date_time.time() < schedule.end_time and schedule.appointment_duration:
+                return cls.clamp_duration(schedule.appointment_duration)
+        
+        specialty = db.session.get(Specialty, int(specialty_id)) if specialty_id else None
+        return cls.clamp_duration(specialty.consultation_duration if specialty else None)
+    
+    @classmethod
+    def clamp_duration(cls, minutes):
+        """Duración en minutos limitada a MAX_DURATION_MINUTES (30 si no hay)"""
+        return min(minutes or 30, cls.MAX_DURATION_MINUTES)
+    
+    @classmethod
+    def duration_error(cls, minutes):
+        """Mensaje de error si la duración no está entre 1 y MAX_DURATION_MINUTES"""
+        if not minutes or minutes <= 0:
+            return 'La duración de la cita debe ser mayor a cero.'
+        if minutes > cls.MAX_DURATION_MINUTES:
+            return f'La duración de la cita no puede superar {cls.MAX_DURATION_MINUTES} minutos.'
+        return None
+    
+    def reserve(self, savepoint=False):
+        """Insertar o mover la cita ocupando su horario de forma atómica
+        
+        El índice único parcial uq_appointments_doctor_active_slot rechaza una
+        segunda cita activa del doctor con el mismo inicio, sin bloquear la
+        tabla. También se ocupa el slot del inventario en la misma transacción.
+        
+        Args:
+            savepoint: Reservar una cita nueva dentro de un SAVEPOINT, de modo
+                que si el horario está ocupado sólo se deshaga la reserva y no
+                los demás cambios de la transacción
+        
+        Raises:
+            SlotTakenError: Si otra operación reservó el horario primero; la
+                transacción de la sesión se revierte (o sólo el savepoint)
+        """
+        from app.models.appointment_slot import AppointmentSlot
+        
+        if savepoint:
+            # Lo pendiente se escribe antes, fuera del savepoint
+            db.session.flush()
+            try:
+                with db.session.begin_nested():
+                    db.session.add(self)
+                    db.session.flush()
+                    AppointmentSlot.book(self)
+            except IntegrityError:
+                raise SlotTakenError('El horario seleccionado acaba de ser reservado')
+            return
+        
+        db.session.add(self)
+        try:
+            db.session.flush()
+        except IntegrityError:
+            db.session.rollback()
+            raise SlotTakenError('El horario seleccionado acaba de ser reservado')
+        AppointmentSlot.book(self)
+    
+    @classmethod
+    def find_conflicts(cls, candidates, exclude_ids=()):
+        """Detectar solapamientos [inicio, inicio + duración) para doctor y paciente
+        
+        Sirve tanto para una reserva individual como para importaciones masivas:
+        usa una sola consulta por rango sobre date_time (acotada por
+        MAX_DURATION_MINUTES) y compara los intervalos en memoria, incluyendo los
+        conflictos entre las propias filas del lote. Las comparaciones usan
+        búsqueda binaria sobre listas ordenadas por inicio, por lo que un lote de
+        miles de filas no compara cada fila con todas las demás.
+        
+        Args:
+            candidates: Lista de dicts con doctor_id, patient_id, date_time y duration
+            exclude_ids: IDs de citas a ignorar (p. ej. la cita que se está editando)
+        
+        Returns:
+            list: Por cada candidato, lista de (tipo, conflicto) donde tipo es
+                'doctor' o 'patient' y conflicto es la fila de la cita existente o
+                el índice de otro candidato del lote
+        """
+        conflicts = [[] for _ in candidates]
+        if not candidates:
+            return conflicts
+        
+        intervals = []
+        for candidate in candidates:
+            start = candidate['date_time']
+            end = start + timedelta(minutes=candidate.get('duration') or 30)
+            intervals.append((start, end, int(candidate['doctor_id']), int(candidate['patient_id'])))
+        
+        doctor_ids = {interval[2] for interval in intervals}
+        patient_ids = {interval[3] for interval in intervals}
+        window_start = min(interval[0] for interval in intervals) - timedelta(minutes=cls.MAX_DURATION_MINUTES)
+        window_end = max(interval[1] for interval in intervals)
+        
+        query = db.session.query(cls.id, cls.doctor_id, cls.patient_id, cls.date_time, cls.duration).filter(
+            cls.date_time > window_start,
+            cls.date_time < window_end,
+            cls.status.in_(cls.ACTIVE_STATUSES),
+            db.or_(cls.doctor_id.in_(doctor_ids), cls.patient_id.in_(patient_ids))
+        )
+        if exclude_ids:
+            query = query.filter(cls.id.notin_(list(exclude_ids)))
+        
+        # Indexar citas existentes por doctor y por paciente, ordenadas por inicio
+        by_doctor, by_patient = {}, {}
+        for row in query.all():
+            by_doctor.setdefault(row.doctor_id, []).append((row.date_time, row.id, row))
+            by_patient.setdefault(row.patient_id, []).append((row.date_time, row.id, row))
+        for rows in list(by_doctor.values()) + list(by_patient.values()):
+            rows.sort(key=lambda item: item[:2])
+        
+        # Filas anteriores del lote por doctor y por paciente, como listas (inicio, índice) ordenadas
+        longest = max(end - start for start, end, _, _ in intervals)
+        batch_by_doctor, batch_by_patient = {}, {}
+        max_duration = timedelta(minutes=cls.MAX_DURATION_MINUTES)
+        
+        for index, (start, end, doctor_id, patient_id) in enumerate(intervals):
+            # Sólo pueden solaparse las que empiezan en (inicio - duración máxima, fin)
+            for kind, rows in (('doctor', by_doctor.get(doctor_id, ())), ('patient', by_patient.get(patient_id, ()))):
+                low = bisect_left(rows, (start - max_duration,))
+                for row_start, _, row in rows[low:bisect_left(rows, (end,))]:
+                    if row_start + timedelta(minutes=row.duration or 30) > start:
+                        conflicts[index].append((kind, row))
+            
+            # Conflictos con filas anteriores del mismo lote
+            overlapping = []
+            for kind, previous in (('doctor', batch_by_doctor.setdefault(doctor_id, [])),
+                                   ('patient', batch_by_patient.setdefault(patient_id, []))):
+                low = bisect_left(previous, (start - longest,))
+                for _, other in previous[low:bisect_left(previous, (end,))]:
+                    if intervals[other][1] > start:
+                        overlapping.append((other, kind))
+            conflicts[index].extend((kind, other) for other, kind in sorted(overlapping))
+            insort(batch_by_doctor[doctor_id], (start, index))
+            insort(batch_by_patient[patient_id], (start, index))
+        
+        return conflicts
+    
     def __repr__(self):
         return f'<Appointment {self.patient.full_name} - {self.doctor.full_name} - {self.date_time}>'
@@ -0,0 +1,183 @@
+from bisect import bisect_left
+from datetime import datetime, date, timedelta
+from app import db
+
+class AppointmentSlot(db.Model):
+    """Inventario materializado de slots de citas generado desde WorkSchedule"""
+    __tablename__ = 'appointment_slots'
+    __table_args__ = (
+        db.UniqueConstraint('doctor_id', 'start_time', name='uq_appointment_slots_doctor_start'),
+        db.Index('ix_appointment_slots_doctor_state_start', 'doctor_id', 'state', 'start_time'),
+    )
+
+    # Semanas generadas hacia adelante por defecto
+    DEFAULT_WEEKS_AHEAD = 8
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    # Referencias
+    doctor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    specialty_id = db.Column(db.Integer, db.ForeignKey('specialties.id'), nullable=True)
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id'), nullable=True)
+
+    # Intervalo del slot
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False)
+
+    # Estado: 'available', 'booked'
+    state = db.Column(db.String(20), default='available', nullable=False)
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @classmethod
+    def weeks_ahead(cls):
+        """Semanas de inventario configuradas (SLOT_INVENTORY_WEEKS)"""
+        from flask import current_app
+        return current_app.config.get('SLOT_INVENTORY_WEEKS', cls.DEFAULT_WEEKS_AHEAD)
+
+    @classmethod
+    def regenerate_for_doctor(cls, doctor_id, from_date=None, weeks=None):
+        """Regenerar el inventario de un doctor desde una fecha
+
+        Cada slot que se superpone con una cita activa [inicio, inicio +
+        duración) queda reservado por esa cita. No hace commit: debe ejecutarse dentro de la transacción que modificó
+        los horarios del doctor.
+
+        Returns:
+            int: Número de slots generados
+        """
+        from app.models.appointment import Appointment
+        from app.models.work_schedule import WorkSchedule
+
+        from_date = from_date or date.today()
+        weeks = weeks or cls.weeks_ahead()
+        range_start = datetime.combine(from_date, datetime.min.time())
+        range_end = range_start + timedelta(weeks=weeks)
+
+        cls.query.filter(
+            cls.doctor_id == doctor_id,
+            cls.start_time >= range_start
+        ).delete(synchronize_session=False)
+
+        schedules = WorkSchedule.query.filter_by(doctor_id=doctor_id, is_active=True).all()
+        if not schedules:
+            return 0
+
+        # Si dos horarios generan el mismo inicio gana el de la especialidad
+        # (misma prioridad que WorkSchedule.get_available_times_for_doctors)
+        schedules.sort(key=lambda schedule: (schedule.specialty_id is None, schedule.id))
+
+        # Citas activas del rango en una sola consulta (incluidas las que empiezan
+        # antes y todavía ocupan el inicio del rango), ordenadas por inicio
+        max_duration = timedelta(minutes=Appointment.MAX_DURATION_MINUTES)
+        booked = db.session.query(Appointment.date_time, Appointment.duration, Appointment.id).filter(
+            Appointment.doctor_id == doctor_id,
+            Appointment.date_time > range_start - max_duration,
+            Appointment.date_time < range_end,
+            Appointment.status.in_(Appointment.ACTIVE_STATUSES)
+        ).order_by(Appointment.date_time, Appointment.id).all()
+        booked_starts = [row.date_time for row in booked]
+
+        def booking_for(slot_start, slot_end):
+            """Cita activa que se superpone con [slot_start, slot_end), si existe"""
+            low = bisect_left(booked_starts, slot_start - max_duration)
+            for row in booked[low:bisect_left(booked_starts, slot_end)]:
+                if row.date_time + timedelta(minutes=row.duration or 30) > slot_start:
+                    return row.id
+            return None
+
+        rows = {}
+        now = datetime.utcnow()
+        current_date = from_date
+        while current_date < range_end.date():
+            for schedule in schedules:
+                duration = timedelta(minutes=schedule.appointment_duration or 30)
+                for slot_start in schedule.get_slot_grid(current_date):
+                    if slot_start in rows:
+                        continue
+                    appointment_id = booking_for(slot_start, slot_start + duration)
+                    rows[slot_start] = {
+                        'doctor_id': doctor_id,
+                        'specialty_id': schedule.specialty_id,
+                        'appointment_id': appointment_id,
+                        'start_time': slot_start,
+                        'end_time': slot_start + duration,
+                        'state': 'booked' if appointment_id else 'available',
+                        'created_at': now,
+                        'updated_at': now
+                    }
+            current_date += timedelta(days=1)
+
+        if rows:
+            db.session.bulk_insert_mappings(cls, list(rows.values()))
+        return len(rows)
+
+    @classmethod
+    def rebuild(cls, from_date=None, weeks=None):
+        """Reconstruir el inventario de todos los doctores (reparación de desvíos)
+
+        Returns:
+            dict: {doctor_id: slots_generados}
+        """
+        from app.models.user import User
+
+        doctor_ids = [row[0] for row in db.session.query(User.id).filter_by(role='doctor').all()]
+        return {doctor_id: cls.regenerate_for_doctor(doctor_id, from_date, weeks) for doctor_id in doctor_ids}
+
+    @classmethod
+    def book(cls, appointment):
+        """Marcar como reservados los slots libres que se superponen con la cita (sin commit)
+
+        Una cita más larga que el paso de la grilla ocupa también los slots
+        siguientes dentro de [inicio, inicio + duración).
+        """
+        from app.models.appointment import Appointment
+
+        start = appointment.date_time
+        end = start + timedelta(minutes=appointment.duration or 30)
+        cls.query.filter(
+            cls.doctor_id == appointment.doctor_id,
+            cls.state == 'available',
+            cls.start_time > start - timedelta(minutes=Appointment.MAX_DURATION_MINUTES),
+            cls.start_time < end,
+            cls.end_time > start
+        ).update({'state': 'booked', 'appointment_id': appointment.id,
+                  'updated_at': datetime.utcnow()}, synchronize_session=False)
+
+    @classmethod
+    def release(cls, appointment):
+        """Liberar los slots ocupados por una cita (sin commit)"""
+        cls.query.filter(
+            cls.appointment_id == appointment.id
+        ).update({'state': 'available', 'appointment_id': None,
+                  'updated_at': datetime.utcnow()}, synchronize_session=False)
+
+    @classmethod
+    def get_available_times(cls, doctor_id, date, specialty_id=None):
+        """Horarios libres de un doctor en una fecha con un único escaneo por rango
+
+        Si la fecha no tiene inventario (fuera del horizonte o aún no generado)
+        se calcula en vivo desde WorkSchedule.
+        """
+        from app.models.work_schedule import WorkSchedule
+
+        day_start = datetime.combine(date, datetime.min.time())
+        rows = db.session.query(cls.start_time, cls.specialty_id, cls.state).filter(
+            cls.doctor_id == doctor_id,
+            cls.start_time >= day_start,
+            cls.start_time < day_start + timedelta(days=1)
+        ).order_by(cls.start_time).all()
+
+        if not rows:
+            return WorkSchedule.get_available_times(doctor_id, date, specialty_id)
+
+        # Priorizar slots de la especialidad si existen (igual que WorkSchedule)
+        if specialty_id and any(row.specialty_id == specialty_id for row in rows):
+            rows = [row for row in rows if row.specialty_id == specialty_id]
+
+        return [row.start_time.time() for row in rows if row.state == 'available']
+
+    def __repr__(self):
+        return f'<AppointmentSlot doctor={self.doctor_id} {self.start_time} ({self.state})>'
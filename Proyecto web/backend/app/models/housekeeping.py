@@ -0,0 +1,190 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, exists, func, select, update
+from app import db
+
+class HousekeepingRun(db.Model):
+    """Ejecución de una regla de mantenimiento nocturno de citas
+
+    Cada regla es un UPDATE ... WHERE sobre appointments (o la tabla que
+    indique la regla) aplicado por tramos de id. Tras cada tramo se hace commit y se guarda el último id procesado,
+    de modo que una ejecución interrumpida se retoma con el mismo corte
+    temporal. Las condiciones incluyen el estado de origen, así que volver a
+    ejecutar una regla no modifica filas ya cerradas (idempotente).
+    """
+    __tablename__ = 'housekeeping_runs'
+    __table_args__ = (
+        db.Index('ix_housekeeping_runs_rule_status', 'rule', 'status'),
+    )
+
+    # Reglas: estados de origen, estado final, horas de gracia (clave de config) y nota.
+    # Solo las citas programadas vencidas pasan a 'no_show'; el paciente que llegó
+    # a triage o consulta sí asistió y se cierra como 'incomplete'.
+    RULES = {
+        'stale_scheduled': {
+            'label': 'Citas programadas vencidas → No asistió',
+            'from_statuses': ('scheduled',),
+            'to_status': 'no_show',
+            'grace_config': 'HOUSEKEEPING_NO_SHOW_GRACE_HOURS',
+            'note': None
+        },
+        'abandoned_triage': {
+            'label': 'Triage sin consulta → Atención incompleta',
+            'from_statuses': ('in_triage', 'ready_for_doctor'),
+            'to_status': 'incomplete',
+            'grace_config': 'HOUSEKEEPING_ABANDONED_HOURS',
+            'note': 'Cerrada automáticamente: triage sin consulta'
+        },
+        'abandoned_consultation_with_record': {
+            'label': 'Consulta abierta con historia registrada → Completada',
+            'from_statuses': ('in_consultation',),
+            'to_status': 'completed',
+            'grace_config': 'HOUSEKEEPING_ABANDONED_HOURS',
+            'with_record': True,
+            'note': 'Cerrada automáticamente: consulta sin finalizar'
+        },
+        'abandoned_consultation': {
+            'label': 'Consulta abierta sin historia → Atención incompleta',
+            'from_statuses': ('in_consultation',),
+            'to_status': 'incomplete',
+            'grace_config': 'HOUSEKEEPING_ABANDONED_HOURS',
+            'with_record': False,
+            'note': 'Cerrada automáticamente: consulta sin finalizar'
+        },
+        'expired_waitlist': {
+            'label': 'Lista de espera con ventana vencida → Vencida',
+            'table': 'waitlist_entries',
+            'time_column': 'latest_date',
+            'from_statuses': ('waiting',),
+            'to_status': 'expired',
+            'grace_config': 'HOUSEKEEPING_WAITLIST_GRACE_HOURS',
+            'note': None
+        }
+    }
+
+    id = db.Column(db.Integer, primary_key=True)
+    rule = db.Column(db.String(50), nullable=False)
+
+    # Estado: 'running' (en curso o interrumpida), 'completed'
+    status = db.Column(db.String(20), default='running', nullable=False)
+
+    # Corte temporal fijo de la ejecución y punto de reanudación
+    cutoff = db.Column(db.DateTime, nullable=False)
+    last_id = db.Column(db.Integer, default=0, nullable=False)
+    rows_affected = db.Column(db.Integer, default=0, nullable=False)
+    chunks = db.Column(db.Integer, default=0, nullable=False)
+
+    started_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def label(self):
+        return self.RULES.get(self.rule, {}).get('label', self.rule)
+
+    @classmethod
+    def _table(cls, rule):
+        """Tabla sobre la que actúa la regla (appointments por defecto)"""
+        from app.models.appointment import Appointment
+        from app.models.waitlist import WaitlistEntry
+
+        tables = {'appointments': Appointment.__table__, 'waitlist_entries': WaitlistEntry.__table__}
+        return tables[cls.RULES[rule].get('table', 'appointments')]
+
+    @classmethod
+    def _conditions(cls, rule, cutoff):
+        """Condiciones WHERE de una regla (sin el tramo de ids)"""
+        from app.models.medical_record import MedicalRecord
+
+        table = cls._table(rule)
+        config = cls.RULES[rule]
+        column = table.c[config.get('time_column', 'date_time')]
+        # Columnas de fecha (latest_date): vencidas las anteriores al día del corte
+        limit = cutoff if isinstance(column.type, db.DateTime) else cutoff.date()
+        conditions = [table.c.status.in_(config['from_statuses']), column < limit]
+        if 'with_record' in config:
+            has_record = exists().where(MedicalRecord.__table__.c.appointment_id == table.c.id)
+            conditions.append(has_record if config['with_record'] else ~has_record)
+        return and_(*conditions)
+
+    @classmethod
+    def _start(cls, rule, now):
+        """Retomar la ejecución interrumpida de la regla o crear una nueva"""
+        run = cls.query.filter_by(rule=rule, status='running').order_by(cls.id.desc()).first()
+        if run is None:
+            hours = current_app.config.get(cls.RULES[rule]['grace_config'], 24)
+            run = cls(rule=rule, status='running', cutoff=now - timedelta(hours=hours),
+                      last_id=0, rows_affected=0, chunks=0)
+            db.session.add(run)
+            db.session.commit()
+        return run
+
+    @classmethod
+    def run_rule(cls, rule, now=None, chunk_size=None, max_chunks=None):
+        """Aplicar una regla por tramos de id con commit por tramo
+
+        Cada tramo usa dos sentencias: el id límite del tramo (LIMIT 1 OFFSET
+        chunk_size - 1 sobre las filas que cumplen la regla) y el UPDATE del
+        rango. No se cargan objetos ORM, por lo que no se disparan eventos de
+        Appointment; las citas afectadas son pasadas y no alteran la
+        disponibilidad ni el inventario de slots. Las entradas de lista de
+        espera vencidas dejan de recorrerse al buscar candidatos.
+
+        Args:
+            max_chunks: Detenerse tras N tramos dejando la ejecución para retomar
+
+        Returns:
+            HousekeepingRun
+        """
+        table = cls._table(rule)
+        config = cls.RULES[rule]
+        chunk_size = chunk_size or current_app.config.get('HOUSEKEEPING_CHUNK_SIZE', 1000)
+        run = cls._start(rule, now or datetime.now())
+
+        values = {'status': config['to_status'], 'updated_at': datetime.utcnow()}
+        if config['note']:
+            values['notes'] = func.coalesce(table.c.notes + '\n', '') + config['note']
+
+        conditions = cls._conditions(rule, run.cutoff)
+        last_id, rows_affected, chunks = run.last_id, run.rows_affected, run.chunks
+        processed = 0
+        while max_chunks is None or processed < max_chunks:
+            pending = and_(conditions, table.c.id > last_id)
+            upper = db.session.execute(
+                select(table.c.id).where(pending).order_by(table.c.id).limit(1).offset(chunk_size - 1)
+            ).scalar()
+
+            chunk = pending if upper is None else and_(pending, table.c.id <= upper)
+            result = db.session.execute(update(table).where(chunk).values(**values))
+            rows_affected += result.rowcount
+            chunks += 1
+            processed += 1
+
+            # Guardar el avance junto con el tramo actualizado
+            run.rows_affected, run.chunks = rows_affected, chunks
+            if upper is None:
+                run.status = 'completed'
+                run.finished_at = datetime.utcnow()
+            else:
+                run.last_id = last_id = upper
+            db.session.commit()
+
+            if upper is None:
+                break
+        return run
+
+    @classmethod
+    def run_all(cls, now=None, chunk_size=None, rules=None):
+        """Aplicar todas las reglas (o las indicadas) en orden
+
+        Returns:
+            list: HousekeepingRun de cada regla
+        """
+        return [cls.run_rule(rule, now=now, chunk_size=chunk_size) for rule in (rules or cls.RULES)]
+
+    @classmethod
+    def latest(cls, limit=20):
+        """Últimas ejecuciones registradas"""
+        return cls.query.order_by(cls.started_at.desc(), cls.id.desc()).limit(limit).all()
+
+    def __repr__(self):
+        return f'<HousekeepingRun {self.rule} ({self.status}): {self.rows_affected} filas>'
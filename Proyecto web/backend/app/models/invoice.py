@@ -5,6 +5,10 @@ from sqlalchemy.sql import func
 class Invoice(db.Model):
     """Modelo de factura médica"""
     __tablename__ = 'invoices'
+    __table_args__ = (
+        # Estado de pago de una cita (is_paid, payment_status, precarga de listas)
+        db.Index('ix_invoices_appointment_status', 'appointment_id', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
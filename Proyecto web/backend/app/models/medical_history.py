@@ -16,11 +16,8 @@ class MedicalHistory:
     
     def _load_first_record(self):
         """Cargar el primer registro médico del paciente"""
-        if self.patient and self.patient.medical_records:
-            from app.models.medical_record import MedicalRecord
-            self._first_record = self.patient.medical_records.order_by(
-                MedicalRecord.created_at.asc()
-            ).first()
+        if self.patient:
+            self._first_record = self.patient.get_first_consultation()
     
     # === PROPIEDADES LÓGICAS ===
     
@@ -314,7 +311,7 @@ class MedicalHistory:
             None: Si el paciente no tiene registros médicos o solo tiene registros vacíos
         """
         # Solo devolver historia clínica si el paciente tiene registros médicos con información sustancial
-        if patient and patient.medical_records.count() > 0:
+        if patient and patient.has_medical_history():
             # Verificar si al menos un registro médico tiene información sustancial
             for record in patient.medical_records:
                 # Contar observaciones con información estructurada de historia clínica
@@ -366,7 +363,7 @@ class MedicalHistory:
             'has_chronic_medications': bool(self.chronic_medications),
             'total_consultations': self.patient.get_medical_records_count() if self.patient else 0,
             'first_consultation': self.opening_date,
-            'last_consultation': self.patient.get_last_consultation().consultation_date if self.patient and self.patient.get_last_consultation() else None
+            'last_consultation': self.patient.last_consultation_at if self.patient else None
         }
     
     def get_complete_history(self):
@@ -404,7 +401,7 @@ class MedicalHistory:
             'consultations': {
                 'total': self.patient.get_medical_records_count() if self.patient else 0,
                 'first': self.opening_date,
-                'last': self.patient.get_last_consultation().consultation_date if self.patient and self.patient.get_last_consultation() else None
+                'last': self.patient.last_consultation_at if self.patient else None
             }
         }
     
@@ -8,6 +8,12 @@ class MedicalRecord(db.Model):
     Los nuevos campos son lógicos y se mapean a los campos existentes.
     """
     __tablename__ = 'medical_records'
+    __table_args__ = (
+        # Historia clínica del paciente ordenada por fecha de consulta
+        db.Index('ix_medical_records_patient_date', 'patient_id', 'consultation_date'),
+        # Últimas consultas de un doctor (dashboard del doctor)
+        db.Index('ix_medical_records_doctor_date', 'doctor_id', 'consultation_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
@@ -573,7 +579,18 @@ class MedicalRecord(db.Model):
                 MedicalRecord.consultation_date.desc()
             ).all()
         return []
-    
+
+    @classmethod
+    def real_consultation_clause(cls):
+        """Condición SQL de consulta real (equivalente a filter_real_consultations)
+
+        Un registro es consulta real si tiene síntomas, diagnóstico,
+        tratamiento o receta no vacíos; los que sólo guardan historia clínica
+        quedan fuera sin tener que cargarlos.
+        """
+        return db.or_(*[db.func.trim(column) != '' for column in
+                        (cls.symptoms, cls.diagnosis, cls.treatment, cls.prescriptions)])
+
     # === COMPATIBILIDAD CON DATOS EXISTENTES ===
     
     def migrate_to_new_format(self):
@@ -1,9 +1,36 @@
 from datetime import datetime, date
+from sqlalchemy import case
+from sqlalchemy.ext.hybrid import hybrid_property
 from app import db
+from app.utils.sql_dates import age_in_years
+
+# Grupos etarios para triage: (clave, edad mínima, edad máxima exclusiva, etiqueta)
+AGE_GROUPS = (
+    ('lactante', 0, 2, 'Lactante (0-2 años)'),
+    ('preescolar', 2, 6, 'Preescolar (2-6 años)'),
+    ('escolar', 6, 12, 'Escolar (6-12 años)'),
+    ('adolescente', 12, 18, 'Adolescente (12-18 años)'),
+    ('adulto', 18, 65, 'Adulto (18-65 años)'),
+    ('adulto_mayor', 65, None, 'Adulto Mayor (65+ años)')
+)
+AGE_GROUP_LABELS = {key: label for key, _, _, label in AGE_GROUPS}
+
+
+def _years_before(day, years):
+    """La misma fecha `years` años antes (el 29 de febrero pasa al 28)"""
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
 
 class Patient(db.Model):
     """Modelo de paciente"""
     __tablename__ = 'patients'
+    __table_args__ = (
+        # Directorios de pacientes ordenados por apellido y nombre (paginación por cursor)
+        db.Index('ix_patients_name', 'last_name', 'first_name', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
@@ -16,7 +43,7 @@ class Patient(db.Model):
     phone = db.Column(db.String(20))
     email = db.Column(db.String(120))
     address = db.Column(db.Text)    # Información médica básica
-    birth_date = db.Column(db.Date, nullable=False)
+    birth_date = db.Column(db.Date, nullable=False, index=True)
     gender = db.Column(db.String(10))  # 'M', 'F', 'Other'
     blood_type = db.Column(db.String(5))  # 'A+', 'B-', etc.
     is_active = db.Column(db.Boolean, default=True, nullable=False)
@@ -32,6 +59,14 @@ class Patient(db.Model):
     guardian_phone = db.Column(db.String(20))
     guardian_relationship = db.Column(db.String(50))
     
+    # Contadores clínicos desnormalizados (los mantienen los eventos de MedicalRecord,
+    # ver app/utils/clinical_counters.py; se verifican con scripts/maintenance/clinical_counters.py)
+    consultation_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    first_record_id = db.Column(db.Integer)   # primer registro médico (por created_at)
+    last_record_id = db.Column(db.Integer)    # última consulta (por consultation_date)
+    last_consultation_at = db.Column(db.DateTime)
+    last_doctor_id = db.Column(db.Integer)    # doctor de la última consulta
+    
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -44,7 +79,7 @@ class Patient(db.Model):
     
     def has_medical_history(self):
         """Verificar si el paciente tiene historia clínica (al menos un registro médico)"""
-        return self.medical_records.count() > 0
+        return (self.consultation_count or 0) > 0
     
     def is_new_patient(self):
         """Verificar si es un paciente nuevo (sin historia clínica)"""
@@ -85,7 +120,7 @@ class Patient(db.Model):
     
     def get_medical_records_count(self):
         """Obtener el número total de registros médicos del paciente"""
-        return self.medical_records.count()
+        return self.consultation_count or 0
     
     def get_consultation_count(self):
         """Obtener el número total de consultas/registros médicos del paciente
@@ -93,17 +128,27 @@ class Patient(db.Model):
         Returns:
             int: Número total de consultas del paciente
         """
-        return self.medical_records.count()
+        return self.consultation_count or 0
     
     def get_last_consultation(self):
-        """Obtener la última consulta"""
-        from app.models.medical_record import MedicalRecord
-        return self.medical_records.order_by(MedicalRecord.consultation_date.desc()).first()
+        """Obtener la última consulta (por clave primaria; repetir la llamada no consulta)"""
+        return self._counted_record('_last_consultation', self.last_record_id)
     
     def get_first_consultation(self):
         """Obtener la primera consulta (base para historia clínica)"""
+        return self._counted_record('_first_consultation', self.first_record_id)
+    
+    def _counted_record(self, memo, record_id):
+        """Registro médico apuntado por un contador, memorizado mientras el contador no cambie"""
         from app.models.medical_record import MedicalRecord
-        return self.medical_records.order_by(MedicalRecord.created_at.asc()).first()
+        
+        if not record_id:
+            return None
+        cached = getattr(self, memo, None)
+        if cached is None or cached[0] != record_id:
+            cached = (record_id, db.session.get(MedicalRecord, record_id))
+            setattr(self, memo, cached)
+        return cached[1]
     
     def get_consultations_by_doctor(self, doctor_id):
         """Obtener consultas realizadas por un doctor específico"""
@@ -148,46 +193,59 @@ class Patient(db.Model):
         """Nombre completo del paciente"""
         return f"{self.first_name} {self.last_name}"
     
-    @property
+    @hybrid_property
     def age(self):
         """Calcular edad del paciente"""
         today = date.today()
         return today.year - self.birth_date.year - ((today.month, today.day) < (self.birth_date.month, self.birth_date.day))
     
-    @property
+    @age.expression
+    def age(cls):
+        """Edad en SQL (SQLite y PostgreSQL) para filter(), group_by() y order_by()"""
+        return age_in_years(cls.birth_date)
+    
+    @hybrid_property
     def is_minor(self):
         """Verificar si el paciente es menor de edad"""
         return self.age < 18
     
-    @property
+    @hybrid_property
     def age_group(self):
         """Clasificar paciente por grupo etario para triage"""
         age = self.age
-        if age < 2:
-            return 'lactante'  # 0-2 años
-        elif age < 6:
-            return 'preescolar'  # 2-6 años
-        elif age < 12:
-            return 'escolar'  # 6-12 años
-        elif age < 18:
-            return 'adolescente'  # 12-18 años
-        elif age < 65:
-            return 'adulto'  # 18-65 años
-        else:
-            return 'adulto_mayor'  # 65+ años
+        for key, _, max_age, _ in AGE_GROUPS:
+            if max_age is None or age < max_age:
+                return key
+    
+    @age_group.expression
+    def age_group(cls):
+        """Grupo etario en SQL (CASE sobre la edad)"""
+        age = cls.age
+        return case(
+            *((age < max_age, key) for key, _, max_age, _ in AGE_GROUPS if max_age is not None),
+            else_=AGE_GROUPS[-1][0]
+        )
     
     @property
     def age_group_label(self):
         """Etiqueta legible del grupo etario"""
-        labels = {
-            'lactante': 'Lactante (0-2 años)',
-            'preescolar': 'Preescolar (2-6 años)',
-            'escolar': 'Escolar (6-12 años)',
-            'adolescente': 'Adolescente (12-18 años)',
-            'adulto': 'Adulto (18-65 años)',
-            'adulto_mayor': 'Adulto Mayor (65+ años)'
-        }
-        return labels.get(self.age_group, 'Sin clasificar')
+        return AGE_GROUP_LABELS.get(self.age_group, 'Sin clasificar')
+    
+    @classmethod
+    def age_group_filter(cls, age_group, today=None):
+        """Condición por rango de birth_date para un grupo etario (puede usar índice)
+        
+        Equivale a age_group == clave pero compara la fecha de nacimiento en
+        lugar de calcular la edad de cada fila.
+        """
+        for key, min_age, max_age, _ in AGE_GROUPS:
+            if key == age_group:
+                today = today or date.today()
+                conditions = [cls.birth_date <= _years_before(today, min_age)]
+                if max_age is not None:
+                    conditions.append(cls.birth_date > _years_before(today, max_age))
+                return db.and_(*conditions)
+        raise ValueError(f'Grupo etario desconocido: {age_group}')
     
     def needs_guardian_consent(self):
         """Verificar si necesita consentimiento del tutor"""
@@ -232,13 +290,56 @@ class Patient(db.Model):
     
     def get_patient_status_for_doctor(self):
         """Obtener estado del paciente para el flujo del doctor
-        
+
+        Si el estado fue precargado con preload_doctor_status() se devuelve
+        sin consultar la base de datos.
+
         Returns:
             dict: Estado completo del paciente
         """
-        has_history = self.has_medical_history()
+        if getattr(self, '_doctor_status', None) is not None:
+            return self._doctor_status
+
         total_consultations = self.get_consultation_count()
-        
+        history = self.get_medical_history() if total_consultations else None
+        return self._build_doctor_status(total_consultations, history.opening_date if history else None)
+
+    @classmethod
+    def preload_doctor_status(cls, patients):
+        """Calcular el estado para el doctor de varios pacientes con una sola consulta
+
+        Toma la cantidad de consultas de consultation_count y lee por clave
+        primaria la fecha del primer registro de cada paciente; deja el
+        resultado memorizado en cada instancia, de modo que
+        get_patient_status_for_doctor() no vuelve a consultar.
+
+        Returns:
+            dict: {patient_id: estado}
+        """
+        from app.models.medical_record import MedicalRecord
+
+        patients = {patient.id: patient for patient in patients}
+        if not patients:
+            return {}
+
+        first_records = {patient.first_record_id for patient in patients.values() if patient.first_record_id}
+        created = dict(db.session.query(MedicalRecord.id, MedicalRecord.created_at).filter(
+            MedicalRecord.id.in_(first_records)
+        ).all()) if first_records else {}
+
+        statuses = {}
+        for patient_id, patient in patients.items():
+            total = patient.consultation_count or 0
+            first_created = created.get(patient.first_record_id)
+            opening_date = first_created.date() if first_created else None
+            patient._doctor_status = statuses[patient_id] = patient._build_doctor_status(total, opening_date)
+        return statuses
+
+    def _build_doctor_status(self, total_consultations, opening_date):
+        """Armar el estado para el doctor a partir del conteo de registros y la fecha de apertura"""
+        from app.models.medical_history import MedicalHistory
+
+        has_history = total_consultations > 0
         status = {
             'has_medical_history': has_history,
             'is_new_patient': not has_history,
@@ -246,14 +347,14 @@ class Patient(db.Model):
             'needs_guardian': self.needs_guardian_consent(),
             'is_minor': self.is_minor,
             'age_group': self.age_group,
-            'can_create_history': self.can_create_medical_history()[0]
+            # Mismas reglas que can_create_medical_history(), sin volver a contar registros
+            'can_create_history': not has_history and bool(self.is_active) and bool(self.dni)
         }
         
         if has_history:
-            history = self.get_medical_history()
             status.update({
-                'history_number': history.medical_history_number,
-                'history_creation_date': history.opening_date,
+                'history_number': MedicalHistory.generate_unique_number(self),
+                'history_creation_date': opening_date or (self.created_at.date() if self.created_at else None),
                 'expected_action': 'new_consultation'
             })
         else:
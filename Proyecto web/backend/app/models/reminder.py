@@ -0,0 +1,242 @@
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, or_, select, update
+from app import db
+
+class ReminderMessage(db.Model):
+    """Recordatorio de cita en la bandeja de salida (outbox)
+
+    enqueue_for_day() selecciona en una consulta las citas programadas del
+    día, renderiza los mensajes con las plantillas de reminders/ y los
+    inserta en lote. La clave de idempotencia (cita + fecha y hora) es única:
+    volver a encolar no duplica mensajes y una cita reprogramada recibe uno
+    nuevo. dispatch() reclama lotes de mensajes pendientes, los envía con el
+    transporte configurado y reintenta los fallidos con espera exponencial;
+    los mensajes enviados nunca se vuelven a reclamar.
+    """
+    __tablename__ = 'reminder_outbox'
+    __table_args__ = (
+        # Lotes a despachar: pendientes con el próximo intento vencido
+        db.Index('ix_reminder_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    # Tamaño de las listas IN al comprobar claves ya encoladas
+    KEY_CHUNK = 500
+
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(64), unique=True, nullable=False)
+
+    # Referencias (la hora de la cita se guarda para detectar reprogramaciones)
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id'), nullable=False, index=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), nullable=False)
+    appointment_time = db.Column(db.DateTime, nullable=False)
+
+    # Mensaje renderizado
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+
+    # Estado: 'pending', 'sending' (reclamado por un worker), 'sent',
+    # 'failed' (agotó los reintentos), 'skipped' (la cita cambió o se canceló)
+    status = db.Column(db.String(20), default='pending', nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, nullable=False)
+    claim_token = db.Column(db.String(32), nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    appointment = db.relationship('Appointment', backref=db.backref('reminders', lazy='dynamic'))
+
+    @staticmethod
+    def key_for(appointment_id, date_time):
+        """Clave de idempotencia de un recordatorio"""
+        return f'recordatorio-{appointment_id}-{date_time:%Y%m%d%H%M}'
+
+    @classmethod
+    def enqueue_for_day(cls, day=None, now=None):
+        """Encolar los recordatorios de las citas programadas de un día
+
+        Usa una consulta para las citas (con paciente, doctor y especialidad),
+        una por tramo de KEY_CHUNK para descartar las ya encoladas y un INSERT
+        en lote. No hace commit.
+
+        Args:
+            day: Día de las citas (por defecto, mañana)
+
+        Returns:
+            dict: enqueued, already_queued, without_email
+        """
+        from app.models.appointment import Appointment
+        from app.models.patient import Patient
+        from app.models.specialty import Specialty
+        from app.models.user import User
+
+        now = now or datetime.now()
+        day = day or (now + timedelta(days=1)).date()
+        start = datetime.combine(day, datetime.min.time())
+
+        rows = db.session.execute(
+            select(
+                Appointment.id, Appointment.date_time, Appointment.duration, Appointment.patient_id,
+                Patient.first_name, Patient.last_name, Patient.email,
+                User.first_name.label('doctor_first_name'), User.last_name.label('doctor_last_name'),
+                Specialty.name.label('specialty_name')
+            ).join(Patient, Appointment.patient_id == Patient.id).join(
+                User, Appointment.doctor_id == User.id
+            ).join(Specialty, Appointment.specialty_id == Specialty.id).where(
+                Appointment.status == 'scheduled',
+                Appointment.date_time >= start,
+                Appointment.date_time < start + timedelta(days=1)
+            ).order_by(Appointment.date_time, Appointment.id)
+        ).all()
+
+        with_email = [row for row in rows if row.email and row.email.strip()]
+        keys = [cls.key_for(row.id, row.date_time) for row in with_email]
+        existing = set()
+        for offset in range(0, len(keys), cls.KEY_CHUNK):
+            existing.update(db.session.execute(
+                select(cls.idempotency_key).where(cls.idempotency_key.in_(keys[offset:offset + cls.KEY_CHUNK]))
+            ).scalars())
+
+        # Plantillas compiladas una vez y renderizadas por fila
+        environment = current_app.jinja_env
+        subject_template = environment.get_template('reminders/appointment_reminder_subject.txt')
+        body_template = environment.get_template('reminders/appointment_reminder.txt')
+        clinic = current_app.config.get('CLINIC_NAME', 'Clínica')
+
+        messages = []
+        for row, key in zip(with_email, keys):
+            if key in existing:
+                continue
+            context = {
+                'patient_name': f'{row.first_name} {row.last_name}',
+                'doctor_name': f'{row.doctor_first_name} {row.doctor_last_name}',
+                'specialty': row.specialty_name,
+                'date_time': row.date_time,
+                'duration': row.duration or 30,
+                'clinic': clinic
+            }
+            messages.append({
+                'idempotency_key': key, 'appointment_id': row.id, 'patient_id': row.patient_id,
+                'appointment_time': row.date_time, 'recipient': row.email.strip(),
+                'subject': subject_template.render(context).strip(), 'body': body_template.render(context),
+                'status': 'pending', 'attempts': 0, 'next_attempt_at': now, 'created_at': datetime.utcnow()
+            })
+        if messages:
+            db.session.execute(cls.__table__.insert(), messages)
+
+        return {
+            'enqueued': len(messages),
+            'already_queued': len(existing),
+            'without_email': len(rows) - len(with_email)
+        }
+
+    @classmethod
+    def _claim(cls, batch_size, now):
+        """Reclamar un lote de mensajes vencidos para este worker (con commit)
+
+        Los mensajes 'sending' de un worker caído vuelven a reclamarse tras
+        REMINDER_CLAIM_TIMEOUT segundos.
+        """
+        table = cls.__table__
+        stale = now - timedelta(seconds=current_app.config.get('REMINDER_CLAIM_TIMEOUT', 900))
+        due = or_(
+            and_(table.c.status == 'pending', table.c.next_attempt_at <= now),
+            and_(table.c.status == 'sending', table.c.claimed_at < stale)
+        )
+        ids = select(table.c.id).where(due).order_by(table.c.next_attempt_at, table.c.id).limit(batch_size)
+        token = uuid.uuid4().hex
+        # La condición se repite: otro worker pudo reclamar las mismas filas
+        db.session.execute(update(table).where(table.c.id.in_(ids.scalar_subquery()), due).values(
+            status='sending', claim_token=token, claimed_at=now
+        ))
+        db.session.commit()
+        return cls.query.filter_by(claim_token=token, status='sending').order_by(cls.id).all()
+
+    @classmethod
+    def dispatch(cls, transport, batch_size=None, now=None, max_batches=None):
+        """Enviar los mensajes vencidos por lotes
+
+        Cada lote usa dos sentencias para reclamarlo y leerlo, una para el
+        estado actual de sus citas, el envío por el transporte y un UPDATE
+        para todos los enviados (más uno por cada error). Los fallos se
+        reintentan tras REMINDER_RETRY_BASE_SECONDS * 2^(intentos - 1)
+        segundos y pasan a 'failed' al llegar a REMINDER_MAX_ATTEMPTS.
+
+        Returns:
+            dict: sent, retried, failed, skipped, batches
+        """
+        from app.models.appointment import Appointment
+
+        config = current_app.config
+        batch_size = batch_size or config.get('REMINDER_BATCH_SIZE', 100)
+        max_attempts = config.get('REMINDER_MAX_ATTEMPTS', 5)
+        retry_base = config.get('REMINDER_RETRY_BASE_SECONDS', 60)
+        now = now or datetime.now()
+        table = cls.__table__
+        totals = {'sent': 0, 'retried': 0, 'failed': 0, 'skipped': 0, 'batches': 0}
+
+        while max_batches is None or totals['batches'] < max_batches:
+            messages = cls._claim(batch_size, now)
+            if not messages:
+                break
+            totals['batches'] += 1
+
+            # La cita pudo cancelarse o reprogramarse después de encolar
+            current = {row.id: row for row in db.session.execute(
+                select(Appointment.id, Appointment.status, Appointment.date_time).where(
+                    Appointment.id.in_({message.appointment_id for message in messages})
+                )
+            )}
+            deliverable, skipped = [], []
+            for message in messages:
+                appointment = current.get(message.appointment_id)
+                if appointment is None or appointment.status != 'scheduled' \
+                        or appointment.date_time != message.appointment_time:
+                    skipped.append(message.id)
+                else:
+                    deliverable.append(message)
+
+            results = transport.send_batch(deliverable) if deliverable else {}
+            sent = [message_id for message_id, error in results.items() if error is None]
+            if sent:
+                db.session.execute(update(table).where(table.c.id.in_(sent)).values(
+                    status='sent', attempts=table.c.attempts + 1, sent_at=datetime.utcnow(),
+                    claim_token=None, last_error=None
+                ))
+            if skipped:
+                db.session.execute(update(table).where(table.c.id.in_(skipped)).values(
+                    status='skipped', claim_token=None
+                ))
+            for message in deliverable:
+                error = results.get(message.id, 'Sin respuesta del transporte')
+                if error is None:
+                    continue
+                attempts = message.attempts + 1
+                if attempts >= max_attempts:
+                    values = {'status': 'failed'}
+                    totals['failed'] += 1
+                else:
+                    values = {'status': 'pending',
+                              'next_attempt_at': now + timedelta(seconds=retry_base * 2 ** (attempts - 1))}
+                    totals['retried'] += 1
+                db.session.execute(update(table).where(table.c.id == message.id).values(
+                    attempts=attempts, last_error=error[:1000], claim_token=None, **values
+                ))
+            db.session.commit()
+
+            totals['sent'] += len(sent)
+            totals['skipped'] += len(skipped)
+        return totals
+
+    @classmethod
+    def stats(cls):
+        """Mensajes por estado"""
+        return dict(db.session.query(cls.status, db.func.count(cls.id)).group_by(cls.status).all())
+
+    def __repr__(self):
+        return f'<ReminderMessage {self.idempotency_key} ({self.status})>'
@@ -0,0 +1,198 @@
+from datetime import datetime
+from types import SimpleNamespace
+from app import db
+
+class ScheduleTemplate(db.Model):
+    """Plantilla de horario recurrente aplicable a varios doctores y rangos de fechas
+
+    Ejemplo: "Lun–Vie 08:00–14:00, 20 min, descanso 10:00–10:15" genera un
+    WorkSchedule por doctor, día de la semana y rango de fechas.
+    """
+    __tablename__ = 'schedule_templates'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    description = db.Column(db.Text)
+
+    # Días de la semana separados por comas (0=Lunes, ..., 6=Domingo)
+    days_of_week = db.Column(db.String(20), nullable=False)
+
+    # Horarios
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    appointment_duration = db.Column(db.Integer, default=30, nullable=False)
+    break_start_time = db.Column(db.Time, nullable=True)
+    break_end_time = db.Column(db.Time, nullable=True)
+    max_patients_per_day = db.Column(db.Integer, default=None)
+
+    # Estado y timestamps
+    is_active = db.Column(db.Boolean, default=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    DAY_NAMES_SHORT = ['Lun', 'Mar', 'Mié', 'Jue', 'Vie', 'Sáb', 'Dom']
+
+    @property
+    def days(self):
+        """Lista de días de la semana de la plantilla"""
+        return sorted(int(day) for day in self.days_of_week.split(',') if day.strip())
+
+    @days.setter
+    def days(self, values):
+        self.days_of_week = ','.join(str(day) for day in sorted(set(int(value) for value in values)))
+
+    @property
+    def days_label(self):
+        """Días formateados (p. ej. 'Lun–Vie' o 'Lun, Mié, Vie')"""
+        days = self.days
+        if len(days) > 2 and days == list(range(days[0], days[-1] + 1)):
+            return f"{self.DAY_NAMES_SHORT[days[0]]}–{self.DAY_NAMES_SHORT[days[-1]]}"
+        return ', '.join(self.DAY_NAMES_SHORT[day] for day in days)
+
+    @property
+    def summary(self):
+        """Descripción corta de la plantilla"""
+        text = (f"{self.days_label} {self.start_time.strftime('%H:%M')}–{self.end_time.strftime('%H:%M')}, "
+                f"{self.appointment_duration} min")
+        if self.break_start_time and self.break_end_time:
+            text += f", descanso {self.break_start_time.strftime('%H:%M')}–{self.break_end_time.strftime('%H:%M')}"
+        return text
+
+    def validate(self):
+        """Validar la configuración de la plantilla
+
+        Returns:
+            list: Mensajes de error (vacía si es válida)
+        """
+        from app.models.appointment import Appointment
+
+        errors = []
+        if not self.days or any(day < 0 or day > 6 for day in self.days):
+            errors.append('Seleccione al menos un día de la semana válido.')
+        if self.start_time >= self.end_time:
+            errors.append('La hora de inicio debe ser anterior a la hora de fin.')
+        duration_error = Appointment.duration_error(self.appointment_duration)
+        if duration_error:
+            errors.append(duration_error)
+        if bool(self.break_start_time) != bool(self.break_end_time):
+            errors.append('Indique inicio y fin del descanso.')
+        elif self.break_start_time and not (
+                self.start_time <= self.break_start_time < self.break_end_time <= self.end_time):
+            errors.append('El descanso debe estar dentro del horario de atención.')
+        return errors
+
+    @staticmethod
+    def _ranges_overlap(start_a, end_a, start_b, end_b):
+        """Intersección de rangos cerrados donde None significa sin límite"""
+        return ((end_b is None or start_a is None or start_a <= end_b) and
+                (end_a is None or start_b is None or start_b <= end_a))
+
+    @staticmethod
+    def _describe_block(block):
+        """Texto de un bloque existente o planificado para el informe de conflictos"""
+        start = block.start_date.strftime('%d/%m/%Y') if block.start_date else 'sin inicio'
+        end = block.end_date.strftime('%d/%m/%Y') if block.end_date else 'sin fin'
+        return f"{block.start_time.strftime('%H:%M')}–{block.end_time.strftime('%H:%M')} ({start} - {end})"
+
+    def plan(self, doctor_ids, periods):
+        """Calcular (sin escribir) los horarios que generaría la plantilla
+
+        Carga los horarios activos de todos los doctores con una sola consulta
+        y detecta bloques que se superponen con el mismo doctor y día, tanto
+        contra los existentes como entre los propios periodos solicitados.
+
+        Args:
+            doctor_ids: IDs de los doctores
+            periods: Lista de (fecha_inicio, fecha_fin o None)
+
+        Returns:
+            dict: {'create': [filas], 'conflicts': [filas con 'existing']} donde
+                cada fila tiene los campos de WorkSchedule más 'doctor_name'
+        """
+        from app.models.user import User
+        from app.models.work_schedule import WorkSchedule
+
+        doctor_ids = sorted(set(int(doctor_id) for doctor_id in doctor_ids))
+        doctors = {doctor.id: doctor for doctor in User.query.filter(
+            User.id.in_(doctor_ids), User.role == 'doctor'
+        ).all()}
+
+        existing = {}
+        for schedule in WorkSchedule.query.filter(
+            WorkSchedule.doctor_id.in_(doctor_ids),
+            WorkSchedule.day_of_week.in_(self.days),
+            WorkSchedule.is_active == True
+        ).all():
+            existing.setdefault((schedule.doctor_id, schedule.day_of_week), []).append(schedule)
+
+        diff = {'create': [], 'conflicts': []}
+        for doctor_id in doctor_ids:
+            doctor = doctors.get(doctor_id)
+            if doctor is None:
+                continue
+            for day in self.days:
+                blocks = existing.get((doctor_id, day), [])
+                planned = []
+                for start_date, end_date in periods:
+                    row = {
+                        'doctor_id': doctor_id,
+                        'doctor_name': doctor.full_name,
+                        'specialty_id': doctor.specialty_id,
+                        'day_of_week': day,
+                        'start_time': self.start_time,
+                        'end_time': self.end_time,
+                        'start_date': start_date,
+                        'end_date': end_date,
+                        'appointment_duration': self.appointment_duration,
+                        'break_start_time': self.break_start_time,
+                        'break_end_time': self.break_end_time,
+                        'max_patients_per_day': self.max_patients_per_day
+                    }
+
+                    overlapping = [block for block in blocks + planned
+                                   if block.start_time < self.end_time and self.start_time < block.end_time
+                                   and self._ranges_overlap(start_date, end_date, block.start_date, block.end_date)]
+                    if overlapping:
+                        row['existing'] = [self._describe_block(block) for block in overlapping]
+                        diff['conflicts'].append(row)
+                    else:
+                        diff['create'].append(row)
+                        planned.append(SimpleNamespace(**row))
+        return diff
+
+    def apply(self, doctor_ids, periods, dry_run=False, skip_conflicts=False):
+        """Aplicar la plantilla a varios doctores y periodos en una sola transacción
+
+        No hace commit. Si hay conflictos y skip_conflicts es False no se
+        escribe nada; con dry_run sólo se devuelve la diferencia.
+
+        Returns:
+            dict: Diferencia de plan() más 'applied' (bool)
+        """
+        from app.models.work_schedule import WorkSchedule
+        from app.models.appointment_slot import AppointmentSlot
+        from app.utils.availability_cache import availability_cache
+
+        diff = self.plan(doctor_ids, periods)
+        diff['applied'] = False
+        if dry_run or not diff['create'] or (diff['conflicts'] and not skip_conflicts):
+            return diff
+
+        # Inserción masiva (executemany) de todos los bloques en la transacción actual
+        now = datetime.utcnow()
+        db.session.execute(WorkSchedule.__table__.insert(), [
+            dict({key: value for key, value in row.items() if key != 'doctor_name'},
+                 is_active=True, created_at=now, updated_at=now)
+            for row in diff['create']
+        ])
+
+        # Regenerar el inventario de slots e invalidar la caché de los doctores afectados
+        for doctor_id in sorted({row['doctor_id'] for row in diff['create']}):
+            AppointmentSlot.regenerate_for_doctor(doctor_id)
+            availability_cache.invalidate_on_commit(db.session, doctor_id)
+
+        diff['applied'] = True
+        return diff
+
+    def __repr__(self):
+        return f'<ScheduleTemplate {self.name}: {self.summary}>'
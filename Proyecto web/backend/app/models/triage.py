@@ -4,12 +4,19 @@ from app import db
 class Triage(db.Model):
     """Modelo de triage - evaluación inicial del paciente por enfermera"""
     __tablename__ = 'triages'
+    __table_args__ = (
+        # Pacientes de una enfermera y su último triage (directorio de enfermería)
+        db.Index('ix_triages_nurse_patient_created', 'nurse_id', 'patient_id', 'created_at'),
+        # Contadores del dashboard de enfermería: pendientes y completados del día
+        db.Index('ix_triages_status', 'status'),
+        db.Index('ix_triages_nurse_completed', 'nurse_id', 'completed_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
     # Referencias
     patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), nullable=False)
-    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id'), nullable=True)
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id'), nullable=True, index=True)
     nurse_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     
     # Signos vitales básicos
@@ -203,15 +210,17 @@ class Triage(db.Model):
         }
         return colors.get(self.priority_level, 'secondary')
     
+    # Etiquetas legibles de cada nivel de prioridad
+    PRIORITY_LABELS = {
+        'alta': 'Prioridad Alta',
+        'media': 'Prioridad Media',
+        'baja': 'Prioridad Baja'
+    }
+    
     @property
     def priority_label(self):
         """Etiqueta legible para la prioridad"""
-        labels = {
-            'alta': 'Prioridad Alta',
-            'media': 'Prioridad Media',
-            'baja': 'Prioridad Baja'
-        }
-        return labels.get(self.priority_level, 'Sin Clasificar')
+        return self.PRIORITY_LABELS.get(self.priority_level, 'Sin Clasificar')
     
     def is_vital_signs_abnormal(self):
         """Verificar signos vitales anormales usando validaciones específicas por edad"""
@@ -0,0 +1,221 @@
+from datetime import datetime
+from app import db
+
+class WaitlistEntry(db.Model):
+    """Paciente en lista de espera para un horario de una especialidad o doctor
+
+    Cuando se cancela una cita, backfill() busca con una consulta indexada la
+    entrada en espera de mayor prioridad compatible con el horario liberado y
+    le ofrece el horario o la agenda automáticamente.
+    """
+    __tablename__ = 'waitlist_entries'
+    __table_args__ = (
+        # Búsqueda de candidatos: igualdad en estado/especialidad y recorrido
+        # ordenado por prioridad y antigüedad desde el primer elemento (o desde
+        # el último candidato visto). Las entradas con la ventana vencida pasan a
+        # 'expired' (regla expired_waitlist de HousekeepingRun) y salen del recorrido
+        db.Index('ix_waitlist_match', 'status', 'specialty_id', 'priority', 'created_at'),
+    )
+
+    # Prioridades (menor número = más urgente)
+    PRIORITIES = {1: 'Urgente', 2: 'Alta', 3: 'Normal'}
+
+    # Candidatos evaluados por tramo al cancelar (se descartan los que tienen otra cita a esa hora)
+    MATCH_CANDIDATES = 10
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    # Referencias
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), nullable=False, index=True)
+    specialty_id = db.Column(db.Integer, db.ForeignKey('specialties.id'), nullable=False)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # None = cualquier doctor
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id'), nullable=True)  # cita agendada
+
+    # Ventana aceptable
+    earliest_date = db.Column(db.Date, nullable=False)
+    latest_date = db.Column(db.Date, nullable=False)
+    time_from = db.Column(db.Time, nullable=True)
+    time_to = db.Column(db.Time, nullable=True)
+
+    priority = db.Column(db.Integer, default=3, nullable=False)
+    auto_book = db.Column(db.Boolean, default=False, nullable=False)  # agendar sin confirmar con el paciente
+    reason = db.Column(db.Text)
+
+    # Estado: 'waiting', 'offered', 'booked', 'cancelled', 'expired'
+    status = db.Column(db.String(20), default='waiting', nullable=False)
+
+    # Horario ofrecido pendiente de confirmación
+    offered_doctor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    offered_date_time = db.Column(db.DateTime, nullable=True)
+    offered_duration = db.Column(db.Integer, nullable=True)
+    offered_at = db.Column(db.DateTime, nullable=True)
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relaciones
+    patient = db.relationship('Patient', backref=db.backref('waitlist_entries', lazy='dynamic'))
+    specialty = db.relationship('Specialty')
+    doctor = db.relationship('User', foreign_keys=[doctor_id])
+    offered_doctor = db.relationship('User', foreign_keys=[offered_doctor_id])
+    appointment = db.relationship('Appointment', foreign_keys=[appointment_id])
+
+    @property
+    def priority_label(self):
+        return self.PRIORITIES.get(self.priority, 'Normal')
+
+    @property
+    def status_label(self):
+        labels = {
+            'waiting': 'En espera',
+            'offered': 'Horario ofrecido',
+            'booked': 'Agendado',
+            'cancelled': 'Cancelado',
+            'expired': 'Vencido'
+        }
+        return labels.get(self.status, 'Estado desconocido')
+
+    @classmethod
+    def find_candidates(cls, doctor_id, specialty_id, date_time, limit=None, after=None, exclude_ids=()):
+        """Entradas en espera compatibles con un horario, por prioridad y antigüedad
+
+        Usa el índice ix_waitlist_match: igualdad en (status, specialty_id) y
+        recorrido ordenado por (priority, created_at) hasta reunir `limit`
+        candidatos, sin leer toda la lista de espera. Para seguir después de un
+        tramo se pasa en `after` la clave (priority, created_at, id) del último
+        candidato, de modo que el recorrido retoma en el índice en lugar de
+        saltar filas con OFFSET.
+        """
+        slot_date = date_time.date()
+        slot_time = date_time.time()
+        query = cls.query.filter(
+            cls.status == 'waiting',
+            cls.specialty_id == specialty_id,
+            db.or_(cls.doctor_id == None, cls.doctor_id == doctor_id),
+            cls.earliest_date <= slot_date,
+            cls.latest_date >= slot_date,
+            db.or_(cls.time_from == None, cls.time_from <= slot_time),
+            db.or_(cls.time_to == None, cls.time_to > slot_time)
+        )
+        if exclude_ids:
+            query = query.filter(cls.id.notin_(list(exclude_ids)))
+        if after:
+            priority, created_at, entry_id = after
+            query = query.filter(db.or_(
+                cls.priority > priority,
+                db.and_(cls.priority == priority, cls.created_at > created_at),
+                db.and_(cls.priority == priority, cls.created_at == created_at, cls.id > entry_id)
+            ))
+        return query.order_by(cls.priority, cls.created_at, cls.id).limit(limit or cls.MATCH_CANDIDATES).all()
+
+    @classmethod
+    def backfill(cls, appointment, exclude_ids=()):
+        """Ofrecer o agendar el horario de una cita cancelada (sin commit)
+
+        Recorre los candidatos de a MATCH_CANDIDATES y toma el primero sin
+        otra cita superpuesta; si la entrada admite agendado automático se
+        crea la cita, si no queda como oferta pendiente de confirmación. Si el
+        doctor ya tiene otra cita en ese horario no se ofrece a nadie.
+
+        Returns:
+            WaitlistEntry o None si nadie en espera es compatible
+        """
+        from app.models.appointment import Appointment, SlotTakenError
+
+        if appointment.date_time <= datetime.now():
+            return None
+
+        duration = appointment.duration or 30
+        after = None
+        while True:
+            candidates = cls.find_candidates(
+                appointment.doctor_id, appointment.specialty_id, appointment.date_time,
+                cls.MATCH_CANDIDATES, after, exclude_ids
+            )
+            if not candidates:
+                return None
+
+            # Conflictos de los candidatos con citas existentes (una consulta por tramo);
+            # los candidatos comparten horario entre sí, así que se ignoran los del propio lote
+            conflicts = Appointment.find_conflicts([{
+                'doctor_id': appointment.doctor_id,
+                'patient_id': entry.patient_id,
+                'date_time': appointment.date_time,
+                'duration': duration
+            } for entry in candidates], exclude_ids=[appointment.id] if appointment.id else ())
+
+            for entry, entry_conflicts in zip(candidates, conflicts):
+                kinds = {kind for kind, conflict in entry_conflicts if not isinstance(conflict, int)}
+                if 'doctor' in kinds:
+                    # El horario liberado ya fue ocupado por otra cita del doctor
+                    return None
+                if 'patient' in kinds:
+                    continue
+                entry.offered_doctor_id = appointment.doctor_id
+                entry.offered_date_time = appointment.date_time
+                entry.offered_duration = duration
+                entry.offered_at = datetime.utcnow()
+                entry.status = 'offered'
+                if entry.auto_book:
+                    try:
+                        entry.book_offer()
+                    except SlotTakenError:
+                        return None
+                return entry
+
+            if len(candidates) < cls.MATCH_CANDIDATES:
+                return None
+            last = candidates[-1]
+            after = (last.priority, last.created_at, last.id)
+
+    def book_offer(self):
+        """Agendar el horario ofrecido (sin commit)
+
+        La reserva se hace en un savepoint: si el horario ya fue ocupado sólo
+        se deshace la reserva (no la transacción en curso, p. ej. la
+        cancelación que liberó el horario) y la entrada vuelve a la espera.
+
+        Raises:
+            SlotTakenError: Si el horario ya fue ocupado
+        """
+        from app.models.appointment import Appointment, SlotTakenError
+
+        appointment = Appointment(
+            patient_id=self.patient_id,
+            doctor_id=self.offered_doctor_id,
+            specialty_id=self.specialty_id,
+            date_time=self.offered_date_time,
+            duration=self.offered_duration,
+            reason=self.reason or 'Agendada desde lista de espera',
+            status='scheduled'
+        )
+        try:
+            appointment.reserve(savepoint=True)
+        except SlotTakenError:
+            self.clear_offer()
+            raise
+        self.appointment_id = appointment.id
+        self.status = 'booked'
+        return appointment
+
+    def clear_offer(self):
+        """Volver a la espera sin horario ofrecido (sin commit)"""
+        self.status = 'waiting'
+        self.offered_doctor_id = self.offered_date_time = self.offered_duration = self.offered_at = None
+
+    def decline_offer(self):
+        """Rechazar la oferta: la entrada vuelve a la espera y el horario pasa al siguiente (sin commit)
+
+        Returns:
+            WaitlistEntry o None: Siguiente entrada a la que se ofreció el horario
+        """
+        from app.models.appointment import Appointment
+
+        freed = Appointment(doctor_id=self.offered_doctor_id, specialty_id=self.specialty_id,
+                            date_time=self.offered_date_time, duration=self.offered_duration)
+        self.clear_offer()
+        return WaitlistEntry.backfill(freed, exclude_ids=(self.id,))
+
+    def __repr__(self):
+        return f'<WaitlistEntry patient={self.patient_id} specialty={self.specialty_id} ({self.status})>'
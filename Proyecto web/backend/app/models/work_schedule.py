@@ -1,4 +1,5 @@
-from datetime import datetime, time
+from bisect import bisect_left
+from datetime import datetime, time, timedelta
 from app import db
 from sqlalchemy import Enum
 
@@ -6,6 +7,9 @@ class WorkSchedule(db.Model):
     """Modelo para configuración de horarios de trabajo de médicos"""
     __tablename__ = 'work_schedules'
     
+    # Días de citas cargados por consulta en las búsquedas entre doctores
+    BOOKING_WINDOW_DAYS = 14
+    
     id = db.Column(db.Integer, primary_key=True)
     
     # Referencias
@@ -76,50 +80,53 @@ class WorkSchedule(db.Model):
         else:
             return "Sin límite de fechas"
     
-    def get_available_slots(self, date=None):
-        """Obtener slots disponibles para una fecha específica"""
+    def get_slot_grid(self, date):
+        """Generar la grilla de slots del día (sin descanso), sin consultar citas"""
         from datetime import datetime, timedelta
         
-        if not date:
-            date = datetime.now().date()
-        
-        # Verificar si es el día correcto de la semana
-        if date.weekday() != self.day_of_week:
-            return []
-        
-        # Verificar si la fecha está dentro del rango de vigencia
-        if self.start_date and date < self.start_date:
-            return []
-        
-        if self.end_date and date > self.end_date:
+        # Verificar día de la semana y rango de vigencia
+        if not self.is_valid_for_date(date):
             return []
         
         slots = []
         current_time = datetime.combine(date, self.start_time)
         end_time = datetime.combine(date, self.end_time)
+        step = timedelta(minutes=self.appointment_duration or 30)
         
         while current_time < end_time:
-            # Verificar si está en horario de descanso
-            if (self.break_start_time and self.break_end_time and
-                self.break_start_time <= current_time.time() < self.break_end_time):
-                current_time += timedelta(minutes=self.appointment_duration)
-                continue
-            
-            # Verificar si el slot está disponible (no tiene cita programada)
-            from app.models.appointment import Appointment
-            existing_appointment = Appointment.query.filter(
-                Appointment.doctor_id == self.doctor_id,
-                Appointment.date_time == current_time,
-                Appointment.status.in_(['scheduled', 'in_triage', 'ready_for_doctor', 'in_consultation'])
-            ).first()
-            
-            if not existing_appointment:
-                slots.append(current_time.time())
-            
-            current_time += timedelta(minutes=self.appointment_duration)
+            # Omitir slots dentro del horario de descanso
+            if not (self.break_start_time and self.break_end_time and
+                    self.break_start_time <= current_time.time() < self.break_end_time):
+                slots.append(current_time)
+            current_time += step
         
         return slots
     
+    def get_available_slots(self, date=None, booked_times=None):
+        """Obtener slots disponibles para una fecha específica
+        
+        Un slot está ocupado si se superpone con alguna cita activa
+        [inicio, inicio + duración), no sólo si coincide su inicio.
+        
+        Args:
+            date: Fecha a consultar (por defecto hoy)
+            booked_times: Lista opcional (inicio, fin) de citas del doctor, como
+                la devuelve get_booked_times(). Si no se proporciona se carga
+                con una sola consulta.
+        """
+        if not date:
+            date = datetime.now().date()
+        
+        grid = self.get_slot_grid(date)
+        if not grid:
+            return []
+        
+        if booked_times is None:
+            booked_times = self.get_booked_times([self.doctor_id], date).get(self.doctor_id, [])
+        
+        step = timedelta(minutes=self.appointment_duration or 30)
+        return [slot.time() for slot in grid if not self.is_booked(booked_times, slot, step)]
+    
     def is_available_at(self, date_time):
         """Verificar si el doctor está disponible en una fecha/hora específica"""
         # Verificar día de la semana
@@ -165,6 +172,48 @@ class WorkSchedule(db.Model):
         
         return schedules
     
+    @classmethod
+    def get_booked_times(cls, doctor_ids, date, end_date=None):
+        """Cargar en una sola consulta las citas activas de varios doctores en un día
+        
+        Si se indica end_date se cargan todas las citas del rango [date, end_date].
+        También se incluyen las que empiezan antes (hasta MAX_DURATION_MINUTES)
+        y todavía ocupan el inicio del rango.
+        
+        Returns:
+            dict: {doctor_id: [(inicio, fin), ...]} ordenado por inicio
+        """
+        from app.models.appointment import Appointment
+        
+        booked = {doctor_id: [] for doctor_id in doctor_ids}
+        if not doctor_ids:
+            return booked
+        
+        day_start = datetime.combine(date, datetime.min.time())
+        rows = db.session.query(Appointment.doctor_id, Appointment.date_time, Appointment.duration).filter(
+            Appointment.doctor_id.in_(list(doctor_ids)),
+            Appointment.date_time > day_start - timedelta(minutes=Appointment.MAX_DURATION_MINUTES),
+            Appointment.date_time < datetime.combine(end_date or date, datetime.min.time()) + timedelta(days=1),
+            Appointment.status.in_(Appointment.ACTIVE_STATUSES)
+        ).order_by(Appointment.date_time).all()
+        
+        for doctor_id, date_time, duration in rows:
+            booked.setdefault(doctor_id, []).append((date_time, date_time + timedelta(minutes=duration or 30)))
+        
+        return booked
+    
+    @staticmethod
+    def is_booked(booked, slot, step):
+        """Verificar si [slot, slot + step) se superpone con alguna cita
+        
+        Args:
+            booked: Lista (inicio, fin) ordenada de get_booked_times()
+        """
+        from app.models.appointment import Appointment
+        
+        low = bisect_left(booked, (slot - timedelta(minutes=Appointment.MAX_DURATION_MINUTES),))
+        return any(end > slot for _, end in booked[low:bisect_left(booked, (slot + step,))])
+    
     @classmethod
     def get_available_times(cls, doctor_id, date, specialty_id=None):
         """Obtener horarios disponibles para un doctor en una fecha específica"""
@@ -177,17 +226,324 @@ class WorkSchedule(db.Model):
         if not schedules and specialty_id:
             schedules = cls.get_doctor_schedule(doctor_id, day_of_week, None, for_date=date)
         
-        available_times = []
+        if not schedules:
+            return []
+        
+        # Una sola consulta de citas para todos los horarios del día
+        booked_times = cls.get_booked_times([doctor_id], date)[doctor_id]
+        
+        available_times = set()
         for schedule in schedules:
             if schedule.is_active:
-                slots = schedule.get_available_slots(date)
-                available_times.extend(slots)
+                available_times.update(schedule.get_available_slots(date, booked_times))
+        
+        # Ordenar (los duplicados ya se eliminaron con el conjunto)
+        return sorted(available_times)
+    
+    @classmethod
+    def get_available_times_for_doctors(cls, doctor_ids, date, specialty_id=None):
+        """Obtener horarios disponibles de varios doctores para una fecha
+        
+        Usa dos consultas en total (horarios y citas) sin importar el número de doctores.
+        
+        Returns:
+            dict: {doctor_id: [time, ...]} con los horarios libres ordenados
+        """
+        doctor_ids = list(doctor_ids)
+        result = {doctor_id: [] for doctor_id in doctor_ids}
+        if not doctor_ids:
+            return result
+        
+        schedules = cls.query.filter(
+            cls.doctor_id.in_(doctor_ids),
+            cls.day_of_week == date.weekday(),
+            cls.is_active == True
+        ).all()
+        
+        # Agrupar por doctor respetando la prioridad especialidad -> horario general
+        by_doctor = {}
+        for schedule in schedules:
+            if schedule.is_valid_for_date(date):
+                by_doctor.setdefault(schedule.doctor_id, []).append(schedule)
+        
+        if specialty_id:
+            for doctor_id, doctor_schedules in by_doctor.items():
+                specific = [s for s in doctor_schedules if s.specialty_id == specialty_id]
+                by_doctor[doctor_id] = specific or doctor_schedules
+        
+        booked = cls.get_booked_times(list(by_doctor.keys()), date)
+        
+        for doctor_id, doctor_schedules in by_doctor.items():
+            available_times = set()
+            for schedule in doctor_schedules:
+                available_times.update(schedule.get_available_slots(date, booked[doctor_id]))
+            result[doctor_id] = sorted(available_times)
+        
+        return result
+    
+    @classmethod
+    def get_available_dates(cls, doctor_id, start_date, end_date, schedules=None, specialty_id=None):
+        """Calcular las fechas con cupo de un doctor y los slots libres de cada una
+        
+        Las fechas se obtienen por aritmética de calendario sobre la vigencia y el
+        día de la semana de cada horario; las citas del rango se cargan con una
+        sola consulta. Cada fecha usa los mismos horarios que
+        get_available_times_for_doctors() (los de la especialidad si existen) y
+        cuenta como libres los slots de la grilla sin cita, sólo los futuros si
+        la fecha es hoy (sin superposición con citas [inicio, inicio + duración)).
+        El tope max_patients_per_day cuenta todas las citas activas del día.
+        Los días completos se excluyen.
+        
+        Returns:
+            dict: {date: slots_libres} ordenado por fecha
+        """
+        from datetime import datetime, timedelta
+        
+        if schedules is None:
+            schedules = cls.query.filter_by(doctor_id=doctor_id, is_active=True).all()
+        
+        # Horarios válidos por fecha
+        day_schedules = {}
+        for schedule in schedules:
+            first = max(start_date, schedule.start_date or start_date)
+            last = min(end_date, schedule.end_date or end_date)
+            if first > last:
+                continue
+            
+            first += timedelta(days=(schedule.day_of_week - first.weekday()) % 7)
+            current_date = first
+            while current_date <= last:
+                day_schedules.setdefault(current_date, []).append(schedule)
+                current_date += timedelta(days=7)
+        
+        if not day_schedules:
+            return {}
+        
+        # Citas activas del rango con una sola consulta
+        booked = cls.get_booked_times([doctor_id], min(day_schedules), max(day_schedules))[doctor_id]
+        booked_by_date = {}
+        for start, _ in booked:
+            booked_by_date[start.date()] = booked_by_date.get(start.date(), 0) + 1
+        
+        # La grilla horaria (hora, duración) es la misma para todas las fechas de un horario
+        grids = {}
+        now = datetime.now()
+        available_dates = {}
+        for current_date in sorted(day_schedules):
+            valid = day_schedules[current_date]
+            # Priorizar horarios de la especialidad sobre los generales
+            if specialty_id:
+                valid = [s for s in valid if s.specialty_id == specialty_id] or valid
+            
+            times = {}
+            for schedule in valid:
+                if schedule.id not in grids:
+                    step = timedelta(minutes=schedule.appointment_duration or 30)
+                    grids[schedule.id] = [(slot.time(), step) for slot in schedule.get_slot_grid(current_date)]
+                for slot_time, step in grids[schedule.id]:
+                    times.setdefault(slot_time, step)
+            if current_date == now.date():
+                times = {slot: step for slot, step in times.items() if slot > now.time()}
+            
+            remaining = sum(1 for slot, step in times.items()
+                            if not cls.is_booked(booked, datetime.combine(current_date, slot), step))
+            limits = [s.max_patients_per_day for s in valid if s.max_patients_per_day]
+            if limits:
+                remaining = min(remaining, max(limits) - booked_by_date.get(current_date, 0))
+            if remaining > 0:
+                available_dates[current_date] = remaining
+        
+        return available_dates
+    
+    @classmethod
+    def find_first_available(cls, specialty_id, start_date, end_date, time_from=None, time_to=None, limit=10):
+        """Buscar los primeros slots libres de una especialidad entre todos los doctores activos
+        
+        Usa una consulta de horarios (con sus doctores) y una consulta de citas por
+        cada bloque de BOOKING_WINDOW_DAYS días recorrido, deteniéndose al completar
+        el límite.
+        
+        Args:
+            specialty_id: Especialidad buscada
+            start_date, end_date: Ventana de fechas (inclusive)
+            time_from, time_to: Preferencia horaria opcional [time_from, time_to)
+            limit: Número máximo de slots a devolver
+        
+        Returns:
+            list: [(datetime, doctor), ...] ordenados por fecha y hora
+        """
+        from datetime import datetime, timedelta
+        from sqlalchemy.orm import contains_eager
+        from app.models.user import User
+        
+        schedules = cls.query.join(cls.doctor).options(contains_eager(cls.doctor)).filter(
+            cls.is_active == True,
+            User.role == 'doctor',
+            User.is_active == True,
+            db.or_(cls.specialty_id == specialty_id, User.specialty_id == specialty_id),
+            db.or_(cls.start_date == None, cls.start_date <= end_date),
+            db.or_(cls.end_date == None, cls.end_date >= start_date)
+        ).all()
+        
+        if not schedules:
+            return []
+        
+        # Indexar horarios por día de la semana y doctor
+        by_weekday = {}
+        for schedule in schedules:
+            by_weekday.setdefault(schedule.day_of_week, {}).setdefault(schedule.doctor_id, []).append(schedule)
+        
+        doctor_ids = {schedule.doctor_id for schedule in schedules}
+        now = datetime.now()
+        
+        results = []
+        booked = {}
+        window_end = None
+        current_date = start_date
+        while current_date <= end_date and len(results) < limit:
+            # Cargar las citas del siguiente bloque de días en una sola consulta
+            if window_end is None or current_date > window_end:
+                window_end = min(current_date + timedelta(days=cls.BOOKING_WINDOW_DAYS - 1), end_date)
+                booked = cls.get_booked_times(doctor_ids, current_date, window_end)
+            
+            day_candidates = {}
+            for doctor_id, doctor_schedules in by_weekday.get(current_date.weekday(), {}).items():
+                valid = [s for s in doctor_schedules if s.is_valid_for_date(current_date)]
+                # Priorizar horarios de la especialidad sobre los generales
+                valid = [s for s in valid if s.specialty_id == specialty_id] or valid
+                for schedule in valid:
+                    step = timedelta(minutes=schedule.appointment_duration or 30)
+                    for slot in schedule.get_slot_grid(current_date):
+                        if slot <= now or cls.is_booked(booked[doctor_id], slot, step):
+                            continue
+                        if time_from and slot.time() < time_from:
+                            continue
+                        if time_to and slot.time() >= time_to:
+                            continue
+                        day_candidates[(slot, doctor_id)] = schedule.doctor
+            
+            for slot, doctor_id in sorted(day_candidates):
+                results.append((slot, day_candidates[(slot, doctor_id)]))
+                if len(results) >= limit:
+                    break
+            current_date += timedelta(days=1)
+        
+        return results
+    
+    @classmethod
+    def get_week_calendar(cls, week_start, doctor_ids=None):
+        """Agenda semanal de varios doctores en formato columnar compacto
+        
+        Usa tres consultas sin importar el número de doctores: doctores,
+        horarios y citas de la semana (con el nombre del paciente). Las horas
+        se expresan en minutos desde la medianoche y los días como índice
+        0-6 desde week_start; cada sección es un objeto de columnas paralelas.
+        
+        Args:
+            week_start: Lunes de la semana
+            doctor_ids: IDs de doctores (por defecto todos los activos)
+        
+        Returns:
+            dict: doctors, blocks, appointments y free (ver api_calendar)
+        """
+        from datetime import datetime, timedelta
+        from app.models.user import User
+        from app.models.patient import Patient
+        from app.models.appointment import Appointment
+        
+        def minutes(value):
+            return value.hour * 60 + value.minute
+        
+        week_days = [week_start + timedelta(days=offset) for offset in range(7)]
+        range_start = datetime.combine(week_start, datetime.min.time())
+        range_end = range_start + timedelta(days=7)
+        
+        # 1) Doctores
+        doctor_query = db.session.query(User.id, User.first_name, User.last_name).filter(
+            User.role == 'doctor', User.is_active == True
+        )
+        if doctor_ids is not None:
+            doctor_query = doctor_query.filter(User.id.in_(list(doctor_ids)))
+        doctors = doctor_query.order_by(User.first_name, User.last_name).all()
+        doctor_index = {doctor.id: index for index, doctor in enumerate(doctors)}
+        
+        calendar = {
+            'days': [day.isoformat() for day in week_days],
+            'doctors': {'id': [d.id for d in doctors], 'name': [f'{d.first_name} {d.last_name}' for d in doctors]},
+            'blocks': {'doctor': [], 'day': [], 'start': [], 'end': [], 'break_start': [], 'break_end': [], 'step': []},
+            'appointments': {'id': [], 'doctor': [], 'day': [], 'start': [], 'duration': [], 'patient': [], 'status': []},
+            'statuses': list(Appointment.ACTIVE_STATUSES) + ['completed', 'no_show', 'incomplete'],
+            'free': {'doctor': [], 'day': [], 'slots': []}
+        }
+        if not doctors:
+            return calendar
+        
+        # 2) Horarios vigentes durante la semana
+        schedules = cls.query.filter(
+            cls.doctor_id.in_(list(doctor_index)),
+            cls.is_active == True,
+            db.or_(cls.start_date == None, cls.start_date <= week_days[-1]),
+            db.or_(cls.end_date == None, cls.end_date >= week_start)
+        ).order_by(cls.doctor_id, cls.day_of_week, cls.start_time).all()
+        
+        # 3) Citas de la semana (no canceladas) con las iniciales del paciente
+        status_index = {status: index for index, status in enumerate(calendar['statuses'])}
+        appointments = db.session.query(
+            Appointment.id, Appointment.doctor_id, Appointment.date_time, Appointment.duration,
+            Appointment.status, Patient.first_name, Patient.last_name
+        ).join(Patient, Patient.id == Appointment.patient_id).filter(
+            Appointment.doctor_id.in_(list(doctor_index)),
+            Appointment.date_time >= range_start,
+            Appointment.date_time < range_end,
+            Appointment.status.in_(calendar['statuses'])
+        ).order_by(Appointment.date_time).all()
+        
+        busy = {}
+        columns = calendar['appointments']
+        for row in appointments:
+            day = (row.date_time.date() - week_start).days
+            columns['id'].append(row.id)
+            columns['doctor'].append(doctor_index[row.doctor_id])
+            columns['day'].append(day)
+            columns['start'].append(minutes(row.date_time))
+            columns['duration'].append(row.duration or 30)
+            columns['patient'].append(f'{(row.first_name or " ")[0]}{(row.last_name or " ")[0]}'.strip().upper())
+            columns['status'].append(status_index[row.status])
+            busy.setdefault((row.doctor_id, day), []).append(
+                (row.date_time, row.date_time + timedelta(minutes=row.duration or 30)))
+        
+        # Bloques de atención y slots libres (futuros y sin superposición con citas)
+        now = datetime.now()
+        free_slots = {}
+        columns = calendar['blocks']
+        for schedule in schedules:
+            for day, current_date in enumerate(week_days):
+                grid = schedule.get_slot_grid(current_date)
+                if not grid:
+                    continue
+                columns['doctor'].append(doctor_index[schedule.doctor_id])
+                columns['day'].append(day)
+                columns['start'].append(minutes(schedule.start_time))
+                columns['end'].append(minutes(schedule.end_time))
+                columns['break_start'].append(minutes(schedule.break_start_time) if schedule.break_start_time else None)
+                columns['break_end'].append(minutes(schedule.break_end_time) if schedule.break_end_time else None)
+                columns['step'].append(schedule.appointment_duration or 30)
+                
+                step = timedelta(minutes=schedule.appointment_duration or 30)
+                taken = busy.get((schedule.doctor_id, day), ())
+                slots = free_slots.setdefault((doctor_index[schedule.doctor_id], day), set())
+                for slot in grid:
+                    if slot > now and not any(start < slot + step and slot < end for start, end in taken):
+                        slots.add(minutes(slot))
         
-        # Eliminar duplicados y ordenar
-        available_times = list(set(available_times))
-        available_times.sort()
+        columns = calendar['free']
+        for (doctor, day), slots in sorted(free_slots.items()):
+            if slots:
+                columns['doctor'].append(doctor)
+                columns['day'].append(day)
+                columns['slots'].append(sorted(slots))
         
-        return available_times
+        return calendar
     
     def is_valid_for_date(self, date):
         """Verificar si el horario es válido para una fecha específica"""
@@ -9,13 +9,18 @@ import csv
 import io
 from app.utils.decorators import require_role
 from app.models.user import User
-from app.models.patient import Patient
+from app.models.patient import Patient, AGE_GROUPS, AGE_GROUP_LABELS
 from app.models.appointment import Appointment
 from app.models.medical_record import MedicalRecord
 from app.models.specialty import Specialty
 from app.models.salary_configuration import SalaryConfiguration, CommissionRecord
 from app.models.work_schedule import WorkSchedule
+from app.models.appointment_slot import AppointmentSlot
+from app.models.schedule_template import ScheduleTemplate
 from app.models.invoice import Invoice
+from app.utils.availability_cache import availability_cache
+from app.utils.patient_search import patient_filter
+from app.utils.patient_directory import SORTS, directory_args, directory_page, gender_counts
 from app import db
 
 # Blueprint para administrador
@@ -268,12 +273,16 @@ def reports():
     # Estadísticas de doctores
     doctor_stats = get_doctor_statistics(start_date, end_date)
     
+    # Estadísticas por grupo etario
+    age_group_stats = get_age_group_statistics(start_date, end_date)
+    
     return render_template('admin/reports.html', 
                          title='Reportes Administrativos',
                          stats=stats,
                          specialty_stats=specialty_stats,
                          monthly_stats=monthly_stats,
                          doctor_stats=doctor_stats,
+                         age_group_stats=age_group_stats,
                          start_date=start_date,
                          end_date=end_date,
                          period=period)
@@ -282,48 +291,52 @@ def reports():
 @login_required
 @require_role('admin')
 def patients():
-    """Vista de todos los pacientes para administrador"""
-    # Obtener parámetros de búsqueda
-    search = request.args.get('search', '')
-    gender = request.args.get('gender', '')
-    status = request.args.get('status', '')
-    
-    print(f"DEBUG - Parámetros recibidos - search: '{search}', gender: '{gender}', status: '{status}'")
+    """Vista de todos los pacientes para administrador (paginada por cursor)"""
+    cursor, filters, per_page = directory_args(('search', 'gender', 'status', 'age_group'))
+    search = filters.get('search', '')
+    gender = filters.get('gender', '')
+    status = filters.get('status', '')
+    age_group = filters.get('age_group', '')
     
     # Construir query base
     query = Patient.query
     
     # Aplicar filtros
     if search:
-        search_term = f"%{search}%"
-        query = query.filter(
-            db.or_(
-                Patient.first_name.ilike(search_term),
-                Patient.last_name.ilike(search_term),
-                Patient.dni.ilike(search_term),
-                Patient.email.ilike(search_term)
-            )
-        )
+        query = query.filter(patient_filter(search))
     
     # Aplicar filtro de género si se especifica
     if gender:
-        print(f"DEBUG - Aplicando filtro de género: '{gender}'")
         # Convertir el valor del formulario al formato de la base de datos
         # Comparación insensible a mayúsculas/minúsculas y espacios
         normalized_gender = gender.strip().lower()
         query = query.filter(func.lower(func.trim(Patient.gender)) == normalized_gender)
     
-    # Ejecutar query con ordenamiento
-    patients = query.order_by(Patient.created_at.desc()).all()
+    # Filtro de estado (activos / inactivos)
+    if status in ('active', 'inactive'):
+        query = query.filter(Patient.is_active == (status == 'active'))
+    
+    # Filtro por grupo etario (rango de fecha de nacimiento)
+    if age_group in AGE_GROUP_LABELS:
+        query = query.filter(Patient.age_group_filter(age_group))
     
-    print(f"DEBUG - Número de pacientes encontrados: {len(patients)}")
-    if patients:
-        print(f"DEBUG - Primer paciente: {patients[0].first_name} {patients[0].last_name} (Género: {patients[0].gender})")
+    # Página ordenada en la base de datos; totales cacheados para las tarjetas
+    page, total = directory_page('admin.patients', query, cursor, filters, per_page)
+    genders = gender_counts('admin.patients', filters, query)
     
     return render_template('admin/patients.html', 
                          title='Todos los Pacientes', 
-                         patients=patients,
-                         selected_gender=gender)
+                         patients=page.items,
+                         page=page,
+                         total=total,
+                         gender_totals=genders,
+                         sorts=SORTS,
+                         sort=filters['sort'],
+                         search=search,
+                         age_groups=AGE_GROUP_LABELS,
+                         selected_age_group=age_group,
+                         selected_gender=gender,
+                         selected_status=status)
 
 @bp.route('/patients/<int:id>')
 @login_required
@@ -555,6 +568,64 @@ def get_doctor_statistics(start_date, end_date):
     return sorted(doctor_stats, key=lambda x: x['total_appointments'], reverse=True)
 
 
+def get_age_group_statistics(start_date, end_date):
+    """Obtener estadísticas por grupo etario (edad actual del paciente)
+    
+    Una consulta agrupada por Patient.age_group para cada métrica: pacientes
+    activos, citas del período y triages del período.
+    """
+    from app.models.triage import Triage
+    
+    age_group = Patient.age_group.label('age_group')
+    
+    active_patients = dict(db.session.query(
+        age_group, func.count(Patient.id)
+    ).filter(Patient.is_active == True).group_by(age_group).all())
+    
+    appointments = {
+        row.age_group: row for row in db.session.query(
+            age_group,
+            func.count(Appointment.id).label('total_appointments'),
+            func.count(func.nullif(Appointment.status == 'completed', False)).label('completed')
+        ).join(
+            Patient, Appointment.patient_id == Patient.id
+        ).filter(
+            func.date(Appointment.date_time).between(start_date, end_date)
+        ).group_by(age_group).all()
+    }
+    
+    triages = {
+        row.age_group: row for row in db.session.query(
+            age_group,
+            func.count(Triage.id).label('total_triages'),
+            func.count(func.nullif(Triage.priority_level == 'alta', False)).label('high_priority')
+        ).join(
+            Patient, Triage.patient_id == Patient.id
+        ).filter(
+            func.date(Triage.created_at).between(start_date, end_date)
+        ).group_by(age_group).all()
+    }
+    
+    age_group_stats = []
+    for key, _, _, label in AGE_GROUPS:
+        appointment_row = appointments.get(key)
+        triage_row = triages.get(key)
+        total_appointments = appointment_row.total_appointments if appointment_row else 0
+        completed = appointment_row.completed if appointment_row else 0
+        age_group_stats.append({
+            'key': key,
+            'label': label,
+            'active_patients': active_patients.get(key, 0),
+            'total_appointments': total_appointments,
+            'completed': completed,
+            'completion_rate': round(completed / total_appointments * 100, 1) if total_appointments > 0 else 0,
+            'total_triages': triage_row.total_triages if triage_row else 0,
+            'high_priority': triage_row.high_priority if triage_row else 0
+        })
+    
+    return age_group_stats
+
+
 # API endpoints para datos en tiempo real
 @bp.route('/api/reports/general')
 @login_required
@@ -636,6 +707,20 @@ def export_csv_report(start_date, end_date):
             specialty['cancelled'],
             specialty['completion_rate']
         ])
+    writer.writerow([])
+    
+    # Estadísticas por grupo etario
+    writer.writerow(['Estadísticas por Grupo Etario'])
+    writer.writerow(['Grupo Etario', 'Pacientes Activos', 'Total Citas', 'Completadas', 'Triages', 'Prioridad Alta'])
+    for group in get_age_group_statistics(start_date, end_date):
+        writer.writerow([
+            group['label'],
+            group['active_patients'],
+            group['total_appointments'],
+            group['completed'],
+            group['total_triages'],
+            group['high_priority']
+        ])
     
     # Preparar respuesta
     output.seek(0)
@@ -656,6 +741,7 @@ def export_json_report(start_date, end_date):
         'general_statistics': get_general_statistics(start_date, end_date),
         'specialty_statistics': get_specialty_statistics(start_date, end_date),
         'doctor_statistics': get_doctor_statistics(start_date, end_date),
+        'age_group_statistics': get_age_group_statistics(start_date, end_date),
         'monthly_statistics': get_monthly_statistics(),
         'generated_at': datetime.now().isoformat()
     }
@@ -725,6 +811,11 @@ def add_specialty():
                 flash('Complete todos los campos obligatorios correctamente.', 'error')
                 return redirect(url_for('admin.add_specialty'))
             
+            duration_error = Appointment.duration_error(consultation_duration)
+            if duration_error:
+                flash(duration_error, 'error')
+                return redirect(url_for('admin.add_specialty'))
+            
             # Verificar que el nombre no exista
             existing_specialty = Specialty.query.filter_by(name=name).first()
             if existing_specialty:
@@ -781,6 +872,11 @@ def edit_specialty(id):
                 flash('Complete todos los campos obligatorios correctamente.', 'error')
                 return redirect(url_for('admin.edit_specialty', id=id))
             
+            duration_error = Appointment.duration_error(consultation_duration)
+            if duration_error:
+                flash(duration_error, 'error')
+                return redirect(url_for('admin.edit_specialty', id=id))
+            
             # Verificar que el nombre no exista en otra especialidad
             existing_specialty = Specialty.query.filter(
                 Specialty.name == name,
@@ -1133,6 +1229,11 @@ def create_work_schedule(doctor_id):
                 flash('Día de la semana inválido.', 'error')
                 return redirect(url_for('admin.doctor_schedule_detail', doctor_id=doctor_id))
             
+            duration_error = Appointment.duration_error(appointment_duration)
+            if duration_error:
+                flash(duration_error, 'error')
+                return redirect(url_for('admin.doctor_schedule_detail', doctor_id=doctor_id))
+            
             # Convertir fechas
             try:
                 start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
@@ -1197,6 +1298,10 @@ def create_work_schedule(doctor_id):
             )
             
             db.session.add(new_schedule)
+            db.session.flush()
+            
+            # Regenerar el inventario de slots en la misma transacción
+            AppointmentSlot.regenerate_for_doctor(doctor_id)
             db.session.commit()
             
             flash(f'Horario creado exitosamente para Dr. {doctor.full_name}', 'success')
@@ -1237,6 +1342,11 @@ def edit_work_schedule(schedule_id):
             break_end_time = request.form.get('break_end_time') or None
             max_patients_per_day = request.form.get('max_patients_per_day') or None
             
+            duration_error = Appointment.duration_error(appointment_duration)
+            if duration_error:
+                flash(duration_error, 'error')
+                return redirect(url_for('admin.edit_work_schedule', schedule_id=schedule_id))
+            
             # Convertir horarios y validar (mismo código que create)
             try:
                 start_time_obj = datetime.strptime(start_time, '%H:%M').time()
@@ -1308,6 +1418,8 @@ def edit_work_schedule(schedule_id):
                         other_schedule.updated_at = datetime.utcnow()
                         updated_count += 1
                 
+                db.session.flush()
+                AppointmentSlot.regenerate_for_doctor(doctor.id)
                 db.session.commit()
                 
                 if updated_count > 0:
@@ -1315,6 +1427,8 @@ def edit_work_schedule(schedule_id):
                 else:
                     flash(f'Horario actualizado exitosamente', 'success')
             else:
+                db.session.flush()
+                AppointmentSlot.regenerate_for_doctor(doctor.id)
                 db.session.commit()
                 flash(f'Horario actualizado exitosamente', 'success')
             return redirect(url_for('admin.doctor_schedule_detail', doctor_id=doctor.id))
@@ -1343,6 +1457,8 @@ def toggle_work_schedule(schedule_id):
         schedule.is_active = not schedule.is_active
         schedule.updated_at = datetime.utcnow()
         
+        db.session.flush()
+        AppointmentSlot.regenerate_for_doctor(schedule.doctor_id)
         db.session.commit()
         
         status = "activado" if schedule.is_active else "desactivado"
@@ -1376,6 +1492,8 @@ def delete_work_schedule(schedule_id):
             flash('No se puede eliminar el horario porque hay citas futuras programadas.', 'error')
         else:
             db.session.delete(schedule)
+            db.session.flush()
+            AppointmentSlot.regenerate_for_doctor(doctor_id)
             db.session.commit()
             flash('Horario eliminado exitosamente', 'success')
         
@@ -1386,6 +1504,163 @@ def delete_work_schedule(schedule_id):
     return redirect(url_for('admin.doctor_schedule_detail', doctor_id=doctor_id))
 
 
+# === PLANTILLAS DE HORARIOS ===
+
+def _parse_template_form(form, template=None):
+    """Construir una plantilla desde el formulario; devuelve (plantilla, errores)"""
+    template = template or ScheduleTemplate()
+    try:
+        template.name = form.get('name', '').strip()
+        template.description = form.get('description', '').strip() or None
+        template.days = form.getlist('days_of_week')
+        template.start_time = datetime.strptime(form.get('start_time'), '%H:%M').time()
+        template.end_time = datetime.strptime(form.get('end_time'), '%H:%M').time()
+        template.appointment_duration = int(form.get('appointment_duration', 30))
+        break_start = form.get('break_start_time') or None
+        break_end = form.get('break_end_time') or None
+        template.break_start_time = datetime.strptime(break_start, '%H:%M').time() if break_start else None
+        template.break_end_time = datetime.strptime(break_end, '%H:%M').time() if break_end else None
+        max_patients = form.get('max_patients_per_day') or None
+        template.max_patients_per_day = int(max_patients) if max_patients else None
+    except (TypeError, ValueError):
+        return template, ['Formato de hora o número inválido.']
+    
+    errors = template.validate()
+    if not template.name:
+        errors.append('El nombre de la plantilla es obligatorio.')
+    return template, errors
+
+
+def _parse_periods(form):
+    """Leer los rangos de fechas (period_start[] / period_end[]) del formulario"""
+    periods = []
+    for start, end in zip(form.getlist('period_start'), form.getlist('period_end')):
+        if not start:
+            continue
+        start_date = datetime.strptime(start, '%Y-%m-%d').date()
+        end_date = datetime.strptime(end, '%Y-%m-%d').date() if end else None
+        if end_date and end_date < start_date:
+            raise ValueError('La fecha de inicio debe ser anterior a la fecha de fin.')
+        periods.append((start_date, end_date))
+    if not periods:
+        raise ValueError('Indique al menos un rango de fechas.')
+    return periods
+
+
+@bp.route('/work-schedules/templates')
+@login_required
+@require_role('admin')
+def schedule_templates():
+    """Plantillas de horarios recurrentes"""
+    templates = ScheduleTemplate.query.filter_by(is_active=True).order_by(ScheduleTemplate.name).all()
+    doctors = User.query.filter_by(role='doctor', is_active=True).order_by(User.first_name, User.last_name).all()
+    
+    return render_template('admin/schedule_templates.html',
+                         title='Plantillas de Horarios',
+                         templates=templates,
+                         doctors=doctors,
+                         days=['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo'],
+                         diff=None)
+
+
+@bp.route('/work-schedules/templates/add', methods=['POST'])
+@login_required
+@require_role('admin')
+def add_schedule_template():
+    """Crear plantilla de horario"""
+    template, errors = _parse_template_form(request.form)
+    if not errors and ScheduleTemplate.query.filter_by(name=template.name).first():
+        errors.append('Ya existe una plantilla con ese nombre.')
+    
+    if errors:
+        for error in errors:
+            flash(error, 'error')
+        return redirect(url_for('admin.schedule_templates'))
+    
+    try:
+        db.session.add(template)
+        db.session.commit()
+        flash(f'Plantilla "{template.name}" creada: {template.summary}', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error al crear plantilla: {str(e)}', 'error')
+    
+    return redirect(url_for('admin.schedule_templates'))
+
+
+@bp.route('/work-schedules/templates/<int:template_id>/delete', methods=['POST'])
+@login_required
+@require_role('admin')
+def delete_schedule_template(template_id):
+    """Eliminar plantilla (los horarios ya generados no se modifican)"""
+    template = ScheduleTemplate.query.get_or_404(template_id)
+    try:
+        db.session.delete(template)
+        db.session.commit()
+        flash('Plantilla eliminada exitosamente', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error al eliminar plantilla: {str(e)}', 'error')
+    
+    return redirect(url_for('admin.schedule_templates'))
+
+
+@bp.route('/work-schedules/templates/<int:template_id>/apply', methods=['POST'])
+@login_required
+@require_role('admin')
+def apply_schedule_template(template_id):
+    """Aplicar una plantilla a varios doctores y rangos de fechas
+    
+    Con action=preview muestra la diferencia (horarios a crear y conflictos)
+    sin escribir; con action=apply crea todos los horarios en una transacción.
+    """
+    template = ScheduleTemplate.query.get_or_404(template_id)
+    doctor_ids = [int(doctor_id) for doctor_id in request.form.getlist('doctor_ids') if doctor_id]
+    dry_run = request.form.get('action', 'preview') != 'apply'
+    skip_conflicts = request.form.get('skip_conflicts') == 'on'
+    
+    if not doctor_ids:
+        flash('Seleccione al menos un doctor.', 'error')
+        return redirect(url_for('admin.schedule_templates'))
+    
+    try:
+        periods = _parse_periods(request.form)
+    except ValueError as e:
+        flash(f'Rango de fechas inválido: {str(e)}', 'error')
+        return redirect(url_for('admin.schedule_templates'))
+    
+    try:
+        diff = template.apply(doctor_ids, periods, dry_run=dry_run, skip_conflicts=skip_conflicts)
+        
+        if dry_run:
+            return render_template('admin/schedule_templates.html',
+                                 title='Plantillas de Horarios',
+                                 templates=ScheduleTemplate.query.filter_by(is_active=True).order_by(ScheduleTemplate.name).all(),
+                                 doctors=User.query.filter_by(role='doctor', is_active=True).order_by(User.first_name, User.last_name).all(),
+                                 days=['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo'],
+                                 diff=diff,
+                                 selected_template=template,
+                                 selected_doctor_ids=doctor_ids,
+                                 periods=periods)
+        
+        if not diff['applied']:
+            if diff['conflicts']:
+                flash(f'No se aplicó la plantilla: {len(diff["conflicts"])} bloque(s) se superponen con horarios existentes.', 'error')
+            else:
+                flash('La plantilla no genera horarios nuevos.', 'warning')
+            return redirect(url_for('admin.schedule_templates'))
+        
+        db.session.commit()
+        flash(f'Plantilla "{template.name}" aplicada: {len(diff["create"])} horario(s) creados'
+              + (f', {len(diff["conflicts"])} omitidos por conflicto' if diff['conflicts'] else ''), 'success')
+        return redirect(url_for('admin.work_schedules'))
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error al aplicar plantilla: {str(e)}', 'error')
+        return redirect(url_for('admin.schedule_templates'))
+
+
 # API para obtener horarios disponibles en tiempo real
 @bp.route('/api/work-schedules/available-times')
 @login_required
@@ -1406,16 +1681,14 @@ def api_available_times():
         except ValueError:
             return jsonify({'success': False, 'error': 'Formato de fecha inválido'}), 400
         
-        # Obtener horarios disponibles
-        available_times = WorkSchedule.get_available_times(
-            int(doctor_id), 
-            date_obj, 
-            int(specialty_id) if specialty_id else None
+        # Obtener horarios disponibles (caché -> inventario de slots)
+        specialty_id = int(specialty_id) if specialty_id else None
+        formatted_times = availability_cache.get_or_set(
+            doctor_id, date_obj, specialty_id,
+            lambda: [time.strftime('%H:%M') for time in AppointmentSlot.get_available_times(
+                int(doctor_id), date_obj, specialty_id)]
         )
         
-        # Formatear horarios para respuesta
-        formatted_times = [time.strftime('%H:%M') for time in available_times]
-        
         return jsonify({
             'success': True,
             'available_times': formatted_times,
@@ -1426,6 +1699,14 @@ def api_available_times():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# API para monitorear la caché de disponibilidad
+@bp.route('/api/availability-cache/stats')
+@login_required
+@require_role('admin')
+def api_availability_cache_stats():
+    """API con los contadores de aciertos/fallos de la caché de disponibilidad"""
+    return jsonify({'success': True, 'stats': availability_cache.stats()})
+
 @bp.route('/users/<int:user_id>/edit', methods=['POST'])
 @login_required
 @require_role('admin')
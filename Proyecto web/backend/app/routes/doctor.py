@@ -1,11 +1,16 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
 from app.utils.decorators import require_role
 from app.models.appointment import Appointment
 from app.models.medical_record import MedicalRecord
 from app.models.patient import Patient
 from app.models.user import User
 from app.models.medical_history import MedicalHistory
+from app.utils.pagination import decode_cursor, resolve_per_page, keyset_paginate, count_estimate
+from app.utils.live_events import stream_response
+from app.utils.doctor_dashboard import doctor_dashboard
+from app.utils.patient_search import patient_filter
 from app import db
 from datetime import datetime, date
 
@@ -72,90 +77,43 @@ def _build_observations_text(form):
 @require_role('doctor')
 def dashboard():
     """Dashboard del médico"""
-    today = date.today()
-    
-    # Citas de hoy (excluyendo las ya completadas)
-    today_appointments = Appointment.query.filter(
-        Appointment.doctor_id == current_user.id,
-        Appointment.date_time >= datetime.combine(today, datetime.min.time()),
-        Appointment.date_time < datetime.combine(today, datetime.max.time()),
-        Appointment.status != 'completed'  # Excluir citas completadas
-    ).order_by(Appointment.date_time).all()
-    
-    # Citas listas para consulta (con triage completado, pero no completadas)
-    ready_appointments = Appointment.query.filter(
-        Appointment.doctor_id == current_user.id,
-        Appointment.status == 'ready_for_doctor'
-    ).order_by(Appointment.date_time).all()
-    
-    # Citas en triage actualmente
-    in_triage_appointments = Appointment.query.filter(
-        Appointment.doctor_id == current_user.id,
-        Appointment.status == 'in_triage'
-    ).order_by(Appointment.date_time).all()
-    
-    # Próximas citas (después de hoy)
-    upcoming_appointments = Appointment.query.filter(
-        Appointment.doctor_id == current_user.id,
-        Appointment.date_time > datetime.combine(today, datetime.max.time())
-    ).order_by(Appointment.date_time).limit(5).all()
-    
-    # Contar pacientes únicos que he atendido
-    my_patients_count = Patient.query.join(Appointment).filter(
-        Appointment.doctor_id == current_user.id
-    ).distinct().count()
-    
-    # Consultas del mes actual (filtradas para contar solo consultas reales)
-    start_of_month = datetime(today.year, today.month, 1)
-    consultations_this_month_all = MedicalRecord.query.filter(
-        MedicalRecord.doctor_id == current_user.id,
-        MedicalRecord.consultation_date >= start_of_month
-    ).all()
-    
-    # Contar solo consultas reales
-    consultations_this_month = len(filter_real_consultations(consultations_this_month_all))
-    
-    # Últimas consultas (filtradas para mostrar solo consultas reales)
-    recent_consultations_all = MedicalRecord.query.filter(
-        MedicalRecord.doctor_id == current_user.id
-    ).order_by(MedicalRecord.consultation_date.desc()).limit(10).all()
-    
-    # Filtrar y tomar solo las primeras 5 consultas reales
-    recent_consultations = filter_real_consultations(recent_consultations_all)[:5]
-    
-    # Agregar información completa de estado de historia clínica para cada cita
-    for appointment in ready_appointments:
-        patient_status = appointment.patient.get_patient_status_for_doctor()
-        appointment.patient_has_history = patient_status['has_medical_history']
-        appointment.patient_status = patient_status
-        appointment.expected_action = patient_status['expected_action']
-    
-    for appointment in today_appointments:
-        patient_status = appointment.patient.get_patient_status_for_doctor()
-        appointment.patient_has_history = patient_status['has_medical_history']
-        appointment.patient_status = patient_status
-        appointment.expected_action = patient_status['expected_action']
+    # Citas, estado de historia clínica, contadores y últimas consultas en cuatro consultas
+    data = doctor_dashboard(current_user.id)
     
     return render_template('doctor/dashboard.html', 
                          title='Dashboard Médico',
-                         today_appointments=today_appointments,
-                         ready_appointments=ready_appointments,
-                         in_triage_appointments=in_triage_appointments,
-                         upcoming_appointments=upcoming_appointments,
-                         my_patients_count=my_patients_count,
-                         consultations_this_month=consultations_this_month,
-                         recent_consultations=recent_consultations)
+                         **data)
+
+@bp.route('/events')
+@login_required
+@require_role('doctor')
+def events():
+    """Stream SSE con los cambios de estado de las citas de hoy del doctor"""
+    doctor_id = current_user.id
+    
+    def accepts(item):
+        return item['doctor_id'] == doctor_id and item['date'] == date.today().isoformat()
+    
+    return stream_response(accepts, request.headers.get('Last-Event-ID'))
 
 @bp.route('/appointments')
 @login_required
 @require_role('doctor')
 def appointments():
-    """Mis citas"""
-    page = request.args.get('page', 1, type=int)
-    status_filter = request.args.get('status', '')
-    date_from = request.args.get('date_from', '')
-    date_to = request.args.get('date_to', '')
-    patient_search = request.args.get('patient_search', '')
+    """Mis citas (paginadas por cursor sobre fecha e id)"""
+    # Los filtros viajan dentro del cursor al navegar entre páginas
+    cursor = decode_cursor(request.args.get('cursor'))
+    if cursor:
+        filters = cursor['filters']
+        per_page = resolve_per_page(cursor['per_page'])
+    else:
+        filters = {name: request.args.get(name, '') for name in ('status', 'date_from', 'date_to', 'patient_search')}
+        per_page = resolve_per_page(request.args.get('per_page'))
+    
+    status_filter = filters.get('status', '')
+    date_from = filters.get('date_from', '')
+    date_to = filters.get('date_to', '')
+    patient_search = filters.get('patient_search', '')
     
     # Query base - solo citas del doctor actual
     query = Appointment.query.filter_by(doctor_id=current_user.id)
@@ -165,11 +123,7 @@ def appointments():
         query = query.filter(Appointment.status == status_filter)
     
     if patient_search:
-        query = query.join(Patient).filter(
-            (Patient.first_name.ilike(f'%{patient_search}%')) |
-            (Patient.last_name.ilike(f'%{patient_search}%')) |
-            (Patient.dni.ilike(f'%{patient_search}%'))
-        )
+        query = query.join(Patient).filter(patient_filter(patient_search))
     
     if date_from:
         try:
@@ -185,8 +139,17 @@ def appointments():
             query = query.filter(Appointment.date_time <= to_date)
         except ValueError:
             pass
-      # Ordenar por fecha
-    appointments = query.order_by(Appointment.date_time.desc()).all()
+    
+    # Página ordenada por fecha (más recientes primero)
+    page = keyset_paginate(
+        query.options(joinedload(Appointment.patient)),
+        (Appointment.date_time, Appointment.id),
+        cursor=cursor,
+        per_page=per_page,
+        filters=filters
+    )
+    appointments = page.items
+    total = count_estimate(f'doctor.appointments:{current_user.id}', filters, query)
     
     # Agregar información adicional para determinar si se puede consultar
     current_datetime = datetime.now()
@@ -214,6 +177,8 @@ def appointments():
     return render_template('doctor/appointments.html', 
                          title='Mis Citas',
                          appointments=appointments,
+                         page=page,
+                         total=total,
                          today_appointments=today_appointments,
                          pending_appointments=pending_appointments,
                          status_filter=status_filter,
@@ -240,11 +205,7 @@ def medical_records():
     
     # Aplicar búsqueda por paciente si se proporciona
     if patient_search:
-        query = query.join(Patient).filter(
-            (Patient.first_name.ilike(f'%{patient_search}%')) |
-            (Patient.last_name.ilike(f'%{patient_search}%')) |
-            (Patient.dni.ilike(f'%{patient_search}%'))
-        )
+        query = query.join(Patient).filter(patient_filter(patient_search))
     
     # Aplicar filtros de fecha
     if date_from:
@@ -1079,11 +1040,7 @@ def clinical_histories():
     
     # Filtro de búsqueda
     if search:
-        query = query.filter(
-            (Patient.first_name.ilike(f'%{search}%')) |
-            (Patient.last_name.ilike(f'%{search}%')) |
-            (Patient.dni.ilike(f'%{search}%'))
-        )
+        query = query.filter(patient_filter(search))
     
     # Obtener pacientes
     patients = query.order_by(Patient.first_name, Patient.last_name).all()
@@ -2,11 +2,15 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from datetime import datetime, date
 from app.utils.decorators import require_role
-from app.models.patient import Patient
+from app.models.patient import Patient, AGE_GROUP_LABELS
 from app.models.appointment import Appointment
 from app.models.triage import Triage
 from app.models.user import User
 from app.models.invoice import Invoice
+from app.utils.live_events import stream_response
+from app.utils.patient_search import patient_filter
+from app.utils.patient_directory import SORTS, directory_args, directory_page, nurse_directory_rows
+from app.utils.pagination import count_estimate
 from app import db
 
 # Blueprint para enfermera
@@ -59,6 +63,16 @@ def dashboard():
                          today_appointments=today_appointments,
                          today_appointments_count=today_appointments_count)
 
+@bp.route('/events')
+@login_required
+@require_role('nurse')
+def events():
+    """Stream SSE con los cambios de estado de las citas de hoy"""
+    def accepts(item):
+        return item['date'] == date.today().isoformat()
+    
+    return stream_response(accepts, request.headers.get('Last-Event-ID'))
+
 @bp.route('/triage')
 @login_required
 @require_role('nurse')
@@ -388,71 +402,41 @@ def complete_triage(triage_id):
 @login_required
 @require_role('nurse')
 def patients():
-    """Mis pacientes - pacientes a los que he realizado triage"""
-    page = request.args.get('page', 1, type=int)
-    search = request.args.get('search', '')
+    """Mis pacientes - pacientes a los que he realizado triage (paginado por cursor)"""
+    cursor, filters, per_page = directory_args(('search', 'age_group'), default_sort='name')
+    search = filters.get('search', '')
+    age_group = filters.get('age_group', '')
     
     # Query base - pacientes a los que he realizado triage
-    query = Patient.query.join(Triage).filter(
-        Triage.nurse_id == current_user.id,
+    query = Patient.query.filter(
+        Patient.id.in_(db.session.query(Triage.patient_id).filter(Triage.nurse_id == current_user.id)),
         Patient.is_active == True
-    ).distinct()
+    )
     
     # Filtro de búsqueda
     if search:
-        query = query.filter(
-            (Patient.first_name.ilike(f'%{search}%')) |
-            (Patient.last_name.ilike(f'%{search}%')) |
-            (Patient.dni.ilike(f'%{search}%')) |
-            (Patient.email.ilike(f'%{search}%'))
-        )
+        query = query.filter(patient_filter(search))
     
-    # Obtener pacientes
-    patients = query.order_by(Patient.first_name, Patient.last_name).all()
-    
-    # Agregar información adicional para cada paciente
-    patients_data = []
-    for patient in patients:
-        # Último triage que hice a este paciente
-        last_triage = Triage.query.filter_by(
-            patient_id=patient.id,
-            nurse_id=current_user.id
-        ).order_by(Triage.created_at.desc()).first()
-        
-        # Próxima cita del paciente que podría necesitar triage
-        next_appointment = Appointment.query.join(
-            Invoice, Appointment.id == Invoice.appointment_id
-        ).filter(
-            Appointment.patient_id == patient.id,
-            Appointment.date_time > datetime.now(),
-            Appointment.status.in_(['scheduled', 'confirmed']),
-            Invoice.status == 'paid'
-        ).outerjoin(
-            Triage, Appointment.id == Triage.appointment_id
-        ).filter(
-            Triage.id.is_(None)  # Sin triage existente
-        ).order_by(Appointment.date_time).first()
-        
-        # Total de triages que he realizado a este paciente
-        total_triages = Triage.query.filter_by(
-            patient_id=patient.id,
-            nurse_id=current_user.id
-        ).count()
-        
-        # Último estado de prioridad asignado
-        priority_level = last_triage.priority_level if last_triage else None
-        
-        patients_data.append({
-            'patient': patient,
-            'last_triage': last_triage,
-            'next_appointment': next_appointment,
-            'total_triages': total_triages,
-            'priority_level': priority_level
-        })
+    # Filtro por grupo etario (rango de fecha de nacimiento)
+    if age_group in AGE_GROUP_LABELS:
+        query = query.filter(Patient.age_group_filter(age_group))
+    
+    # Página de pacientes y datos de triage/próxima cita en dos consultas por página
+    page, total = directory_page(f'nurse.patients:{current_user.id}', query, cursor, filters, per_page)
+    patients_data = nurse_directory_rows(page.items, current_user.id)
+    total_triages = count_estimate(f'nurse.triages:{current_user.id}', {},
+                                   Triage.query.filter(Triage.nurse_id == current_user.id))
     
     return render_template('nurse/patients.html', 
                          title='Mis Pacientes',
                          patients_data=patients_data,
+                         page=page,
+                         total=total,
+                         total_triages=total_triages,
+                         sorts=SORTS,
+                         sort=filters['sort'],
+                         age_groups=AGE_GROUP_LABELS,
+                         selected_age_group=age_group,
                          search=search)
 
 @bp.route('/api/patient/<int:patient_id>/paid-appointment')
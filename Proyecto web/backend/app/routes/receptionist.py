@@ -1,14 +1,24 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, send_file, stream_template, stream_with_context
 from flask_login import login_required, current_user
 from sqlalchemy import func, desc, extract
+from sqlalchemy.orm import joinedload
 from decimal import Decimal
 from datetime import datetime, date, timedelta
 from app.utils.decorators import require_role
-from app.models.appointment import Appointment
-from app.models.patient import Patient
+from app.models.appointment import Appointment, SlotTakenError
+from app.models.patient import Patient, AGE_GROUP_LABELS
 from app.models.user import User
 from app.models.specialty import Specialty
 from app.models.invoice import Invoice
+from app.models.appointment_slot import AppointmentSlot
+from app.models.waitlist import WaitlistEntry
+from app.utils.availability_cache import availability_cache
+from app.utils.reference_data import reference_data
+from app.utils.appointment_import import AppointmentImportError, read_rows, import_appointments as import_appointment_rows
+from app.utils.agenda_export import agenda_groups, csv_chunks
+from app.utils.patient_search import patient_filter, autocomplete
+from app.utils.patient_directory import SORTS, directory_args, directory_page
+from app.utils.pagination import decode_cursor, resolve_per_page, keyset_paginate, count_estimate
 from app import db
 
 # Blueprint para recepcionista
@@ -24,17 +34,8 @@ def search_patients():
     
     if len(query) < 2:        # Si no hay query o es muy corta, devolver todos los pacientes activos
         patients = Patient.query.filter_by(is_active=True).order_by(Patient.first_name, Patient.last_name).limit(50).all()
-    else:        # Búsqueda por nombre, apellido o DNI
-        search_term = f'%{query}%'
-        patients = Patient.query.filter(
-            Patient.is_active == True,
-            db.or_(
-                Patient.first_name.ilike(search_term),
-                Patient.last_name.ilike(search_term),
-                Patient.dni.ilike(search_term),
-                func.concat(Patient.first_name, ' ', Patient.last_name).ilike(search_term)
-            )
-        ).order_by(Patient.first_name, Patient.last_name).limit(20).all()
+    else:        # Búsqueda por nombre, apellido, DNI o email en el índice de pacientes
+        patients = autocomplete(query, limit=20)
       # Convertir a JSON
     patients_data = []
     for patient in patients:
@@ -123,13 +124,10 @@ def billing():
         query = query.filter(Invoice.status == status_filter)
     
     if search:
-        search_term = f"%{search}%"
         query = query.join(Patient).filter(
             db.or_(
-                Patient.first_name.ilike(search_term),
-                Patient.last_name.ilike(search_term),
-                Patient.dni.ilike(search_term),
-                Invoice.invoice_number.ilike(search_term)
+                patient_filter(search),
+                Invoice.invoice_number.ilike(f"%{search}%")
             )
         )
     
@@ -166,19 +164,17 @@ def billing():
 @login_required
 @require_role('receptionist')
 def patients():
-    """Gestión de pacientes"""
-    search = request.args.get('search', '')
-    gender = request.args.get('gender', '')
+    """Gestión de pacientes (paginado por cursor)"""
+    cursor, filters, per_page = directory_args(('search', 'gender', 'age_group'))
+    search = filters.get('search', '')
+    gender = filters.get('gender', '')
+    age_group = filters.get('age_group', '')
     
     query = Patient.query
     
     # Aplicar filtro de búsqueda
     if search:
-        query = query.filter(
-            (Patient.first_name.ilike(f'%{search}%')) |
-            (Patient.last_name.ilike(f'%{search}%')) |
-            (Patient.dni.ilike(f'%{search}%'))
-        )
+        query = query.filter(patient_filter(search))
     
     # Aplicar filtro de género si se especifica
     if gender in ['M', 'F']:
@@ -186,12 +182,22 @@ def patients():
         gender_mapping = {'M': 'Masculino', 'F': 'Femenino'}
         query = query.filter_by(gender=gender_mapping[gender])
     
-    # Ordenar y obtener resultados
-    patients = query.order_by(Patient.created_at.desc()).all()
+    # Filtro por grupo etario (rango de fecha de nacimiento)
+    if age_group in AGE_GROUP_LABELS:
+        query = query.filter(Patient.age_group_filter(age_group))
+    
+    # Página ordenada en la base de datos y total cacheado
+    page, total = directory_page('receptionist.patients', query, cursor, filters, per_page)
     
     return render_template('receptionist/patients.html', 
                          title='Gestión de Pacientes', 
-                         patients=patients,
+                         patients=page.items,
+                         page=page,
+                         total=total,
+                         sorts=SORTS,
+                         sort=filters['sort'],
+                         age_groups=AGE_GROUP_LABELS,
+                         selected_age_group=age_group,
                          search=search,
                          selected_gender=gender)
 
@@ -640,12 +646,20 @@ def delete_patient(patient_id):
 @login_required
 @require_role('receptionist')
 def appointments():
-    """Lista de citas para recepcionista"""
-    # Obtener filtros de la URL
-    date_filter = request.args.get('date', '')
-    doctor_filter = request.args.get('doctor', '')
-    status_filter = request.args.get('status', '')
-    search = request.args.get('search', '')
+    """Lista de citas para recepcionista (paginada por cursor sobre fecha e id)"""
+    # Los filtros viajan dentro del cursor al navegar entre páginas
+    cursor = decode_cursor(request.args.get('cursor'))
+    if cursor:
+        filters = cursor['filters']
+        per_page = resolve_per_page(cursor['per_page'])
+    else:
+        filters = {name: request.args.get(name, '') for name in ('date', 'doctor', 'status', 'search')}
+        per_page = resolve_per_page(request.args.get('per_page'))
+    
+    date_filter = filters.get('date', '')
+    doctor_filter = filters.get('doctor', '')
+    status_filter = filters.get('status', '')
+    search = filters.get('search', '')
     
     # Query base
     query = Appointment.query
@@ -669,27 +683,59 @@ def appointments():
     
     if search:
         # Buscar por nombre de paciente o DNI
-        query = query.join(Patient).filter(
-            (Patient.first_name.ilike(f'%{search}%')) |
-            (Patient.last_name.ilike(f'%{search}%')) |
-            (Patient.dni.ilike(f'%{search}%'))
-        )
-    
-    # Ordenar por fecha y hora
-    appointments = query.order_by(Appointment.date_time.desc()).all()
+        query = query.join(Patient).filter(patient_filter(search))
+    
+    # Página ordenada por fecha y hora (paciente, doctor, especialidad, factura y triage precargados)
+    page = keyset_paginate(
+        query.options(
+            joinedload(Appointment.patient),
+            joinedload(Appointment.doctor),
+            joinedload(Appointment.specialty),
+            *Appointment.status_options()
+        ),
+        (Appointment.date_time, Appointment.id),
+        cursor=cursor,
+        per_page=per_page,
+        filters=filters
+    )
+    total = count_estimate('receptionist.appointments', filters, query)
     
     # Obtener doctores para el filtro
-    doctors = User.query.filter_by(role='doctor', is_active=True).all()
+    doctors = reference_data.doctors()
     
     return render_template('receptionist/appointments.html',
                          title='Gestión de Citas',
-                         appointments=appointments,
+                         appointments=page.items,
+                         page=page,
+                         total=total,
                          doctors=doctors,
                          date_filter=date_filter,
                          doctor_filter=doctor_filter,
                          status_filter=status_filter,
                          search=search)
 
+def _render_appointment_form(title, appointment=None, form_data=None):
+    """Formulario de cita con doctores y especialidades de la caché de referencia
+    
+    El paciente se elige con el autocompletado (/api/patients/search); sólo
+    se carga el paciente ya seleccionado (edición o repoblación tras un error).
+    """
+    selected_patient = appointment.patient if appointment else None
+    if selected_patient is None and form_data and form_data.get('patient_id'):
+        try:
+            selected_patient = db.session.get(Patient, int(form_data.get('patient_id')))
+        except (ValueError, TypeError):
+            # Si patient_id no es un número válido, ignorar
+            selected_patient = None
+    
+    return render_template('receptionist/appointment_form.html',
+                         title=title,
+                         appointment=appointment,
+                         selected_patient=selected_patient,
+                         doctors=reference_data.doctors(),
+                         specialties=reference_data.specialties(),
+                         form_data=form_data)
+
 @bp.route('/appointments/new', methods=['GET', 'POST'])
 @login_required
 @require_role('receptionist')
@@ -727,18 +773,7 @@ def new_appointment():
             
             if missing_fields:
                 flash(f'Los siguientes campos son obligatorios: {", ".join(missing_fields)}', 'error')
-                # Obtener datos para repoblar el formulario
-                patients = Patient.query.order_by(Patient.first_name, Patient.last_name).all()
-                doctors = User.query.filter_by(role='doctor', is_active=True).order_by(User.first_name, User.last_name).all()
-                specialties = Specialty.query.filter_by(is_active=True).order_by(Specialty.name).all()
-                
-                return render_template('receptionist/appointment_form.html',
-                                     title='Nueva Cita',
-                                     patients=patients,
-                                     doctors=doctors,
-                                     specialties=specialties,
-                                     appointment=None,
-                                     form_data=request.form)
+                return _render_appointment_form('Nueva Cita', form_data=request.form)
             
             # Combinar fecha y hora
             try:
@@ -747,78 +782,29 @@ def new_appointment():
                 appointment_datetime = datetime.combine(date_obj, time_obj)
             except ValueError:
                 flash('Formato de fecha u hora inválido', 'error')
-                # Obtener datos para repoblar el formulario
-                patients = Patient.query.order_by(Patient.first_name, Patient.last_name).all()
-                doctors = User.query.filter_by(role='doctor', is_active=True).order_by(User.first_name, User.last_name).all()
-                specialties = Specialty.query.filter_by(is_active=True).order_by(Specialty.name).all()
-                
-                return render_template('receptionist/appointment_form.html',
-                                     title='Nueva Cita',
-                                     patients=patients,
-                                     doctors=doctors,
-                                     specialties=specialties,
-                                     appointment=None,
-                                     form_data=request.form)
+                return _render_appointment_form('Nueva Cita', form_data=request.form)
             
             # Validar que la fecha sea futura
             if appointment_datetime <= datetime.now():
                 flash('La cita debe ser programada para una fecha y hora futura', 'error')
-                # Obtener datos para repoblar el formulario
-                patients = Patient.query.order_by(Patient.first_name, Patient.last_name).all()
-                doctors = User.query.filter_by(role='doctor', is_active=True).order_by(User.first_name, User.last_name).all()
-                specialties = Specialty.query.filter_by(is_active=True).order_by(Specialty.name).all()
-                
-                return render_template('receptionist/appointment_form.html',
-                                     title='Nueva Cita',
-                                     patients=patients,
-                                     doctors=doctors,
-                                     specialties=specialties,
-                                     appointment=None,
-                                     form_data=request.form)
+                return _render_appointment_form('Nueva Cita', form_data=request.form)
             
-            # Verificar disponibilidad del doctor
-            existing_appointment = Appointment.query.filter(
-                Appointment.doctor_id == doctor_id,
-                Appointment.date_time == appointment_datetime,
-                Appointment.status.in_(['scheduled', 'confirmed'])
-            ).first()
+            # Verificar solapamientos con citas activas del doctor y del paciente
+            duration = Appointment.resolve_duration(doctor_id, specialty_id, appointment_datetime)
+            conflicts = Appointment.find_conflicts([{
+                'doctor_id': doctor_id,
+                'patient_id': patient_id,
+                'date_time': appointment_datetime,
+                'duration': duration
+            }])[0]
             
-            if existing_appointment:
-                flash('El doctor ya tiene una cita programada en esa fecha y hora', 'error')
-                # Obtener datos para repoblar el formulario
-                patients = Patient.query.order_by(Patient.first_name, Patient.last_name).all()
-                doctors = User.query.filter_by(role='doctor', is_active=True).order_by(User.first_name, User.last_name).all()
-                specialties = Specialty.query.filter_by(is_active=True).order_by(Specialty.name).all()
-                
-                return render_template('receptionist/appointment_form.html',
-                                     title='Nueva Cita',
-                                     patients=patients,
-                                     doctors=doctors,
-                                     specialties=specialties,
-                                     appointment=None,
-                                     form_data=request.form)
-            
-            # Verificar que el paciente no tenga cita en la misma hora
-            patient_conflict = Appointment.query.filter(
-                Appointment.patient_id == patient_id,
-                Appointment.date_time == appointment_datetime,
-                Appointment.status.in_(['scheduled', 'confirmed'])
-            ).first()
-            
-            if patient_conflict:
-                flash('El paciente ya tiene una cita programada en esa fecha y hora', 'error')
-                # Obtener datos para repoblar el formulario
-                patients = Patient.query.order_by(Patient.first_name, Patient.last_name).all()
-                doctors = User.query.filter_by(role='doctor', is_active=True).order_by(User.first_name, User.last_name).all()
-                specialties = Specialty.query.filter_by(is_active=True).order_by(Specialty.name).all()
-                
-                return render_template('receptionist/appointment_form.html',
-                                     title='Nueva Cita',
-                                     patients=patients,
-                                     doctors=doctors,
-                                     specialties=specialties,
-                                     appointment=None,
-                                     form_data=request.form)
+            if conflicts:
+                for kind in sorted({kind for kind, _ in conflicts}):
+                    if kind == 'doctor':
+                        flash('El doctor ya tiene una cita que se superpone con ese horario', 'error')
+                    else:
+                        flash('El paciente ya tiene una cita que se superpone con ese horario', 'error')
+                return _render_appointment_form('Nueva Cita', form_data=request.form)
             
             # Crear la cita
             appointment = Appointment(
@@ -826,13 +812,18 @@ def new_appointment():
                 doctor_id=doctor_id,
                 specialty_id=specialty_id,
                 date_time=appointment_datetime,
+                duration=duration,
                 reason=reason if reason else None,
                 notes=notes if notes else None,
                 status='scheduled'
             )
             
-            from app import db
-            db.session.add(appointment)
+            # Reservar de forma atómica (índice único) junto con el slot del inventario
+            try:
+                appointment.reserve()
+            except SlotTakenError:
+                flash('El horario seleccionado acaba de ser reservado por otra persona. Elija otro horario.', 'error')
+                return _render_appointment_form('Nueva Cita', form_data=request.form)
             db.session.commit()
             
             # Obtener datos para el mensaje
@@ -843,46 +834,77 @@ def new_appointment():
             return redirect(url_for('receptionist.appointments'))
             
         except Exception as e:
-            from app import db
             db.session.rollback()
             flash(f'Error al crear la cita: {str(e)}', 'error')
-            # Obtener datos para repoblar el formulario
-            patients = Patient.query.order_by(Patient.first_name, Patient.last_name).all()
-            doctors = User.query.filter_by(role='doctor', is_active=True).order_by(User.first_name, User.last_name).all()
-            specialties = Specialty.query.filter_by(is_active=True).order_by(Specialty.name).all()
-            
-            return render_template('receptionist/appointment_form.html',
-                                 title='Nueva Cita',
-                                 patients=patients,
-                                 doctors=doctors,
-                                 specialties=specialties,
-                                 appointment=None,
-                                 form_data=request.form)
+            return _render_appointment_form('Nueva Cita', form_data=request.form)
     
-    # GET - Mostrar formulario
-    patients = Patient.query.order_by(Patient.first_name, Patient.last_name).all()
-    doctors = User.query.filter_by(role='doctor', is_active=True).order_by(User.first_name, User.last_name).all()
-    specialties = Specialty.query.filter_by(is_active=True).order_by(Specialty.name).all()
-    
-    # Verificar si se pasó un patient_id en la URL para pre-llenar el formulario
-    patient_id = request.args.get('patient_id')
-    form_data = {}
-    if patient_id:
+    # GET - Mostrar formulario (pre-llenado si se pasó un patient_id en la URL)
+    patient_id = request.args.get('patient_id', '')
+    return _render_appointment_form('Nueva Cita', form_data={'patient_id': patient_id} if patient_id.isdigit() else None)
+
+@bp.route('/appointments/import', methods=['GET', 'POST'])
+@login_required
+@require_role('receptionist')
+def import_appointments():
+    """Importar citas desde CSV o XLSX (jornadas de campaña) con reporte por fila"""
+    report = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        dry_run = bool(request.form.get('dry_run'))
+        if not upload or not upload.filename:
+            flash('Seleccione un archivo CSV o XLSX', 'error')
+            return redirect(url_for('receptionist.import_appointments'))
         try:
-            patient = Patient.query.get(int(patient_id))
-            if patient:
-                form_data['patient_id'] = patient.id
-        except (ValueError, TypeError):
-            # Si patient_id no es un número válido, ignorar
-            pass
+            report = import_appointment_rows(read_rows(upload.stream, upload.filename), dry_run=dry_run)
+            if not dry_run:
+                db.session.commit()
+        except (AppointmentImportError, SlotTakenError) as e:
+            db.session.rollback()
+            flash(str(e), 'error')
+            return redirect(url_for('receptionist.import_appointments'))
+        
+        if dry_run:
+            flash(f'Validación: {report.valid} filas listas para importar, {report.errors} con errores', 'info')
+        elif report.created:
+            flash(f'Se crearon {report.created} citas ({report.errors} filas con errores)', 'success')
+        else:
+            flash('No se creó ninguna cita: revise los errores del reporte', 'warning')
     
-    return render_template('receptionist/appointment_form.html',
-                         title='Nueva Cita',
-                         patients=patients,
-                         doctors=doctors,
-                         specialties=specialties,
-                         appointment=None,
-                         form_data=form_data if form_data else None)
+    return render_template('receptionist/appointment_import.html',
+                         title='Importar Citas',
+                         report=report)
+
+@bp.route('/agenda/export')
+@login_required
+@require_role('receptionist')
+def export_agenda():
+    """Agenda del día de todos los doctores: CSV, HTML imprimible o PDF
+    
+    CSV y HTML se envían a medida que se leen las filas de la consulta.
+    """
+    try:
+        day = datetime.strptime(request.args.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        day = date.today()
+    export_format = request.args.get('format', 'html')
+    
+    if export_format == 'csv':
+        return Response(stream_with_context(csv_chunks(day)), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename=agenda_{day.isoformat()}.csv'})
+    if export_format == 'pdf':
+        try:
+            from weasyprint import HTML
+        except ImportError:
+            flash('La exportación a PDF requiere WeasyPrint; use la versión imprimible', 'error')
+            return redirect(url_for('receptionist.export_agenda', date=day.isoformat()))
+        import io
+        html = render_template('receptionist/agenda_print.html', day=day, groups=agenda_groups(day), pdf=True)
+        pdf_file = io.BytesIO()
+        HTML(string=html).write_pdf(pdf_file)
+        pdf_file.seek(0)
+        return send_file(pdf_file, mimetype='application/pdf', as_attachment=True,
+                         download_name=f'agenda_{day.isoformat()}.pdf')
+    return Response(stream_template('receptionist/agenda_print.html', day=day, groups=agenda_groups(day), pdf=False))
 
 @bp.route('/appointments/<int:appointment_id>/edit', methods=['GET', 'POST'])
 @login_required
@@ -910,12 +932,7 @@ def edit_appointment(appointment_id):
             # Validaciones básicas
             if not all([patient_id, doctor_id, specialty_id, appointment_date, appointment_time]):
                 flash('Todos los campos obligatorios deben ser completados', 'error')
-                return render_template('receptionist/appointment_form.html',
-                                     title='Editar Cita',
-                                     appointment=appointment,
-                                     patients=Patient.query.order_by(Patient.first_name).all(),
-                                     doctors=User.query.filter_by(role='doctor', is_active=True).all(),
-                                     specialties=Specialty.query.filter_by(is_active=True).all())
+                return _render_appointment_form('Editar Cita', appointment=appointment)
             
             # Combinar fecha y hora
             try:
@@ -924,71 +941,63 @@ def edit_appointment(appointment_id):
                 appointment_datetime = datetime.combine(date_obj, time_obj)
             except ValueError:
                 flash('Formato de fecha u hora inválido', 'error')
-                return render_template('receptionist/appointment_form.html',
-                                     title='Editar Cita',
-                                     appointment=appointment,
-                                     patients=Patient.query.order_by(Patient.first_name).all(),
-                                     doctors=User.query.filter_by(role='doctor', is_active=True).all(),
-                                     specialties=Specialty.query.filter_by(is_active=True).all())
+                return _render_appointment_form('Editar Cita', appointment=appointment)
             
             # Validar que la fecha sea futura
             if appointment_datetime <= datetime.now():
                 flash('La cita debe ser programada para una fecha y hora futura', 'error')
-                return render_template('receptionist/appointment_form.html',
-                                     title='Editar Cita',
-                                     appointment=appointment,
-                                     patients=Patient.query.order_by(Patient.first_name).all(),
-                                     doctors=User.query.filter_by(role='doctor', is_active=True).all(),
-                                     specialties=Specialty.query.filter_by(is_active=True).all())
+                return _render_appointment_form('Editar Cita', appointment=appointment)
             
-            # Si cambió la fecha/hora, verificar disponibilidad
-            if appointment_datetime != appointment.date_time or int(doctor_id) != appointment.doctor_id:
-                existing_appointment = Appointment.query.filter(
-                    Appointment.doctor_id == doctor_id,
-                    Appointment.date_time == appointment_datetime,
-                    Appointment.status.in_(['scheduled', 'confirmed']),
-                    Appointment.id != appointment_id  # Excluir la cita actual
-                ).first()
-                
-                if existing_appointment:
-                    flash('El doctor ya tiene una cita programada en esa fecha y hora', 'error')
-                    return render_template('receptionist/appointment_form.html',
-                                         title='Editar Cita',
-                                         appointment=appointment,
-                                         patients=Patient.query.order_by(Patient.first_name).all(),
-                                         doctors=User.query.filter_by(role='doctor', is_active=True).all(),
-                                         specialties=Specialty.query.filter_by(is_active=True).all())
+            # Verificar solapamientos del doctor y del paciente (excluyendo la cita actual)
+            slot_changed = appointment_datetime != appointment.date_time or int(doctor_id) != appointment.doctor_id
+            duration = appointment.duration
+            if slot_changed:
+                duration = Appointment.resolve_duration(doctor_id, specialty_id, appointment_datetime)
+            conflicts = Appointment.find_conflicts([{
+                'doctor_id': doctor_id,
+                'patient_id': patient_id,
+                'date_time': appointment_datetime,
+                'duration': duration
+            }], exclude_ids=[appointment_id])[0]
+            
+            if conflicts:
+                for kind in sorted({kind for kind, _ in conflicts}):
+                    if kind == 'doctor':
+                        flash('El doctor ya tiene una cita que se superpone con ese horario', 'error')
+                    else:
+                        flash('El paciente ya tiene una cita que se superpone con ese horario', 'error')
+                return _render_appointment_form('Editar Cita', appointment=appointment)
+            
+            # Liberar el slot anterior si cambió el doctor o el horario
+            if slot_changed:
+                AppointmentSlot.release(appointment)
             
             # Actualizar la cita
             appointment.patient_id = patient_id
             appointment.doctor_id = doctor_id
             appointment.specialty_id = specialty_id
             appointment.date_time = appointment_datetime
+            appointment.duration = duration
             appointment.reason = reason if reason else None
             appointment.notes = notes if notes else None
             
-            from app import db
+            if slot_changed:
+                try:
+                    appointment.reserve()
+                except SlotTakenError:
+                    flash('El horario seleccionado acaba de ser reservado por otra persona. Elija otro horario.', 'error')
+                    return redirect(url_for('receptionist.edit_appointment', appointment_id=appointment_id))
             db.session.commit()
             
             flash('Cita actualizada exitosamente', 'success')
             return redirect(url_for('receptionist.appointments'))
             
         except Exception as e:
-            from app import db
             db.session.rollback()
             flash(f'Error al actualizar la cita: {str(e)}', 'error')
     
     # GET - Mostrar formulario
-    patients = Patient.query.order_by(Patient.first_name, Patient.last_name).all()
-    doctors = User.query.filter_by(role='doctor', is_active=True).order_by(User.first_name, User.last_name).all()
-    specialties = Specialty.query.filter_by(is_active=True).order_by(Specialty.name).all()
-    
-    return render_template('receptionist/appointment_form.html',
-                         title='Editar Cita',
-                         appointment=appointment,
-                         patients=patients,
-                         doctors=doctors,
-                         specialties=specialties)
+    return _render_appointment_form('Editar Cita', appointment=appointment)
 
 @bp.route('/appointments/<int:appointment_id>/cancel', methods=['POST'])
 @login_required
@@ -1006,22 +1015,166 @@ def cancel_appointment(appointment_id):
         appointment.status = 'cancelled'
         appointment.notes = f"Cancelada por recepcionista el {datetime.now().strftime('%d/%m/%Y %H:%M')}"
         
-        from app import db
+        # Liberar el slot del inventario en la misma transacción
+        AppointmentSlot.release(appointment)
+        
+        # Ofrecer o agendar el horario liberado a la lista de espera
+        entry = WaitlistEntry.backfill(appointment)
         db.session.commit()
         
+        message = 'Cita cancelada exitosamente'
+        if entry and entry.status == 'booked':
+            message += f'. El horario fue asignado a {entry.patient.full_name} (lista de espera)'
+        elif entry:
+            message += f'. Horario ofrecido a {entry.patient.full_name} (lista de espera)'
+        
         return jsonify({
             'success': True,
-            'message': f'Cita cancelada exitosamente'
+            'message': message,
+            'waitlist_entry_id': entry.id if entry else None
         })
         
     except Exception as e:
-        from app import db
         db.session.rollback()
         return jsonify({
             'success': False,
             'message': f'Error al cancelar cita: {str(e)}'
         }), 500
 
+# === LISTA DE ESPERA ===
+
+@bp.route('/waitlist')
+@login_required
+@require_role('receptionist')
+def waitlist():
+    """Lista de espera de pacientes (en espera y con horario ofrecido)"""
+    entries = WaitlistEntry.query.filter(
+        WaitlistEntry.status.in_(['waiting', 'offered'])
+    ).order_by(WaitlistEntry.status.desc(), WaitlistEntry.priority, WaitlistEntry.created_at).all()
+    specialties = reference_data.specialties()
+    doctors = reference_data.doctors()
+    
+    return render_template('receptionist/waitlist.html',
+                         title='Lista de Espera',
+                         entries=entries,
+                         specialties=specialties,
+                         doctors=doctors,
+                         priorities=WaitlistEntry.PRIORITIES,
+                         today=date.today())
+
+@bp.route('/waitlist/add', methods=['POST'])
+@login_required
+@require_role('receptionist')
+def add_waitlist_entry():
+    """Agregar paciente a la lista de espera"""
+    try:
+        patient_id = request.form.get('patient_id', type=int)
+        specialty_id = request.form.get('specialty_id', type=int)
+        if not patient_id or not specialty_id or not db.session.get(Patient, patient_id):
+            flash('Seleccione un paciente y una especialidad', 'error')
+            return redirect(url_for('receptionist.waitlist'))
+        
+        try:
+            earliest_date = datetime.strptime(request.form.get('earliest_date', ''), '%Y-%m-%d').date()
+            latest_date = datetime.strptime(request.form.get('latest_date', ''), '%Y-%m-%d').date()
+            time_from = request.form.get('time_from') or None
+            time_to = request.form.get('time_to') or None
+            time_from = datetime.strptime(time_from, '%H:%M').time() if time_from else None
+            time_to = datetime.strptime(time_to, '%H:%M').time() if time_to else None
+        except ValueError:
+            flash('Formato de fecha u hora inválido', 'error')
+            return redirect(url_for('receptionist.waitlist'))
+        
+        if latest_date < earliest_date or latest_date < date.today():
+            flash('El rango de fechas aceptable no es válido', 'error')
+            return redirect(url_for('receptionist.waitlist'))
+        
+        entry = WaitlistEntry(
+            patient_id=patient_id,
+            specialty_id=specialty_id,
+            doctor_id=request.form.get('doctor_id', type=int) or None,
+            earliest_date=earliest_date,
+            latest_date=latest_date,
+            time_from=time_from,
+            time_to=time_to,
+            priority=request.form.get('priority', 3, type=int),
+            auto_book=request.form.get('auto_book') == 'on',
+            reason=request.form.get('reason', '').strip() or None
+        )
+        db.session.add(entry)
+        db.session.commit()
+        
+        flash(f'{entry.patient.full_name} agregado a la lista de espera', 'success')
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error al agregar a la lista de espera: {str(e)}', 'error')
+    
+    return redirect(url_for('receptionist.waitlist'))
+
+@bp.route('/waitlist/<int:entry_id>/accept', methods=['POST'])
+@login_required
+@require_role('receptionist')
+def accept_waitlist_offer(entry_id):
+    """Confirmar el horario ofrecido y agendar la cita"""
+    entry = WaitlistEntry.query.get_or_404(entry_id)
+    if entry.status != 'offered':
+        flash('La entrada no tiene un horario ofrecido', 'error')
+        return redirect(url_for('receptionist.waitlist'))
+    
+    try:
+        entry.book_offer()
+        db.session.commit()
+        flash(f'Cita agendada para {entry.patient.full_name} el {entry.offered_date_time.strftime("%d/%m/%Y %H:%M")}', 'success')
+    except SlotTakenError:
+        # book_offer() deshizo sólo la reserva y devolvió la entrada a la espera
+        db.session.commit()
+        flash('El horario ofrecido ya fue ocupado; el paciente sigue en lista de espera', 'warning')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error al agendar la cita: {str(e)}', 'error')
+    
+    return redirect(url_for('receptionist.waitlist'))
+
+@bp.route('/waitlist/<int:entry_id>/decline', methods=['POST'])
+@login_required
+@require_role('receptionist')
+def decline_waitlist_offer(entry_id):
+    """Rechazar el horario ofrecido: se ofrece al siguiente en espera"""
+    entry = WaitlistEntry.query.get_or_404(entry_id)
+    if entry.status != 'offered':
+        flash('La entrada no tiene un horario ofrecido', 'error')
+        return redirect(url_for('receptionist.waitlist'))
+    
+    try:
+        next_entry = entry.decline_offer()
+        db.session.commit()
+        if next_entry:
+            flash(f'Horario ofrecido a {next_entry.patient.full_name}', 'info')
+        else:
+            flash('Oferta rechazada; no hay otros pacientes compatibles en espera', 'info')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error al rechazar la oferta: {str(e)}', 'error')
+    
+    return redirect(url_for('receptionist.waitlist'))
+
+@bp.route('/waitlist/<int:entry_id>/remove', methods=['POST'])
+@login_required
+@require_role('receptionist')
+def remove_waitlist_entry(entry_id):
+    """Quitar a un paciente de la lista de espera"""
+    entry = WaitlistEntry.query.get_or_404(entry_id)
+    try:
+        entry.status = 'cancelled'
+        db.session.commit()
+        flash('Paciente retirado de la lista de espera', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error al actualizar la lista de espera: {str(e)}', 'error')
+    
+    return redirect(url_for('receptionist.waitlist'))
+
 @bp.route('/appointments/<int:appointment_id>')
 @login_required
 @require_role('receptionist')
@@ -1653,7 +1806,6 @@ def api_available_times():
             return jsonify({'success': False, 'error': 'Formato de fecha inválido'}), 400
         
         # Obtener doctor y verificar especialidad
-        from app.models.work_schedule import WorkSchedule
         doctor = db.session.get(User, doctor_id)
         if not doctor:
             return jsonify({'success': False, 'error': 'Doctor no encontrado'}), 404
@@ -1661,36 +1813,20 @@ def api_available_times():
         # Usar la especialidad del doctor automáticamente
         doctor_specialty_id = doctor.specialty_id if doctor.specialty else None
         
-        # Verificar que la fecha esté dentro de la vigencia del doctor
-        schedules = WorkSchedule.query.filter_by(
-            doctor_id=int(doctor_id),
-            day_of_week=date_obj.weekday(),
-            is_active=True
-        ).all()
-        
-        valid_schedules = []
-        for schedule in schedules:
-            if (schedule.start_date <= date_obj and 
-                (not schedule.end_date or schedule.end_date >= date_obj)):
-                valid_schedules.append(schedule)
+        # Obtener horarios disponibles (caché -> inventario de slots)
+        formatted_times = availability_cache.get_or_set(
+            doctor_id, date_obj, doctor_specialty_id,
+            lambda: [time.strftime('%H:%M') for time in AppointmentSlot.get_available_times(
+                int(doctor_id), date_obj, doctor_specialty_id)]
+        )
         
-        if not valid_schedules:
+        if not formatted_times:
             return jsonify({
                 'success': True,
                 'available_times': [],
                 'message': 'No hay horarios disponibles para esta fecha'
             })
         
-        # Obtener horarios disponibles
-        available_times = WorkSchedule.get_available_times(
-            int(doctor_id), 
-            date_obj, 
-            doctor_specialty_id
-        )
-        
-        # Formatear horarios para respuesta
-        formatted_times = [time.strftime('%H:%M') for time in available_times]
-        
         return jsonify({
             'success': True,
             'available_times': formatted_times,
@@ -1766,35 +1902,21 @@ def api_doctor_available_dates(doctor_id):
         min_start_date = min(start_dates)
         max_end_date = max(end_dates) if end_dates else (min_start_date + timedelta(days=365))
         
-        # Obtener días de la semana disponibles
-        available_weekdays = set()
-        for schedule in schedules:
-            if (schedule.start_date and schedule.start_date <= datetime.now().date() + timedelta(days=365) and
-                (not schedule.end_date or schedule.end_date >= datetime.now().date())):
-                available_weekdays.add(schedule.day_of_week)
-        
-        # Generar fechas disponibles
-        available_dates = []
-        current_date = max(min_start_date, datetime.now().date())
-        end_date = min(max_end_date, datetime.now().date() + timedelta(days=90))  # Máximo 3 meses
-        
-        while current_date <= end_date:
-            # Verificar si el día de la semana tiene horarios
-            if current_date.weekday() in available_weekdays:
-                # Verificar si hay horarios válidos para esta fecha
-                valid_schedules = [s for s in schedules if 
-                                 s.day_of_week == current_date.weekday() and
-                                 s.start_date <= current_date and
-                                 (not s.end_date or s.end_date >= current_date)]
-                
-                if valid_schedules:
-                    available_dates.append(current_date.strftime('%Y-%m-%d'))
-            
-            current_date += timedelta(days=1)
+        # Fechas con cupo y slots libres por fecha (máximo 3 meses)
+        today = datetime.now().date()
+        remaining_by_date = WorkSchedule.get_available_dates(
+            doctor_id,
+            max(min_start_date, today),
+            min(max_end_date, today + timedelta(days=90)),
+            schedules=schedules,
+            specialty_id=doctor.specialty_id
+        )
+        available_dates = [day.strftime('%Y-%m-%d') for day in remaining_by_date]
         
         return jsonify({
             'success': True,
             'available_dates': available_dates,
+            'slots_remaining': {day.strftime('%Y-%m-%d'): remaining for day, remaining in remaining_by_date.items()},
             'validity_start': min_start_date.strftime('%Y-%m-%d'),
             'validity_end': max_end_date.strftime('%Y-%m-%d') if max_end_date else None,
             'doctor_id': doctor_id,
@@ -1804,6 +1926,103 @@ def api_doctor_available_dates(doctor_id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# API para buscar los primeros horarios libres de una especialidad
+@bp.route('/api/specialties/<int:specialty_id>/first-available')
+@login_required
+@require_role('receptionist')
+def api_first_available_slots(specialty_id):
+    """API para obtener los N primeros slots libres de una especialidad entre todos los doctores"""
+    try:
+        from app.models.work_schedule import WorkSchedule
+        
+        specialty = Specialty.query.filter_by(id=specialty_id, is_active=True).first()
+        if not specialty:
+            return jsonify({'success': False, 'error': 'Especialidad no encontrada'}), 404
+        
+        # Ventana de fechas (máximo 90 días)
+        try:
+            start_str = request.args.get('start_date')
+            end_str = request.args.get('end_date')
+            start_date = max(datetime.strptime(start_str, '%Y-%m-%d').date(), date.today()) if start_str else date.today()
+            end_date = datetime.strptime(end_str, '%Y-%m-%d').date() if end_str else start_date + timedelta(days=90)
+            end_date = min(end_date, start_date + timedelta(days=90))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Formato de fecha inválido'}), 400
+        
+        # Preferencia horaria opcional
+        try:
+            time_from = datetime.strptime(request.args['time_from'], '%H:%M').time() if request.args.get('time_from') else None
+            time_to = datetime.strptime(request.args['time_to'], '%H:%M').time() if request.args.get('time_to') else None
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Formato de hora inválido'}), 400
+        
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+        
+        slots = WorkSchedule.find_first_available(specialty_id, start_date, end_date,
+                                                  time_from=time_from, time_to=time_to, limit=limit)
+        
+        return jsonify({
+            'success': True,
+            'specialty_id': specialty_id,
+            'specialty_name': specialty.name,
+            'slots': [{
+                'doctor_id': doctor.id,
+                'doctor_name': doctor.full_name,
+                'date': slot.strftime('%Y-%m-%d'),
+                'time': slot.strftime('%H:%M')
+            } for slot, doctor in slots],
+            'total': len(slots)
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# API de agenda semanal de varios doctores
+@bp.route('/api/calendar')
+@login_required
+@require_role('receptionist')
+def api_calendar():
+    """API con la agenda semanal (bloques, descansos, citas y slots libres)
+    
+    Parámetros:
+        week: Cualquier fecha de la semana (YYYY-MM-DD) o semana ISO (YYYY-Www)
+        doctors: IDs separados por comas (opcional, por defecto todos)
+    
+    La respuesta es columnar: cada sección (doctors, blocks, appointments,
+    free) es un objeto de listas paralelas; las horas van en minutos desde la
+    medianoche, 'day' es el índice en 'days', 'doctor' el índice en 'doctors'
+    y 'status' el índice en 'statuses'.
+    """
+    try:
+        from app.models.work_schedule import WorkSchedule
+        
+        week = request.args.get('week', '').strip()
+        try:
+            if not week:
+                reference = date.today()
+            elif '-W' in week:
+                year, week_number = week.split('-W')
+                reference = date.fromisocalendar(int(year), int(week_number), 1)
+            else:
+                reference = datetime.strptime(week, '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Semana inválida (use YYYY-MM-DD o YYYY-Www)'}), 400
+        week_start = reference - timedelta(days=reference.weekday())
+        
+        doctors = request.args.get('doctors', '').strip()
+        try:
+            doctor_ids = [int(doctor_id) for doctor_id in doctors.split(',') if doctor_id.strip()] if doctors else None
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Lista de doctores inválida'}), 400
+        
+        calendar = WorkSchedule.get_week_calendar(week_start, doctor_ids)
+        calendar['success'] = True
+        calendar['week_start'] = week_start.isoformat()
+        return jsonify(calendar)
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # API para búsqueda de doctores en tiempo real
 @bp.route('/api/doctors/search')
 @login_required
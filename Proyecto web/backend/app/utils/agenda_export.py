@@ -0,0 +1,132 @@
+"""Exportación de la agenda diaria de todos los doctores (CSV, HTML y PDF)
+
+Las filas salen de agenda_rows (una consulta con yield_per) y
+se escriben a medida que llegan: el CSV se envía en tandas de CSV_FLUSH
+filas y la versión imprimible se renderiza con stream_template, agrupada
+por doctor con itertools.groupby sobre el mismo cursor. La memoria usada
+no depende del número de citas ni de doctores.
+"""
+import csv
+import io
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from app import db
+from app.models.appointment import Appointment
+from app.models.invoice import Invoice
+from app.models.patient import Patient
+from app.models.specialty import Specialty
+from app.models.triage import Triage
+from app.models.user import User
+
+CSV_HEADER = ('Doctor', 'Especialidad', 'Hora', 'Duración (min)', 'Paciente', 'DNI',
+              'Estado', 'Pago', 'Prioridad de triage', 'Motivo')
+
+# Filas escritas antes de enviar una porción del CSV
+CSV_FLUSH = 200
+
+# Filas leídas por tanda al recorrer la agenda exportada
+AGENDA_YIELD_PER = 500
+
+
+def agenda_rows(day):
+    """Agenda de todos los doctores para un día, en una sola consulta
+
+    Une cita, doctor, especialidad y paciente; el estado de la factura y la
+    prioridad del triage salen de subconsultas correlacionadas, así cada
+    cita es una sola fila. Se devuelven filas planas (no instancias ORM)
+    ordenadas por doctor y hora, leídas de a AGENDA_YIELD_PER con
+    yield_per: la memoria no crece con el tamaño de la clínica.
+    """
+    start = datetime.combine(day, datetime.min.time())
+    invoice_status = db.select(Invoice.status).where(
+        Invoice.appointment_id == Appointment.id
+    ).order_by(Invoice.id).limit(1).correlate(Appointment).scalar_subquery()
+    triage_priority = db.select(Triage.priority_level).where(
+        Triage.appointment_id == Appointment.id
+    ).order_by(Triage.id).limit(1).correlate(Appointment).scalar_subquery()
+
+    statement = db.select(
+        Appointment.id, Appointment.doctor_id, Appointment.date_time, Appointment.duration,
+        Appointment.status, Appointment.reason,
+        User.first_name.label('doctor_first_name'), User.last_name.label('doctor_last_name'),
+        Specialty.name.label('specialty_name'),
+        Patient.first_name.label('patient_first_name'), Patient.last_name.label('patient_last_name'),
+        Patient.dni.label('patient_dni'),
+        invoice_status.label('invoice_status'),
+        triage_priority.label('triage_priority')
+    ).join(User, Appointment.doctor_id == User.id).join(
+        Specialty, Appointment.specialty_id == Specialty.id
+    ).join(Patient, Appointment.patient_id == Patient.id).where(
+        Appointment.date_time >= start,
+        Appointment.date_time < start + timedelta(days=1)
+    ).order_by(User.first_name, User.last_name, Appointment.doctor_id, Appointment.date_time, Appointment.id)
+
+    return db.session.execute(statement.execution_options(yield_per=AGENDA_YIELD_PER))
+
+
+def _priority_label(priority):
+    if priority is None:
+        return 'Sin triage'
+    return Triage.PRIORITY_LABELS.get(priority, 'Sin Clasificar')
+
+
+def _agenda_entry(row):
+    """Fila de la agenda con los valores ya listos para mostrar"""
+    return {
+        'id': row.id,
+        'time': row.date_time.strftime('%H:%M'),
+        'duration': row.duration or 30,
+        'specialty': row.specialty_name,
+        'patient': f'{row.patient_first_name} {row.patient_last_name}',
+        'dni': row.patient_dni,
+        'status': row.status,
+        'status_label': Appointment.STATUS_LABELS.get(row.status, 'Estado desconocido'),
+        'payment': Appointment.payment_label(row.invoice_status),
+        'priority': row.triage_priority,
+        'priority_label': _priority_label(row.triage_priority),
+        'reason': row.reason or ''
+    }
+
+
+def agenda_groups(day):
+    """Recorrer la agenda del día como (doctor, filas) sin cargarla entera
+
+    Cada grupo debe consumirse antes de pasar al siguiente (groupby comparte
+    el cursor de la consulta).
+    """
+    for _, rows in groupby(agenda_rows(day), key=lambda row: row.doctor_id):
+        first = next(rows)
+        doctor = {
+            'id': first.doctor_id,
+            'full_name': f'{first.doctor_first_name} {first.doctor_last_name}'
+        }
+        yield doctor, (_agenda_entry(row) for row in _chain_first(first, rows))
+
+
+def _chain_first(first, rows):
+    yield first
+    yield from rows
+
+
+def csv_chunks(day):
+    """Generador del CSV de la agenda en porciones de CSV_FLUSH filas"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM para que Excel abra el archivo como UTF-8
+    buffer.write('\ufeff')
+    writer.writerow(CSV_HEADER)
+
+    pending = 0
+    for doctor, rows in agenda_groups(day):
+        for entry in rows:
+            writer.writerow((f"Dr. {doctor['full_name']}", entry['specialty'], entry['time'], entry['duration'],
+                             entry['patient'], entry['dni'], entry['status_label'], entry['payment'],
+                             entry['priority_label'], entry['reason']))
+            pending += 1
+            if pending >= CSV_FLUSH:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+    yield buffer.getvalue()
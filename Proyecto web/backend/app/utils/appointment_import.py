@@ -0,0 +1,384 @@
+"""Importación masiva de citas desde CSV o XLSX (jornadas de campaña)
+
+El archivo se lee fila a fila desde el stream subido (CSV con
+csv.reader, XLSX con openpyxl en modo read_only) sin cargarlo entero en
+memoria. El lote completo se valida con pocas consultas:
+
+1. Pacientes por DNI con consultas IN por tramos (un conjunto de DNIs).
+2. Doctores y especialidades desde la caché de referencia (sin consultas
+   si ya está cargada).
+3. Horarios activos de todos los doctores del lote en una consulta; cada
+   fila debe caer en un slot de la grilla de su horario.
+4. Solapamientos con citas existentes y entre filas del archivo con
+   Appointment.find_conflicts (una consulta por rango).
+
+Las filas válidas se insertan con bulk_insert_mappings (un INSERT en
+lote), sus IDs se recuperan con una consulta por rango y los slots del
+inventario se ocupan con un único UPDATE ejecutado en lote. El resultado
+es un reporte por fila.
+
+Columnas (encabezado, sin distinguir mayúsculas): dni, doctor (id,
+usuario o nombre completo), especialidad (id o nombre, opcional),
+fecha_hora o fecha + hora, motivo (opcional).
+"""
+import csv
+import io
+from datetime import date, datetime, time
+from itertools import chain
+
+from flask import current_app
+from sqlalchemy import bindparam, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+
+# Encabezados aceptados para cada campo
+COLUMN_ALIASES = {
+    'dni': 'dni', 'documento': 'dni', 'dni_paciente': 'dni',
+    'doctor': 'doctor', 'medico': 'doctor', 'médico': 'doctor',
+    'especialidad': 'specialty', 'specialty': 'specialty',
+    'fecha_hora': 'date_time', 'fecha y hora': 'date_time', 'datetime': 'date_time', 'date_time': 'date_time',
+    'fecha': 'date', 'date': 'date',
+    'hora': 'time', 'time': 'time',
+    'motivo': 'reason', 'reason': 'reason'
+}
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y')
+TIME_FORMATS = ('%H:%M', '%H:%M:%S')
+
+# Tamaño de las listas IN al resolver DNIs
+LOOKUP_CHUNK = 500
+
+
+class AppointmentImportError(Exception):
+    """El archivo no se puede importar (formato, encabezado o tamaño)"""
+
+
+class ImportReport:
+    """Resultado por fila de una importación"""
+
+    def __init__(self, rows, dry_run):
+        self.rows = rows
+        self.dry_run = dry_run
+
+    def count(self, status):
+        return sum(1 for row in self.rows if row['status'] == status)
+
+    @property
+    def created(self):
+        return self.count('created')
+
+    @property
+    def valid(self):
+        return self.count('valid')
+
+    @property
+    def errors(self):
+        return self.count('error')
+
+    def __len__(self):
+        return len(self.rows)
+
+
+# === LECTURA DEL ARCHIVO ===
+
+def _normalize_header(header):
+    columns = [COLUMN_ALIASES.get(str(name or '').strip().lower()) for name in header]
+    found = set(columns)
+    missing = [name for name in ('dni', 'doctor') if name not in found]
+    if 'date_time' not in found and not {'date', 'time'} <= found:
+        missing.append('fecha_hora (o fecha y hora)')
+    if missing:
+        raise AppointmentImportError(f'Faltan columnas obligatorias: {", ".join(missing)}')
+    return columns
+
+
+def _csv_rows(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    first = text.readline()
+    # Las planillas exportadas en español suelen usar ';' como separador
+    delimiter = ';' if first.count(';') > first.count(',') else ','
+    return csv.reader(chain([first], text), delimiter=delimiter)
+
+
+def _xlsx_rows(stream):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise AppointmentImportError('Para importar archivos XLSX instale openpyxl (o guarde la planilla como CSV)')
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    return workbook.active.iter_rows(values_only=True)
+
+
+def read_rows(stream, filename, max_rows=None):
+    """Recorrer las filas de un CSV o XLSX como (número_de_fila, dict)
+
+    Raises:
+        AppointmentImportError: Formato no soportado, encabezado incompleto o
+            más filas que APPOINTMENT_IMPORT_MAX_ROWS
+    """
+    max_rows = max_rows or current_app.config.get('APPOINTMENT_IMPORT_MAX_ROWS', 10000)
+    extension = (filename or '').rsplit('.', 1)[-1].lower()
+    if extension == 'csv':
+        rows = _csv_rows(stream)
+    elif extension == 'xlsx':
+        rows = _xlsx_rows(stream)
+    else:
+        raise AppointmentImportError('Formato no soportado: use un archivo .csv o .xlsx')
+
+    header = next(rows, None)
+    if header is None:
+        raise AppointmentImportError('El archivo está vacío')
+    columns = _normalize_header(header)
+
+    count = 0
+    for number, values in enumerate(rows, start=2):
+        if not any(value not in (None, '') and str(value).strip() for value in values):
+            continue
+        count += 1
+        if count > max_rows:
+            raise AppointmentImportError(f'El archivo supera el máximo de {max_rows} filas por importación')
+        yield number, {column: value for column, value in zip(columns, values) if column}
+
+
+# === VALIDACIÓN E INSERCIÓN ===
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _parse_date_time(values):
+    """Fecha y hora de la fila (celdas de texto o valores de Excel)"""
+    value = values.get('date_time')
+    if isinstance(value, datetime):
+        return value.replace(second=0, microsecond=0)
+    if value not in (None, ''):
+        text = _text(value).replace('T', ' ')
+        day, _, hour = text.partition(' ')
+    else:
+        day, hour = values.get('date'), values.get('time')
+        if isinstance(day, datetime):
+            day = day.date()
+        if isinstance(hour, datetime):
+            hour = hour.time()
+
+    if not isinstance(day, date):
+        day = _parse_with(_text(day), DATE_FORMATS, lambda parsed: parsed.date())
+    if not isinstance(hour, time):
+        hour = _parse_with(_text(hour), TIME_FORMATS, lambda parsed: parsed.time())
+    if day is None or hour is None:
+        return None
+    return datetime.combine(day, hour.replace(second=0, microsecond=0))
+
+
+def _parse_with(text, formats, convert):
+    for fmt in formats:
+        try:
+            return convert(datetime.strptime(text, fmt))
+        except ValueError:
+            continue
+    return None
+
+
+def _doctor_lookup(doctors):
+    """Doctores activos por id, usuario y nombre completo (con o sin 'Dr.')"""
+    lookup = {}
+    for doctor in doctors:
+        for key in (str(doctor.id), doctor.username, doctor.full_name, f'dr. {doctor.full_name}'):
+            lookup[key.lower()] = doctor
+    return lookup
+
+
+def _patients_by_dni(dnis):
+    from app.models.patient import Patient
+
+    dnis = sorted(dnis)
+    patients = {}
+    for start in range(0, len(dnis), LOOKUP_CHUNK):
+        chunk = dnis[start:start + LOOKUP_CHUNK]
+        for patient_id, dni, is_active in db.session.query(
+            Patient.id, Patient.dni, Patient.is_active
+        ).filter(Patient.dni.in_(chunk)):
+            patients[dni] = (patient_id, is_active)
+    return patients
+
+
+def _schedule_for(schedules, grids, doctor_id, date_time):
+    """Horario del doctor cuya grilla de slots contiene date_time"""
+    for schedule in schedules.get(doctor_id, ()):
+        key = (schedule.id, date_time.date())
+        if key not in grids:
+            grids[key] = set(schedule.get_slot_grid(date_time.date()))
+        if date_time in grids[key]:
+            return schedule
+    return None
+
+
+def import_appointments(rows, dry_run=False, now=None):
+    """Validar e insertar un lote de citas (sin commit)
+
+    Las filas con error se informan y no se insertan; el resto se inserta
+    aunque haya errores en otras filas. Con dry_run sólo se valida.
+
+    Args:
+        rows: Iterable de (número_de_fila, dict) como los de read_rows()
+
+    Returns:
+        ImportReport
+
+    Raises:
+        SlotTakenError: Si otra operación reservó uno de los horarios mientras
+            se importaba; la transacción se revierte y no se inserta nada
+    """
+    from app.models.appointment import Appointment, SlotTakenError
+    from app.models.appointment_slot import AppointmentSlot
+    from app.models.work_schedule import WorkSchedule
+    from app.utils.availability_cache import availability_cache
+    from app.utils.reference_data import reference_data
+
+    now = now or datetime.now()
+    results = []
+    for number, values in rows:
+        results.append({
+            'row': number,
+            'dni': _text(values.get('dni')),
+            'doctor': _text(values.get('doctor')),
+            'specialty': _text(values.get('specialty')),
+            'date_time': _parse_date_time(values),
+            'reason': _text(values.get('reason')) or None,
+            'status': 'valid',
+            'message': '',
+            'appointment_id': None
+        })
+
+    def fail(result, message):
+        result['status'] = 'error'
+        result['message'] = message
+
+    # Pacientes, doctores y especialidades con búsquedas por conjunto
+    patients = _patients_by_dni({result['dni'] for result in results if result['dni']})
+    doctors = _doctor_lookup(reference_data.doctors())
+    specialties = {}
+    for specialty in reference_data.specialties():
+        specialties[str(specialty.id)] = specialties[specialty.name.lower()] = specialty
+
+    for result in results:
+        patient = patients.get(result['dni'])
+        doctor = doctors.get(result['doctor'].lower())
+        if not result['dni'] or patient is None:
+            fail(result, f'No existe un paciente con DNI {result["dni"] or "(vacío)"}')
+        elif not patient[1]:
+            fail(result, 'El paciente está inactivo')
+        elif doctor is None:
+            fail(result, f'Doctor no encontrado o inactivo: {result["doctor"] or "(vacío)"}')
+        elif result['date_time'] is None:
+            fail(result, 'Fecha u hora inválida (use AAAA-MM-DD HH:MM o DD/MM/AAAA HH:MM)')
+        elif result['date_time'] <= now:
+            fail(result, 'La cita debe ser en una fecha y hora futura')
+        elif result['specialty'] and result['specialty'].lower() not in specialties:
+            fail(result, f'Especialidad no encontrada o inactiva: {result["specialty"]}')
+        else:
+            result['patient_id'] = patient[0]
+            result['doctor_id'] = doctor.id
+            result['doctor_name'] = f'Dr. {doctor.full_name}'
+            result['specialty_ref'] = specialties.get(result['specialty'].lower())
+            result['default_specialty_id'] = doctor.specialty_id
+
+    # Horarios de todos los doctores del lote en una consulta
+    pending = [result for result in results if result['status'] == 'valid']
+    schedules = {}
+    if pending:
+        for schedule in WorkSchedule.query.filter(
+            WorkSchedule.doctor_id.in_({result['doctor_id'] for result in pending}),
+            WorkSchedule.is_active == True
+        ):
+            schedules.setdefault(schedule.doctor_id, []).append(schedule)
+
+    durations = {specialty.id: specialty.consultation_duration for specialty in reference_data.specialties()}
+    grids = {}
+    for result in pending:
+        schedule = _schedule_for(schedules, grids, result['doctor_id'], result['date_time'])
+        specialty = result['specialty_ref']
+        if schedule is None:
+            fail(result, 'El horario no corresponde a un turno del doctor')
+            continue
+        if specialty and schedule.specialty_id and schedule.specialty_id != specialty.id:
+            fail(result, 'El turno del doctor en ese horario es de otra especialidad')
+            continue
+        specialty_id = specialty.id if specialty else schedule.specialty_id or result['default_specialty_id']
+        if not specialty_id:
+            fail(result, 'Indique la especialidad (el doctor no tiene una asignada)')
+            continue
+        result['specialty_id'] = specialty_id
+        result['duration'] = Appointment.clamp_duration(schedule.appointment_duration or durations.get(specialty_id))
+
+    # Solapamientos con citas existentes y entre filas del archivo
+    pending = [result for result in results if result['status'] == 'valid']
+    conflicts = Appointment.find_conflicts(pending)
+    for result, row_conflicts in zip(pending, conflicts):
+        if row_conflicts:
+            kind, other = row_conflicts[0]
+            who = 'El doctor' if kind == 'doctor' else 'El paciente'
+            if isinstance(other, int):
+                fail(result, f'{who} ya tiene otra cita en la fila {pending[other]["row"]} del archivo')
+            else:
+                fail(result, f'{who} ya tiene una cita que se superpone ({other.date_time.strftime("%d/%m/%Y %H:%M")})')
+
+    valid = [result for result in results if result['status'] == 'valid']
+    if valid and not dry_run:
+        created_at = datetime.utcnow()
+        mappings = [{
+            'patient_id': result['patient_id'],
+            'doctor_id': result['doctor_id'],
+            'specialty_id': result['specialty_id'],
+            'date_time': result['date_time'],
+            'duration': result['duration'],
+            'reason': result['reason'],
+            'status': 'scheduled',
+            'created_at': created_at,
+            'updated_at': created_at
+        } for result in valid]
+        try:
+            db.session.bulk_insert_mappings(Appointment, mappings)
+        except IntegrityError:
+            db.session.rollback()
+            raise SlotTakenError('Uno de los horarios fue reservado durante la importación; vuelva a importar el archivo')
+
+        # IDs generados: (doctor, inicio) es único entre citas activas, una consulta por rango
+        ids = dict(((doctor_id, date_time), appointment_id) for appointment_id, doctor_id, date_time in
+                   db.session.query(Appointment.id, Appointment.doctor_id, Appointment.date_time).filter(
+                       Appointment.doctor_id.in_({mapping['doctor_id'] for mapping in mappings}),
+                       Appointment.date_time >= min(mapping['date_time'] for mapping in mappings),
+                       Appointment.date_time <= max(mapping['date_time'] for mapping in mappings),
+                       Appointment.status.in_(Appointment.ACTIVE_STATUSES)
+                   ))
+        for mapping in mappings:
+            mapping['id'] = ids[(mapping['doctor_id'], mapping['date_time'])]
+
+        # Ocupar los slots del inventario con un único UPDATE en lote
+        slots = AppointmentSlot.__table__
+        db.session.execute(
+            update(slots).where(
+                slots.c.doctor_id == bindparam('b_doctor_id'),
+                slots.c.start_time == bindparam('b_start_time')
+            ).values(state='booked', appointment_id=bindparam('b_appointment_id'), updated_at=created_at),
+            [{'b_doctor_id': mapping['doctor_id'], 'b_start_time': mapping['date_time'],
+              'b_appointment_id': mapping['id']} for mapping in mappings]
+        )
+
+        # bulk_insert_mappings no dispara los eventos de Appointment
+        for day_key in {(mapping['doctor_id'], mapping['date_time'].date()) for mapping in mappings}:
+            availability_cache.invalidate_on_commit(db.session, *day_key)
+
+        for result, mapping in zip(valid, mappings):
+            result['status'] = 'created'
+            result['appointment_id'] = mapping['id']
+
+    for result in results:
+        if result['status'] != 'error' and not result['message']:
+            result['message'] = 'Cita creada' if result['status'] == 'created' else 'Lista para importar'
+    return ImportReport(results, dry_run)
@@ -0,0 +1,320 @@
+"""Caché de disponibilidad por (doctor, fecha, especialidad)
+
+Guarda los horarios libres calculados para que el formulario de citas no los
+recalcule en cada cambio de doctor o fecha. Las entradas se invalidan con los
+eventos after_insert/after_update/after_delete de Appointment y WorkSchedule
+(y otra vez al hacer commit, por si otro request recalculó antes del commit).
+
+Backends disponibles (AVAILABILITY_CACHE_BACKEND):
+    'memory': LRU con TTL en el proceso (por defecto con un worker)
+    'sqlite': archivo SQLite compartido entre varios workers (por defecto si
+              GUNICORN_WORKERS > 1: con 'memory' la invalidación sólo llega
+              al worker que escribió)
+    'none':   sin caché
+"""
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import date, datetime
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import object_session
+
+
+class CacheBackend(ABC):
+    """Interfaz de backend de caché
+
+    Las claves son tuplas (doctor_id, fecha_iso, specialty_id).
+    """
+
+    name = 'base'
+
+    @abstractmethod
+    def get(self, key):
+        """Devolver el valor guardado o None si no existe o expiró"""
+
+    @abstractmethod
+    def set(self, key, value, ttl):
+        """Guardar un valor durante `ttl` segundos"""
+
+    @abstractmethod
+    def delete(self, doctor_id, day=None):
+        """Eliminar las entradas de un doctor (de una fecha o de todas)"""
+
+    @abstractmethod
+    def clear(self):
+        """Vaciar la caché"""
+
+    @abstractmethod
+    def size(self):
+        """Número de entradas guardadas"""
+
+
+class NullBackend(CacheBackend):
+    """Backend que no guarda nada (caché desactivada)"""
+
+    name = 'none'
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, doctor_id, day=None):
+        pass
+
+    def clear(self):
+        pass
+
+    def size(self):
+        return 0
+
+
+class MemoryBackend(CacheBackend):
+    """LRU con TTL local al proceso"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, doctor_id, day=None):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == doctor_id and (day is None or k[1] == day)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+
+class SQLiteBackend(CacheBackend):
+    """Caché compartida en un archivo SQLite local (varios workers en la misma máquina)"""
+
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS availability_cache ('
+                ' doctor_id INTEGER NOT NULL, day TEXT NOT NULL, specialty_id INTEGER NOT NULL,'
+                ' value TEXT NOT NULL, expires_at REAL NOT NULL,'
+                ' PRIMARY KEY (doctor_id, day, specialty_id))'
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    @staticmethod
+    def _params(key):
+        doctor_id, day, specialty_id = key
+        return doctor_id, day, specialty_id or 0
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT value, expires_at FROM availability_cache WHERE doctor_id=? AND day=? AND specialty_id=?',
+                self._params(key)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO availability_cache VALUES (?, ?, ?, ?, ?)',
+                self._params(key) + (json.dumps(value), time.time() + ttl)
+            )
+
+    def delete(self, doctor_id, day=None):
+        with self._connect() as conn:
+            if day is None:
+                conn.execute('DELETE FROM availability_cache WHERE doctor_id=?', (doctor_id,))
+            else:
+                conn.execute('DELETE FROM availability_cache WHERE doctor_id=? AND day=?', (doctor_id, day))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM availability_cache')
+
+    def size(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM availability_cache').fetchone()[0]
+
+
+class AvailabilityCache:
+    """Caché de horarios disponibles con contadores de aciertos y fallos"""
+
+    def __init__(self, app=None):
+        self.backend = MemoryBackend()
+        self.ttl = 60
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configurar backend desde la configuración de la app y registrar eventos"""
+        backend = app.config.get('AVAILABILITY_CACHE_BACKEND', 'memory')
+        if backend == 'sqlite':
+            self.backend = SQLiteBackend(app.config['AVAILABILITY_CACHE_PATH'])
+        elif backend == 'none':
+            self.backend = NullBackend()
+        else:
+            self.backend = MemoryBackend(app.config.get('AVAILABILITY_CACHE_SIZE', 1024))
+        self.ttl = app.config.get('AVAILABILITY_CACHE_TTL', 60)
+        self.reset_stats()
+        register_invalidation_events()
+
+    @staticmethod
+    def make_key(doctor_id, day, specialty_id=None):
+        return (int(doctor_id), day.isoformat(), int(specialty_id) if specialty_id else None)
+
+    def get_or_set(self, doctor_id, day, specialty_id, compute):
+        """Devolver el valor en caché o calcularlo con compute() y guardarlo"""
+        key = self.make_key(doctor_id, day, specialty_id)
+        value = self.backend.get(key)
+        with self._lock:
+            if value is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if value is None:
+            value = compute()
+            self.backend.set(key, value, self.ttl)
+        return value
+
+    def invalidate(self, doctor_id, day=None):
+        """Invalidar las entradas de un doctor (de una fecha o todas)"""
+        if doctor_id is None:
+            return
+        with self._lock:
+            self.invalidations += 1
+        self.backend.delete(int(doctor_id), day.isoformat() if day else None)
+
+    def invalidate_on_commit(self, session, doctor_id, day=None):
+        """Invalidar ahora y de nuevo al hacer commit (escrituras masivas sin eventos ORM)"""
+        self.invalidate(doctor_id, day)
+        session.info.setdefault('availability_invalidations', set()).add((doctor_id, day))
+
+    def clear(self):
+        self.backend.clear()
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = self.invalidations = 0
+
+    def stats(self):
+        """Contadores para monitoreo"""
+        total = self.hits + self.misses
+        return {
+            'backend': self.backend.name,
+            'ttl': self.ttl,
+            'entries': self.backend.size(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'hit_rate': round(self.hits / total * 100, 1) if total else 0
+        }
+
+
+availability_cache = AvailabilityCache()
+
+
+# === INVALIDACIÓN POR EVENTOS DE SQLALCHEMY ===
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return None
+
+
+def _attribute_values(target, attribute):
+    """Valor actual y valores anteriores (si cambió) de un atributo"""
+    history = inspect(target).attrs[attribute].history
+    values = list(history.added or ()) + list(history.deleted or ()) + list(history.unchanged or ())
+    return values or [getattr(target, attribute)]
+
+
+def _pending_invalidations(target):
+    """Invalidaciones a repetir cuando la sesión del objeto haga commit"""
+    session = object_session(target)
+    if session is None:
+        return set()
+    return session.info.setdefault('availability_invalidations', set())
+
+
+def _invalidate_appointment(mapper, connection, target):
+    pending = _pending_invalidations(target)
+    for doctor_id in _attribute_values(target, 'doctor_id'):
+        for date_time in _attribute_values(target, 'date_time'):
+            day = _as_date(date_time)
+            availability_cache.invalidate(doctor_id, day)
+            pending.add((doctor_id, day))
+
+
+def _invalidate_schedule(mapper, connection, target):
+    pending = _pending_invalidations(target)
+    for doctor_id in _attribute_values(target, 'doctor_id'):
+        availability_cache.invalidate(doctor_id)
+        pending.add((doctor_id, None))
+
+
+def _invalidate_after_commit(session):
+    for doctor_id, day in session.info.pop('availability_invalidations', set()):
+        availability_cache.invalidate(doctor_id, day)
+
+
+def _discard_after_rollback(session, previous_transaction):
+    session.info.pop('availability_invalidations', None)
+
+
+def register_invalidation_events():
+    """Registrar (una sola vez) los eventos de invalidación"""
+    from sqlalchemy.orm import Session
+    from app.models.appointment import Appointment
+    from app.models.work_schedule import WorkSchedule
+
+    for model, handler in ((Appointment, _invalidate_appointment), (WorkSchedule, _invalidate_schedule)):
+        for event_name in ('after_insert', 'after_update', 'after_delete'):
+            if not event.contains(model, event_name, handler):
+                event.listen(model, event_name, handler)
+
+    if not event.contains(Session, 'after_commit', _invalidate_after_commit):
+        event.listen(Session, 'after_commit', _invalidate_after_commit)
+        event.listen(Session, 'after_soft_rollback', _discard_after_rollback)
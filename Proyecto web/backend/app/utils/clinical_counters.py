@@ -0,0 +1,184 @@
+"""Contadores clínicos desnormalizados de pacientes
+
+patients.consultation_count, first_record_id, last_record_id,
+last_consultation_at y last_doctor_id resumen los registros médicos del
+paciente para que has_medical_history(), get_consultation_count(),
+get_last_consultation() y similares no consulten medical_records.
+
+- Los eventos after_insert/after_delete/after_update de MedicalRecord
+  actualizan la fila del paciente con la misma conexión del flush, es decir
+  en la misma transacción: si se revierte, los contadores también.
+- Un alta incrementa el contador y compara con el primer/último registro
+  guardados; una baja o un cambio de paciente, fecha o doctor recalcula
+  los contadores del paciente desde medical_records.
+- Los cambios hechos fuera del ORM (INSERT en lote, SQL manual) no pasan
+  por los eventos: refresh_counters() los recalcula y find_mismatches()
+  los detecta (scripts/maintenance/clinical_counters.py).
+"""
+from sqlalchemy import case, event, func, inspect, or_, select, update
+from sqlalchemy.orm import object_session
+
+from app import db
+
+# Columnas de patients mantenidas por este módulo
+COUNTER_COLUMNS = ('consultation_count', 'first_record_id', 'last_record_id', 'last_consultation_at', 'last_doctor_id')
+
+# Cambios de un registro médico que obligan a recalcular
+TRACKED_ATTRIBUTES = ('patient_id', 'consultation_date', 'created_at', 'doctor_id')
+
+# Pacientes por UPDATE al recalcular todos
+REFRESH_CHUNK = 2000
+
+
+def _tables():
+    from app.models.medical_record import MedicalRecord
+    from app.models.patient import Patient
+    return Patient.__table__, MedicalRecord.__table__
+
+
+def computed_counters():
+    """Valores correctos de cada contador como subconsultas correlacionadas con patients"""
+    patients, records = _tables()
+    of_patient = records.c.patient_id == patients.c.id
+    first = (records.c.created_at.asc(), records.c.id.asc())
+    last = (records.c.consultation_date.desc(), records.c.id.desc())
+
+    def pick(column, ordering):
+        return select(column).where(of_patient).order_by(*ordering).limit(1).scalar_subquery()
+
+    return {
+        'consultation_count': select(func.count(records.c.id)).where(of_patient).scalar_subquery(),
+        'first_record_id': pick(records.c.id, first),
+        'last_record_id': pick(records.c.id, last),
+        'last_consultation_at': pick(records.c.consultation_date, last),
+        'last_doctor_id': pick(records.c.doctor_id, last)
+    }
+
+
+def refresh_counters(patient_ids=None, connection=None):
+    """Recalcular los contadores de los pacientes indicados (o de todos, por tramos)
+
+    Returns:
+        int: Pacientes actualizados
+    """
+    patients, _ = _tables()
+    executor = connection if connection is not None else db.session
+    values = computed_counters()
+    if patient_ids is not None:
+        patient_ids = list(patient_ids)
+        if not patient_ids:
+            return 0
+        return executor.execute(update(patients).where(patients.c.id.in_(patient_ids)).values(**values)).rowcount
+
+    updated = 0
+    low, high = executor.execute(select(func.min(patients.c.id), func.max(patients.c.id))).one()
+    for start in range(low or 0, (high or -1) + 1, REFRESH_CHUNK):
+        updated += executor.execute(update(patients).where(
+            patients.c.id >= start, patients.c.id < start + REFRESH_CHUNK
+        ).values(**values)).rowcount
+    return updated
+
+
+def find_mismatches(limit=None):
+    """Pacientes cuyos contadores no coinciden con medical_records
+
+    Returns:
+        list de (patient_id, {columna: (guardado, correcto)})
+    """
+    patients, _ = _tables()
+    values = computed_counters()
+    expected = [values[name].label(f'expected_{name}') for name in COUNTER_COLUMNS]
+    query = select(patients.c.id, *(patients.c[name] for name in COUNTER_COLUMNS), *expected).where(or_(
+        *(patients.c[name].is_distinct_from(values[name]) for name in COUNTER_COLUMNS)
+    )).order_by(patients.c.id)
+    if limit:
+        query = query.limit(limit)
+
+    mismatches = []
+    for row in db.session.execute(query).mappings():
+        differences = {
+            name: (row[name], row[f'expected_{name}'])
+            for name in COUNTER_COLUMNS if row[name] != row[f'expected_{name}']
+        }
+        mismatches.append((row['id'], differences))
+    return mismatches
+
+
+# === SINCRONIZACIÓN CON EVENTOS DE SQLALCHEMY ===
+
+def _mark_changed(target, *patient_ids):
+    """Recordar los pacientes a expirar en la sesión al terminar el flush"""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('clinical_counter_patients', set()).update(
+            patient_id for patient_id in patient_ids if patient_id is not None
+        )
+
+
+def _count_insert(mapper, connection, target):
+    """Alta: incrementar y comparar con el primer y último registro guardados"""
+    patients, records = _tables()
+    first_created = select(records.c.created_at).where(
+        records.c.id == patients.c.first_record_id
+    ).scalar_subquery()
+    is_first = or_(patients.c.first_record_id.is_(None), first_created > target.created_at)
+    # Mismo orden que get_last_consultation(): fecha de consulta y, a igual fecha, el id mayor
+    is_last = or_(patients.c.last_consultation_at.is_(None), patients.c.last_consultation_at <= target.consultation_date)
+    connection.execute(update(patients).where(patients.c.id == target.patient_id).values(
+        consultation_count=patients.c.consultation_count + 1,
+        first_record_id=case((is_first, target.id), else_=patients.c.first_record_id),
+        last_record_id=case((is_last, target.id), else_=patients.c.last_record_id),
+        last_consultation_at=case((is_last, target.consultation_date), else_=patients.c.last_consultation_at),
+        last_doctor_id=case((is_last, target.doctor_id), else_=patients.c.last_doctor_id)
+    ))
+    _mark_changed(target, target.patient_id)
+
+
+def _count_update(mapper, connection, target):
+    """Cambio de paciente, fechas o doctor: recalcular el paciente anterior y el actual"""
+    state = inspect(target)
+    if not any(state.attrs[name].history.has_changes() for name in TRACKED_ATTRIBUTES):
+        return
+    patient_ids = {target.patient_id, *state.attrs.patient_id.history.deleted}
+    refresh_counters(patient_ids, connection=connection)
+    _mark_changed(target, *patient_ids)
+
+
+def _load_patient_id(mapper, connection, target):
+    """Cargar patient_id antes del DELETE (después la fila ya no existe)"""
+    target.patient_id
+
+
+def _count_delete(mapper, connection, target):
+    """Baja: recalcular el paciente (puede haberse borrado el primer o el último registro)"""
+    refresh_counters([target.patient_id], connection=connection)
+    _mark_changed(target, target.patient_id)
+
+
+def _keep_previous_value(target, value, oldvalue, initiator):
+    """Sólo activa active_history: el paciente anterior queda en el historial"""
+
+
+def _expire_counters(session, flush_context):
+    """Los pacientes cargados en la sesión vuelven a leer los contadores"""
+    from app.models.patient import Patient
+
+    patient_ids = session.info.pop('clinical_counter_patients', None)
+    for patient_id in patient_ids or ():
+        patient = session.identity_map.get(session.identity_key(Patient, patient_id))
+        if patient is not None:
+            session.expire(patient, COUNTER_COLUMNS)
+
+
+def register_clinical_counters():
+    """Registrar (una sola vez) los eventos que mantienen los contadores"""
+    from sqlalchemy.orm import Session
+    from app.models.medical_record import MedicalRecord
+
+    if not event.contains(MedicalRecord, 'after_insert', _count_insert):
+        event.listen(MedicalRecord.patient_id, 'set', _keep_previous_value, active_history=True)
+        event.listen(MedicalRecord, 'after_insert', _count_insert)
+        event.listen(MedicalRecord, 'after_update', _count_update)
+        event.listen(MedicalRecord, 'before_delete', _load_patient_id)
+        event.listen(MedicalRecord, 'after_delete', _count_delete)
+        event.listen(Session, 'after_flush_postexec', _expire_counters)
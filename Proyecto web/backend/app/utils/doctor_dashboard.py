@@ -0,0 +1,96 @@
+"""Datos del dashboard del doctor
+
+doctor_dashboard() arma todas las variables de doctor/dashboard.html con
+cuatro sentencias SQL sin importar cuántos pacientes haya:
+
+1. Una consulta con todas las citas del dashboard (hoy sin completar,
+   listas, en triage y las próximas DASHBOARD_UPCOMING) con paciente y
+   triage en el mismo JOIN; cada lista se arma luego en memoria.
+2. Una consulta agrupada con el estado de historia clínica de todos los
+   pacientes involucrados (Patient.preload_doctor_status).
+3. Los contadores (pacientes atendidos y consultas reales del mes) como
+   subconsultas escalares de un único SELECT.
+4. Las últimas consultas reales con su paciente.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import joinedload
+
+from app import db
+from app.models.appointment import Appointment
+from app.models.medical_record import MedicalRecord
+from app.models.patient import Patient
+
+# Próximas citas (después de hoy) que muestra el dashboard del doctor
+DASHBOARD_UPCOMING = 5
+
+# Últimas consultas reales que muestra el dashboard del doctor
+DASHBOARD_RECENT = 5
+
+
+def doctor_dashboard(doctor_id, today=None):
+    """Datos listos para renderizar el dashboard del doctor
+
+    Returns:
+        dict: Variables de la plantilla doctor/dashboard.html
+    """
+    today = today or datetime.now().date()
+    start_of_day = datetime.combine(today, datetime.min.time())
+    start_of_tomorrow = start_of_day + timedelta(days=1)
+    start_of_month = datetime(today.year, today.month, 1)
+
+    upcoming_ids = db.select(Appointment.id).where(
+        Appointment.doctor_id == doctor_id,
+        Appointment.date_time >= start_of_tomorrow
+    ).order_by(Appointment.date_time, Appointment.id).limit(DASHBOARD_UPCOMING)
+
+    appointments = Appointment.query.options(
+        joinedload(Appointment.patient),
+        joinedload(Appointment.triage)
+    ).filter(
+        Appointment.doctor_id == doctor_id,
+        db.or_(
+            db.and_(Appointment.date_time >= start_of_day, Appointment.date_time < start_of_tomorrow,
+                    Appointment.status != 'completed'),
+            Appointment.status.in_(('ready_for_doctor', 'in_triage')),
+            Appointment.id.in_(upcoming_ids)
+        )
+    ).order_by(Appointment.date_time, Appointment.id).all()
+
+    # Estado de historia clínica memorizado en cada paciente
+    Patient.preload_doctor_status({appointment.patient for appointment in appointments})
+    for appointment in appointments:
+        patient_status = appointment.patient.get_patient_status_for_doctor()
+        appointment.patient_has_history = patient_status['has_medical_history']
+        appointment.patient_status = patient_status
+        appointment.expected_action = patient_status['expected_action']
+
+    my_patients_count, consultations_this_month = db.session.execute(db.select(
+        db.select(db.func.count(db.distinct(Appointment.patient_id)))
+        .where(Appointment.doctor_id == doctor_id).scalar_subquery(),
+        db.select(db.func.count(MedicalRecord.id)).where(
+            MedicalRecord.doctor_id == doctor_id,
+            MedicalRecord.consultation_date >= start_of_month,
+            MedicalRecord.real_consultation_clause()
+        ).scalar_subquery()
+    )).one()
+
+    recent_consultations = MedicalRecord.query.options(joinedload(MedicalRecord.patient)).filter(
+        MedicalRecord.doctor_id == doctor_id,
+        MedicalRecord.real_consultation_clause()
+    ).order_by(MedicalRecord.consultation_date.desc()).limit(DASHBOARD_RECENT).all()
+
+    return {
+        'today_appointments': [appointment for appointment in appointments
+                               if start_of_day <= appointment.date_time < start_of_tomorrow
+                               and appointment.status != 'completed'],
+        'ready_appointments': [appointment for appointment in appointments
+                               if appointment.status == 'ready_for_doctor'],
+        'in_triage_appointments': [appointment for appointment in appointments
+                                   if appointment.status == 'in_triage'],
+        'upcoming_appointments': [appointment for appointment in appointments
+                                  if appointment.date_time >= start_of_tomorrow][:DASHBOARD_UPCOMING],
+        'my_patients_count': my_patients_count,
+        'consultations_this_month': consultations_this_month,
+        'recent_consultations': recent_consultations
+    }
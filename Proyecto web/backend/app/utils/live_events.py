@@ -0,0 +1,207 @@
+"""Eventos en vivo de la cola de atención (Server-Sent Events)
+
+Los cambios de estado de las citas se capturan con eventos de sesión de
+SQLAlchemy (after_flush) y se publican recién al hacer commit, en un
+pub/sub en memoria del proceso. Cada dashboard abierto mantiene una
+suscripción con su propia cola acotada; publicar sólo agrega el evento a
+las colas que le corresponden y despierta a los lectores, sin hilos
+adicionales ni consultas a la base de datos.
+
+Un stream no retiene recursos de la petición: el filtro se arma con los
+datos del usuario antes de empezar, la sesión de base de datos se libera
+(la conexión vuelve al pool) y el generador no conserva el contexto de la
+petición. En producción se sirve con workers gevent (gunicorn.conf.py):
+cada conexión es una corrutina y la espera en threading.Condition es
+cooperativa, así que muchos oyentes no ocupan un hilo del sistema cada uno.
+Las conexiones se cierran tras LIVE_EVENTS_STREAM_SECONDS y el navegador
+se reconecta solo (EventSource) recuperando lo perdido con Last-Event-ID.
+
+El historial y la numeración de eventos son del proceso: la aplicación
+debe servirse con un único worker (ver gunicorn.conf.py).
+"""
+import json
+import threading
+import time
+from collections import deque
+from itertools import count
+
+from flask import Response, current_app
+from sqlalchemy import event, inspect
+
+from app import db
+
+
+class Subscription:
+    """Cola de eventos de un oyente con su filtro"""
+
+    def __init__(self, broker, accepts, max_pending=100):
+        self.broker = broker
+        self.accepts = accepts
+        self.pending = deque(maxlen=max_pending)
+
+    def get(self, timeout):
+        """Eventos pendientes (espera hasta `timeout` segundos si no hay ninguno)"""
+        with self.broker.condition:
+            self.broker.condition.wait_for(lambda: self.pending, timeout)
+            events = list(self.pending)
+            self.pending.clear()
+        return events
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class EventBroker:
+    """Pub/sub en memoria del proceso con historial corto para reconexiones"""
+
+    def __init__(self, history=200):
+        self.condition = threading.Condition()
+        self.subscriptions = set()
+        self.history = deque(maxlen=history)
+        self._sequence = count(1)
+
+    def subscribe(self, accepts, last_event_id=None, max_pending=100):
+        """Registrar un oyente; `accepts(evento)` decide qué eventos recibe
+
+        Si se indica last_event_id se reenvían los eventos posteriores que
+        aún estén en el historial.
+        """
+        subscription = Subscription(self, accepts, max_pending)
+        with self.condition:
+            if last_event_id is not None:
+                subscription.pending.extend(item for item in self.history
+                                            if item['id'] > last_event_id and accepts(item))
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.condition:
+            self.subscriptions.discard(subscription)
+
+    def publish(self, events):
+        """Entregar eventos a los oyentes que los aceptan y despertarlos"""
+        if not events:
+            return
+        with self.condition:
+            for payload in events:
+                item = dict(payload, id=next(self._sequence))
+                self.history.append(item)
+                for subscription in self.subscriptions:
+                    if subscription.accepts(item):
+                        subscription.pending.append(item)
+            self.condition.notify_all()
+
+    @property
+    def listeners(self):
+        return len(self.subscriptions)
+
+
+live_events = EventBroker()
+
+
+def format_event(item):
+    """Mensaje SSE de un evento de cita"""
+    data = {key: value for key, value in item.items() if key != 'id'}
+    return f"id: {item['id']}\nevent: appointment\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_response(accepts, last_event_id=None):
+    """Respuesta text/event-stream para un oyente con el filtro `accepts`
+
+    `accepts` no debe depender de la petición ni de la sesión (usar valores
+    ya leídos, como el id del doctor): el stream corre sin ellas.
+    """
+    heartbeat = current_app.config.get('LIVE_EVENTS_HEARTBEAT', 15)
+    lifetime = current_app.config.get('LIVE_EVENTS_STREAM_SECONDS', 300)
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    # Devolver la conexión al pool: el stream puede durar minutos y no consulta la base de datos
+    db.session.remove()
+
+    def generate():
+        subscription = live_events.subscribe(accepts, last_event_id)
+        deadline = time.monotonic() + lifetime
+        try:
+            yield 'retry: 3000\n\n'
+            while time.monotonic() < deadline:
+                events = subscription.get(timeout=min(heartbeat, max(deadline - time.monotonic(), 0)))
+                if events:
+                    for item in events:
+                        yield format_event(item)
+                else:
+                    # Comentario SSE: mantiene viva la conexión a través de proxies
+                    yield ': ping\n\n'
+        finally:
+            subscription.close()
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# === CAPTURA DE CAMBIOS DE ESTADO ===
+
+def _appointment_event(appointment, previous):
+    patient = appointment.patient
+    return {
+        'appointment_id': appointment.id,
+        'status': appointment.status,
+        'previous_status': previous,
+        'status_label': appointment.status_label,
+        'status_color': appointment.status_color,
+        'doctor_id': appointment.doctor_id,
+        'patient_id': appointment.patient_id,
+        'patient_name': patient.full_name if patient else None,
+        'date': appointment.date_time.date().isoformat(),
+        'time': appointment.date_time.strftime('%H:%M')
+    }
+
+
+def _collect_status_changes(session, flush_context):
+    """Preparar los eventos de las citas nuevas o con cambio de estado del flush
+
+    Se arma el evento aquí porque tras el commit los atributos están
+    expirados y la sesión ya no puede consultar la base de datos.
+    """
+    from app.models.appointment import Appointment
+
+    for instance in list(session.new) + list(session.dirty):
+        if not isinstance(instance, Appointment):
+            continue
+        history = inspect(instance).attrs.status.history
+        if instance in session.new:
+            previous = None
+        elif history.added:
+            previous = history.deleted[0] if history.deleted else None
+        else:
+            continue
+
+        pending = session.info.setdefault('live_events', {})
+        # Si la cita cambia varias veces en la transacción se conserva el primer estado previo
+        if instance in pending:
+            previous = pending[instance]['previous_status']
+        with session.no_autoflush:
+            pending[instance] = _appointment_event(instance, previous)
+
+
+def _publish_after_commit(session):
+    pending = session.info.pop('live_events', None)
+    if pending:
+        live_events.publish([payload for payload in pending.values()
+                             if payload['status'] != payload['previous_status']])
+
+
+def _discard_after_rollback(session, previous_transaction):
+    session.info.pop('live_events', None)
+
+
+def register_live_events():
+    """Registrar (una sola vez) los eventos de sesión que alimentan el pub/sub"""
+    from sqlalchemy.orm import Session
+
+    if not event.contains(Session, 'after_flush', _collect_status_changes):
+        event.listen(Session, 'after_flush', _collect_status_changes)
+        event.listen(Session, 'after_commit', _publish_after_commit)
+        event.listen(Session, 'after_soft_rollback', _discard_after_rollback)
@@ -0,0 +1,171 @@
+"""Paginación por cursor (keyset) para listados largos
+
+En lugar de OFFSET o de cargar toda la tabla, cada página se obtiene con
+un filtro sobre la clave de orden de la última fila vista, por ejemplo
+(date_time, id) < (último_date_time, último_id), y LIMIT por_página + 1.
+El costo y la memoria por página no dependen del tamaño del historial.
+
+El cursor es un token firmado con SECRET_KEY que guarda la clave de la
+fila límite, la dirección y los filtros activos, de modo que al navegar
+se conservan los filtros aunque la URL sólo lleve el cursor.
+
+El total se calcula aparte con count_estimate() y se guarda en una caché
+en memoria con TTL (PAGINATION_COUNT_TTL), porque contar sigue siendo
+proporcional al número de filas que cumplen los filtros.
+"""
+from datetime import datetime
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import and_, or_
+
+from app.utils.availability_cache import MemoryBackend
+
+CURSOR_SALT = 'keyset-cursor'
+
+# Totales por (listado, filtros); se recalculan al expirar el TTL
+count_cache = MemoryBackend(max_entries=512)
+
+
+class KeysetPage:
+    """Página de resultados con los cursores para avanzar y retroceder"""
+
+    def __init__(self, items, per_page, filters, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.filters = filters
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt=CURSOR_SALT)
+
+
+def _dump_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _load_value(value):
+    if isinstance(value, dict) and 'dt' in value:
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+
+def encode_cursor(key, direction, filters, per_page):
+    """Token firmado con la clave de la fila límite, la dirección y los filtros"""
+    return _serializer().dumps({
+        'k': [_dump_value(value) for value in key],
+        'd': direction,
+        'f': filters,
+        'n': per_page
+    })
+
+
+def decode_cursor(token):
+    """Decodificar un cursor; devuelve None si falta, está alterado o es inválido"""
+    if not token:
+        return None
+    try:
+        data = _serializer().loads(token)
+        return {
+            'key': [_load_value(value) for value in data['k']],
+            'direction': 'prev' if data.get('d') == 'prev' else 'next',
+            'filters': dict(data.get('f') or {}),
+            'per_page': data.get('n')
+        }
+    except (BadSignature, KeyError, TypeError, ValueError):
+        return None
+
+
+def resolve_per_page(value, default=None):
+    """Tamaño de página acotado entre 10 y PAGINATION_MAX_PER_PAGE"""
+    default = default or current_app.config.get('PAGINATION_PER_PAGE', 50)
+    try:
+        value = int(value) if value else default
+    except (TypeError, ValueError):
+        value = default
+    return max(10, min(value, current_app.config.get('PAGINATION_MAX_PER_PAGE', 200)))
+
+
+def _after(columns, key, descending):
+    """Filas posteriores a la clave según el orden (comparación lexicográfica)"""
+    conditions = []
+    for index, column in enumerate(columns):
+        equal = [columns[i] == key[i] for i in range(index)]
+        beyond = column < key[index] if descending else column > key[index]
+        conditions.append(and_(*equal, beyond))
+    return or_(*conditions)
+
+
+def keyset_paginate(query, columns, cursor=None, per_page=50, filters=None, descending=True):
+    """Obtener una página de `query` ordenada por `columns`
+
+    Args:
+        query: Query ya filtrada (sin order_by ni limit)
+        columns: Columnas de la clave de orden; la última debe ser única (p. ej. id)
+        cursor: Cursor decodificado con decode_cursor() o None para la primera página
+        per_page: Filas por página
+        filters: Filtros activos que se guardan en los cursores generados
+        descending: Orden descendente (lo más reciente primero)
+
+    Returns:
+        KeysetPage
+    """
+    filters = filters or {}
+    backwards = bool(cursor) and cursor['direction'] == 'prev'
+    # Al retroceder se recorre en orden inverso y luego se invierte la página
+    reverse = descending != backwards
+
+    if cursor:
+        query = query.filter(_after(columns, cursor['key'], reverse))
+    ordering = [column.desc() if reverse else column.asc() for column in columns]
+    rows = query.order_by(*ordering).limit(per_page + 1).all()
+
+    more = len(rows) > per_page
+    items = rows[:per_page]
+    if backwards:
+        items.reverse()
+
+    def key_of(item):
+        return [getattr(item, column.key) for column in columns]
+
+    next_cursor = prev_cursor = None
+    if items:
+        # Hay página siguiente si sobró una fila avanzando o si venimos retrocediendo
+        if more or backwards:
+            next_cursor = encode_cursor(key_of(items[-1]), 'next', filters, per_page)
+        # Hay página anterior si venimos avanzando o si sobró una fila retrocediendo
+        if (cursor and not backwards) or (more and backwards):
+            prev_cursor = encode_cursor(key_of(items[0]), 'prev', filters, per_page)
+
+    return KeysetPage(items, per_page, filters, next_cursor, prev_cursor)
+
+
+def count_estimate(scope, filters, query):
+    """Total de filas del listado, cacheado por (scope, filtros) durante PAGINATION_COUNT_TTL
+
+    Es una estimación: puede quedar desactualizado hasta que expire el TTL.
+    """
+    key = (scope, tuple(sorted((name, str(value)) for name, value in filters.items() if value)))
+    total = count_cache.get(key)
+    if total is None:
+        total = query.order_by(None).count()
+        count_cache.set(key, total, current_app.config.get('PAGINATION_COUNT_TTL', 60))
+    return total
@@ -0,0 +1,166 @@
+"""Listados (directorios) de pacientes paginados por cursor
+
+Los listados de pacientes de recepción, administración y enfermería usan
+esta capa común en lugar de cargar todos los pacientes con .all():
+
+- directory_args() lee los filtros y el orden de la URL o del cursor.
+- directory_page() ordena en la base de datos por una clave respaldada por
+  índice (SORTS) y devuelve una página con keyset_paginate() y el total
+  cacheado con count_estimate().
+- nurse_directory_rows() completa una página de enfermería con dos
+  consultas por página (triages y próxima cita), en lugar de tres consultas
+  por paciente.
+
+El costo de cada página depende del tamaño de la página, no del número de
+pacientes.
+"""
+from datetime import datetime
+
+from flask import current_app, request
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased
+
+from app import db
+from app.utils.pagination import count_cache, count_estimate, decode_cursor, keyset_paginate, resolve_per_page
+
+# Órdenes disponibles: etiqueta, atributos de la clave (el último es único) y si es descendente.
+# Cada clave está cubierta por un índice (clave primaria, ix_patients_name, dni único).
+SORTS = {
+    'recent': ('Más recientes', ('id',), True),
+    'name': ('Apellido y nombre', ('last_name', 'first_name', 'id'), False),
+    'dni': ('DNI', ('dni', 'id'), False)
+}
+
+
+def directory_args(names, default_sort='recent'):
+    """Cursor, filtros y tamaño de página del listado
+
+    Con cursor, los filtros y el orden salen del cursor firmado; si no, de
+    los parámetros `names` y 'sort' de la URL.
+
+    Returns:
+        tuple: (cursor, filters, per_page)
+    """
+    cursor = decode_cursor(request.args.get('cursor'))
+    if cursor:
+        filters = cursor['filters']
+        per_page = resolve_per_page(cursor['per_page'])
+    else:
+        filters = {name: request.args.get(name, '') for name in names}
+        filters['sort'] = request.args.get('sort', '')
+        per_page = resolve_per_page(request.args.get('per_page'))
+    if filters.get('sort') not in SORTS:
+        filters['sort'] = default_sort
+    return cursor, filters, per_page
+
+
+def directory_page(scope, query, cursor, filters, per_page):
+    """Página de pacientes de `query` en el orden filters['sort']
+
+    Args:
+        scope: Nombre del listado para la caché del total
+        query: Query de Patient ya filtrada (sin order_by)
+
+    Returns:
+        tuple: (KeysetPage, total estimado)
+    """
+    from app.models.patient import Patient
+
+    _, attributes, descending = SORTS[filters['sort']]
+    page = keyset_paginate(
+        query,
+        tuple(getattr(Patient, attribute) for attribute in attributes),
+        cursor=cursor,
+        per_page=per_page,
+        filters=filters,
+        descending=descending
+    )
+    # El orden no cambia el total: se cachea una vez por filtros
+    counted = {name: value for name, value in filters.items() if name != 'sort'}
+    return page, count_estimate(scope, counted, query)
+
+
+def gender_counts(scope, filters, query):
+    """Pacientes por género para las tarjetas de resumen (una consulta agrupada, cacheada)"""
+    from app.models.patient import Patient
+
+    key = (scope + ':gender', tuple(sorted(
+        (name, str(value)) for name, value in filters.items() if value and name != 'sort'
+    )))
+    counts = count_cache.get(key)
+    if counts is None:
+        counts = dict(query.order_by(None).with_entities(
+            Patient.gender, func.count(Patient.id)
+        ).group_by(Patient.gender).all())
+        count_cache.set(key, counts, current_app.config.get('PAGINATION_COUNT_TTL', 60))
+    return counts
+
+
+def nurse_directory_rows(patients, nurse_id, now=None):
+    """Datos de enfermería para una página de pacientes
+
+    Usa una consulta para el último triage y el total de triages de la
+    enfermera por paciente, y otra para la próxima cita pagada sin triage.
+
+    Returns:
+        list de dict: patient, last_triage, next_appointment, total_triages, priority_level
+    """
+    from app.models.appointment import Appointment
+    from app.models.invoice import Invoice
+    from app.models.triage import Triage
+
+    patient_ids = [patient.id for patient in patients]
+    if not patient_ids:
+        return []
+    now = now or datetime.now()
+
+    # Último triage de la enfermera y total por paciente (funciones de ventana)
+    ranked_triages = select(
+        Triage,
+        func.row_number().over(
+            partition_by=Triage.patient_id, order_by=(Triage.created_at.desc(), Triage.id.desc())
+        ).label('position'),
+        func.count(Triage.id).over(partition_by=Triage.patient_id).label('total')
+    ).where(Triage.patient_id.in_(patient_ids), Triage.nurse_id == nurse_id).subquery()
+    last_triage = aliased(Triage, ranked_triages)
+    triages = {
+        triage.patient_id: (triage, total)
+        for triage, total in db.session.execute(
+            select(last_triage, ranked_triages.c.total).where(ranked_triages.c.position == 1)
+        )
+    }
+
+    # Próxima cita pagada y sin triage de cada paciente
+    ranked_appointments = select(
+        Appointment,
+        func.row_number().over(
+            partition_by=Appointment.patient_id, order_by=(Appointment.date_time, Appointment.id)
+        ).label('position')
+    ).join(Invoice, Appointment.id == Invoice.appointment_id).outerjoin(
+        Triage, Appointment.id == Triage.appointment_id
+    ).where(
+        Appointment.patient_id.in_(patient_ids),
+        Appointment.date_time > now,
+        Appointment.status.in_(['scheduled', 'confirmed']),
+        Invoice.status == 'paid',
+        Triage.id.is_(None)
+    ).subquery()
+    next_appointment = aliased(Appointment, ranked_appointments)
+    appointments = {
+        appointment.patient_id: appointment
+        for appointment in db.session.execute(
+            select(next_appointment).where(ranked_appointments.c.position == 1)
+        ).scalars()
+    }
+
+    rows = []
+    for patient in patients:
+        triage, total = triages.get(patient.id, (None, 0))
+        rows.append({
+            'patient': patient,
+            'last_triage': triage,
+            'next_appointment': appointments.get(patient.id),
+            'total_triages': total,
+            'priority_level': triage.priority_level if triage else None
+        })
+    return rows
@@ -0,0 +1,322 @@
+"""Índice en memoria por prefijo de DNI, DNI del apoderado y teléfono
+
+El autocompletado de recepción recibe los dígitos a medida que se teclean.
+Este índice resuelve esas búsquedas sin ir a la base de datos: cada
+entrada es un registro de ancho fijo (KEY_WIDTH dígitos ASCII + id de 4
+bytes) dentro de un único bytes ordenado, y un prefijo se resuelve con dos
+bisect sobre él (unos microsegundos, ~20 bytes por dato indexado).
+
+- Se construye con una consulta en streaming (yield_per) en un hilo de
+  fondo al arrancar el servidor (run.py) o en la primera búsqueda;
+  mientras tanto lookup() devuelve None y el llamador usa la búsqueda en
+  la base de datos.
+- Los cambios de Patient hechos con el ORM (after_insert/update/delete) se
+  aplican al confirmar la transacción en una capa de cambios ordenada que
+  se fusiona con el bloque principal al superar MERGE_THRESHOLD.
+- Los cambios de otros procesos o de INSERT en lote no pasan por esos
+  eventos: el índice se reconstruye cada PATIENT_PREFIX_INDEX_TTL segundos
+  y, si no encuentra nada, el llamador también consulta la base de datos.
+"""
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import object_session
+
+# Dígitos guardados por clave (los siguientes se ignoran)
+KEY_WIDTH = 15
+RECORD_WIDTH = KEY_WIDTH + 4
+
+# Dígitos del número local: '+51 987 654 321' se indexa también como '987654321'
+PHONE_LOCAL_DIGITS = 9
+
+# Filas leídas por tanda al construir el índice
+BUILD_YIELD_PER = 5000
+
+
+def digits(value):
+    """Sólo los dígitos de un DNI o teléfono"""
+    return re.sub(r'\D', '', value or '')
+
+
+def patient_keys(dni, guardian_dni, phone):
+    """Claves indexadas de un paciente (sin repetir)"""
+    keys = {digits(dni), digits(guardian_dni)}
+    phone = digits(phone)
+    keys.add(phone)
+    if len(phone) > PHONE_LOCAL_DIGITS:
+        keys.add(phone[-PHONE_LOCAL_DIGITS:])
+    return {key[:KEY_WIDTH].encode('ascii') for key in keys if key}
+
+
+def _record(key, patient_id):
+    return key.ljust(KEY_WIDTH, b'\x00') + patient_id.to_bytes(4, 'big')
+
+
+class PatientPrefixIndex:
+    """Índice ordenado de prefijos numéricos de pacientes activos"""
+
+    # Cambios pendientes que disparan la fusión con el bloque principal
+    MERGE_THRESHOLD = 2000
+
+    def __init__(self, app=None):
+        self.app = None
+        self.ttl = 3600
+        self.warmup = True
+        self.hits = 0
+        self.cold_lookups = 0
+        self._lock = threading.Lock()
+        self._building = False
+        self.reset()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configurar y registrar los eventos de Patient (el índice queda frío)"""
+        self.app = app
+        self.ttl = app.config.get('PATIENT_PREFIX_INDEX_TTL', 3600)
+        self.warmup = app.config.get('PATIENT_PREFIX_INDEX_WARMUP', True)
+        self.reset()
+        register_sync_events()
+
+    def reset(self):
+        """Dejar el índice frío (sin datos)"""
+        with self._lock:
+            self._records = b''
+            self._count = 0
+            self._added = []
+            self._removed = set()
+            self.built_at = None
+
+    @property
+    def ready(self):
+        return self.built_at is not None
+
+    # === CONSTRUCCIÓN ===
+
+    def build(self):
+        """Construir el índice desde la base de datos (requiere contexto de app)"""
+        from app import db
+        from app.models.patient import Patient
+
+        rows = db.session.execute(
+            select(Patient.id, Patient.dni, Patient.guardian_dni, Patient.phone).where(
+                Patient.is_active == True
+            ).execution_options(yield_per=BUILD_YIELD_PER)
+        )
+        records = []
+        for patient_id, dni, guardian_dni, phone in rows:
+            records.extend(_record(key, patient_id) for key in patient_keys(dni, guardian_dni, phone))
+        records.sort()
+        with self._lock:
+            self._records = b''.join(records)
+            self._count = len(records)
+            self._added = []
+            self._removed = set()
+            self.built_at = time.monotonic()
+        return self._count
+
+    def warm_up(self):
+        """Construir el índice en un hilo de fondo (una sola construcción a la vez)"""
+        with self._lock:
+            if self._building or self.app is None:
+                return
+            self._building = True
+
+        def run():
+            try:
+                with self.app.app_context():
+                    self.build()
+            except Exception as e:
+                self.app.logger.warning(f'No se pudo construir el índice de prefijos de pacientes: {e}')
+            finally:
+                self._building = False
+
+        threading.Thread(target=run, name='patient-prefix-index', daemon=True).start()
+
+    # === BÚSQUEDA ===
+
+    def lookup(self, text, limit=20):
+        """Ids de pacientes cuyo DNI, DNI de apoderado o teléfono empieza con text
+
+        Returns:
+            list de ids (en orden de clave), o None si el índice está frío y
+            hay que buscar en la base de datos
+        """
+        if not self.ready or (self.ttl and time.monotonic() - self.built_at > self.ttl):
+            self.cold_lookups += 1
+            if self.warmup:
+                self.warm_up()
+            if not self.ready:
+                return None
+
+        prefix = digits(text)[:KEY_WIDTH].encode('ascii')
+        if not prefix:
+            return []
+        low_key = prefix.ljust(KEY_WIDTH, b'\x00')
+        high_key = prefix.ljust(KEY_WIDTH, b'\xff')
+
+        with self._lock:
+            records, count, added, removed = self._records, self._count, self._added, self._removed
+        self.hits += 1
+
+        positions, key_at = range(count), self._key_reader(records)
+        start = bisect_left(positions, low_key, key=key_at)
+        end = bisect_left(positions, high_key, key=key_at)
+        found, seen = [], set()
+        for position in range(start, end):
+            record = records[position * RECORD_WIDTH:(position + 1) * RECORD_WIDTH]
+            patient_id = int.from_bytes(record[KEY_WIDTH:], 'big')
+            if (record[:KEY_WIDTH].rstrip(b'\x00'), patient_id) in removed or patient_id in seen:
+                continue
+            seen.add(patient_id)
+            found.append((record[:KEY_WIDTH], patient_id))
+            if len(found) >= limit:
+                break
+
+        # Cambios aún no fusionados
+        for key, patient_id in added[bisect_left(added, (prefix,)):]:
+            if not key.startswith(prefix):
+                break
+            if patient_id not in seen:
+                seen.add(patient_id)
+                found.append((key.ljust(KEY_WIDTH, b'\x00'), patient_id))
+
+        found.sort()
+        return [patient_id for _, patient_id in found[:limit]]
+
+    @staticmethod
+    def _key_reader(records):
+        """Clave del registro en una posición del bloque"""
+        return lambda position: records[position * RECORD_WIDTH:position * RECORD_WIDTH + KEY_WIDTH]
+
+    # === ACTUALIZACIÓN ===
+
+    def apply(self, changes):
+        """Aplicar cambios confirmados: lista de (patient_id, claves anteriores, claves nuevas)"""
+        with self._lock:
+            if not self.ready:
+                return
+            added, removed = list(self._added), set(self._removed)
+            for patient_id, old_keys, new_keys in changes:
+                for key in old_keys - new_keys:
+                    entry = (key, patient_id)
+                    position = bisect_left(added, entry)
+                    if position < len(added) and added[position] == entry:
+                        del added[position]
+                    else:
+                        removed.add(entry)
+                for key in new_keys - old_keys:
+                    entry = (key, patient_id)
+                    if entry in removed:
+                        removed.discard(entry)
+                    else:
+                        insort(added, entry)
+            self._added, self._removed = added, removed
+            merge = len(added) + len(removed) > self.MERGE_THRESHOLD
+        if merge:
+            self._merge()
+
+    def _merge(self):
+        """Fusionar la capa de cambios con el bloque principal"""
+        with self._lock:
+            records, removed = self._records, self._removed
+            kept = (
+                record for record in (records[start:start + RECORD_WIDTH]
+                                      for start in range(0, len(records), RECORD_WIDTH))
+                if (record[:KEY_WIDTH].rstrip(b'\x00'), int.from_bytes(record[KEY_WIDTH:], 'big')) not in removed
+            )
+            merged = b''.join(heapq.merge(kept, (_record(key, patient_id) for key, patient_id in self._added)))
+            self._records = merged
+            self._count = len(merged) // RECORD_WIDTH
+            self._added = []
+            self._removed = set()
+
+    def stats(self):
+        """Tamaño y uso del índice para monitoreo"""
+        return {
+            'ready': self.ready,
+            'entries': self._count,
+            'pending_changes': len(self._added) + len(self._removed),
+            'bytes': len(self._records),
+            'hits': self.hits,
+            'cold_lookups': self.cold_lookups
+        }
+
+
+patient_prefix_index = PatientPrefixIndex()
+
+
+# === SINCRONIZACIÓN CON EVENTOS DE SQLALCHEMY ===
+
+# Atributos de Patient que cambian las claves indexadas
+TRACKED_ATTRIBUTES = ('dni', 'guardian_dni', 'phone', 'is_active')
+
+
+def _values_before_flush(target):
+    """dni, guardian_dni, phone e is_active anteriores al UPDATE"""
+    state = inspect(target)
+    values = []
+    for name in TRACKED_ATTRIBUTES:
+        history = state.attrs[name].history
+        values.append(history.deleted[0] if history.deleted else getattr(target, name))
+    return values
+
+
+def _keys(dni, guardian_dni, phone, is_active):
+    return patient_keys(dni, guardian_dni, phone) if is_active else set()
+
+
+def _record_change(target, old_keys, new_keys):
+    session = object_session(target)
+    if session is not None and old_keys != new_keys:
+        session.info.setdefault('patient_prefix_changes', []).append((target.id, old_keys, new_keys))
+
+
+def _track_insert(mapper, connection, target):
+    _record_change(target, set(), _keys(target.dni, target.guardian_dni, target.phone, target.is_active))
+
+
+def _track_update(mapper, connection, target):
+    state = inspect(target)
+    if not any(state.attrs[name].history.has_changes() for name in TRACKED_ATTRIBUTES):
+        return
+    _record_change(target, _keys(*_values_before_flush(target)),
+                   _keys(target.dni, target.guardian_dni, target.phone, target.is_active))
+
+
+def _track_delete(mapper, connection, target):
+    _record_change(target, _keys(*_values_before_flush(target)), set())
+
+
+def _keep_previous_value(target, value, oldvalue, initiator):
+    """Sólo activa active_history: el valor anterior queda en el historial
+    aunque el atributo estuviera expirado tras un commit"""
+
+
+def _apply_after_commit(session):
+    changes = session.info.pop('patient_prefix_changes', None)
+    if changes:
+        patient_prefix_index.apply(changes)
+
+
+def _discard_after_rollback(session, previous_transaction):
+    session.info.pop('patient_prefix_changes', None)
+
+
+def register_sync_events():
+    """Registrar (una sola vez) los eventos de sincronización"""
+    from sqlalchemy.orm import Session
+    from app.models.patient import Patient
+
+    if not event.contains(Patient, 'after_insert', _track_insert):
+        for name in TRACKED_ATTRIBUTES:
+            event.listen(getattr(Patient, name), 'set', _keep_previous_value, active_history=True)
+        event.listen(Patient, 'after_insert', _track_insert)
+        event.listen(Patient, 'after_update', _track_update)
+        event.listen(Patient, 'after_delete', _track_delete)
+        event.listen(Session, 'after_commit', _apply_after_commit)
+        event.listen(Session, 'after_soft_rollback', _discard_after_rollback)
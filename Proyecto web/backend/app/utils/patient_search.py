@@ -0,0 +1,218 @@
+"""Búsqueda de pacientes por nombre, apellido, DNI o email con índice
+
+Todas las búsquedas de pacientes (autocompletado y listados de recepción,
+administración, enfermería y doctor) pasan por este módulo en lugar de
+filtrar con ilike('%texto%'), que obliga a recorrer la tabla completa.
+
+- SQLite: tabla virtual FTS5 'patient_search' con contenido externo
+  (patients) y tokenizador unicode61 remove_diacritics, por lo que la
+  búsqueda ignora mayúsculas y acentos ("nunez" encuentra "Núñez"). Se
+  mantiene sincronizada con triggers AFTER INSERT/UPDATE/DELETE, que
+  también cubren los INSERT en lote que no pasan por el ORM.
+- PostgreSQL: índice GIN con pg_trgm sobre el texto normalizado con
+  unaccent/lower (función inmutable f_unaccent); al ser un índice de
+  expresión no necesita sincronización.
+
+Cada palabra del texto buscado debe coincidir: en SQLite como prefijo de
+una palabra del paciente ("mar gar" encuentra "María García"), en
+PostgreSQL como subcadena. Si el índice no existe se usa ilike como antes.
+"""
+import re
+import unicodedata
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import Integer, event, false, func, or_, text
+
+from app import db
+
+# Columnas indexadas del paciente
+SEARCH_COLUMNS = ('first_name', 'last_name', 'dni', 'email')
+
+# Resultados del autocompletado
+AUTOCOMPLETE_LIMIT = 20
+
+# DNI o teléfono: dígitos con separadores habituales
+NUMERIC_QUERY = re.compile(r'^[\d\s()+.-]*\d[\d\s()+.-]*$')
+
+SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS patient_search USING fts5("
+    "first_name, last_name, dni, email, content='patients', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS patients_search_ai AFTER INSERT ON patients BEGIN "
+    "INSERT INTO patient_search(rowid, first_name, last_name, dni, email) "
+    "VALUES (new.id, new.first_name, new.last_name, new.dni, new.email); END",
+    "CREATE TRIGGER IF NOT EXISTS patients_search_ad AFTER DELETE ON patients BEGIN "
+    "INSERT INTO patient_search(patient_search, rowid, first_name, last_name, dni, email) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.dni, old.email); END",
+    "CREATE TRIGGER IF NOT EXISTS patients_search_au AFTER UPDATE OF first_name, last_name, dni, email ON patients BEGIN "
+    "INSERT INTO patient_search(patient_search, rowid, first_name, last_name, dni, email) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.dni, old.email); "
+    "INSERT INTO patient_search(rowid, first_name, last_name, dni, email) "
+    "VALUES (new.id, new.first_name, new.last_name, new.dni, new.email); END"
+)
+
+POSTGRES_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS "
+    "$$ SELECT public.unaccent('public.unaccent', $1) $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT",
+    "CREATE INDEX IF NOT EXISTS ix_patients_search_trgm ON patients USING gin "
+    "(f_unaccent(lower(first_name || ' ' || last_name || ' ' || dni || ' ' || coalesce(email, ''))) gin_trgm_ops)"
+)
+
+# Motores con el índice disponible (se comprueba una vez por motor)
+_available = WeakKeyDictionary()
+
+
+def normalize(value):
+    """Texto en minúsculas y sin acentos ("Núñez" -> "nunez")"""
+    decomposed = unicodedata.normalize('NFKD', value or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def search_terms(value):
+    """Palabras buscadas, normalizadas (los separadores de FTS5 se descartan)"""
+    return re.findall(r'\w+', normalize(value))
+
+
+def _backend():
+    """'sqlite' o 'postgresql' si el índice está disponible, si no None"""
+    engine = db.engine
+    if engine not in _available:
+        backend = None
+        with engine.connect() as connection:
+            if engine.dialect.name == 'sqlite':
+                if connection.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'patient_search'"
+                )).first():
+                    backend = 'sqlite'
+            elif engine.dialect.name == 'postgresql':
+                if connection.execute(text(
+                    "SELECT 1 FROM pg_indexes WHERE indexname = 'ix_patients_search_trgm'"
+                )).first():
+                    backend = 'postgresql'
+        _available[engine] = backend
+    return _available[engine]
+
+
+def _fts_query(terms):
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _postgres_document():
+    from app.models.patient import Patient
+    document = Patient.first_name + ' ' + Patient.last_name + ' ' + Patient.dni + ' ' + func.coalesce(Patient.email, '')
+    return func.f_unaccent(func.lower(document))
+
+
+def patient_filter(value):
+    """Condición sobre Patient para el texto buscado
+
+    Se combina con cualquier consulta que incluya la tabla patients (p. ej.
+    citas o historias unidas a Patient). Sin palabras válidas no coincide
+    ningún paciente.
+    """
+    from app.models.patient import Patient
+
+    terms = search_terms(value)
+    if not terms:
+        return false()
+
+    backend = _backend()
+    if backend == 'sqlite':
+        matches = text(
+            "SELECT rowid FROM patient_search WHERE patient_search MATCH :patient_search_query"
+        ).bindparams(patient_search_query=_fts_query(terms)).columns(rowid=Integer)
+        return Patient.id.in_(matches)
+    if backend == 'postgresql':
+        document = _postgres_document()
+        return db.and_(*(document.contains(term, autoescape=True) for term in terms))
+
+    # Sin índice: búsqueda anterior por subcadena en cada columna
+    like = f'%{value.strip()}%'
+    return or_(*(getattr(Patient, column).ilike(like) for column in SEARCH_COLUMNS))
+
+
+def autocomplete(value, limit=AUTOCOMPLETE_LIMIT, active_only=True):
+    """Pacientes para el autocompletado, ordenados por nombre
+
+    Los textos numéricos (DNI o teléfono tecleado dígito a dígito) se
+    resuelven con el índice de prefijos en memoria y una consulta por clave
+    primaria, ordenados por DNI/teléfono; si el índice está frío o no
+    encuentra nada se busca en la base de datos. En SQLite se recorre el
+    índice FTS y se corta en `limit` coincidencias, sin ordenar todas las
+    coincidencias en la base de datos.
+    """
+    from app.models.patient import Patient
+    from app.utils.patient_prefix_index import patient_prefix_index
+
+    terms = search_terms(value)
+    if not terms:
+        return []
+
+    if active_only and NUMERIC_QUERY.match(value):
+        ids = patient_prefix_index.lookup(value, limit=limit)
+        if ids:
+            by_id = {patient.id: patient for patient in Patient.query.filter(
+                Patient.id.in_(ids), Patient.is_active == True
+            )}
+            return [by_id[patient_id] for patient_id in ids if patient_id in by_id]
+
+    if _backend() == 'sqlite':
+        statement = text(
+            "SELECT patients.* FROM patient_search JOIN patients ON patients.id = patient_search.rowid "
+            "WHERE patient_search MATCH :query" + (" AND patients.is_active = 1" if active_only else "") +
+            " LIMIT :limit"
+        ).bindparams(query=_fts_query(terms), limit=limit)
+        patients = db.session.query(Patient).from_statement(statement).all()
+    else:
+        query = Patient.query.filter(patient_filter(value))
+        if active_only:
+            query = query.filter(Patient.is_active == True)
+        patients = query.limit(limit).all()
+    return sorted(patients, key=lambda patient: (normalize(patient.first_name), normalize(patient.last_name)))
+
+
+def rebuild_index():
+    """Reconstruir el índice FTS desde patients (SQLite; en PostgreSQL no hace falta)"""
+    if _backend() == 'sqlite':
+        db.session.execute(text("INSERT INTO patient_search(patient_search) VALUES ('rebuild')"))
+
+
+# === CREACIÓN DEL ÍNDICE JUNTO CON LA TABLA ===
+
+def _create_search_index(table, connection, **kwargs):
+    """Crear el índice al crear patients con create_all (p. ej. en pruebas)"""
+    _available.pop(connection.engine, None)
+    if connection.dialect.name == 'sqlite':
+        try:
+            for statement in SQLITE_DDL:
+                connection.execute(text(statement))
+        except Exception:
+            # SQLite compilado sin FTS5: se usa la búsqueda sin índice
+            pass
+    elif connection.dialect.name == 'postgresql':
+        savepoint = connection.begin_nested()
+        try:
+            for statement in POSTGRES_DDL:
+                connection.execute(text(statement))
+            savepoint.commit()
+        except Exception:
+            # Sin permisos para crear las extensiones: las crea la migración
+            savepoint.rollback()
+
+
+def _drop_search_index(table, connection, **kwargs):
+    """La tabla FTS no se borra sola con patients (los triggers sí)"""
+    _available.pop(connection.engine, None)
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text("DROP TABLE IF EXISTS patient_search"))
+
+
+def register_search_index():
+    """Registrar (una sola vez) la creación del índice con la tabla patients"""
+    from app.models.patient import Patient
+
+    if not event.contains(Patient.__table__, 'after_create', _create_search_index):
+        event.listen(Patient.__table__, 'after_create', _create_search_index)
+        event.listen(Patient.__table__, 'before_drop', _drop_search_index)
@@ -0,0 +1,122 @@
+"""Datos de referencia cacheados: doctores y especialidades activos
+
+Los formularios (citas, lista de espera, filtros) muestran siempre las
+mismas listas cortas de doctores y especialidades. Se guardan por proceso
+durante REFERENCE_DATA_TTL segundos como tuplas inmutables (no instancias
+ORM, que quedarían ligadas a la sesión de un request) y se invalidan con
+los eventos after_insert/after_update/after_delete de User y Specialty, y
+otra vez al hacer commit, cuando el administrador edita usuarios o
+especialidades. En otros workers el cambio se ve al expirar el TTL.
+"""
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+
+DoctorRef = namedtuple('DoctorRef', 'id username first_name last_name full_name specialty_id specialty_name')
+SpecialtyRef = namedtuple('SpecialtyRef', 'id name consultation_duration')
+
+
+class ReferenceData:
+    """Listas de referencia con TTL e invalidación por eventos"""
+
+    def __init__(self, app=None):
+        self.ttl = 300
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configurar el TTL y registrar los eventos de invalidación"""
+        self.ttl = app.config.get('REFERENCE_DATA_TTL', 300)
+        self.invalidate()
+        register_invalidation_events()
+
+    def _get_or_load(self, name, load):
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[1] >= time.monotonic():
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        value = load()
+        with self._lock:
+            self._entries[name] = (value, time.monotonic() + self.ttl)
+        return value
+
+    def doctors(self):
+        """Doctores activos ordenados por nombre"""
+        def load():
+            from app.models.specialty import Specialty
+            from app.models.user import User
+            rows = User.query.outerjoin(Specialty, User.specialty_id == Specialty.id).filter(
+                User.role == 'doctor',
+                User.is_active == True
+            ).order_by(User.first_name, User.last_name).with_entities(
+                User.id, User.username, User.first_name, User.last_name, User.specialty_id, Specialty.name
+            ).all()
+            return tuple(DoctorRef(id, username, first_name, last_name, f'{first_name} {last_name}',
+                                   specialty_id, specialty_name)
+                         for id, username, first_name, last_name, specialty_id, specialty_name in rows)
+        return self._get_or_load('doctors', load)
+
+    def specialties(self):
+        """Especialidades activas ordenadas por nombre"""
+        def load():
+            from app.models.specialty import Specialty
+            rows = Specialty.query.filter_by(is_active=True).order_by(Specialty.name).with_entities(
+                Specialty.id, Specialty.name, Specialty.consultation_duration
+            ).all()
+            return tuple(SpecialtyRef(*row) for row in rows)
+        return self._get_or_load('specialties', load)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Contadores para monitoreo"""
+        return {'ttl': self.ttl, 'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+reference_data = ReferenceData()
+
+
+# === INVALIDACIÓN POR EVENTOS DE SQLALCHEMY ===
+
+def _invalidate(mapper, connection, target):
+    reference_data.invalidate()
+    session = object_session(target)
+    if session is not None:
+        session.info['reference_data_changed'] = True
+
+
+def _invalidate_after_commit(session):
+    # Un request pudo recargar las listas entre el flush y el commit
+    if session.info.pop('reference_data_changed', False):
+        reference_data.invalidate()
+
+
+def _discard_after_rollback(session, previous_transaction):
+    session.info.pop('reference_data_changed', None)
+
+
+def register_invalidation_events():
+    """Registrar (una sola vez) los eventos de invalidación"""
+    from sqlalchemy.orm import Session
+    from app.models.specialty import Specialty
+    from app.models.user import User
+
+    for model in (User, Specialty):
+        for event_name in ('after_insert', 'after_update', 'after_delete'):
+            if not event.contains(model, event_name, _invalidate):
+                event.listen(model, event_name, _invalidate)
+
+    if not event.contains(Session, 'after_commit', _invalidate_after_commit):
+        event.listen(Session, 'after_commit', _invalidate_after_commit)
+        event.listen(Session, 'after_soft_rollback', _discard_after_rollback)
@@ -0,0 +1,119 @@
+"""Transportes para enviar los recordatorios de la bandeja de salida
+
+Cada transporte recibe un lote de ReminderMessage y devuelve, por id, None
+si el mensaje se envió o el texto del error. Se elige con
+REMINDER_TRANSPORT: 'file' (archivo o stdout, para desarrollo), 'smtp'
+(p. ej. un servidor de depuración local: python -m aiosmtpd -n -l
+localhost:1025) o la ruta 'modulo:Clase' de un transporte propio.
+"""
+import smtplib
+import sys
+from abc import ABC, abstractmethod
+from email.message import EmailMessage
+from importlib import import_module
+
+
+class ReminderTransport(ABC):
+    """Transporte base: abre el canal una vez por lote y envía mensaje a mensaje"""
+
+    def __init__(self, config):
+        self.config = config
+
+    def open(self):
+        """Preparar el canal del lote (conexión, archivo)"""
+
+    def close(self):
+        """Liberar el canal del lote"""
+
+    @abstractmethod
+    def send(self, message):
+        """Enviar un mensaje; cualquier excepción cuenta como fallo del envío"""
+
+    def send_batch(self, messages):
+        """Enviar un lote: {id: None si se envió, o el error}"""
+        results = {}
+        try:
+            self.open()
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+            return {message.id: error for message in messages}
+        try:
+            for message in messages:
+                try:
+                    self.send(message)
+                    results[message.id] = None
+                except Exception as e:
+                    results[message.id] = str(e) or e.__class__.__name__
+        finally:
+            self.close()
+        return results
+
+
+class FileTransport(ReminderTransport):
+    """Escribe los mensajes en REMINDER_FILE_PATH (o stdout si está vacío)"""
+
+    def open(self):
+        path = self.config.get('REMINDER_FILE_PATH')
+        self.stream = open(path, 'a', encoding='utf-8') if path else sys.stdout
+
+    def close(self):
+        if self.stream is not sys.stdout:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+    def send(self, message):
+        self.stream.write(f'To: {message.recipient}\n')
+        self.stream.write(f'Subject: {message.subject}\n')
+        self.stream.write(f'Idempotency-Key: {message.idempotency_key}\n\n')
+        self.stream.write(message.body.rstrip('\n') + '\n')
+        self.stream.write('-' * 60 + '\n')
+
+
+class SMTPTransport(ReminderTransport):
+    """Envía por SMTP reutilizando una conexión por lote
+
+    El Message-ID se deriva de la clave de idempotencia, así un reenvío tras
+    una caída puede descartarse como duplicado en el destino.
+    """
+
+    def open(self):
+        self.connection = smtplib.SMTP(self.config.get('SMTP_HOST', 'localhost'),
+                                       self.config.get('SMTP_PORT', 25), timeout=30)
+        if self.config.get('SMTP_USE_TLS'):
+            self.connection.starttls()
+        if self.config.get('SMTP_USERNAME'):
+            self.connection.login(self.config['SMTP_USERNAME'], self.config.get('SMTP_PASSWORD', ''))
+
+    def close(self):
+        try:
+            self.connection.quit()
+        except smtplib.SMTPException:
+            self.connection.close()
+
+    def send(self, message):
+        sender = self.config.get('REMINDER_SENDER', 'recordatorios@localhost')
+        email = EmailMessage()
+        email['From'] = sender
+        email['To'] = message.recipient
+        email['Subject'] = message.subject
+        email['Message-ID'] = f"<{message.idempotency_key}@{sender.rpartition('@')[2] or 'localhost'}>"
+        email.set_content(message.body)
+        self.connection.send_message(email)
+
+
+TRANSPORTS = {
+    'file': FileTransport,
+    'smtp': SMTPTransport
+}
+
+
+def get_transport(config, name=None):
+    """Instanciar el transporte configurado (nombre registrado o 'modulo:Clase')"""
+    name = name or config.get('REMINDER_TRANSPORT', 'file')
+    if name in TRANSPORTS:
+        return TRANSPORTS[name](config)
+    module_name, _, class_name = name.partition(':')
+    if not class_name:
+        raise ValueError(f'Transporte de recordatorios desconocido: {name}')
+    return getattr(import_module(module_name), class_name)(config)
@@ -0,0 +1,47 @@
+"""Expresiones SQL de fechas compatibles con SQLite y PostgreSQL
+
+La edad en años cumplidos se calcula como en Python con números AAAAMMDD:
+(hoy_AAAAMMDD - nacimiento_AAAAMMDD) / 10000 con división entera, que
+descuenta el año si aún no llegó el cumpleaños. date_number() convierte una
+columna de fecha en ese número con la función propia de cada motor.
+"""
+from datetime import date
+
+from sqlalchemy import Integer, literal_column
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+
+class date_number(FunctionElement):
+    """Fecha como entero AAAAMMDD (p. ej. 2025-07-26 -> 20250726)"""
+    type = Integer()
+    inherit_cache = True
+    name = 'date_number'
+
+
+@compiles(date_number)
+def _date_number_default(element, compiler, **kw):
+    column = compiler.process(element.clauses, **kw)
+    return (f'(EXTRACT(YEAR FROM {column}) * 10000 + EXTRACT(MONTH FROM {column}) * 100 '
+            f'+ EXTRACT(DAY FROM {column}))')
+
+
+@compiles(date_number, 'sqlite')
+def _date_number_sqlite(element, compiler, **kw):
+    return f"CAST(strftime('%Y%m%d', {compiler.process(element.clauses, **kw)}) AS INTEGER)"
+
+
+@compiles(date_number, 'postgresql')
+def _date_number_postgresql(element, compiler, **kw):
+    return f"CAST(to_char({compiler.process(element.clauses, **kw)}, 'YYYYMMDD') AS INTEGER)"
+
+
+def age_in_years(birth_date, today=None):
+    """Edad en años cumplidos a `today` (por defecto hoy) de una columna de fecha
+
+    La fecha de hoy se incrusta como literal entero: la misma expresión puede
+    repetirse en SELECT, GROUP BY y ORDER BY sin parámetros distintos.
+    """
+    today = today or date.today()
+    today_number = today.year * 10000 + today.month * 100 + today.day
+    return (literal_column(str(today_number), Integer) - date_number(birth_date)) // 10000
@@ -9,6 +9,59 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///medical_system.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     WTF_CSRF_ENABLED = True
+    
+    # Semanas de inventario de slots generadas hacia adelante
+    SLOT_INVENTORY_WEEKS = int(os.environ.get('SLOT_INVENTORY_WEEKS', 8))
+    
+    # Caché de disponibilidad: 'memory' (por proceso), 'sqlite' (compartida entre workers) o 'none'.
+    # Con varios workers de gunicorn la invalidación debe llegar a todos: 'sqlite' por defecto
+    AVAILABILITY_CACHE_BACKEND = os.environ.get('AVAILABILITY_CACHE_BACKEND') or (
+        'sqlite' if int(os.environ.get('GUNICORN_WORKERS', 1)) > 1 else 'memory')
+    AVAILABILITY_CACHE_PATH = os.environ.get('AVAILABILITY_CACHE_PATH', 'availability_cache.sqlite')
+    AVAILABILITY_CACHE_TTL = int(os.environ.get('AVAILABILITY_CACHE_TTL', 60))
+    AVAILABILITY_CACHE_SIZE = int(os.environ.get('AVAILABILITY_CACHE_SIZE', 1024))
+    
+    # Paginación por cursor de listados (filas por página y TTL del total cacheado)
+    PAGINATION_PER_PAGE = int(os.environ.get('PAGINATION_PER_PAGE', 50))
+    PAGINATION_MAX_PER_PAGE = int(os.environ.get('PAGINATION_MAX_PER_PAGE', 200))
+    PAGINATION_COUNT_TTL = int(os.environ.get('PAGINATION_COUNT_TTL', 60))
+    
+    # Mantenimiento nocturno de citas: horas de gracia antes de cerrar estados y filas por tramo
+    HOUSEKEEPING_NO_SHOW_GRACE_HOURS = int(os.environ.get('HOUSEKEEPING_NO_SHOW_GRACE_HOURS', 12))
+    HOUSEKEEPING_ABANDONED_HOURS = int(os.environ.get('HOUSEKEEPING_ABANDONED_HOURS', 24))
+    HOUSEKEEPING_WAITLIST_GRACE_HOURS = int(os.environ.get('HOUSEKEEPING_WAITLIST_GRACE_HOURS', 0))
+    HOUSEKEEPING_CHUNK_SIZE = int(os.environ.get('HOUSEKEEPING_CHUNK_SIZE', 1000))
+    
+    # Eventos en vivo (SSE): segundos entre pings y duración máxima de cada conexión
+    LIVE_EVENTS_HEARTBEAT = int(os.environ.get('LIVE_EVENTS_HEARTBEAT', 15))
+    LIVE_EVENTS_STREAM_SECONDS = int(os.environ.get('LIVE_EVENTS_STREAM_SECONDS', 300))
+    
+    # Datos de referencia (doctores y especialidades activos): segundos en caché por proceso
+    REFERENCE_DATA_TTL = int(os.environ.get('REFERENCE_DATA_TTL', 300))
+    
+    # Importación masiva de citas (CSV/XLSX): máximo de filas por archivo
+    APPOINTMENT_IMPORT_MAX_ROWS = int(os.environ.get('APPOINTMENT_IMPORT_MAX_ROWS', 10000))
+    
+    # Recordatorios de citas (bandeja de salida): transporte 'file' (REMINDER_FILE_PATH o stdout),
+    # 'smtp' o 'modulo:Clase'; tamaño de lote, reintentos con espera exponencial y reclamo vencido
+    CLINIC_NAME = os.environ.get('CLINIC_NAME', 'Clínica')
+    REMINDER_TRANSPORT = os.environ.get('REMINDER_TRANSPORT', 'file')
+    REMINDER_FILE_PATH = os.environ.get('REMINDER_FILE_PATH', '')
+    REMINDER_SENDER = os.environ.get('REMINDER_SENDER', 'recordatorios@clinica.local')
+    REMINDER_BATCH_SIZE = int(os.environ.get('REMINDER_BATCH_SIZE', 100))
+    REMINDER_MAX_ATTEMPTS = int(os.environ.get('REMINDER_MAX_ATTEMPTS', 5))
+    REMINDER_RETRY_BASE_SECONDS = int(os.environ.get('REMINDER_RETRY_BASE_SECONDS', 60))
+    REMINDER_CLAIM_TIMEOUT = int(os.environ.get('REMINDER_CLAIM_TIMEOUT', 900))
+    SMTP_HOST = os.environ.get('SMTP_HOST', 'localhost')
+    SMTP_PORT = int(os.environ.get('SMTP_PORT', 1025))
+    SMTP_USERNAME = os.environ.get('SMTP_USERNAME', '')
+    SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD', '')
+    SMTP_USE_TLS = os.environ.get('SMTP_USE_TLS', '').lower() in ('1', 'true', 'yes')
+    
+    # Índice en memoria por prefijo de DNI/teléfono: segundos hasta reconstruirlo y
+    # construcción en segundo plano (al arrancar run.py y en la primera búsqueda)
+    PATIENT_PREFIX_INDEX_TTL = int(os.environ.get('PATIENT_PREFIX_INDEX_TTL', 3600))
+    PATIENT_PREFIX_INDEX_WARMUP = os.environ.get('PATIENT_PREFIX_INDEX_WARMUP', '1').lower() in ('1', 'true', 'yes')
 
 class DevelopmentConfig(Config):
     """Configuración para desarrollo"""
@@ -24,8 +77,9 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     """Configuración para testing"""
     TESTING = True
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    PATIENT_PREFIX_INDEX_WARMUP = False  # las pruebas construyen el índice explícitamente
 
 # Configuraciones disponibles
 config = {
@@ -0,0 +1,49 @@
+"""Configuración de gunicorn para producción
+
+    cd backend
+    gunicorn -c gunicorn.conf.py run:app
+
+Workers gevent: cada petición, incluidos los streams SSE de /doctor/events
+y /nurse/events, es una corrutina en lugar de un hilo del sistema. El
+worker aplica monkey.patch_all() antes de importar la aplicación, así que
+threading.Condition del pub/sub de eventos en vivo espera de forma
+cooperativa; por eso preload_app debe quedar desactivado. post_fork hace
+cooperativo también a psycopg2 (psycogreen).
+
+Un solo worker: el pub/sub de eventos en vivo (app.utils.live_events) vive
+en memoria del proceso, con su propio historial y numeración de eventos.
+Con varios workers un cambio hecho en uno no llega a los dashboards
+conectados a otro, y al reconectarse a otro worker Last-Event-ID se
+compara con ids que no corresponden. Un worker gevent atiende miles de
+conexiones; para escalar a más procesos hace falta un canal compartido
+(LISTEN/NOTIFY de PostgreSQL o Redis) con una única secuencia de ids.
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+# Ver la nota sobre eventos en vivo: más de un worker no está soportado.
+# Con GUNICORN_WORKERS > 1 la caché de disponibilidad pasa a 'sqlite'
+# (config.py), porque la invalidación en memoria sólo llega a un worker.
+workers = int(os.environ.get('GUNICORN_WORKERS', 1))
+worker_class = 'gevent'
+# Conexiones simultáneas por worker (dashboards abiertos incluidos)
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+# La aplicación se importa en cada worker, después del monkey patching de gevent
+preload_app = False
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+
+
+def on_starting(server):
+    """Advertir si se configuran varios workers (eventos en vivo por proceso)"""
+    if server.cfg.workers > 1:
+        server.log.warning('GUNICORN_WORKERS=%s: los eventos en vivo sólo llegan a los dashboards '
+                           'conectados al mismo worker; use un solo worker', server.cfg.workers)
+
+
+def post_fork(server, worker):
+    """Consultas de psycopg2 sin bloquear las demás corrutinas del worker"""
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        return
+    patch_psycopg()
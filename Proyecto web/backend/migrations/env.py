@@ -45,6 +45,23 @@ target_db = current_app.extensions['migrate'].db
 # ... etc.
 
 
+# Objetos creados con SQL directo por la migración c5f1a8e3d702 (búsqueda de
+# pacientes) que no existen en los modelos: la tabla FTS5 patient_search y sus
+# tablas internas (_data, _idx, _docsize, _config) en SQLite y el índice
+# trigram en PostgreSQL. Sin este filtro autogenerate los ve como sobrantes.
+UNMANAGED_TABLE_PREFIXES = ('patient_search',)
+UNMANAGED_INDEXES = ('ix_patients_search_trgm',)
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Excluir de autogenerate los objetos que no gestionan los modelos"""
+    if type_ == 'table' and name.startswith(UNMANAGED_TABLE_PREFIXES):
+        return False
+    if type_ == 'index' and name in UNMANAGED_INDEXES:
+        return False
+    return True
+
+
 def get_metadata():
     if hasattr(target_db, 'metadatas'):
         return target_db.metadatas[None]
@@ -65,7 +82,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -93,6 +111,7 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_object", include_object)
 
     connectable = get_engine()
 
@@ -0,0 +1,108 @@
+"""backfill_appointment_durations
+
+Revision ID: a4c9e1d7b352
+Revises: f3a8d61c2b94
+Create Date: 2025-07-29 09:12:44.301582
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c9e1d7b352'
+down_revision = 'f3a8d61c2b94'
+branch_labels = None
+depends_on = None
+
+
+# Igual que Appointment.MAX_DURATION_MINUTES (las migraciones no importan modelos)
+MAX_DURATION_MINUTES = 240
+
+# Citas leídas y actualizadas por tramo
+CHUNK_SIZE = 5000
+
+appointments = sa.table(
+    'appointments',
+    sa.column('id', sa.Integer),
+    sa.column('doctor_id', sa.Integer),
+    sa.column('specialty_id', sa.Integer),
+    sa.column('date_time', sa.DateTime),
+    sa.column('duration', sa.Integer),
+)
+
+work_schedules = sa.table(
+    'work_schedules',
+    sa.column('doctor_id', sa.Integer),
+    sa.column('specialty_id', sa.Integer),
+    sa.column('day_of_week', sa.Integer),
+    sa.column('start_time', sa.Time),
+    sa.column('end_time', sa.Time),
+    sa.column('appointment_duration', sa.Integer),
+    sa.column('start_date', sa.Date),
+    sa.column('end_date', sa.Date),
+    sa.column('is_active', sa.Boolean),
+)
+
+
+def _schedule_duration(schedules, appointment):
+    """Duración del horario del doctor que contiene la cita (prioriza su especialidad)"""
+    day = appointment.date_time.date()
+    matches = [
+        schedule for schedule in schedules.get(appointment.doctor_id, ())
+        if schedule.day_of_week == day.weekday()
+        and schedule.start_time <= appointment.date_time.time() < schedule.end_time
+        and (schedule.start_date is None or schedule.start_date <= day)
+        and (schedule.end_date is None or day <= schedule.end_date)
+    ]
+    matches.sort(key=lambda schedule: schedule.specialty_id != appointment.specialty_id)
+    if not matches:
+        return None
+    return min(matches[0].appointment_duration, MAX_DURATION_MINUTES)
+
+
+def backfill_durations(connection):
+    """Asignar a cada cita la duración de su horario
+
+    Las citas creadas antes de guardar la duración tienen el valor por
+    defecto de la columna (30 minutos), aunque la grilla del doctor sea de
+    15 o 20. Se recorren por tramos de id y sólo se actualizan las que
+    difieren; las que no caen en ningún horario se dejan como están.
+
+    Returns:
+        int: Citas actualizadas
+    """
+    schedules = {}
+    for schedule in connection.execute(sa.select(work_schedules).where(
+            work_schedules.c.is_active == sa.true(),
+            work_schedules.c.appointment_duration > 0)):
+        schedules.setdefault(schedule.doctor_id, []).append(schedule)
+
+    update = appointments.update().where(appointments.c.id == sa.bindparam('appointment_id')).values(
+        duration=sa.bindparam('new_duration'))
+    updated, last_id = 0, 0
+    while True:
+        rows = connection.execute(
+            sa.select(appointments).where(appointments.c.id > last_id).order_by(appointments.c.id).limit(CHUNK_SIZE)
+        ).all()
+        if not rows:
+            return updated
+        last_id = rows[-1].id
+
+        changes = []
+        for row in rows:
+            duration = _schedule_duration(schedules, row)
+            if duration and duration != row.duration:
+                changes.append({'appointment_id': row.id, 'new_duration': duration})
+        if changes:
+            connection.execute(update, changes)
+            updated += len(changes)
+
+
+def upgrade():
+    backfill_durations(op.get_bind())
+
+
+def downgrade():
+    # La duración anterior (el valor por defecto) no se conserva
+    pass
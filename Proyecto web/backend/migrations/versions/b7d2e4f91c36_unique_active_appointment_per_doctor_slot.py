@@ -0,0 +1,33 @@
+"""unique_active_appointment_per_doctor_slot
+
+Revision ID: b7d2e4f91c36
+Revises: a3c91e5d7b20
+Create Date: 2025-07-14 10:03:27.551902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e4f91c36'
+down_revision = 'a3c91e5d7b20'
+branch_labels = None
+depends_on = None
+
+
+ACTIVE_STATUS_CLAUSE = "status IN ('scheduled', 'in_triage', 'ready_for_doctor', 'in_consultation')"
+
+
+def upgrade():
+    # Índice único parcial: una sola cita activa por doctor y hora de inicio.
+    # Si falla, existen citas activas duplicadas que deben cancelarse antes.
+    with op.batch_alter_table('appointments', schema=None) as batch_op:
+        batch_op.create_index('uq_appointments_doctor_active_slot', ['doctor_id', 'date_time'], unique=True,
+                              sqlite_where=sa.text(ACTIVE_STATUS_CLAUSE),
+                              postgresql_where=sa.text(ACTIVE_STATUS_CLAUSE))
+
+
+def downgrade():
+    with op.batch_alter_table('appointments', schema=None) as batch_op:
+        batch_op.drop_index('uq_appointments_doctor_active_slot')
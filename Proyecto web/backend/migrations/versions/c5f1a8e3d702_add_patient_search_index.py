@@ -0,0 +1,73 @@
+"""add_patient_search_index
+
+Revision ID: c5f1a8e3d702
+Revises: a7d3e9c51f84
+Create Date: 2025-07-25 10:32:14.771520
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5f1a8e3d702'
+down_revision = 'a7d3e9c51f84'
+branch_labels = None
+depends_on = None
+
+
+SQLITE_UPGRADE = (
+    # Índice FTS5 de pacientes sin acentos ni mayúsculas, con prefijos de 2 y 3 letras
+    "CREATE VIRTUAL TABLE IF NOT EXISTS patient_search USING fts5("
+    "first_name, last_name, dni, email, content='patients', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS patients_search_ai AFTER INSERT ON patients BEGIN "
+    "INSERT INTO patient_search(rowid, first_name, last_name, dni, email) "
+    "VALUES (new.id, new.first_name, new.last_name, new.dni, new.email); END",
+    "CREATE TRIGGER IF NOT EXISTS patients_search_ad AFTER DELETE ON patients BEGIN "
+    "INSERT INTO patient_search(patient_search, rowid, first_name, last_name, dni, email) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.dni, old.email); END",
+    "CREATE TRIGGER IF NOT EXISTS patients_search_au AFTER UPDATE OF first_name, last_name, dni, email ON patients BEGIN "
+    "INSERT INTO patient_search(patient_search, rowid, first_name, last_name, dni, email) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.dni, old.email); "
+    "INSERT INTO patient_search(rowid, first_name, last_name, dni, email) "
+    "VALUES (new.id, new.first_name, new.last_name, new.dni, new.email); END",
+    # Cargar los pacientes existentes
+    "INSERT INTO patient_search(patient_search) VALUES ('rebuild')"
+)
+
+SQLITE_DOWNGRADE = (
+    "DROP TRIGGER IF EXISTS patients_search_au",
+    "DROP TRIGGER IF EXISTS patients_search_ad",
+    "DROP TRIGGER IF EXISTS patients_search_ai",
+    "DROP TABLE IF EXISTS patient_search"
+)
+
+POSTGRES_UPGRADE = (
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    # unaccent() no es inmutable: se envuelve para poder indexar la expresión
+    "CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS "
+    "$$ SELECT public.unaccent('public.unaccent', $1) $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT",
+    "CREATE INDEX IF NOT EXISTS ix_patients_search_trgm ON patients USING gin "
+    "(f_unaccent(lower(first_name || ' ' || last_name || ' ' || dni || ' ' || coalesce(email, ''))) gin_trgm_ops)"
+)
+
+POSTGRES_DOWNGRADE = (
+    "DROP INDEX IF EXISTS ix_patients_search_trgm",
+    "DROP FUNCTION IF EXISTS f_unaccent(text)"
+)
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    statements = {'sqlite': SQLITE_UPGRADE, 'postgresql': POSTGRES_UPGRADE}.get(dialect, ())
+    for statement in statements:
+        op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    statements = {'sqlite': SQLITE_DOWNGRADE, 'postgresql': POSTGRES_DOWNGRADE}.get(dialect, ())
+    for statement in statements:
+        op.execute(statement)
@@ -6,6 +6,11 @@ from app.models.invoice import Invoice, InvoiceService
 # Crear la aplicación
 app = create_app(os.getenv('FLASK_ENV') or 'default')
 
+# Construir en segundo plano el índice de prefijos de DNI/teléfono
+if app.config.get('PATIENT_PREFIX_INDEX_WARMUP'):
+    from app.utils.patient_prefix_index import patient_prefix_index
+    patient_prefix_index.warm_up()
+
 # Configurar el user_loader para Flask-Login
 @app.login_manager.user_loader
 def load_user(user_id):
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Script de mantenimiento nocturno de citas
+Marca como 'no_show' las citas programadas ya vencidas y cierra los estados
+abandonados (in_triage, ready_for_doctor, in_consultation) con UPDATE por
+tramos. Si una ejecución se interrumpe, la siguiente la retoma; volver a
+ejecutarlo no modifica las citas ya cerradas.
+
+Uso:
+    python appointment_housekeeping.py [--chunk-size N] [--rule REGLA ...]
+"""
+
+import sys
+import os
+import argparse
+
+# Agregar el directorio backend al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app import create_app, db
+from app.models.housekeeping import HousekeepingRun
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description='Mantenimiento nocturno de citas')
+    parser.add_argument('--chunk-size', type=int, default=None, help='Filas por tramo (HOUSEKEEPING_CHUNK_SIZE)')
+    parser.add_argument('--rule', action='append', choices=list(HousekeepingRun.RULES),
+                        help='Aplicar sólo esta regla (se puede repetir)')
+    args = parser.parse_args()
+
+    app = create_app()
+
+    with app.app_context():
+        print("🧹 Mantenimiento nocturno de citas")
+        print("-" * 50)
+
+        try:
+            runs = HousekeepingRun.run_all(chunk_size=args.chunk_size, rules=args.rule)
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error durante el mantenimiento: {str(e)}")
+            print("   Vuelva a ejecutar el script para retomar desde el último tramo confirmado")
+            return
+
+        for run in runs:
+            print(f"✅ {run.label}: {run.rows_affected} citas ({run.chunks} tramos, corte {run.cutoff:%d/%m/%Y %H:%M})")
+
+        print("-" * 50)
+        print(f"🎉 ¡Proceso completado exitosamente!")
+        print(f"   Citas actualizadas: {sum(run.rows_affected for run in runs)}")
+
+if __name__ == '__main__':
+    main()
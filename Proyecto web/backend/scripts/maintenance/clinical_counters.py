@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Script para cargar o verificar los contadores clínicos de pacientes
+(consultation_count, first_record_id, last_record_id, last_consultation_at
+y last_doctor_id). Los mantienen los eventos de MedicalRecord; este script
+los recalcula desde medical_records después de cargas masivas o SQL
+manual, o sólo informa las diferencias con --verify.
+
+Uso:
+    python clinical_counters.py [--verify] [--limit N]
+"""
+
+import argparse
+import sys
+import os
+
+# Agregar el directorio backend al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app import create_app, db
+from app.utils.clinical_counters import find_mismatches, refresh_counters
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description='Contadores clínicos de pacientes')
+    parser.add_argument('--verify', action='store_true', help='Sólo informar las diferencias (no modifica datos)')
+    parser.add_argument('--limit', type=int, default=50, help='Diferencias a mostrar')
+    args = parser.parse_args()
+
+    app = create_app()
+
+    with app.app_context():
+        if args.verify:
+            print("🔍 Verificando contadores clínicos de pacientes")
+            print("-" * 50)
+            mismatches = find_mismatches(limit=args.limit)
+            for patient_id, differences in mismatches:
+                detail = ', '.join(f'{name}: {stored} → {expected}' for name, (stored, expected) in differences.items())
+                print(f"⚠️  Paciente {patient_id}: {detail}")
+            print("-" * 50)
+            if mismatches:
+                print(f"❌ {len(mismatches)} pacientes con contadores desactualizados "
+                      f"(ejecutar sin --verify para corregirlos)")
+                sys.exit(1)
+            print("✅ Todos los contadores coinciden con medical_records")
+            return
+
+        print("🧮 Recalculando contadores clínicos de pacientes")
+        print("-" * 50)
+        try:
+            updated = refresh_counters()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error al recalcular contadores: {str(e)}")
+            sys.exit(1)
+
+        print(f"🎉 ¡Proceso completado exitosamente!")
+        print(f"   Pacientes actualizados: {updated}")
+
+if __name__ == '__main__':
+    main()
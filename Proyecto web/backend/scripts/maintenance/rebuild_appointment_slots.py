@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Script para reconstruir el inventario de slots (appointment_slots)
+Regenera los slots de todos los doctores desde hoy a partir de WorkSchedule
+y de las citas activas. Sirve para reparar desvíos y para extender el
+horizonte del inventario (conviene ejecutarlo a diario).
+
+Uso:
+    python rebuild_appointment_slots.py [semanas]
+"""
+
+import sys
+import os
+
+# Agregar el directorio backend al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app import create_app, db
+from app.models.user import User
+from app.models.appointment_slot import AppointmentSlot
+
+def main():
+    """Función principal"""
+    app = create_app()
+
+    with app.app_context():
+        weeks = int(sys.argv[1]) if len(sys.argv) > 1 else AppointmentSlot.weeks_ahead()
+
+        print(f"🗓️  Reconstruyendo inventario de slots ({weeks} semanas)")
+        print("-" * 50)
+
+        try:
+            results = AppointmentSlot.rebuild(weeks=weeks)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error al reconstruir inventario: {str(e)}")
+            return
+
+        for doctor_id, generated in results.items():
+            doctor = db.session.get(User, doctor_id)
+            print(f"✅ Dr. {doctor.full_name}: {generated} slots")
+
+        print("-" * 50)
+        print(f"🎉 ¡Proceso completado exitosamente!")
+        print(f"   Doctores procesados: {len(results)}")
+        print(f"   Slots generados: {sum(results.values())}")
+
+if __name__ == '__main__':
+    main()
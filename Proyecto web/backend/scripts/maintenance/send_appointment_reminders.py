@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Script de recordatorios de citas
+Encola en la bandeja de salida (reminder_outbox) los recordatorios de las
+citas programadas de mañana y despacha los mensajes pendientes con el
+transporte configurado (REMINDER_TRANSPORT). Volver a ejecutarlo no
+duplica mensajes ni reenvía los ya enviados; los fallidos se reintentan
+con espera exponencial en ejecuciones posteriores.
+
+Uso:
+    python send_appointment_reminders.py [--date AAAA-MM-DD] [--transport file|smtp|modulo:Clase]
+                                         [--batch-size N] [--enqueue-only | --dispatch-only]
+"""
+
+import sys
+import os
+import argparse
+from datetime import datetime
+
+# Agregar el directorio backend al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app import create_app, db
+from app.models.reminder import ReminderMessage
+from app.utils.reminder_transports import get_transport
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description='Recordatorios de citas')
+    parser.add_argument('--date', help='Día de las citas a recordar (por defecto, mañana)')
+    parser.add_argument('--transport', default=None, help='Transporte (REMINDER_TRANSPORT)')
+    parser.add_argument('--batch-size', type=int, default=None, help='Mensajes por lote (REMINDER_BATCH_SIZE)')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--enqueue-only', action='store_true', help='Sólo encolar, sin enviar')
+    group.add_argument('--dispatch-only', action='store_true', help='Sólo enviar lo pendiente')
+    args = parser.parse_args()
+
+    app = create_app()
+
+    with app.app_context():
+        print("📨 Recordatorios de citas")
+        print("-" * 50)
+
+        try:
+            if not args.dispatch_only:
+                day = datetime.strptime(args.date, '%Y-%m-%d').date() if args.date else None
+                queued = ReminderMessage.enqueue_for_day(day)
+                db.session.commit()
+                print(f"✅ Encolados: {queued['enqueued']} (ya encolados: {queued['already_queued']}, "
+                      f"sin email: {queued['without_email']})")
+
+            if not args.enqueue_only:
+                transport = get_transport(app.config, args.transport)
+                totals = ReminderMessage.dispatch(transport, batch_size=args.batch_size)
+                print(f"✅ Enviados: {totals['sent']} en {totals['batches']} lotes")
+                print(f"   Para reintentar: {totals['retried']}, fallidos: {totals['failed']}, "
+                      f"omitidos (cita cambiada): {totals['skipped']}")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error durante el envío: {str(e)}")
+            print("   Vuelva a ejecutar el script: los mensajes enviados no se repiten")
+            return
+
+        print("-" * 50)
+        print(f"🎉 ¡Proceso completado exitosamente!")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Script para aplicar una plantilla de horario a varios doctores
+Reemplaza la carga manual día por día (setup_work_schedules.py) durante la
+incorporación de doctores. Por defecto sólo muestra la diferencia (dry-run);
+con --apply crea todos los horarios en una sola transacción.
+
+Uso:
+    python apply_schedule_template.py "<plantilla>" <desde> [hasta] [--doctors 1,2,3] [--apply] [--skip-conflicts]
+"""
+
+import sys
+import os
+import argparse
+from datetime import datetime
+
+# Agregar el directorio backend al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app import create_app, db
+from app.models.user import User
+from app.models.schedule_template import ScheduleTemplate
+
+DAYS = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Aplicar una plantilla de horario')
+    parser.add_argument('template', help='Nombre de la plantilla')
+    parser.add_argument('start_date', help='Inicio de vigencia (YYYY-MM-DD)')
+    parser.add_argument('end_date', nargs='?', help='Fin de vigencia (YYYY-MM-DD), opcional')
+    parser.add_argument('--doctors', help='IDs de doctores separados por comas (por defecto todos los activos)')
+    parser.add_argument('--apply', action='store_true', help='Escribir los horarios (sin esto es dry-run)')
+    parser.add_argument('--skip-conflicts', action='store_true', help='Aplicar sólo los bloques sin conflicto')
+    return parser.parse_args()
+
+def main():
+    """Función principal"""
+    args = parse_args()
+    app = create_app()
+
+    with app.app_context():
+        template = ScheduleTemplate.query.filter_by(name=args.template).first()
+        if not template:
+            print(f"❌ No existe la plantilla '{args.template}'")
+            return
+
+        if args.doctors:
+            doctor_ids = [int(doctor_id) for doctor_id in args.doctors.split(',')]
+        else:
+            doctor_ids = [row[0] for row in db.session.query(User.id).filter_by(role='doctor', is_active=True).all()]
+
+        start_date = datetime.strptime(args.start_date, '%Y-%m-%d').date()
+        end_date = datetime.strptime(args.end_date, '%Y-%m-%d').date() if args.end_date else None
+
+        print(f"🗓️  Plantilla: {template.name} ({template.summary})")
+        print(f"   Doctores: {len(doctor_ids)} | Modo: {'aplicar' if args.apply else 'dry-run'}")
+        print("-" * 50)
+
+        try:
+            diff = template.apply(doctor_ids, [(start_date, end_date)], dry_run=not args.apply,
+                                  skip_conflicts=args.skip_conflicts)
+            if diff['applied']:
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error al aplicar plantilla: {str(e)}")
+            return
+
+        for row in diff['create']:
+            print(f"   + Dr. {row['doctor_name']}: {DAYS[row['day_of_week']]} "
+                  f"{row['start_time'].strftime('%H:%M')}-{row['end_time'].strftime('%H:%M')}")
+        for row in diff['conflicts']:
+            print(f"   ⚠️  Dr. {row['doctor_name']}: {DAYS[row['day_of_week']]} se superpone con "
+                  f"{', '.join(row['existing'])}")
+
+        print("-" * 50)
+        if diff['applied']:
+            print(f"🎉 ¡Plantilla aplicada! {len(diff['create'])} horario(s) creados")
+        elif args.apply and diff['conflicts'] and not args.skip_conflicts:
+            print("❌ No se aplicó: resuelva los conflictos o use --skip-conflicts")
+        else:
+            print(f"✅ Dry-run: {len(diff['create'])} a crear, {len(diff['conflicts'])} con conflicto")
+
+if __name__ == '__main__':
+    main()
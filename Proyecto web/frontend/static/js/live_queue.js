@@ -0,0 +1,34 @@
+// Cola de atención en vivo: cambios de estado de citas recibidos por Server-Sent Events
+
+/**
+ * Conectarse al stream SSE de un dashboard.
+ * Actualiza en el lugar los badges de estado ([data-appointment-id] .js-status-badge)
+ * y luego llama a onEvent(evento) para los cambios propios de cada dashboard.
+ * EventSource se reconecta solo y envía Last-Event-ID para recuperar lo perdido.
+ */
+function connectLiveQueue(url, onEvent) {
+    if (!window.EventSource) {
+        return null;
+    }
+    const source = new EventSource(url);
+
+    source.addEventListener('appointment', function(message) {
+        const event = JSON.parse(message.data);
+
+        document.querySelectorAll(`[data-appointment-id="${event.appointment_id}"]`).forEach(function(row) {
+            const badge = row.querySelector('.js-status-badge');
+            if (badge) {
+                badge.className = `badge bg-${event.status_color} ms-2 js-status-badge`;
+                badge.textContent = event.status_label;
+            }
+            row.classList.add('live-queue-updated');
+            setTimeout(() => row.classList.remove('live-queue-updated'), 3000);
+        });
+
+        if (onEvent) {
+            onEvent(event);
+        }
+    });
+
+    return source;
+}
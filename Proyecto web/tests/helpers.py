@@ -0,0 +1,135 @@
+"""
+Utilidades compartidas para las pruebas con base de datos en memoria
+"""
+
+import os
+import sys
+from datetime import datetime, date, time, timedelta
+
+# Agregar el directorio backend al path (antes que tests/config.py)
+backend_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
+
+from flask import g
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from app import create_app, db
+from app.models.user import User
+from app.models.patient import Patient
+from app.models.specialty import Specialty
+from app.models.appointment import Appointment
+from app.models.work_schedule import WorkSchedule
+
+
+# Hash precalculado: generar uno por usuario hace lentas las pruebas
+TEST_PASSWORD_HASH = generate_password_hash('test')
+
+
+class QueryCounter:
+    """Cuenta las sentencias SQL ejecutadas dentro del bloque
+
+    Guarda también los parámetros de cada sentencia para poder repetirla
+    (p. ej. con EXPLAIN QUERY PLAN, ver explain()).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+        self.parameters = []
+
+    def _callback(self, conn, cursor, statement, parameters, *args):
+        self.count += 1
+        self.statements.append(statement)
+        self.parameters.append(parameters)
+
+    def explain(self, index=0):
+        """Plan de SQLite (EXPLAIN QUERY PLAN) de la sentencia capturada en `index`"""
+        rows = db.session.connection().exec_driver_sql(
+            f'EXPLAIN QUERY PLAN {self.statements[index]}', self.parameters[index]).all()
+        return ' '.join(str(row[-1]) for row in rows)
+
+    def __enter__(self):
+        event.listen(db.engine, 'before_cursor_execute', self._callback)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(db.engine, 'before_cursor_execute', self._callback)
+
+
+def make_app(**overrides):
+    """Crear app de testing con user_loader (definido normalmente en run.py)"""
+    app = create_app('testing', overrides)
+
+    @app.login_manager.user_loader
+    def load_user(user_id):
+        return db.session.get(User, int(user_id))
+
+    return app
+
+
+def login(client, user):
+    """Iniciar sesión en el cliente de pruebas sin pasar por el formulario"""
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    # Las pruebas corren dentro de un app_context compartido: olvidar el usuario cacheado en g
+    g.pop('_login_user', None)
+
+
+def next_weekday(weekday, start=None):
+    """Próxima fecha (desde mañana) que cae en el día de la semana indicado"""
+    day = (start or date.today()) + timedelta(days=1)
+    while day.weekday() != weekday:
+        day += timedelta(days=1)
+    return day
+
+
+def create_specialty(name='Medicina General', price=50):
+    specialty = Specialty(name=name, base_price=price)
+    db.session.add(specialty)
+    db.session.flush()
+    return specialty
+
+
+def create_user(username, role, specialty=None, **fields):
+    user = User(username=username, email=f'{username}@test.com', first_name=fields.pop('first_name', 'Ana'),
+                last_name=fields.pop('last_name', username.title()), role=role,
+                specialty_id=specialty.id if specialty else None, **fields)
+    user.password_hash = TEST_PASSWORD_HASH
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+
+def create_patient(dni, first_name='Juan', last_name='Pérez', birth_date=date(1990, 1, 1), **fields):
+    patient = Patient(first_name=first_name, last_name=last_name, dni=dni,
+                      birth_date=birth_date, gender=fields.pop('gender', 'Masculino'), **fields)
+    db.session.add(patient)
+    db.session.flush()
+    return patient
+
+
+def create_schedule(doctor, day_of_week, start=time(8, 0), end=time(12, 0), duration=30,
+                    valid_from=None, valid_to=None, **fields):
+    schedule = WorkSchedule(doctor_id=doctor.id, specialty_id=doctor.specialty_id, day_of_week=day_of_week,
+                            start_time=start, end_time=end, appointment_duration=duration,
+                            start_date=valid_from or date.today() - timedelta(days=30),
+                            end_date=valid_to or date.today() + timedelta(days=120), **fields)
+    db.session.add(schedule)
+    db.session.flush()
+    return schedule
+
+
+def create_appointment(patient, doctor, when, status='scheduled', flush=True, **fields):
+    appointment = Appointment(patient_id=patient.id, doctor_id=doctor.id, specialty_id=doctor.specialty_id,
+                              date_time=when, status=status, **fields)
+    db.session.add(appointment)
+    if flush:
+        db.session.flush()
+    return appointment
+
+
+def at(day, hour, minute=0):
+    """Combinar fecha y hora"""
+    return datetime.combine(day, time(hour, minute))
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Prueba de la edad y el grupo etario calculados en SQL.
+
+Verifica que Patient.age, is_minor y age_group dan en SQL el mismo
+resultado que en Python (cumpleaños hoy, mañana y 29 de febrero), que se
+pueden usar en filter(), group_by() y order_by(), que el filtro por grupo
+etario de los directorios usa el rango de fecha de nacimiento y que los
+reportes agrupan por grupo etario en la base de datos sin cargar pacientes.
+"""
+
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import literal, select
+
+from helpers import (make_app, login, db, QueryCounter, create_specialty, create_user,
+                     create_patient, create_appointment)
+from app.models.patient import Patient, AGE_GROUPS, AGE_GROUP_LABELS, _years_before
+from app.models.triage import Triage
+from app.utils.sql_dates import age_in_years
+
+
+def _birthdays(today):
+    """Fechas de nacimiento en los bordes de cada grupo etario"""
+    birthdays = [date(2000, 2, 29), date(1960, 12, 31), date(2010, 1, 1)]
+    for _, min_age, _, _ in AGE_GROUPS:
+        edge = _years_before(today, min_age)
+        birthdays += [edge, edge + timedelta(days=1), edge - timedelta(days=1)]
+    return [birthday for birthday in birthdays if birthday <= today]
+
+
+def test_sql_matches_python():
+    """Edad, menor de edad y grupo etario iguales en SQL y en Python"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        today = date.today()
+        patients = [create_patient(f'8000{i:04d}', birth_date=birthday)
+                    for i, birthday in enumerate(_birthdays(today))]
+        db.session.commit()
+
+        rows = db.session.query(Patient.id, Patient.age, Patient.is_minor, Patient.age_group).all()
+        computed = {row.id: (row.age, bool(row.is_minor), row.age_group) for row in rows}
+        for patient in patients:
+            assert computed[patient.id] == (patient.age, patient.is_minor, patient.age_group), patient.birth_date
+
+        # 29 de febrero: el cumpleaños se cumple el 1 de marzo en años no bisiestos
+        for today, expected in ((date(2025, 2, 28), 24), (date(2025, 3, 1), 25), (date(2024, 2, 29), 24)):
+            assert db.session.scalar(select(age_in_years(literal(date(2000, 2, 29)), today=today))) == expected
+        print(f"✅ Edad y grupo etario iguales en SQL y Python para {len(patients)} fechas límite")
+
+
+def test_filter_group_order():
+    """Las expresiones sirven en filter(), group_by() y order_by()"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        today = date.today()
+        for i, years in enumerate((1, 4, 9, 15, 17, 30, 50, 70, 90)):
+            create_patient(f'8100{i:04d}', birth_date=_years_before(today, years) - timedelta(days=10))
+        db.session.commit()
+
+        minors = Patient.query.filter(Patient.is_minor).order_by(Patient.age.desc()).all()
+        assert [patient.age for patient in minors] == [17, 15, 9, 4, 1]
+        assert Patient.query.filter(Patient.age >= 65).count() == 2
+
+        age_group = Patient.age_group.label('age_group')
+        counts = dict(db.session.query(age_group, db.func.count(Patient.id)).group_by(age_group).all())
+        assert counts == {'lactante': 1, 'preescolar': 1, 'escolar': 1, 'adolescente': 2,
+                          'adulto': 2, 'adulto_mayor': 2}
+
+        # El filtro por rango de fecha de nacimiento equivale al grupo calculado
+        for key in AGE_GROUP_LABELS:
+            by_range = {p.id for p in Patient.query.filter(Patient.age_group_filter(key))}
+            by_case = {p.id for p in Patient.query.filter(Patient.age_group == key)}
+            assert by_range == by_case and len(by_range) == counts[key]
+        plan = ' '.join(str(row) for row in db.session.execute(db.text(
+            "EXPLAIN QUERY PLAN SELECT id FROM patients WHERE birth_date <= :newest AND birth_date > :oldest"
+        ), {'newest': _years_before(today, 6), 'oldest': _years_before(today, 12)}))
+        assert 'ix_patients_birth_date' in plan
+        print("✅ Edad y grupo etario usados en filter, group_by y order_by; filtro por rango con índice")
+
+
+def test_directories_and_reports():
+    """Filtro de los directorios y desglose de reportes por grupo etario"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        specialty = create_specialty()
+        doctor = create_user('doctor', 'doctor', specialty)
+        nurse = create_user('enfermera', 'nurse')
+        admin = create_user('admin', 'admin')
+        receptionist = create_user('recepcion', 'receptionist')
+        today = date.today()
+        when = datetime.combine(today, datetime.min.time()).replace(hour=9)
+
+        for i, years in enumerate((1, 8, 8, 16, 40, 40, 40, 80)):
+            patient = create_patient(f'8200{i:04d}', birth_date=_years_before(today, years) - timedelta(days=3))
+            appointment = create_appointment(patient, doctor, when + timedelta(minutes=15 * i),
+                                             status='completed' if i % 2 else 'scheduled')
+            db.session.add(Triage(patient_id=patient.id, appointment_id=appointment.id, nurse_id=nurse.id,
+                                  chief_complaint='Control', priority_level='alta' if years < 18 else 'baja'))
+        db.session.commit()
+
+        client = app.test_client()
+        login(client, receptionist)
+        body = client.get('/receptionist/patients?age_group=escolar').get_data(as_text=True)
+        assert '82000001' in body and '82000002' in body and '82000004' not in body
+        login(client, nurse)
+        body = client.get('/nurse/patients?age_group=adulto_mayor').get_data(as_text=True)
+        assert '82000007' in body and '82000000' not in body
+
+        client = app.test_client()
+        login(client, admin)
+        body = client.get('/admin/patients?age_group=adulto').get_data(as_text=True)
+        assert '3 pacientes registrados' in body
+
+        from app.routes.admin import get_age_group_statistics
+        with QueryCounter() as counter:
+            stats = get_age_group_statistics(today, today)
+        assert counter.count == 3
+        assert not any('FROM patients\n' in statement and 'GROUP BY' not in statement
+                       for statement in counter.statements)
+        by_key = {group['key']: group for group in stats}
+        assert [group['key'] for group in stats] == [key for key, _, _, _ in AGE_GROUPS]
+        assert by_key['adulto']['active_patients'] == 3 and by_key['adulto']['total_appointments'] == 3
+        assert by_key['escolar']['total_triages'] == 2 and by_key['escolar']['high_priority'] == 2
+        assert by_key['preescolar']['total_appointments'] == 0
+
+        response = client.get(f'/admin/reports?start_date={today}&end_date={today}')
+        assert response.status_code == 200 and 'Estadísticas por Grupo Etario' in response.get_data(as_text=True)
+        csv_report = client.get(f'/admin/api/reports/export/csv?start_date={today}&end_date={today}')
+        assert 'Adulto (18-65 años),3,3' in csv_report.get_data(as_text=True)
+        print(f"✅ Directorios filtrados por grupo etario y reporte agrupado en {counter.count} consultas")
+
+
+if __name__ == '__main__':
+    test_sql_matches_python()
+    test_filter_group_order()
+    test_directories_and_reports()
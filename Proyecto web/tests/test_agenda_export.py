@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Prueba de la exportación de la agenda diaria de todos los doctores.
+
+Verifica que el CSV y la versión imprimible agrupan las citas del día por
+doctor con paciente, DNI, estado, pago y prioridad de triage (los mismos
+valores que las propiedades del modelo), que ambas respuestas se envían
+en streaming, y que los datos salen de una sola consulta sin importar el
+número de citas o de doctores.
+"""
+
+import csv
+import io
+from datetime import date, datetime, timedelta
+
+from helpers import (make_app, login, db, QueryCounter, next_weekday, at, create_specialty,
+                     create_user, create_patient, create_appointment)
+from app.models.appointment import Appointment
+from app.models.invoice import Invoice
+from app.models.triage import Triage
+from app.utils import agenda_export
+
+INVOICE_STATUSES = ('paid', 'pending', 'overdue', 'cancelled')
+PRIORITIES = ('alta', 'media', 'baja')
+
+
+def _populate(day, doctors, per_doctor):
+    """Citas del día con factura en 3 de cada 4 y triage en 1 de cada 2"""
+    specialty = create_specialty()
+    receptionist = create_user('recepcion', 'receptionist')
+    users = [create_user(f'doctor{i}', 'doctor', specialty, first_name=f'Doc{doctors - i:02d}')
+             for i in range(doctors)]
+    appointments = []
+    for i in range(doctors * per_doctor):
+        patient = create_patient(f'7{i:07d}', first_name=f'Paciente{i}')
+        appointments.append(create_appointment(patient, users[i % doctors], at(day, 8, 0) + timedelta(minutes=15 * (i // doctors)),
+                                               status='cancelled' if i % 7 == 0 else 'scheduled'))
+    # Otro día: no debe aparecer
+    create_appointment(create_patient('79999999'), users[0], at(day + timedelta(days=1), 8, 0))
+
+    invoices, triages = [], []
+    for i, appointment in enumerate(appointments):
+        if i % 4:
+            invoices.append({
+                'patient_id': appointment.patient_id, 'appointment_id': appointment.id,
+                'doctor_id': appointment.doctor_id, 'invoice_number': f'F-{i:06d}',
+                'issue_date': date.today(), 'due_date': date.today(), 'subtotal': 100, 'total_amount': 100,
+                'status': INVOICE_STATUSES[i % 4], 'created_by': receptionist.id,
+                'created_at': datetime.utcnow(), 'updated_at': datetime.utcnow()
+            })
+        if i % 2 == 0:
+            triages.append({
+                'patient_id': appointment.patient_id, 'appointment_id': appointment.id,
+                'nurse_id': receptionist.id, 'chief_complaint': 'Control', 'priority_level': PRIORITIES[i % 3],
+                'status': 'completed', 'created_at': datetime.utcnow()
+            })
+    if invoices:
+        db.session.execute(Invoice.__table__.insert(), invoices)
+    if triages:
+        db.session.execute(Triage.__table__.insert(), triages)
+    db.session.commit()
+    return receptionist
+
+
+def _export(client, day, format):
+    db.session.expire_all()
+    with QueryCounter() as counter:
+        response = client.get(f'/receptionist/agenda/export?date={day.isoformat()}&format={format}')
+        assert response.status_code == 200 and response.is_streamed
+        body = response.get_data(as_text=True)
+    agenda = [statement for statement in counter.statements if 'FROM appointments' in statement]
+    return body, len(agenda), counter.count
+
+
+def test_csv_matches_model():
+    """El CSV agrupa por doctor con los mismos valores que el modelo"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        day = next_weekday(1)
+        receptionist = _populate(day, doctors=3, per_doctor=8)
+        expected = []
+        for appointment in sorted(Appointment.query.filter(Appointment.date_time < at(day + timedelta(days=1), 0, 0)),
+                                  key=lambda a: (a.doctor.full_name, a.date_time)):
+            triage = appointment.get_triage()
+            expected.append([f'Dr. {appointment.doctor.full_name}', appointment.date_time.strftime('%H:%M'),
+                             appointment.patient.dni, appointment.status_label, appointment.payment_status,
+                             triage.priority_label if triage else 'Sin triage'])
+
+        client = app.test_client()
+        login(client, receptionist)
+        body, queries, _ = _export(client, day, 'csv')
+        rows = list(csv.reader(io.StringIO(body.lstrip('\ufeff'))))
+        assert rows[0] == list(agenda_export.CSV_HEADER)
+        assert [[row[0], row[2], row[5], row[6], row[7], row[8]] for row in rows[1:]] == expected
+        assert queries == 1
+        print(f"✅ CSV de {len(rows) - 1} citas agrupadas por doctor en una consulta")
+
+
+def test_printable_html_constant_queries():
+    """La versión imprimible separa doctores y no consulta por fila"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        day = next_weekday(2)
+        receptionist = _populate(day, doctors=10, per_doctor=30)
+        client = app.test_client()
+        login(client, receptionist)
+
+        html, queries, total = _export(client, day, 'html')
+        assert html.count('<section class="doctor">') == 10 and html.count('30 citas') == 10
+        assert html.index('Dr. Doc01') < html.index('Dr. Doc10')
+        assert 'Prioridad Alta' in html and 'Sin factura' in html
+        assert queries == 1
+
+        # Con más filas por tanda que AGENDA_YIELD_PER la consulta sigue siendo una
+        original = agenda_export.AGENDA_YIELD_PER
+        agenda_export.AGENDA_YIELD_PER = 50
+        try:
+            body, queries, _ = _export(client, day, 'csv')
+        finally:
+            agenda_export.AGENDA_YIELD_PER = original
+        assert queries == 1 and len(body.splitlines()) == 301
+
+        empty, _, _ = _export(client, day + timedelta(days=7), 'html')
+        assert 'No hay citas registradas' in empty
+        print(f"✅ Agenda imprimible de 300 citas y 10 doctores con {total} sentencias SQL")
+
+
+if __name__ == '__main__':
+    test_csv_matches_model()
+    test_printable_html_constant_queries()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Prueba de la importación masiva de citas desde CSV.
+
+Verifica el reporte por fila (DNI o doctor inexistente, fecha pasada,
+horario fuera de turno, solapamientos con citas existentes y entre filas
+del archivo), que la validación sin crear no escribe nada, que la ruta de
+recepción procesa el archivo subido, y que 5.000 filas se importan en
+pocos segundos con un número constante de sentencias SQL.
+"""
+
+import io
+import time as clock
+from datetime import date, datetime, time, timedelta
+
+from helpers import (make_app, login, db, QueryCounter, next_weekday, at, create_specialty,
+                     create_user, create_patient, create_schedule, create_appointment)
+from app.models.appointment import Appointment
+from app.models.appointment_slot import AppointmentSlot
+from app.models.patient import Patient
+from app.utils.appointment_import import read_rows, import_appointments
+
+
+def _setup(doctors=1, patients=0):
+    specialty = create_specialty()
+    created = []
+    for i in range(doctors):
+        doctor = create_user(f'doctor{i}', 'doctor', specialty, first_name='Ana', last_name=f'Torres{i}')
+        for day in range(7):
+            create_schedule(doctor, day, start=time(7, 0), end=time(19, 0), duration=10)
+        created.append(doctor)
+    if patients:
+        db.session.execute(Patient.__table__.insert(), [{
+            'first_name': f'Paciente{i}', 'last_name': 'Campaña', 'dni': f'5{i:07d}',
+            'birth_date': date(1980, 1, 1), 'is_active': True,
+            'created_at': datetime.utcnow(), 'updated_at': datetime.utcnow()
+        } for i in range(patients)])
+    for doctor in created:
+        AppointmentSlot.regenerate_for_doctor(doctor.id, weeks=3)
+    db.session.commit()
+    return specialty, created
+
+
+def _csv(lines, header='dni;doctor;especialidad;fecha_hora;motivo'):
+    return io.BytesIO(('\n'.join([header] + lines) + '\n').encode('utf-8'))
+
+
+def test_row_report():
+    """Cada fila informa su resultado; las válidas se crean y ocupan su slot"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        _, (doctor,) = _setup()
+        create_patient('11111111')
+        create_patient('22222222')
+        other = create_patient('33333333')
+        day = next_weekday(2)
+        create_appointment(other, doctor, at(day, 11, 0))
+        db.session.commit()
+
+        when = lambda hour, minute=0: at(day, hour, minute).strftime('%Y-%m-%d %H:%M')
+        lines = [
+            f'11111111;Ana Torres0;Medicina General;{when(9)};Vacunación',
+            f'22222222;doctor0;;{day.strftime("%d/%m/%Y")} 09:10;',
+            f'99999999;Ana Torres0;;{when(9, 20)};',
+            f'11111111;Dr. Nadie;;{when(9, 30)};',
+            f'11111111;Ana Torres0;;2020-01-01 09:00;',
+            f'11111111;Ana Torres0;;{when(9, 5)};',
+            f'22222222;Ana Torres0;;{when(9)};',
+            f'33333333;Ana Torres0;;{when(11)};',
+            f'11111111;Ana Torres0;Cardiología;{when(10)};',
+            ';;;;'
+        ]
+        report = import_appointments(read_rows(_csv(lines), 'citas.csv'))
+        db.session.commit()
+
+        messages = [(row['row'], row['status'], row['message']) for row in report.rows]
+        expected = [
+            (2, 'created'), (3, 'created'), (4, 'error', 'No existe un paciente con DNI 99999999'),
+            (5, 'error', 'Doctor no encontrado'), (6, 'error', 'fecha y hora futura'),
+            (7, 'error', 'turno del doctor'), (8, 'error', 'fila 2 del archivo'),
+            (9, 'error', 'ya tiene una cita que se superpone'), (10, 'error', 'Especialidad no encontrada')
+        ]
+        assert len(messages) == len(expected)
+        for (number, status, message), check in zip(messages, expected):
+            assert (number, status) == check[:2] and (len(check) == 2 or check[2] in message), (number, message)
+
+        created = [row['appointment_id'] for row in report.rows if row['status'] == 'created']
+        appointments = Appointment.query.filter(Appointment.id.in_(created)).order_by(Appointment.date_time).all()
+        assert [a.reason for a in appointments] == ['Vacunación', None] and all(a.duration == 10 for a in appointments)
+        assert AppointmentSlot.query.filter(AppointmentSlot.appointment_id.in_(created),
+                                            AppointmentSlot.state == 'booked').count() == 2
+        print(f"✅ Reporte por fila: {report.created} creadas, {report.errors} con error")
+
+
+def test_dry_run_and_route():
+    """La validación no escribe y la ruta de recepción procesa el archivo subido"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        _, (doctor,) = _setup()
+        create_patient('11111111')
+        receptionist = create_user('recepcion', 'receptionist')
+        db.session.commit()
+        day = next_weekday(3)
+        lines = [f'11111111;{doctor.id};;{day.isoformat()} 08:00;']
+
+        report = import_appointments(read_rows(_csv(lines), 'citas.csv'), dry_run=True)
+        assert report.valid == 1 and report.created == 0 and Appointment.query.count() == 0
+
+        client = app.test_client()
+        login(client, receptionist)
+        response = client.post('/receptionist/appointments/import', data={
+            'file': (_csv([f'11111111,{doctor.id},{day.strftime("%d/%m/%Y")},08:00'], header='DNI,Doctor,Fecha,Hora'), 'citas.csv')
+        }, content_type='multipart/form-data')
+        assert response.status_code == 200 and 'Cita creada' in response.get_data(as_text=True)
+        assert Appointment.query.filter_by(doctor_id=doctor.id).count() == 1
+
+        response = client.post('/receptionist/appointments/import', data={
+            'file': (io.BytesIO(b'nombre;apellido\nJuan;Perez\n'), 'citas.csv')
+        }, content_type='multipart/form-data', follow_redirects=True)
+        assert 'Faltan columnas obligatorias' in response.get_data(as_text=True)
+        print("✅ Validación sin escritura y ruta de importación")
+
+
+def test_large_import():
+    """5.000 filas en pocos segundos con sentencias SQL constantes"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        _, doctors = _setup(doctors=5, patients=5000)
+        start_day = date.today() + timedelta(days=1)
+        lines = []
+        for i in range(5000):
+            # 72 turnos de 10 minutos por doctor y día
+            doctor = doctors[i % 5]
+            slot = i // 5
+            when = datetime.combine(start_day + timedelta(days=slot // 72), time(7, 0)) + timedelta(minutes=10 * (slot % 72))
+            lines.append(f'5{i:07d};{doctor.username};Medicina General;{when:%Y-%m-%d %H:%M};Campaña')
+
+        started = clock.perf_counter()
+        with QueryCounter() as counter:
+            report = import_appointments(read_rows(_csv(lines), 'campaña.csv'))
+            db.session.commit()
+        elapsed = clock.perf_counter() - started
+
+        assert report.created == 5000, [row['message'] for row in report.rows if row['status'] == 'error'][:5]
+        assert Appointment.query.count() == 5000
+        assert AppointmentSlot.query.filter_by(state='booked').count() == 5000
+        print(f"✅ 5000 citas importadas en {elapsed:.2f}s con {counter.count} sentencias SQL")
+        assert elapsed < 15 and counter.count < 60
+
+
+if __name__ == '__main__':
+    test_row_report()
+    test_dry_run_and_route()
+    test_large_import()
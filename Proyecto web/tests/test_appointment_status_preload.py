@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Prueba de la precarga de estado de pago y triage en listas de citas.
+
+Verifica que is_paid, payment_status, has_triage() y get_triage() leen los
+valores precargados (status_options / preload_status) con los mismos
+resultados que la consulta por fila, y que la página de citas de
+recepción ejecuta un número constante de sentencias SQL sin importar
+cuántas citas muestra.
+"""
+
+from datetime import date, datetime, timedelta
+
+from helpers import (make_app, login, db, QueryCounter, next_weekday, at, create_specialty,
+                     create_user, create_patient, create_appointment)
+from app.models.appointment import Appointment
+from app.models.invoice import Invoice
+from app.models.triage import Triage
+from app.utils.pagination import count_cache
+
+INVOICE_STATUSES = ('paid', 'pending', 'overdue', 'cancelled')
+
+
+def _populate(count):
+    """Citas con factura en 4 de cada 5 y triage en 1 de cada 3"""
+    specialty = create_specialty()
+    doctors = [create_user(f'doctor{i}', 'doctor', specialty) for i in range(3)]
+    receptionist = create_user('recepcion', 'receptionist')
+    start = next_weekday(0)
+    appointments = []
+    for i in range(count):
+        patient = create_patient(f'8{i:07d}', first_name=f'Paciente{i}')
+        day = start + timedelta(days=i // 20)
+        appointments.append(create_appointment(patient, doctors[i % 3], at(day, 8 + (i % 20) // 2, 30 * (i % 2))))
+
+    invoices, triages = [], []
+    for i, appointment in enumerate(appointments):
+        if i % 5:
+            invoices.append({
+                'patient_id': appointment.patient_id, 'appointment_id': appointment.id,
+                'doctor_id': appointment.doctor_id, 'invoice_number': f'F-{i:06d}',
+                'issue_date': date.today(), 'due_date': date.today(), 'subtotal': 100, 'total_amount': 100,
+                'status': INVOICE_STATUSES[i % 4], 'created_by': receptionist.id,
+                'created_at': datetime.utcnow(), 'updated_at': datetime.utcnow()
+            })
+        if i % 3 == 0:
+            triages.append({
+                'patient_id': appointment.patient_id, 'appointment_id': appointment.id,
+                'nurse_id': receptionist.id, 'chief_complaint': 'Control', 'priority_level': 'media',
+                'status': 'completed', 'created_at': datetime.utcnow()
+            })
+    db.session.execute(Invoice.__table__.insert(), invoices)
+    db.session.execute(Triage.__table__.insert(), triages)
+    db.session.commit()
+    return receptionist
+
+
+def _snapshot(appointment):
+    triage = appointment.get_triage()
+    return (appointment.is_paid, appointment.payment_status, appointment.has_triage(), triage.id if triage else None)
+
+
+def test_preloaded_values_match_queries():
+    """Los valores precargados coinciden con la consulta por fila"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        _populate(40)
+        expected = {appointment.id: _snapshot(appointment) for appointment in Appointment.query.all()}
+        db.session.expire_all()
+
+        appointments = Appointment.query.options(*Appointment.status_options()).all()
+        with QueryCounter() as counter:
+            preloaded = {appointment.id: _snapshot(appointment) for appointment in appointments}
+        assert counter.count == 0 and preloaded == expected
+
+        db.session.expire_all()
+        appointments = Appointment.query.all()
+        with QueryCounter() as counter:
+            Appointment.preload_status(appointments)
+            preloaded = {appointment.id: _snapshot(appointment) for appointment in appointments}
+        assert counter.count == 2 and preloaded == expected
+        print(f"✅ {len(expected)} citas: mismos valores sin consultas por fila")
+
+
+def _count_page_queries(count):
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        count_cache.clear()
+        receptionist = _populate(count)
+        client = app.test_client()
+        login(client, receptionist)
+        db.session.expire_all()
+        with QueryCounter() as counter:
+            response = client.get('/receptionist/appointments?per_page=200')
+        assert response.status_code == 200
+        assert response.get_data(as_text=True).count('fa-file-invoice-dollar') == count
+        return counter.count
+
+
+def test_appointments_page_constant_queries():
+    """La página de citas ejecuta las mismas sentencias con 20 y con 200 citas"""
+    small = _count_page_queries(20)
+    large = _count_page_queries(200)
+    print(f"✅ Sentencias SQL: {small} con 20 citas, {large} con 200 citas")
+    assert small == large and large <= 8
+
+
+if __name__ == '__main__':
+    test_preloaded_values_match_queries()
+    test_appointments_page_constant_queries()
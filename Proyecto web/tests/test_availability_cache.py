@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Prueba de la caché de disponibilidad por (doctor, fecha, especialidad).
+
+Verifica aciertos/fallos, la invalidación por eventos de Appointment y
+WorkSchedule, el LRU/TTL en memoria, el backend SQLite compartido y que
+con varios workers de gunicorn la caché por defecto es la compartida.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time as timer
+from datetime import time
+
+from helpers import (make_app, login, db, QueryCounter, next_weekday, at, create_specialty,
+                     create_user, create_patient, create_schedule, create_appointment)
+from app.models.user import User
+from app.models.patient import Patient
+from app.utils.availability_cache import availability_cache, MemoryBackend, SQLiteBackend
+
+
+def test_cache_hits_and_event_invalidation():
+    """Segunda consulta sin SQL de disponibilidad; crear cita o editar horario invalida"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        specialty = create_specialty()
+        doctor = create_user('doctor1', 'doctor', specialty)
+        receptionist = create_user('recepcion', 'receptionist')
+        patient = create_patient('70000001')
+        monday = next_weekday(0)
+        schedule = create_schedule(doctor, 0, start=time(8, 0), end=time(10, 0))
+        db.session.commit()
+        doctor_id, patient_id = doctor.id, patient.id
+
+        client = app.test_client()
+        login(client, receptionist)
+        url = f'/receptionist/api/available-times?doctor_id={doctor_id}&date={monday.isoformat()}'
+
+        first = client.get(url).get_json()['available_times']
+        with QueryCounter() as counter:
+            second = client.get(url).get_json()['available_times']
+        assert first == second == ['08:00', '08:30', '09:00', '09:30']
+        stats = availability_cache.stats()
+        assert (stats['hits'], stats['misses']) == (1, 1)
+        # Sólo usuario en sesión y doctor; nada de horarios ni citas
+        assert not any('work_schedules' in sql or 'appointment' in sql for sql in counter.statements)
+
+        # Crear una cita invalida la fecha
+        create_appointment(db.session.get(Patient, patient_id), db.session.get(User, doctor_id), at(monday, 8, 30))
+        db.session.commit()
+        assert '08:30' not in client.get(url).get_json()['available_times']
+
+        # Editar el horario invalida todas las fechas del doctor
+        schedule = db.session.merge(schedule)
+        schedule.end_time = time(9, 0)
+        db.session.commit()
+        assert client.get(url).get_json()['available_times'] == ['08:00']
+
+        admin = create_user('admin', 'admin')
+        db.session.commit()
+        login(client, admin)
+        stats = client.get('/admin/api/availability-cache/stats').get_json()['stats']
+        print(f"✅ Estadísticas de caché: {stats}")
+        assert stats['misses'] == 3 and stats['invalidations'] >= 2
+
+
+def test_memory_backend_lru_and_ttl():
+    """El backend en memoria descarta por LRU y por TTL"""
+    backend = MemoryBackend(max_entries=2)
+    backend.set((1, '2025-01-01', None), ['08:00'], ttl=60)
+    backend.set((2, '2025-01-01', None), ['09:00'], ttl=60)
+    backend.get((1, '2025-01-01', None))
+    backend.set((3, '2025-01-01', None), ['10:00'], ttl=60)
+    assert backend.get((2, '2025-01-01', None)) is None
+    assert backend.get((1, '2025-01-01', None)) == ['08:00']
+
+    backend.set((4, '2025-01-01', None), [], ttl=0.01)
+    timer.sleep(0.02)
+    assert backend.get((4, '2025-01-01', None)) is None
+
+
+def test_sqlite_backend_is_shared_between_workers():
+    """Dos instancias (workers) sobre el mismo archivo comparten entradas e invalidaciones"""
+    path = os.path.join(tempfile.mkdtemp(), 'availability_cache.sqlite')
+    worker_a, worker_b = SQLiteBackend(path), SQLiteBackend(path)
+    worker_a.set((7, '2025-01-06', 3), ['08:00', '08:30'], ttl=60)
+    assert worker_b.get((7, '2025-01-06', 3)) == ['08:00', '08:30']
+    worker_b.delete(7, '2025-01-06')
+    assert worker_a.get((7, '2025-01-06', 3)) is None
+    print("✅ Backend SQLite compartido")
+
+
+def test_default_backend_follows_worker_count():
+    """Sin AVAILABILITY_CACHE_BACKEND: 'memory' con un worker y 'sqlite' con varios"""
+    backend = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+    defaults = {}
+    for workers in ('1', '4'):
+        environ = {key: value for key, value in os.environ.items() if key != 'AVAILABILITY_CACHE_BACKEND'}
+        environ['GUNICORN_WORKERS'] = workers
+        result = subprocess.run([sys.executable, '-c', 'import config; print(config.Config.AVAILABILITY_CACHE_BACKEND)'],
+                                cwd=backend, env=environ, capture_output=True, text=True, timeout=60)
+        assert result.returncode == 0, result.stderr
+        defaults[workers] = result.stdout.strip()
+    assert defaults == {'1': 'memory', '4': 'sqlite'}
+    print(f"✅ Backend por defecto según workers: {defaults}")
+
+
+if __name__ == '__main__':
+    test_cache_hits_and_event_invalidation()
+    test_memory_backend_lru_and_ttl()
+    test_sqlite_backend_is_shared_between_workers()
+    test_default_backend_follows_worker_count()
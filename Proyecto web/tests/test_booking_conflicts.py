@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Prueba de la detección de solapamientos entre citas.
+
+Verifica que los intervalos [inicio, inicio + duración) se comparan para el
+doctor y para el paciente, con todos los estados activos (incluido
+in_triage), que un lote se valida con una sola consulta, que el formulario
+de recepción rechaza citas superpuestas, que ninguna duración supera
+MAX_DURATION_MINUTES, el margen con el que se busca hacia atrás, y que la
+disponibilidad descarta los mismos intervalos que la detección de
+solapamientos (también tras completar la duración de citas antiguas).
+"""
+
+import importlib.util
+import os
+from datetime import timedelta
+
+from helpers import (make_app, login, db, QueryCounter, next_weekday, at, create_specialty,
+                     create_user, create_patient, create_schedule, create_appointment)
+from app.models.appointment import Appointment
+from app.models.appointment_slot import AppointmentSlot
+from app.models.schedule_template import ScheduleTemplate
+from app.models.specialty import Specialty
+from app.models.work_schedule import WorkSchedule
+
+
+def test_overlapping_intervals_and_statuses():
+    """Solapamientos parciales, bordes contiguos y estados activos"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        specialty = create_specialty()
+        doctor = create_user('doctor1', 'doctor', specialty)
+        other_doctor = create_user('doctor2', 'doctor', specialty)
+        patient = create_patient('70000001')
+        other_patient = create_patient('70000002')
+        free = [create_patient(f'7100000{i}') for i in range(3)]
+        monday = next_weekday(0)
+
+        # 09:00-09:45 en triage, 11:00-11:30 cancelada
+        create_appointment(patient, doctor, at(monday, 9, 0), status='in_triage', duration=45)
+        create_appointment(patient, doctor, at(monday, 11, 0), status='cancelled')
+        # Historia antigua que no debe leerse
+        for day in range(1, 200):
+            create_appointment(other_patient, doctor, at(monday - timedelta(days=day), 9, 0),
+                               status='completed', flush=False)
+        db.session.commit()
+
+        def candidate(doctor_obj, patient_obj, hour, minute, duration=30):
+            return {'doctor_id': doctor_obj.id, 'patient_id': patient_obj.id,
+                    'date_time': at(monday, hour, minute), 'duration': duration}
+
+        candidates = [
+            candidate(doctor, free[0], 9, 30, 15),      # dentro de 09:00-09:45
+            candidate(doctor, free[1], 9, 45),          # contiguo: sin conflicto
+            candidate(other_doctor, patient, 8, 45),    # paciente ocupado desde 09:00
+            candidate(other_doctor, free[2], 11, 0),    # la cancelada no cuenta
+            candidate(doctor, other_patient, 8, 30),    # contiguo por la izquierda
+        ]
+        with QueryCounter() as counter:
+            result = Appointment.find_conflicts(candidates)
+        assert counter.count == 1
+        assert [sorted(kind for kind, _ in item) for item in result] == [['doctor'], [], ['patient'], [], []]
+        print("✅ Solapamientos por intervalo detectados con una consulta")
+
+
+def test_batch_conflicts_within_candidates():
+    """Filas del mismo lote que se superponen entre sí"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        specialty = create_specialty()
+        doctor = create_user('doctor1', 'doctor', specialty)
+        patient = create_patient('70000001')
+        other_patient = create_patient('70000002')
+        db.session.commit()
+        monday = next_weekday(0)
+
+        result = Appointment.find_conflicts([
+            {'doctor_id': doctor.id, 'patient_id': patient.id, 'date_time': at(monday, 8, 0), 'duration': 60},
+            {'doctor_id': doctor.id, 'patient_id': other_patient.id, 'date_time': at(monday, 8, 30), 'duration': 30},
+        ])
+        assert result[0] == []
+        assert result[1] == [('doctor', 0)]
+
+
+def test_receptionist_form_rejects_overlaps():
+    """El formulario usa la duración del horario y rechaza citas superpuestas"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        specialty = create_specialty()
+        doctor = create_user('doctor1', 'doctor', specialty)
+        receptionist = create_user('recepcion', 'receptionist')
+        patient = create_patient('70000001')
+        other_patient = create_patient('70000002')
+        monday = next_weekday(0)
+        create_schedule(doctor, 0, duration=40)
+        db.session.commit()
+        doctor_id, specialty_id = doctor.id, specialty.id
+        patient_id, other_patient_id = patient.id, other_patient.id
+
+        client = app.test_client()
+        login(client, receptionist)
+
+        def book(patient_id, hour, minute):
+            return client.post('/receptionist/appointments/new', data={
+                'patient_id': patient_id, 'doctor_id': doctor_id, 'specialty_id': specialty_id,
+                'appointment_date': monday.isoformat(), 'appointment_time': f'{hour:02d}:{minute:02d}'
+            })
+
+        assert book(patient_id, 8, 0).status_code == 302
+        created = Appointment.query.filter_by(doctor_id=doctor_id).one()
+        assert created.duration == 40
+
+        # 08:30 cae dentro de 08:00-08:40
+        response = book(other_patient_id, 8, 30)
+        assert response.status_code == 200
+        assert 'se superpone' in response.get_data(as_text=True)
+        assert Appointment.query.count() == 1
+
+        assert book(other_patient_id, 8, 40).status_code == 302
+        assert Appointment.query.count() == 2
+
+
+def test_durations_capped_for_lookback():
+    """Horarios, plantillas y especialidades no superan MAX_DURATION_MINUTES"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        limit = Appointment.MAX_DURATION_MINUTES
+        specialty = create_specialty()
+        doctor = create_user('doctor1', 'doctor', specialty)
+        admin = create_user('admin', 'admin')
+        patient = create_patient('70000001')
+        monday = next_weekday(0)
+        db.session.commit()
+
+        client = app.test_client()
+        login(client, admin)
+        client.post('/admin/specialties/add', data={'name': 'Cirugía', 'consultation_duration': limit + 60,
+                                                    'base_price': 100, 'is_active': '1'})
+        assert Specialty.query.filter_by(name='Cirugía').count() == 0
+        schedule_form = {'day_of_week': 0, 'start_time': '08:00', 'end_time': '18:00',
+                         'start_date': monday.isoformat()}
+        client.post(f'/admin/work-schedules/create/{doctor.id}',
+                    data=dict(schedule_form, appointment_duration=limit + 60))
+        assert WorkSchedule.query.filter_by(doctor_id=doctor.id).count() == 0
+        template = ScheduleTemplate(name='Larga', start_time=at(monday, 8).time(), end_time=at(monday, 18).time(),
+                                    appointment_duration=limit + 60)
+        template.days = [0]
+        assert any(str(limit) in error for error in template.validate())
+
+        # Un horario previo con más duración se acota al reservar
+        create_schedule(doctor, 0, end=at(monday, 18).time(), duration=limit + 60)
+        duration = Appointment.resolve_duration(doctor.id, specialty.id, at(monday, 8))
+        assert duration == limit
+        create_appointment(patient, doctor, at(monday, 8), duration=duration)
+        late = {'doctor_id': doctor.id, 'patient_id': create_patient('70000002').id,
+                'date_time': at(monday, 8) + timedelta(minutes=limit - 5), 'duration': 30}
+        assert [kind for kind, _ in Appointment.find_conflicts([late])[0]] == ['doctor']
+        print(f"✅ Duraciones limitadas a {limit} minutos en formularios, plantillas y reservas")
+
+
+def _backfill_migration():
+    """Módulo de la migración que completa la duración de las citas"""
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend', 'migrations',
+                        'versions', 'a4c9e1d7b352_backfill_appointment_durations.py')
+    spec = importlib.util.spec_from_file_location('backfill_appointment_durations', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_availability_matches_conflicts_for_legacy_durations():
+    """Las dos vías de disponibilidad sólo ofrecen horarios que se pueden reservar"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        doctor = create_user('doctor1', 'doctor', create_specialty())
+        receptionist = create_user('recepcion', 'receptionist')
+        patient = create_patient('70000001')
+        other = create_patient('70000002')
+        monday = next_weekday(0)
+        create_schedule(doctor, 0, duration=15)
+        # Cita antigua con la duración por defecto de la columna (30 min)
+        legacy = create_appointment(patient, doctor, at(monday, 8, 0))
+        db.session.commit()
+        assert legacy.duration == 30
+
+        def bookable(when):
+            candidate = {'doctor_id': doctor.id, 'patient_id': other.id, 'date_time': when, 'duration': 15}
+            return not Appointment.find_conflicts([candidate])[0]
+
+        def offered():
+            live = WorkSchedule.get_available_times(doctor.id, monday)
+            AppointmentSlot.regenerate_for_doctor(doctor.id, weeks=1)
+            db.session.commit()
+            assert AppointmentSlot.get_available_times(doctor.id, monday) == live
+            return live
+
+        client = app.test_client()
+        login(client, receptionist)
+        times = offered()
+        assert at(monday, 8, 15).time() not in times and not bookable(at(monday, 8, 15))
+        assert all(bookable(at(monday, slot.hour, slot.minute)) for slot in times)
+        response = client.get(f'/receptionist/api/available-times?doctor_id={doctor.id}&date={monday}')
+        assert '08:15' not in response.get_json()['available_times']
+
+        # La migración asigna la duración del horario y libera las 08:15
+        assert _backfill_migration().backfill_durations(db.session.connection()) == 1
+        db.session.commit()
+        db.session.expire_all()
+        assert legacy.duration == 15
+        times = offered()
+        assert at(monday, 8, 15).time() in times and bookable(at(monday, 8, 15))
+        print(f"✅ {len(times)} horarios ofrecidos, todos reservables antes y después de migrar duraciones")
+
+
+if __name__ == '__main__':
+    test_overlapping_intervals_and_statuses()
+    test_batch_conflicts_within_candidates()
+    test_receptionist_form_rejects_overlaps()
+    test_durations_capped_for_lookback()
+    test_availability_matches_conflicts_for_legacy_durations()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Prueba de los contadores clínicos desnormalizados de pacientes.
+
+Verifica que las altas, bajas y cambios de registros médicos actualizan
+consultation_count, primer/último registro, fecha y doctor de la última
+consulta en la misma transacción (y se revierten con ella), que los
+métodos del paciente ya no consultan medical_records, y que la
+verificación detecta y la recarga corrige los cambios hechos fuera del ORM.
+"""
+
+from datetime import datetime, timedelta
+
+from helpers import make_app, db, QueryCounter, create_specialty, create_user, create_patient
+from app.models.medical_record import MedicalRecord
+from app.models.patient import Patient
+from app.utils.clinical_counters import find_mismatches, refresh_counters
+
+DAY = datetime(2025, 3, 10, 9, 0)
+
+
+def _record(patient, doctor, when, **fields):
+    record = MedicalRecord(patient_id=patient.id, doctor_id=doctor.id, consultation_date=when,
+                           diagnosis=fields.pop('diagnosis', 'Control'), **fields)
+    db.session.add(record)
+    return record
+
+
+def _counters(patient):
+    return (patient.consultation_count, patient.first_record_id, patient.last_record_id,
+            patient.last_consultation_at, patient.last_doctor_id)
+
+
+def test_counters_follow_writes():
+    """Altas, bajas y cambios actualizan los contadores en la misma transacción"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        specialty = create_specialty()
+        doctor = create_user('doctor', 'doctor', specialty)
+        other_doctor = create_user('doctor2', 'doctor', specialty)
+        patient = create_patient('60000001')
+        other = create_patient('60000002')
+        db.session.commit()
+        assert _counters(patient) == (0, None, None, None, None) and patient.is_new_patient()
+
+        first = _record(patient, doctor, DAY)
+        db.session.commit()
+        assert _counters(patient) == (1, first.id, first.id, DAY, doctor.id)
+
+        # Una consulta registrada con fecha anterior no reemplaza a la última
+        latest = _record(patient, other_doctor, DAY + timedelta(days=30))
+        earlier = _record(patient, doctor, DAY - timedelta(days=30), created_at=datetime(2025, 1, 1))
+        db.session.commit()
+        assert _counters(patient) == (3, earlier.id, latest.id, DAY + timedelta(days=30), other_doctor.id)
+
+        # Al revertir, los contadores también vuelven atrás
+        _record(patient, doctor, DAY + timedelta(days=60))
+        db.session.flush()
+        assert patient.consultation_count == 4
+        db.session.rollback()
+        assert patient.consultation_count == 3
+
+        db.session.delete(latest)
+        db.session.commit()
+        assert _counters(patient) == (2, earlier.id, first.id, DAY, doctor.id)
+
+        # Mover un registro a otro paciente recalcula ambos
+        first.patient_id = other.id
+        db.session.commit()
+        assert _counters(patient) == (1, earlier.id, earlier.id, DAY - timedelta(days=30), doctor.id)
+        assert _counters(other) == (1, first.id, first.id, DAY, doctor.id)
+
+        earlier.consultation_date = DAY + timedelta(days=90)
+        earlier.doctor_id = other_doctor.id
+        db.session.commit()
+        assert patient.last_consultation_at == DAY + timedelta(days=90) and patient.last_doctor_id == other_doctor.id
+
+        # Borrar el paciente borra sus registros en cascada
+        db.session.delete(other)
+        db.session.commit()
+        assert find_mismatches() == []
+        print("✅ Contadores actualizados con altas, bajas, cambios y rollback")
+
+
+def test_patient_methods_read_columns():
+    """Los métodos del paciente leen las columnas en lugar de contar"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        specialty = create_specialty()
+        doctor = create_user('doctor', 'doctor', specialty)
+        patient = create_patient('60000003')
+        for i in range(5):
+            _record(patient, doctor, DAY + timedelta(days=i))
+        db.session.commit()
+        patient = db.session.get(Patient, patient.id)
+
+        with QueryCounter() as counter:
+            for _ in range(10):
+                assert patient.has_medical_history() and not patient.is_new_patient()
+                assert patient.get_consultation_count() == patient.get_medical_records_count() == 5
+                assert patient.get_last_consultation().consultation_date == DAY + timedelta(days=4)
+                assert patient.get_first_consultation().consultation_date == DAY
+        assert counter.count <= 2
+        assert not any('count(' in statement.lower() for statement in counter.statements)
+
+        statuses = Patient.preload_doctor_status([patient])
+        assert statuses[patient.id]['total_consultations'] == 5
+        assert statuses[patient.id]['history_creation_date'] == patient.get_first_consultation().created_at.date()
+        print(f"✅ 40 llamadas a los métodos del paciente con {counter.count} consultas (antes una o más por llamada)")
+
+
+def test_verify_and_backfill():
+    """Los INSERT fuera del ORM se detectan y la recarga los corrige"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        specialty = create_specialty()
+        doctor = create_user('doctor', 'doctor', specialty)
+        patients = [create_patient(f'6100{i:04d}') for i in range(300)]
+        db.session.commit()
+
+        db.session.execute(MedicalRecord.__table__.insert(), [{
+            'patient_id': patients[i % 300].id, 'doctor_id': doctor.id, 'diagnosis': 'Control',
+            'consultation_date': DAY + timedelta(hours=i), 'created_at': DAY + timedelta(hours=i)
+        } for i in range(900)])
+        db.session.commit()
+
+        mismatches = find_mismatches()
+        assert len(mismatches) == 300
+        assert mismatches[0][1]['consultation_count'] == (0, 3)
+
+        assert refresh_counters() == 300
+        db.session.commit()
+        assert find_mismatches() == []
+        patient = db.session.get(Patient, patients[7].id)
+        assert patient.consultation_count == 3 and patient.last_consultation_at == DAY + timedelta(hours=607)
+        print("✅ Verificación detecta 300 pacientes desactualizados y la recarga los corrige")
+
+
+if __name__ == '__main__':
+    test_counters_follow_writes()
+    test_patient_methods_read_columns()
+    test_verify_and_backfill()
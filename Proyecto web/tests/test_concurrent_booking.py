@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Prueba de reservas concurrentes del mismo horario.
+
+Varias recepcionistas (hilos con su propia sesión y conexión) reservan a la
+vez el mismo doctor y hora: sólo una cita debe quedar activa. Se ejecuta
+sobre un archivo SQLite y, si TEST_POSTGRES_URL está definido, también sobre
+PostgreSQL.
+"""
+
+import os
+import tempfile
+import threading
+from datetime import time
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateIndex
+
+from helpers import (make_app, login, db, next_weekday, at, create_specialty, create_user,
+                     create_patient, create_schedule)
+from app.models.user import User
+from app.models.appointment import Appointment, SlotTakenError
+from app.models.appointment_slot import AppointmentSlot
+
+THREADS = 8
+
+
+def _seed(app):
+    """Doctor con horario, una recepcionista y un paciente por hilo"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        specialty = create_specialty()
+        doctor = create_user('doctor1', 'doctor', specialty)
+        receptionist = create_user('recepcion', 'receptionist')
+        patients = [create_patient(f'7000000{i}') for i in range(THREADS)]
+        monday = next_weekday(0)
+        create_schedule(doctor, 0, start=time(8, 0), end=time(10, 0))
+        AppointmentSlot.regenerate_for_doctor(doctor.id)
+        db.session.commit()
+        return {'doctor_id': doctor.id, 'specialty_id': specialty.id, 'receptionist_id': receptionist.id,
+                'patient_ids': [patient.id for patient in patients], 'monday': monday}
+
+
+def _run_parallel(target):
+    barrier = threading.Barrier(THREADS)
+    results = [None] * THREADS
+
+    def worker(index):
+        barrier.wait()
+        results[index] = target(index)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def _assert_parallel_reservations(app):
+    """Reservas directas (sin validación previa): el índice único decide"""
+    data = _seed(app)
+    slot = at(data['monday'], 8, 0)
+
+    def reserve(index):
+        with app.app_context():
+            try:
+                Appointment(patient_id=data['patient_ids'][index], doctor_id=data['doctor_id'],
+                            specialty_id=data['specialty_id'], date_time=slot, status='scheduled').reserve()
+                db.session.commit()
+                return 'booked'
+            except SlotTakenError:
+                return 'taken'
+            finally:
+                db.session.remove()
+
+    results = _run_parallel(reserve)
+    assert results.count('booked') == 1, results
+    assert results.count('taken') == THREADS - 1, results
+
+    with app.app_context():
+        booked = Appointment.query.filter_by(doctor_id=data['doctor_id'], date_time=slot).one()
+        slot_row = AppointmentSlot.query.filter_by(doctor_id=data['doctor_id'], start_time=slot).one()
+        assert (slot_row.state, slot_row.appointment_id) == ('booked', booked.id)
+
+        # Una cita cancelada libera el horario para una nueva reserva
+        booked.status = 'cancelled'
+        AppointmentSlot.release(booked)
+        db.session.commit()
+        Appointment(patient_id=data['patient_ids'][0], doctor_id=data['doctor_id'],
+                    specialty_id=data['specialty_id'], date_time=slot, status='scheduled').reserve()
+        db.session.commit()
+        assert Appointment.query.filter_by(doctor_id=data['doctor_id'], date_time=slot).count() == 2
+        db.session.remove()
+
+
+def _assert_parallel_form_submissions(app):
+    """Envíos simultáneos del formulario: una cita creada y el resto rechazadas"""
+    data = _seed(app)
+    with app.app_context():
+        receptionist = db.session.get(User, data['receptionist_id'])
+
+    def submit(index):
+        with app.app_context():
+            client = app.test_client()
+            login(client, receptionist)
+            response = client.post('/receptionist/appointments/new', data={
+                'patient_id': data['patient_ids'][index], 'doctor_id': data['doctor_id'],
+                'specialty_id': data['specialty_id'], 'appointment_date': data['monday'].isoformat(),
+                'appointment_time': '09:00'
+            })
+            db.session.remove()
+            return response.status_code
+
+    results = _run_parallel(submit)
+    assert results.count(302) == 1, results
+
+    with app.app_context():
+        assert Appointment.query.filter_by(doctor_id=data['doctor_id']).count() == 1
+        db.session.remove()
+
+
+def test_parallel_bookings_sqlite():
+    """Hilos concurrentes sobre un archivo SQLite (una conexión por hilo)"""
+    path = os.path.join(tempfile.mkdtemp(), 'concurrency.sqlite')
+    app = make_app(SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}')
+    _assert_parallel_reservations(app)
+    _assert_parallel_form_submissions(app)
+    print(f"✅ SQLite: {THREADS} reservas simultáneas, una sola cita activa")
+
+
+def test_parallel_bookings_postgresql():
+    """Mismo escenario en PostgreSQL si hay una base de pruebas disponible"""
+    url = os.environ.get('TEST_POSTGRES_URL')
+    if not url:
+        print("⚠️  TEST_POSTGRES_URL no definido: se omite la prueba en PostgreSQL")
+        return
+    app = make_app(SQLALCHEMY_DATABASE_URI=url)
+    _assert_parallel_reservations(app)
+    _assert_parallel_form_submissions(app)
+    with app.app_context():
+        db.drop_all()
+    print(f"✅ PostgreSQL: {THREADS} reservas simultáneas, una sola cita activa")
+
+
+def test_partial_unique_index_ddl():
+    """El índice es parcial (sólo estados activos) en ambos dialectos"""
+    index = next(index for index in Appointment.__table__.indexes
+                 if index.name == 'uq_appointments_doctor_active_slot')
+    for dialect in (sqlite.dialect(), postgresql.dialect()):
+        ddl = str(CreateIndex(index).compile(dialect=dialect))
+        assert ddl.startswith('CREATE UNIQUE INDEX uq_appointments_doctor_active_slot')
+        assert "WHERE status IN ('scheduled', 'in_triage', 'ready_for_doctor', 'in_consultation')" in ddl
+
+
+if __name__ == '__main__':
+    test_parallel_bookings_sqlite()
+    test_parallel_bookings_postgresql()
+    test_partial_unique_index_ddl()
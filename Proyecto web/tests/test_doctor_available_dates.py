@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Prueba de las fechas disponibles de un doctor con cupos restantes.
+
+Verifica que el cálculo por aritmética de calendario coincide con el
+recorrido día por día, que los días completos se excluyen, que las citas
+se cargan con una sola consulta, y que hoy y los horarios de especialidad
+coinciden con los horarios disponibles de get_available_times_for_doctors().
+"""
+
+from datetime import date, datetime, time, timedelta
+
+from helpers import (make_app, login, db, QueryCounter, next_weekday, at, create_specialty,
+                     create_user, create_patient, create_schedule, create_appointment)
+from app.models.work_schedule import WorkSchedule
+
+
+def test_available_dates_with_remaining_slots():
+    """Fechas válidas por vigencia y día, con cupos y sin días completos"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        specialty = create_specialty()
+        doctor = create_user('doctor1', 'doctor', specialty)
+        receptionist = create_user('recepcion', 'receptionist')
+        patient = create_patient('70000001')
+
+        monday = next_weekday(0)
+        # Lunes 08:00-10:00 (4 slots) y miércoles con máximo 2 pacientes, vigencias distintas
+        create_schedule(doctor, 0, start=time(8, 0), end=time(10, 0), valid_from=date.today(),
+                        valid_to=date.today() + timedelta(days=60))
+        create_schedule(doctor, 2, start=time(14, 0), end=time(18, 0), max_patients_per_day=2,
+                        valid_from=monday + timedelta(days=14), valid_to=None)
+
+        # Lunes próximo completo, el siguiente con una cita
+        for hour, minute in ((8, 0), (8, 30), (9, 0), (9, 30)):
+            create_appointment(patient, doctor, at(monday, hour, minute))
+        create_appointment(patient, doctor, at(monday + timedelta(days=7), 8, 0))
+        create_appointment(patient, doctor, at(monday + timedelta(days=7), 8, 30), status='cancelled')
+        db.session.commit()
+
+        schedules = WorkSchedule.query.filter_by(doctor_id=doctor.id, is_active=True).all()
+        start, end = date.today(), date.today() + timedelta(days=90)
+        with QueryCounter() as counter:
+            remaining = WorkSchedule.get_available_dates(doctor.id, start, end, schedules=schedules)
+        assert counter.count == 1
+
+        # Referencia: recorrido día por día con los horarios válidos
+        expected_days = [start + timedelta(days=i) for i in range(91)
+                         if any(s.is_valid_for_date(start + timedelta(days=i)) for s in schedules)]
+        expected_days = [day for day in expected_days if day != monday and day != date.today()]
+        assert [day for day in remaining if day != date.today()] == expected_days
+
+        assert monday not in remaining
+        assert remaining[monday + timedelta(days=7)] == 3
+        assert remaining[monday + timedelta(days=16)] == 2
+        print(f"✅ {len(remaining)} fechas con cupo; lunes completo excluido")
+
+        client = app.test_client()
+        login(client, receptionist)
+        data = client.get(f'/receptionist/api/doctors/{doctor.id}/available-dates').get_json()
+        assert data['success']
+        assert monday.strftime('%Y-%m-%d') not in data['available_dates']
+        assert data['slots_remaining'][(monday + timedelta(days=7)).strftime('%Y-%m-%d')] == 3
+
+
+def test_today_and_specialty_schedules_match_available_times():
+    """Hoy cuenta sólo slots y citas futuras; se prefieren los horarios de la especialidad"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        specialty = create_specialty('Cardiología')
+        general = create_specialty()
+        doctor = create_user('doctor1', 'doctor', specialty)
+        patient = create_patient('70000001')
+        today = date.today()
+
+        # Hoy: grilla de todo el día con citas pasadas, futuras y una fuera de la grilla
+        create_schedule(doctor, today.weekday(), start=time(0, 0), end=time(23, 59))
+        now = datetime.now()
+        past = [at(today, 0, 0), at(today, 0, 30)] if now.time() > time(0, 30) else []
+        future = [at(today, 23, 30)] if now.time() < time(23, 30) else []
+        for when in past + future:
+            create_appointment(patient, doctor, when)
+        create_appointment(patient, doctor, at(today, 23, 45))
+
+        # Lunes próximo: horario general 08-12 y de la especialidad 08-10 superpuestos
+        monday = next_weekday(0) + timedelta(days=7 if today.weekday() == 0 else 0)
+        create_schedule(doctor, 0, start=time(8, 0), end=time(12, 0)).specialty_id = general.id
+        create_schedule(doctor, 0, start=time(8, 0), end=time(10, 0))
+        create_appointment(patient, doctor, at(monday, 11, 0))
+        db.session.commit()
+
+        remaining = WorkSchedule.get_available_dates(doctor.id, today, monday, specialty_id=specialty.id)
+        for day in (today, monday):
+            times = WorkSchedule.get_available_times_for_doctors([doctor.id], day, specialty.id)[doctor.id]
+            if day == today:
+                times = [slot for slot in times if slot > datetime.now().time()]
+            assert remaining.get(day, 0) == len(times), day
+        assert remaining[monday] == 4
+        print(f"✅ Hoy con {remaining.get(today, 0)} slots libres futuros; lunes con los 4 de la especialidad")
+
+
+if __name__ == '__main__':
+    test_available_dates_with_remaining_slots()
+    test_today_and_specialty_schedules_match_available_times()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Prueba del dashboard del doctor (app.utils.doctor_dashboard).
+
+Verifica que las listas de citas, el estado de historia clínica de cada
+paciente y los contadores coinciden con las consultas por separado, y que
+el dashboard usa menos de 5 sentencias SQL sin importar cuántos pacientes
+involucra.
+"""
+
+from datetime import date, datetime, timedelta
+
+from helpers import (make_app, login, db, QueryCounter, create_specialty, create_user,
+                     create_patient, create_appointment)
+from app.models.appointment import Appointment
+from app.models.medical_record import MedicalRecord
+from app.models.patient import Patient
+from app.models.triage import Triage
+from app.utils.doctor_dashboard import doctor_dashboard
+
+STATUSES = ('scheduled', 'in_triage', 'ready_for_doctor', 'completed')
+
+
+def _populate(count):
+    """Citas de hoy, pasadas (listas/en triage) y futuras; historia en la mitad de los pacientes"""
+    specialty = create_specialty()
+    doctor = create_user('doctor', 'doctor', specialty)
+    nurse = create_user('enfermera', 'nurse')
+    today = datetime.combine(date.today(), datetime.min.time())
+    records, triages = [], []
+    for i in range(count):
+        patient = create_patient(f'7{i:07d}', first_name=f'Paciente{i}')
+        when = today + timedelta(hours=7, minutes=5 * i)
+        appointment = create_appointment(patient, doctor, when, status=STATUSES[i % 4])
+        create_appointment(patient, doctor, today + timedelta(days=1 + i, hours=9))
+        if i % 5 == 0:
+            create_appointment(patient, doctor, today - timedelta(days=1) + timedelta(hours=8, minutes=i),
+                               status='ready_for_doctor')
+        if i % 2 == 0:
+            records.append({
+                'patient_id': patient.id, 'doctor_id': doctor.id,
+                # Uno de cada tres registros sólo guarda historia clínica (no es consulta real)
+                'diagnosis': None if i % 3 == 0 else 'Control', 'observations': 'ANTECEDENTES PERSONALES: ninguno',
+                'consultation_date': today - timedelta(days=i % 3), 'created_at': datetime(2024, 1, 1 + i % 28)
+            })
+        if i % 4 == 1:
+            triages.append({
+                'patient_id': patient.id, 'appointment_id': appointment.id, 'nurse_id': nurse.id,
+                'chief_complaint': 'Control', 'priority_level': 'media', 'status': 'completed',
+                'created_at': datetime.utcnow()
+            })
+    db.session.execute(MedicalRecord.__table__.insert(), records)
+    if triages:
+        db.session.execute(Triage.__table__.insert(), triages)
+    db.session.commit()
+    return doctor
+
+
+def _expected(doctor_id):
+    """Listas y estados calculados con las consultas por separado del dashboard original"""
+    today = date.today()
+    start = datetime.combine(today, datetime.min.time())
+    end = start + timedelta(days=1)
+    query = Appointment.query.filter(Appointment.doctor_id == doctor_id)
+    lists = {
+        'today_appointments': query.filter(Appointment.date_time >= start, Appointment.date_time < end,
+                                           Appointment.status != 'completed').order_by(Appointment.date_time).all(),
+        'ready_appointments': query.filter(Appointment.status == 'ready_for_doctor').order_by(Appointment.date_time).all(),
+        'in_triage_appointments': query.filter(Appointment.status == 'in_triage').order_by(Appointment.date_time).all(),
+        'upcoming_appointments': query.filter(Appointment.date_time >= end).order_by(Appointment.date_time).limit(5).all()
+    }
+    result = {name: [appointment.id for appointment in items] for name, items in lists.items()}
+    result['statuses'] = {appointment.patient_id: appointment.patient.get_patient_status_for_doctor()
+                          for appointment in lists['today_appointments'] + lists['ready_appointments']}
+    result['triage'] = {appointment.id: appointment.has_triage() for appointment in lists['today_appointments']}
+    return result
+
+
+def test_dashboard_matches_separate_queries():
+    """Listas, estados de historia y triage iguales a las consultas por separado"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        doctor_id = _populate(24).id
+        expected = _expected(doctor_id)
+        db.session.expire_all()
+
+        data = doctor_dashboard(doctor_id)
+        for name in ('today_appointments', 'ready_appointments', 'in_triage_appointments', 'upcoming_appointments'):
+            assert [appointment.id for appointment in data[name]] == expected[name], name
+        with QueryCounter() as counter:
+            statuses = {appointment.patient_id: appointment.patient_status
+                        for appointment in data['today_appointments'] + data['ready_appointments']}
+            triage = {appointment.id: appointment.has_triage() for appointment in data['today_appointments']}
+            assert all(appointment.patient.get_patient_status_for_doctor() is appointment.patient_status
+                       for appointment in data['today_appointments'])
+        assert counter.count == 0
+        assert statuses == expected['statuses'] and triage == expected['triage']
+
+        real = [record for record in MedicalRecord.query.filter_by(doctor_id=doctor_id).all()
+                if record.diagnosis]
+        month_start = datetime(date.today().year, date.today().month, 1)
+        assert data['consultations_this_month'] == len([r for r in real if r.consultation_date >= month_start])
+        assert data['my_patients_count'] == Patient.query.count()
+        assert all(record.diagnosis for record in data['recent_consultations'])
+        print(f"✅ {len(data['today_appointments'])} citas de hoy, {len(data['ready_appointments'])} listas: "
+              f"mismos estados sin consultas por paciente")
+
+
+def _count_dashboard_queries(count):
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        doctor = _populate(count)
+        doctor_id = doctor.id
+        client = app.test_client()
+        login(client, doctor)
+        db.session.expire_all()
+        with QueryCounter() as counter:
+            doctor_dashboard(doctor_id)
+        response = client.get('/doctor/dashboard')
+        assert response.status_code == 200
+        assert 'Paciente1 ' in response.get_data(as_text=True)
+        return counter.count
+
+
+def test_dashboard_constant_queries():
+    """Menos de 5 sentencias SQL con 10 y con 120 pacientes"""
+    small = _count_dashboard_queries(10)
+    large = _count_dashboard_queries(120)
+    print(f"✅ Sentencias SQL del dashboard: {small} con 10 pacientes, {large} con 120 pacientes")
+    assert small == large and large < 5
+
+
+if __name__ == '__main__':
+    test_dashboard_matches_separate_queries()
+    test_dashboard_constant_queries()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Prueba de la búsqueda del primer horario libre por especialidad.
+
+Compara el resultado con la consulta doctor por doctor / día por día y
+mide consultas y latencia para 30 doctores en un horizonte de 90 días.
+"""
+
+import time as timer
+from datetime import date, time, timedelta
+
+from helpers import (make_app, login, db, QueryCounter, at, create_specialty, create_user,
+                     create_patient, create_schedule, create_appointment)
+from app.models.user import User
+from app.models.work_schedule import WorkSchedule
+
+NUM_DOCTORS = 30
+
+
+def setup_data():
+    specialty = create_specialty('Pediatría')
+    other = create_specialty('Cardiología')
+    receptionist = create_user('recepcion', 'receptionist')
+    patient = create_patient('70000001')
+    doctors = []
+    for i in range(NUM_DOCTORS):
+        doctor = create_user(f'doctor{i}', 'doctor', specialty)
+        doctors.append(doctor)
+        for weekday in range(5):
+            create_schedule(doctor, weekday, start=time(8, 0), end=time(14, 0), duration=20,
+                            valid_from=date.today(), valid_to=date.today() + timedelta(days=90))
+    cardiologist = create_user('cardio', 'doctor', other)
+    create_schedule(cardiologist, date.today().weekday(), valid_from=date.today())
+
+    # Ocupar por completo las dos primeras semanas de todos los pediatras
+    for doctor in doctors:
+        day = date.today() + timedelta(days=1)
+        while day < date.today() + timedelta(days=15):
+            if day.weekday() < 5:
+                for minute in range(0, 6 * 60, 20):
+                    create_appointment(patient, doctor, at(day, 8) + timedelta(minutes=minute), flush=False)
+            day += timedelta(days=1)
+    db.session.commit()
+    return specialty, receptionist, [doctor.id for doctor in doctors]
+
+
+def brute_force(doctor_ids, specialty_id, start_date, end_date, limit):
+    """Referencia: get_available_times doctor por doctor y día por día"""
+    from datetime import datetime
+    found = []
+    day = start_date
+    while day <= end_date:
+        for doctor_id in doctor_ids:
+            for slot in WorkSchedule.get_available_times(doctor_id, day, specialty_id):
+                moment = datetime.combine(day, slot)
+                if moment > datetime.now():
+                    found.append((moment, doctor_id))
+        day += timedelta(days=1)
+    return sorted(found)[:limit]
+
+
+def test_first_available_across_doctors():
+    """Los primeros slots coinciden con la referencia con consultas por lote, no por doctor/día"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        specialty, receptionist, doctor_ids = setup_data()
+        specialty_id, receptionist_id = specialty.id, receptionist.id
+        start, end = date.today(), date.today() + timedelta(days=90)
+
+        # Primera llamada para compilar las sentencias (caché de SQLAlchemy)
+        WorkSchedule.find_first_available(specialty_id, start, end, limit=10)
+        db.session.expunge_all()
+
+        with QueryCounter() as counter:
+            started = timer.perf_counter()
+            slots = WorkSchedule.find_first_available(specialty_id, start, end, limit=10)
+            elapsed_ms = (timer.perf_counter() - started) * 1000
+        print(f"✅ {len(slots)} slots en {elapsed_ms:.1f} ms con {counter.count} consultas "
+              f"({NUM_DOCTORS} doctores, 90 días; objetivo < 50 ms)")
+        # Horarios + un bloque de citas por cada 14 días recorridos (aquí 2 bloques)
+        assert counter.count == 3
+
+        expected = brute_force(doctor_ids, specialty_id, start, start + timedelta(days=21), 10)
+        assert [(slot, doctor.id) for slot, doctor in slots] == expected
+        assert all(slot.date() >= date.today() + timedelta(days=15) for slot, _ in slots)
+
+        # Preferencia horaria: sólo a partir de las 12:00
+        afternoon = WorkSchedule.find_first_available(specialty_id, start, end, time_from=time(12, 0), limit=5)
+        assert all(slot.time() >= time(12, 0) for slot, _ in afternoon)
+
+        client = app.test_client()
+        login(client, db.session.get(User, receptionist_id))
+        response = client.get(f'/receptionist/api/specialties/{specialty_id}/first-available?limit=3&time_to=09:00')
+        data = response.get_json()
+        assert data['success'] and data['total'] == 3
+        assert all(slot['time'] < '09:00' for slot in data['slots'])
+
+
+if __name__ == '__main__':
+    test_first_available_across_doctors()
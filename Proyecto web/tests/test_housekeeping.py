@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Prueba del mantenimiento nocturno de citas (HousekeepingRun).
+
+Verifica que las reglas cierran sólo las citas vencidas de cada estado,
+que se aplican con UPDATE por tramos sin cargar objetos ORM, que una
+ejecución interrumpida se retoma desde el último tramo con el mismo corte
+y que volver a ejecutar no modifica nada (idempotencia).
+"""
+
+from datetime import datetime, timedelta
+
+from helpers import (make_app, db, QueryCounter, create_specialty, create_user, create_patient,
+                     create_appointment)
+from app.models.appointment import Appointment
+from app.models.medical_record import MedicalRecord
+from app.models.housekeeping import HousekeepingRun
+
+
+def _populate():
+    specialty = create_specialty()
+    doctor = create_user('doctor1', 'doctor', specialty)
+    patient = create_patient('91000001')
+    now = datetime.now().replace(second=0, microsecond=0)
+    old = now - timedelta(days=3)
+    stuck = now - timedelta(days=2)
+    expected = {}
+
+    def add(status, when, final, record=False):
+        appointment = create_appointment(patient, doctor, when, status=status)
+        if record:
+            db.session.add(MedicalRecord(patient_id=patient.id, doctor_id=doctor.id,
+                                         appointment_id=appointment.id, consultation_date=when))
+        expected[appointment.id] = final
+
+    for i in range(45):
+        add('scheduled', old - timedelta(minutes=30 * i), 'no_show')             # vencidas
+    add('scheduled', now - timedelta(hours=1), 'scheduled')                      # dentro de la gracia
+    add('scheduled', now + timedelta(days=1), 'scheduled')                       # futura
+    add('in_triage', stuck, 'incomplete')
+    add('ready_for_doctor', stuck - timedelta(hours=1), 'incomplete')
+    add('in_triage', now - timedelta(hours=2), 'in_triage')                      # en curso hoy
+    add('in_consultation', stuck - timedelta(hours=2), 'completed', record=True)
+    add('in_consultation', stuck - timedelta(hours=3), 'incomplete')
+    add('completed', stuck - timedelta(hours=4), 'completed')
+    db.session.commit()
+    return expected
+
+
+def _statuses():
+    return dict(db.session.query(Appointment.id, Appointment.status).all())
+
+
+def test_rules_close_stale_states():
+    """Cada regla cierra sólo las citas vencidas de su estado"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        expected = _populate()
+
+        with QueryCounter() as counter:
+            runs = HousekeepingRun.run_all(chunk_size=10)
+        db.session.expire_all()
+        assert _statuses() == expected
+
+        touched = {run.rule: run.rows_affected for run in runs}
+        assert touched == {'stale_scheduled': 45, 'abandoned_triage': 2,
+                           'abandoned_consultation_with_record': 1, 'abandoned_consultation': 1,
+                           'expired_waitlist': 0}
+        assert next(run for run in runs if run.rule == 'stale_scheduled').chunks == 5
+        incomplete = Appointment.query.filter_by(status='incomplete').all()
+        assert len(incomplete) == 3 and all('Cerrada automáticamente' in a.notes for a in incomplete)
+        # Sólo las citas programadas vencidas cuentan como inasistencia
+        assert Appointment.query.filter_by(status='no_show').count() == 45
+        assert Appointment.query.filter_by(status='cancelled').count() == 0
+
+        # Sin SELECT de filas completas de appointments: sólo ids límite y UPDATE
+        loads = [s for s in counter.statements if s.lstrip().upper().startswith('SELECT') and 'appointments.patient_id' in s]
+        assert not loads
+        print(f"✅ Filas por regla: {touched} en {counter.count} sentencias")
+
+
+def test_resume_and_idempotency():
+    """Una ejecución interrumpida se retoma y repetirla no cambia nada"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        expected = _populate()
+
+        partial = HousekeepingRun.run_rule('stale_scheduled', chunk_size=10, max_chunks=2)
+        assert (partial.status, partial.rows_affected) == ('running', 20)
+        cutoff = partial.cutoff
+
+        resumed = HousekeepingRun.run_rule('stale_scheduled', chunk_size=10)
+        assert resumed.id == partial.id and resumed.cutoff == cutoff
+        assert (resumed.status, resumed.rows_affected) == ('completed', 45)
+
+        HousekeepingRun.run_all(chunk_size=10)
+        before = _statuses()
+        again = HousekeepingRun.run_all(chunk_size=10)
+        assert all(run.rows_affected == 0 and run.status == 'completed' for run in again)
+        assert _statuses() == before == expected
+        assert HousekeepingRun.query.count() == 1 + 2 * len(HousekeepingRun.RULES)
+        print("✅ Ejecución retomada con el mismo corte; segunda pasada sin cambios")
+
+
+if __name__ == '__main__':
+    test_rules_close_stale_states()
+    test_resume_and_idempotency()
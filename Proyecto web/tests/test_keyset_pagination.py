@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Prueba de la paginación por cursor (keyset) de los listados de citas.
+
+Verifica que recorrer las páginas hacia adelante y hacia atrás devuelve
+todas las citas una sola vez en orden (date_time, id) aunque haya
+horarios repetidos, que el cursor conserva los filtros, que cada página
+usa LIMIT sin cargar el historial completo y que el total se cachea.
+"""
+
+import re
+from datetime import timedelta
+
+from helpers import (make_app, login, db, QueryCounter, next_weekday, at, create_specialty,
+                     create_user, create_patient, create_appointment)
+from app.models.appointment import Appointment
+from app.utils.pagination import keyset_paginate, decode_cursor, count_cache
+
+NEXT_LINK = re.compile(r'href="[^"]*cursor=([^"&]+)"[^>]*>\s*Siguientes')
+PREV_LINK = re.compile(r'href="[^"]*cursor=([^"&]+)"[^>]*>\s*<i class="fas fa-chevron-left"')
+
+
+def _populate(count):
+    """Citas de tres doctores; cada horario se repite para probar el desempate por id"""
+    specialty = create_specialty()
+    doctors = [create_user(f'doctor{i}', 'doctor', specialty) for i in range(3)]
+    patient = create_patient('90000001')
+    start = next_weekday(0) - timedelta(days=70)
+    for i in range(count):
+        status = 'cancelled' if i % 4 == 0 else 'completed'
+        create_appointment(patient, doctors[i % 3], at(start + timedelta(days=i // 6), 8 + (i % 6) // 3), status=status)
+    db.session.commit()
+    return doctors
+
+
+def _walk(query, per_page):
+    """Recorrer todas las páginas hacia adelante y luego hacia atrás"""
+    pages, cursor = [], None
+    while True:
+        page = keyset_paginate(query, (Appointment.date_time, Appointment.id), cursor=cursor, per_page=per_page)
+        pages.append([appointment.id for appointment in page])
+        if not page.has_next:
+            break
+        cursor = decode_cursor(page.next_cursor)
+
+    backwards = [pages[-1]]
+    while page.has_prev:
+        page = keyset_paginate(query, (Appointment.date_time, Appointment.id),
+                               cursor=decode_cursor(page.prev_cursor), per_page=per_page)
+        backwards.insert(0, [appointment.id for appointment in page])
+    return pages, backwards
+
+
+def test_walk_forward_and_back():
+    """Todas las citas una vez, en orden, en ambos sentidos"""
+    app = make_app()
+    with app.app_context(), app.test_request_context():
+        db.create_all()
+        _populate(130)
+        expected = [appointment.id for appointment in
+                    Appointment.query.order_by(Appointment.date_time.desc(), Appointment.id.desc()).all()]
+
+        pages, backwards = _walk(Appointment.query, 25)
+        assert [len(page) for page in pages] == [25, 25, 25, 25, 25, 5]
+        assert sum(pages, []) == expected
+        assert backwards == pages
+
+        with QueryCounter() as counter:
+            page = keyset_paginate(Appointment.query, (Appointment.date_time, Appointment.id), per_page=25)
+        assert counter.count == 1 and 'LIMIT' in counter.statements[0]
+        print(f"✅ {len(expected)} citas en {len(pages)} páginas, ida y vuelta sin repetir")
+
+        # Un cursor alterado se ignora (se vuelve a la primera página)
+        assert decode_cursor(page.next_cursor[:-2] + 'xx') is None
+        assert decode_cursor('basura') is None
+
+
+def test_routes_keep_filters_in_cursor():
+    """El cursor conserva los filtros y el total se calcula una vez por TTL"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        count_cache.clear()
+        doctors = _populate(130)
+        receptionist = create_user('recepcion', 'receptionist')
+        db.session.commit()
+        doctor_id = doctors[0].id
+        cancelled = Appointment.query.filter_by(status='cancelled').count()
+
+        client = app.test_client()
+        login(client, receptionist)
+        html = client.get('/receptionist/appointments?status=cancelled&per_page=10').get_data(as_text=True)
+        assert f'{cancelled} citas' in html
+        seen = html.count('fa-file-invoice-dollar')
+        with QueryCounter() as counter:
+            while NEXT_LINK.search(html):
+                token = NEXT_LINK.search(html).group(1)
+                assert decode_cursor(token)['filters']['status'] == 'cancelled'
+                html = client.get(f'/receptionist/appointments?cursor={token}').get_data(as_text=True)
+                assert 'bg-info">Programada' not in html and 'bg-primary">Completada' not in html
+                seen += html.count('fa-file-invoice-dollar')
+        assert seen == cancelled
+        assert not any('count(' in statement.lower() for statement in counter.statements)
+        assert PREV_LINK.search(html)
+        print(f"✅ Filtro de estado conservado en {cancelled} citas canceladas; total cacheado")
+
+        # Listado del doctor: sólo sus citas, paginadas
+        login(client, doctors[0])
+        own = Appointment.query.filter_by(doctor_id=doctor_id).count()
+        html = client.get('/doctor/appointments?per_page=10').get_data(as_text=True)
+        assert f'Lista de Citas ({own} resultados)' in html
+        assert NEXT_LINK.search(html)
+
+
+if __name__ == '__main__':
+    test_walk_forward_and_back()
+    test_routes_keep_filters_in_cursor()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Prueba de los eventos en vivo (SSE) de la cola de atención.
+
+Verifica que los cambios de estado de citas se publican sólo al hacer
+commit (nada si hay rollback), una vez por transacción, que cada stream
+recibe sólo los eventos de su rol/doctor, que la reconexión con
+Last-Event-ID recupera lo perdido, que los streams abiertos no retienen
+conexiones del pool, que muchos oyentes no crean hilos (ni con gevent) y
+que gunicorn usa por defecto un solo worker (el pub/sub es por proceso).
+"""
+
+import json
+import os
+import runpy
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import date
+
+from sqlalchemy.pool import QueuePool
+
+from helpers import (make_app, login, db, at, create_specialty, create_user, create_patient,
+                     create_appointment)
+from app.models.appointment import Appointment
+from app.utils.live_events import live_events
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+
+def _setup():
+    specialty = create_specialty()
+    doctor = create_user('doctor1', 'doctor', specialty)
+    other = create_user('doctor2', 'doctor', specialty)
+    nurse = create_user('enfermera', 'nurse')
+    patient = create_patient('93000001', first_name='Lucía')
+    mine = create_appointment(patient, doctor, at(date.today(), 12))
+    theirs = create_appointment(patient, other, at(date.today(), 13))
+    db.session.commit()
+    return doctor, other, nurse, mine, theirs
+
+
+def _events(chunks):
+    return [json.loads(line[len('data: '):]) for chunk in chunks
+            for line in chunk.splitlines() if line.startswith('data: ')]
+
+
+def test_publish_on_commit_only():
+    """Se publica al hacer commit, una vez por transacción; nada tras rollback"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        doctor, other, nurse, mine, theirs = _setup()
+        subscription = live_events.subscribe(lambda item: True)
+        try:
+            mine.status = 'in_triage'
+            db.session.flush()
+            assert subscription.get(timeout=0) == []
+            mine.status = 'ready_for_doctor'
+            db.session.commit()
+            events = subscription.get(timeout=0)
+            assert [(e['status'], e['previous_status'], e['patient_name']) for e in events] == \
+                [('ready_for_doctor', 'scheduled', 'Lucía Pérez')]
+
+            theirs.status = 'in_triage'
+            db.session.flush()
+            db.session.rollback()
+            theirs.reason = 'Sin cambio de estado'
+            db.session.commit()
+            assert subscription.get(timeout=0) == []
+        finally:
+            subscription.close()
+        print("✅ Un evento por transacción confirmada; ninguno tras rollback")
+
+
+def test_streams_filter_and_resume():
+    """Cada stream recibe lo suyo y la reconexión recupera eventos perdidos"""
+    app = make_app(LIVE_EVENTS_HEARTBEAT=0.05, LIVE_EVENTS_STREAM_SECONDS=0.3)
+    with app.app_context():
+        db.create_all()
+        doctor, other, nurse, mine, theirs = _setup()
+        mine_id, theirs_id, nurse_id = mine.id, theirs.id, nurse.id
+
+        client = app.test_client()
+        login(client, doctor)
+        stream = client.get('/doctor/events', buffered=False)
+        assert stream.mimetype == 'text/event-stream'
+        chunks = stream.response
+        assert next(chunks).startswith(b'retry:')
+        last_id = live_events.history[-1]['id'] if live_events.history else 0
+
+        # El stream liberó la sesión (compartida con la prueba): volver a cargar los objetos
+        mine, theirs = db.session.get(Appointment, mine_id), db.session.get(Appointment, theirs_id)
+        nurse = db.session.get(type(nurse), nurse_id)
+        theirs.status = 'in_triage'
+        db.session.commit()
+        mine.status = 'in_triage'
+        db.session.commit()
+
+        doctor_events = _events(chunk.decode() for chunk in chunks)
+        assert [(e['appointment_id'], e['status']) for e in doctor_events] == [(mine_id, 'in_triage')]
+        print("✅ Stream del doctor filtrado por sus citas")
+
+        # Reconexión de enfermería: recibe los eventos de hoy posteriores a Last-Event-ID
+        login(client, nurse)
+        resumed = client.get('/nurse/events', headers={'Last-Event-ID': str(last_id)})
+        assert len(_events([resumed.get_data(as_text=True)])) == 2
+        print("✅ Reconexión con Last-Event-ID recupera los eventos perdidos")
+
+
+def test_streams_release_pool_connections():
+    """Más streams abiertos que conexiones en el pool no bloquean otras peticiones"""
+    path = os.path.join(tempfile.mkdtemp(), 'live_events.sqlite')
+    app = make_app(SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}', LIVE_EVENTS_HEARTBEAT=0.05,
+                   SQLALCHEMY_ENGINE_OPTIONS={'poolclass': QueuePool, 'pool_size': 2,
+                                              'max_overflow': 1, 'pool_timeout': 1})
+    with app.app_context():
+        db.create_all()
+        doctor, other, nurse, mine, theirs = _setup()
+        users = [doctor, other, nurse]
+        paths = ['/doctor/events', '/doctor/events', '/nurse/events']
+        mine_id = mine.id
+        for user in users:
+            db.session.refresh(user)
+        db.session.expunge_all()
+        pool = db.engine.pool
+
+    # Fuera del app_context de la prueba: cada petición tiene su propia sesión, como en producción
+    streams = []
+    try:
+        for n in range(8):
+            client = app.test_client()
+            with app.app_context():
+                login(client, users[n % 3])
+            stream = client.get(paths[n % 3], buffered=False)
+            assert stream.status_code == 200 and next(stream.response).startswith(b'retry:')
+            streams.append(stream)
+        assert pool.checkedout() == 0
+
+        client = app.test_client()
+        with app.app_context():
+            login(client, doctor)
+        assert client.get('/doctor/dashboard').status_code == 200
+        with app.app_context():
+            appointment = db.session.get(Appointment, mine_id)
+            appointment.status = 'in_triage'
+            db.session.commit()
+        received = [_events([next(stream.response).decode()]) for stream in streams]
+        assert sum(1 for events in received if events) == 5  # 3 streams del doctor y 2 de enfermería
+    finally:
+        for stream in streams:
+            stream.close()
+    assert live_events.listeners == 0
+    print(f"✅ {len(streams)} streams abiertos con un pool de {pool.size()}+1 conexiones y 0 en uso")
+
+
+def test_gevent_listeners():
+    """Con gevent (gunicorn.conf.py) cada oyente espera en una corrutina"""
+    script = '''
+from gevent import monkey
+monkey.patch_all()
+import threading, gevent
+from datetime import date
+from app.utils.live_events import live_events
+
+def listen(n):
+    subscription = live_events.subscribe(lambda item: True)
+    try:
+        return len(subscription.get(timeout=5))
+    finally:
+        subscription.close()
+
+threads = threading.active_count()
+listeners = [gevent.spawn(listen, n) for n in range(500)]
+gevent.sleep(0.1)
+assert live_events.listeners == 500
+live_events.publish([{'appointment_id': 1, 'doctor_id': 2, 'status': 'in_triage', 'date': date.today().isoformat()}])
+gevent.joinall(listeners, timeout=5)
+assert [listener.value for listener in listeners] == [1] * 500
+assert threading.active_count() == threads
+print(threads)
+'''
+    result = subprocess.run([sys.executable, '-c', script], cwd=BACKEND, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    print(f"✅ 500 oyentes en corrutinas gevent con {result.stdout.strip()} hilo(s) en el proceso")
+
+
+def test_gunicorn_single_worker_default():
+    """El pub/sub es del proceso: gunicorn arranca un solo worker por defecto"""
+    environ = os.environ.pop('GUNICORN_WORKERS', None)
+    try:
+        settings = runpy.run_path(os.path.join(BACKEND, 'gunicorn.conf.py'))
+    finally:
+        if environ is not None:
+            os.environ['GUNICORN_WORKERS'] = environ
+    assert settings['workers'] == 1 and settings['worker_class'] == 'gevent'
+    print("✅ gunicorn con 1 worker gevent por defecto")
+
+
+def test_many_listeners_without_threads():
+    """Decenas de oyentes no crean hilos y todos reciben el evento"""
+    threads_before = threading.active_count()
+    subscriptions = [live_events.subscribe(lambda item, n=n: item['doctor_id'] % 2 == n % 2) for n in range(60)]
+    try:
+        assert threading.active_count() == threads_before
+        live_events.publish([{'appointment_id': 1, 'doctor_id': 2, 'status': 'in_triage', 'date': date.today().isoformat()}])
+        received = [len(subscription.get(timeout=0)) for subscription in subscriptions]
+        assert received == [1, 0] * 30
+    finally:
+        for subscription in subscriptions:
+            subscription.close()
+    print(f"✅ 60 oyentes, {threading.active_count()} hilos en el proceso")
+
+
+def test_dashboards_render_live_script():
+    """Los dashboards cargan el script de la cola en vivo"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        doctor, other, nurse, mine, theirs = _setup()
+        client = app.test_client()
+        login(client, doctor)
+        html = client.get('/doctor/dashboard').get_data(as_text=True)
+        assert 'live_queue.js' in html and f'data-appointment-id="{mine.id}"' in html
+        login(client, nurse)
+        assert '/nurse/events' in client.get('/nurse/dashboard').get_data(as_text=True)
+
+
+if __name__ == '__main__':
+    test_publish_on_commit_only()
+    test_streams_filter_and_resume()
+    test_streams_release_pool_connections()
+    test_gevent_listeners()
+    test_gunicorn_single_worker_default()
+    test_many_listeners_without_threads()
+    test_dashboards_render_live_script()
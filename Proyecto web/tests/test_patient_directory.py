@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Prueba de los directorios de pacientes paginados (recepción, administración
+y enfermería).
+
+Verifica que recorrer las páginas con el cursor devuelve cada paciente una
+vez en el orden elegido conservando los filtros, que el directorio de
+enfermería calcula último triage, total de triages y próxima cita con un
+número fijo de consultas por página, y que el número de consultas y el
+tiempo de una página no crecen con el número de pacientes.
+"""
+
+import re
+import time
+from datetime import date, datetime, timedelta
+
+from helpers import (make_app, login, db, QueryCounter, next_weekday, at, create_specialty,
+                     create_user, create_patient, create_appointment)
+from app.models.invoice import Invoice
+from app.models.patient import Patient
+from app.models.triage import Triage
+from app.utils.pagination import count_cache
+
+NEXT_LINK = re.compile(r'href="[^"]*cursor=([^"&]+)"[^>]*>\s*Siguientes')
+DNI = re.compile(r'\b(7\d{7})\b')
+
+
+def _walk(client, url):
+    """DNIs de todas las páginas siguiendo el enlace 'Siguientes'"""
+    pages = []
+    while url:
+        body = client.get(url).get_data(as_text=True)
+        pages.append(list(dict.fromkeys(DNI.findall(body))))
+        match = NEXT_LINK.search(body)
+        url = f"{url.split('?')[0]}?cursor={match.group(1)}" if match else None
+    return pages
+
+
+def _insert_patients(count, offset=0):
+    now = datetime.utcnow()
+    rows = [{
+        'first_name': f'Nombre{i % 7}', 'last_name': f'Apellido{(i * 37) % 101:03d}', 'dni': f'{70000000 + offset + i}',
+        'gender': 'Femenino' if i % 2 else 'Masculino', 'birth_date': date(1985, 1, 1),
+        'is_active': i % 10 != 9, 'created_at': now, 'updated_at': now
+    } for i in range(count)]
+    for start in range(0, len(rows), 20000):
+        db.session.execute(Patient.__table__.insert(), rows[start:start + 20000])
+    db.session.commit()
+
+
+def test_walk_directories():
+    """Cada paciente una vez, en el orden elegido y con los filtros del cursor"""
+    app = make_app(PAGINATION_PER_PAGE=10)
+    with app.app_context():
+        db.create_all()
+        receptionist = create_user('recepcion', 'receptionist')
+        admin = create_user('admin', 'admin')
+        _insert_patients(95)
+
+        def expected(query, *order):
+            return [patient.dni for patient in query.order_by(*order)]
+
+        client = app.test_client()
+        login(client, receptionist)
+        pages = _walk(client, '/receptionist/patients?sort=name')
+        assert [len(page) for page in pages] == [10] * 9 + [5]
+        assert sum(pages, []) == expected(Patient.query, Patient.last_name, Patient.first_name, Patient.id)
+        assert sum(_walk(client, '/receptionist/patients'), []) == expected(Patient.query, Patient.id.desc())
+        assert sum(_walk(client, '/receptionist/patients?gender=F&sort=dni'), []) == expected(
+            Patient.query.filter_by(gender='Femenino'), Patient.dni)
+
+        client = app.test_client()
+        login(client, admin)
+        body = client.get('/admin/patients?status=inactive&gender=Femenino').get_data(as_text=True)
+        assert '9 pacientes registrados' in body
+        inactive = sum(_walk(client, '/admin/patients?status=inactive&sort=name'), [])
+        assert inactive == expected(Patient.query.filter_by(is_active=False), Patient.last_name,
+                                    Patient.first_name, Patient.id)
+        print(f"✅ Directorios recorridos por cursor: {sum(len(page) for page in pages)} pacientes sin repetir")
+
+
+def test_nurse_directory_batched():
+    """Último triage, total y próxima cita con consultas fijas por página"""
+    app = make_app(PAGINATION_PER_PAGE=50)
+    with app.app_context():
+        db.create_all()
+        specialty = create_specialty()
+        doctor = create_user('doctor', 'doctor', specialty)
+        nurse = create_user('enfermera', 'nurse')
+        other_nurse = create_user('enfermera2', 'nurse')
+        day = next_weekday(0)
+
+        patients = [create_patient(f'7{i:07d}', last_name=f'Apellido{i:02d}') for i in range(40)]
+        for i, patient in enumerate(patients):
+            past = create_appointment(patient, doctor, at(day - timedelta(days=14), 8, 0) + timedelta(minutes=5 * i),
+                                      status='completed')
+            for n in range(i % 3 + 1):
+                db.session.add(Triage(patient_id=patient.id, appointment_id=past.id if n == 0 else None,
+                                      nurse_id=nurse.id, chief_complaint=f'Control {n}', priority_level='baja',
+                                      created_at=datetime(2025, 1, 1) + timedelta(days=n)))
+            if i % 2 == 0:
+                upcoming = create_appointment(patient, doctor, at(day + timedelta(days=7), 8, 0) + timedelta(minutes=5 * i))
+                db.session.add(Invoice(patient_id=patient.id, appointment_id=upcoming.id, doctor_id=doctor.id,
+                                       invoice_number=f'F-{i:04d}', due_date=day, created_by=doctor.id,
+                                       subtotal=50, total_amount=50, status='paid'))
+        # Paciente de otra enfermera: no aparece
+        create_patient('79999999', last_name='Ajeno')
+        db.session.add(Triage(patient_id=Patient.query.filter_by(dni='79999999').one().id,
+                              nurse_id=other_nurse.id, chief_complaint='Control'))
+        db.session.commit()
+
+        client = app.test_client()
+        login(client, nurse)
+        # Con los totales ya cacheados, una página de 10 y una de 40 pacientes usan las mismas consultas
+        client.get('/nurse/patients?search=apellido0')
+        client.get('/nurse/patients')
+        with QueryCounter() as counter:
+            body = client.get('/nurse/patients?search=apellido0').get_data(as_text=True)
+        small = counter.count
+        assert body.count('DNI: 7') == 10
+        with QueryCounter() as counter:
+            body = client.get('/nurse/patients').get_data(as_text=True)
+        assert counter.count == small
+        assert '79999999' not in body and body.count('DNI: 7') == 40
+        assert counter.count <= 10
+
+        from app.utils.patient_directory import nurse_directory_rows
+        with app.test_request_context():
+            rows = {row['patient'].dni: row for row in nurse_directory_rows(patients, nurse.id)}
+        assert rows['70000005']['total_triages'] == 3
+        assert rows['70000005']['last_triage'].chief_complaint == 'Control 2'
+        assert rows['70000004']['next_appointment'] is not None and rows['70000005']['next_appointment'] is None
+        assert rows['70000000']['priority_level'] == 'baja'
+        print(f"✅ Directorio de enfermería con {counter.count} consultas por página (antes 3 por paciente)")
+
+
+def test_page_cost_constant():
+    """Consultas y tiempo de una página independientes del número de pacientes"""
+    measures = {}
+    for size in (1000, 100000):
+        app = make_app()
+        with app.app_context():
+            db.create_all()
+            admin = create_user('admin', 'admin')
+            _insert_patients(size)
+            client = app.test_client()
+            login(client, admin)
+            client.get('/admin/patients?sort=name')
+
+            started = time.perf_counter()
+            with QueryCounter() as counter:
+                for _ in range(5):
+                    response = client.get('/admin/patients?sort=name')
+            elapsed = (time.perf_counter() - started) / 5 * 1000
+            assert response.status_code == 200
+            measures[size] = (counter.count / 5, elapsed)
+            assert any('LIMIT' in statement for statement in counter.statements)
+            plan = ' '.join(str(row) for row in db.session.execute(db.text(
+                "EXPLAIN QUERY PLAN SELECT id FROM patients ORDER BY last_name, first_name, id LIMIT 51"
+            )))
+            assert 'ix_patients_name' in plan and 'TEMP B-TREE' not in plan
+        count_cache.clear()
+
+    (small_queries, small_ms), (large_queries, large_ms) = measures[1000], measures[100000]
+    print(f"✅ Página de pacientes: {small_ms:.1f} ms con 1.000 y {large_ms:.1f} ms con 100.000 "
+          f"({large_queries:.0f} consultas)")
+    assert small_queries == large_queries
+    assert large_ms < max(small_ms * 3, 50)
+
+
+if __name__ == '__main__':
+    test_walk_directories()
+    test_nurse_directory_batched()
+    test_page_cost_constant()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Prueba del índice en memoria por prefijo de DNI, DNI del apoderado y teléfono.
+
+Verifica que el índice se construye desde la base de datos, que resuelve
+prefijos de DNI, DNI del apoderado y teléfono (también sin el código de
+país), que las altas, ediciones, bajas y borrados se aplican al confirmar
+y se descartan al revertir, que la capa de cambios se fusiona con el
+bloque principal, que con el índice frío el autocompletado usa la base de
+datos, y que una búsqueda tarda microsegundos con 100.000 pacientes.
+"""
+
+import time
+from datetime import date, datetime
+
+from helpers import make_app, login, db, QueryCounter, create_user, create_patient
+from app.models.patient import Patient
+from app.utils.patient_prefix_index import PatientPrefixIndex, patient_prefix_index, patient_keys
+
+
+def _dnis(ids):
+    return [db.session.get(Patient, patient_id).dni for patient_id in ids]
+
+
+def test_prefix_lookup():
+    """Prefijos de DNI, DNI del apoderado y teléfono"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        create_patient('12345678', phone='+51 987 654 321')
+        create_patient('12349999', guardian_dni='44556677', phone='(01) 555-1234')
+        create_patient('12340000', phone='987000111', is_active=False)
+        create_patient('55667788', guardian_dni='12345000')
+        db.session.commit()
+
+        assert patient_prefix_index.build() == 8
+        lookup = lambda text: _dnis(patient_prefix_index.lookup(text))
+        assert lookup('1234') == ['55667788', '12345678', '12349999']
+        assert lookup('12345') == ['55667788', '12345678']
+        assert lookup('4455') == ['12349999']
+        assert lookup('987') == lookup('+51 987') == ['12345678']
+        assert lookup('01 555') == ['12349999']
+        assert lookup('7777') == [] and lookup('abc') == []
+        assert patient_keys('123.456-78', None, '+51 987 654 321') == {b'12345678', b'51987654321', b'987654321'}
+        print("✅ Prefijos de DNI, DNI del apoderado y teléfono (con y sin código de país)")
+
+
+def test_events_apply_on_commit():
+    """Altas, ediciones, bajas y borrados se aplican al confirmar y no al revertir"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        patient = create_patient('20000001', phone='999111222')
+        db.session.commit()
+        patient_prefix_index.build()
+        lookup = lambda text: patient_prefix_index.lookup(text)
+
+        added = create_patient('20000002')
+        assert lookup('20000002') == []
+        db.session.commit()
+        assert lookup('20000002') == [added.id]
+
+        patient.dni = '30000001'
+        patient.phone = '999333444'
+        db.session.flush()
+        db.session.rollback()
+        assert lookup('20000001') == [patient.id] and lookup('9993') == []
+
+        patient.dni = '30000001'
+        db.session.commit()
+        assert lookup('20000001') == [] and lookup('30000001') == [patient.id] and lookup('9991') == [patient.id]
+
+        patient.is_active = False
+        db.session.commit()
+        assert lookup('30000001') == [] and lookup('9991') == []
+        patient.is_active = True
+        db.session.commit()
+        assert lookup('30000001') == [patient.id]
+
+        db.session.delete(added)
+        db.session.commit()
+        assert lookup('2000') == []
+        print("✅ Cambios de Patient aplicados al confirmar y descartados al revertir")
+
+
+def test_merge_pending_changes():
+    """La capa de cambios se fusiona con el bloque principal"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        patients = [create_patient(f'4{i:07d}') for i in range(30)]
+        db.session.commit()
+
+        index = PatientPrefixIndex()
+        index.init_app(app)
+        index.MERGE_THRESHOLD = 10
+        index.build()
+        changes = [(patient.id, {patient.dni.encode()}, {f'5{patient.dni[1:]}'.encode()}) for patient in patients[:12]]
+        index.apply(changes)
+        stats = index.stats()
+        assert stats['pending_changes'] == 0 and stats['entries'] == 30
+        assert len(index.lookup('5')) == 12 and len(index.lookup('4', limit=100)) == 18
+        assert index.lookup('50000003') == [patients[3].id]
+        print("✅ Cambios pendientes fusionados con el bloque principal")
+
+
+def test_cold_index_falls_back_to_database():
+    """Con el índice frío el autocompletado busca en la base de datos"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        receptionist = create_user('recepcion', 'receptionist')
+        create_patient('45678901', first_name='Begoña', last_name='Núñez')
+        create_patient('56789012', first_name='Pedro', last_name='Salas')
+        db.session.commit()
+
+        client = app.test_client()
+        login(client, receptionist)
+        patient_prefix_index.reset()
+        assert patient_prefix_index.lookup('4567') is None
+        with QueryCounter() as counter:
+            body = client.get('/receptionist/api/patients/search?q=4567').get_data(as_text=True)
+        assert '45678901' in body and '56789012' not in body
+        assert any('patient_search MATCH' in statement for statement in counter.statements)
+
+        patient_prefix_index.build()
+        with QueryCounter() as counter:
+            body = client.get('/receptionist/api/patients/search?q=4567').get_data(as_text=True)
+        assert '45678901' in body and '56789012' not in body
+        assert not any('MATCH' in statement or 'LIKE' in statement.upper() for statement in counter.statements)
+        print("✅ Índice frío: búsqueda en la base de datos; índice listo: sólo consulta por id")
+
+
+def test_lookup_latency_and_memory():
+    """Búsquedas en microsegundos y pocos bytes por dato con 100.000 pacientes"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        now = datetime.utcnow()
+        rows = [{
+            'first_name': 'Paciente', 'last_name': f'{i}', 'dni': f'{10000000 + i * 7}',
+            'guardian_dni': f'{70000000 + i}' if i % 5 == 0 else None, 'phone': f'+51 9{i:08d}',
+            'birth_date': date(1980, 1, 1), 'is_active': True, 'created_at': now, 'updated_at': now
+        } for i in range(100000)]
+        for start in range(0, len(rows), 20000):
+            db.session.execute(Patient.__table__.insert(), rows[start:start + 20000])
+        db.session.commit()
+
+        started = time.perf_counter()
+        entries = patient_prefix_index.build()
+        build_seconds = time.perf_counter() - started
+
+        terms = ('1', '10', '1000', '1234567', '70001', '900012', '51900045', '99999999')
+        started = time.perf_counter()
+        for _ in range(100):
+            for term in terms:
+                patient_prefix_index.lookup(term)
+        per_lookup = (time.perf_counter() - started) / (100 * len(terms)) * 1e6
+        assert patient_prefix_index.lookup('10000007') and patient_prefix_index.lookup('51900045')
+
+        stats = patient_prefix_index.stats()
+        per_entry = stats['bytes'] / entries
+        print(f"✅ {entries} claves en {build_seconds:.2f} s, {per_entry:.0f} bytes por clave, "
+              f"{per_lookup:.0f} µs por búsqueda")
+        assert per_lookup < 200 and per_entry <= 20
+
+
+if __name__ == '__main__':
+    test_prefix_lookup()
+    test_events_apply_on_commit()
+    test_merge_pending_changes()
+    test_cold_index_falls_back_to_database()
+    test_lookup_latency_and_memory()
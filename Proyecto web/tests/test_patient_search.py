@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Prueba del índice de búsqueda de pacientes (FTS5 en SQLite).
+
+Verifica que la búsqueda ignora acentos y mayúsculas y combina palabras
+de nombre, apellido, DNI y email, que el índice se mantiene sincronizado
+al crear, editar y borrar pacientes (también con INSERT en lote), que las
+rutas de recepción, administración, enfermería y doctor usan el índice, y
+que el autocompletado responde en menos de 20 ms con 100.000 pacientes y
+que autogenerate de Alembic no detecta la tabla FTS5 como sobrante.
+"""
+
+import os
+import tempfile
+import time
+from datetime import date, datetime
+
+from helpers import (make_app, login, db, QueryCounter, next_weekday, at, create_specialty,
+                     create_user, create_patient, create_appointment)
+from app.models.medical_record import MedicalRecord
+from app.models.patient import Patient
+from app.models.triage import Triage
+from app.utils.patient_search import autocomplete, normalize, patient_filter
+
+FIRST_NAMES = ('María', 'José', 'Juan', 'Lucía', 'Martín', 'Sofía', 'Andrés', 'Camila')
+LAST_NAMES = ('García', 'Rodríguez', 'Pérez', 'López', 'Gómez', 'Fernández', 'Ibáñez', 'Muñoz')
+
+
+def _names(query):
+    return sorted(f'{patient.first_name} {patient.last_name}' for patient in query)
+
+
+def test_accent_and_case_insensitive():
+    """Búsqueda sin acentos ni mayúsculas, por prefijo de cada palabra"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        create_patient('12345678', first_name='Begoña', last_name='Núñez', email='bego.nunez@correo.test')
+        create_patient('23456789', first_name='María José', last_name='García')
+        create_patient('34567890', first_name='Mario', last_name='Nuño', is_active=False)
+        db.session.commit()
+
+        search = lambda text: _names(Patient.query.filter(patient_filter(text)))
+        assert search('nunez') == search('NÚÑEZ') == search('Begoña Nú') == ['Begoña Núñez']
+        assert search('nu') == ['Begoña Núñez', 'Mario Nuño']
+        assert search('mar') == ['Mario Nuño', 'María José García']
+        assert search('maria garcia') == search('Jose') == ['María José García']
+        assert search('1234') == search('bego.nunez@correo') == ['Begoña Núñez']
+        assert search('"') == [] and search('xyz') == []
+
+        assert [patient.first_name for patient in autocomplete('nu')] == ['Begoña']
+        assert normalize('Ibáñez') == 'ibanez'
+        print("✅ Búsqueda sin acentos ni mayúsculas por nombre, apellido, DNI y email")
+
+
+def test_index_stays_in_sync():
+    """Altas, ediciones, bajas e INSERT en lote se reflejan en el índice"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        patient = create_patient('11111111', first_name='Carlos', last_name='Ruiz')
+        db.session.commit()
+        assert _names(Patient.query.filter(patient_filter('ruiz'))) == ['Carlos Ruiz']
+
+        patient.last_name = 'Ibáñez'
+        db.session.commit()
+        assert Patient.query.filter(patient_filter('ruiz')).count() == 0
+        assert Patient.query.filter(patient_filter('ibanez')).count() == 1
+
+        db.session.execute(Patient.__table__.insert(), [{
+            'first_name': 'Ana', 'last_name': f'Muñoz{i}', 'dni': f'2{i:07d}', 'birth_date': date(1990, 1, 1),
+            'is_active': True, 'created_at': datetime.utcnow(), 'updated_at': datetime.utcnow()
+        } for i in range(50)])
+        db.session.commit()
+        assert Patient.query.filter(patient_filter('munoz')).count() == 50
+
+        db.session.delete(patient)
+        db.session.commit()
+        assert Patient.query.filter(patient_filter('ibanez')).count() == 0
+        print("✅ Índice sincronizado con altas, ediciones, bajas e INSERT en lote")
+
+
+def test_routes_use_search_index():
+    """Las búsquedas de las rutas consultan el índice y no recorren patients con LIKE"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        specialty = create_specialty()
+        doctor = create_user('doctor', 'doctor', specialty)
+        nurse = create_user('enfermera', 'nurse')
+        receptionist = create_user('recepcion', 'receptionist')
+        admin = create_user('admin', 'admin')
+        target = create_patient('45678901', first_name='Begoña', last_name='Núñez')
+        other = create_patient('56789012', first_name='Pedro', last_name='Salas')
+        for patient in (target, other):
+            appointment = create_appointment(patient, doctor, at(next_weekday(0), 9 if patient is target else 10, 0))
+            db.session.add(Triage(patient_id=patient.id, appointment_id=appointment.id, nurse_id=nurse.id,
+                                  chief_complaint='Control'))
+            db.session.add(MedicalRecord(patient_id=patient.id, doctor_id=doctor.id, appointment_id=appointment.id,
+                                         consultation_date=datetime.now(), diagnosis='Control'))
+        db.session.commit()
+
+        pages = [
+            (receptionist, '/receptionist/api/patients/search?q=nunez'),
+            (receptionist, '/receptionist/patients?search=nunez'),
+            (receptionist, '/receptionist/appointments?search=nunez'),
+            (admin, '/admin/patients?search=nunez'),
+            (nurse, '/nurse/patients?search=nunez'),
+            (doctor, '/doctor/clinical-histories?search=nunez'),
+            (doctor, '/doctor/appointments?patient_search=nunez')
+        ]
+        for user, url in pages:
+            client = app.test_client()
+            login(client, user)
+            with QueryCounter() as counter:
+                response = client.get(url)
+            body = response.get_data(as_text=True)
+            assert response.status_code == 200, url
+            assert '45678901' in body and '56789012' not in body, url
+            assert any('patient_search MATCH' in statement for statement in counter.statements), url
+            assert not any('LIKE' in statement.upper() and 'patients.' in statement for statement in counter.statements), url
+        print(f"✅ {len(pages)} rutas buscan pacientes con el índice FTS")
+
+
+def test_autocomplete_latency():
+    """Autocompletado en menos de 20 ms con 100.000 pacientes"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        now = datetime.utcnow()
+        rows = [{
+            'first_name': f'{FIRST_NAMES[i % 8]}', 'last_name': f'{LAST_NAMES[i // 8 % 8]} {LAST_NAMES[i // 64 % 8]}',
+            'dni': f'{10000000 + i}', 'email': f'paciente{i}@correo.test', 'birth_date': date(1980, 1, 1),
+            'is_active': i % 10 != 0, 'created_at': now, 'updated_at': now
+        } for i in range(100000)]
+        for start in range(0, len(rows), 20000):
+            db.session.execute(Patient.__table__.insert(), rows[start:start + 20000])
+        db.session.commit()
+
+        timings = {}
+        for term in ('mu', 'munoz', 'maria garcia', 'Ibáñez Pérez', '1005', 'paciente4242'):
+            autocomplete(term)
+            started = time.perf_counter()
+            for _ in range(10):
+                results = autocomplete(term)
+            timings[term] = (time.perf_counter() - started) / 10 * 1000
+            assert results and all(patient.is_active for patient in results), term
+        slowest = max(timings, key=timings.get)
+        print(f"✅ Autocompletado con 100.000 pacientes: máximo {timings[slowest]:.1f} ms ('{slowest}')")
+        assert timings[slowest] < 20
+
+
+def test_migrations_ignore_search_index():
+    """'flask db check' no propone borrar patient_search ni sus tablas internas"""
+    from flask_migrate import check, stamp
+
+    directory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'backend', 'migrations')
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(tmp, 'check.db')}")
+        with app.app_context():
+            db.create_all()
+            tables = db.session.execute(db.text(
+                "SELECT name FROM sqlite_master WHERE name LIKE 'patient_search%'")).scalars().all()
+            assert len(tables) == 5
+            stamp(directory=directory)
+            # check() termina con SystemExit si detecta diferencias con los modelos
+            check(directory=directory)
+            db.engine.dispose()
+    print(f"✅ Autogenerate ignora {len(tables)} tablas del índice de búsqueda")
+
+
+if __name__ == '__main__':
+    test_accent_and_case_insensitive()
+    test_index_stays_in_sync()
+    test_routes_use_search_index()
+    test_autocomplete_latency()
+    test_migrations_ignore_search_index()
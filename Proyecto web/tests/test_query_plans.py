@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Prueba de los planes de ejecución de las consultas frecuentes de citas.
+
+Ejecuta las funciones reales (dashboard del doctor, citas reservadas para
+la disponibilidad, dashboard de enfermería, historial del paciente y
+estado de pago/triage), captura con QueryCounter las sentencias que
+emiten y corre EXPLAIN sobre cada una. Falla si alguna recorre una tabla
+completa (o un índice completo) en lugar de buscar por índice, o si una
+lista que se muestra ordenada necesita ordenar en una tabla temporal.
+Corre sobre SQLite con estadísticas (ANALYZE) y, si TEST_POSTGRES_URL
+está definido, sobre PostgreSQL con enable_seqscan = off.
+"""
+
+import os
+import re
+from datetime import datetime, date, timedelta
+
+from helpers import make_app, login, db, QueryCounter, create_specialty, create_user, create_patient
+from app.models.appointment import Appointment
+from app.models.medical_record import MedicalRecord
+from app.models.triage import Triage
+from app.models.invoice import Invoice
+from app.models.user import User
+from app.models.work_schedule import WorkSchedule
+from app.utils.doctor_dashboard import doctor_dashboard
+
+HOT_TABLES = ('appointments', 'medical_records', 'triages', 'invoices')
+
+
+def _hot_paths(app, data):
+    """Funciones frecuentes: (nombre, función sin argumentos, requiere orden por índice)"""
+    doctor_id, nurse_id, patient_id = data['doctor_id'], data['nurse_id'], data['patient_id']
+    today = date.today()
+    client = app.test_client()
+
+    def get(user_id, url):
+        login(client, db.session.get(User, user_id))
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+
+    def appointment_status():
+        # Instancia sin precarga: is_paid y get_triage consultan por cita
+        appointment = db.session.get(Appointment, data['appointment_id'])
+        appointment.is_paid
+        appointment.get_triage()
+
+    return [
+        ('dashboard doctor', lambda: doctor_dashboard(doctor_id, today), False),
+        ('disponibilidad: citas reservadas', lambda: WorkSchedule.get_booked_times(
+            data['doctor_ids'], today, today + timedelta(days=6)), False),
+        ('dashboard enfermería', lambda: get(nurse_id, '/nurse/dashboard'), False),
+        ('historial del paciente', lambda: get(doctor_id, f'/doctor/patient/{patient_id}/history'), True),
+        ('estado de pago/triage de una cita', appointment_status, False),
+        ('precarga de facturas y triages de una lista', lambda: Appointment.preload_status(
+            Appointment.query.filter(Appointment.doctor_id == doctor_id).limit(50).all()), False),
+    ]
+
+
+def _populate():
+    """Datos suficientes para que ANALYZE tenga estadísticas realistas"""
+    specialty = create_specialty()
+    doctors = [create_user(f'doctor{i}', 'doctor', specialty) for i in range(10)]
+    nurse = create_user('enfermera', 'nurse')
+    patients = [create_patient(f'9200{i:04d}') for i in range(200)]
+    db.session.commit()
+
+    start = datetime.combine(date.today() - timedelta(days=100), datetime.min.time())
+    statuses = ('completed', 'completed', 'no_show', 'cancelled', 'scheduled')
+    db.session.execute(Appointment.__table__.insert(), [{
+        'patient_id': patients[i % 200].id, 'doctor_id': doctors[i % 10].id, 'specialty_id': specialty.id,
+        'date_time': start + timedelta(days=i // 40, hours=8 + (i % 40) // 10 % 8, minutes=(i % 10) * 5),
+        'duration': 30, 'status': statuses[i % 5], 'created_at': start, 'updated_at': start
+    } for i in range(5000)])
+    db.session.execute(MedicalRecord.__table__.insert(), [{
+        'patient_id': patients[i % 200].id, 'doctor_id': doctors[i % 10].id, 'appointment_id': i + 1,
+        'consultation_date': start + timedelta(hours=i)
+    } for i in range(0, 5000, 2)])
+    db.session.execute(Triage.__table__.insert(), [{
+        'patient_id': patients[i % 200].id, 'appointment_id': i + 1, 'nurse_id': nurse.id,
+        'chief_complaint': 'Control', 'priority_level': 'media', 'status': 'completed', 'created_at': start
+    } for i in range(0, 5000, 2)])
+    db.session.execute(Invoice.__table__.insert(), [{
+        'patient_id': patients[i % 200].id, 'appointment_id': i + 1, 'doctor_id': doctors[i % 10].id,
+        'invoice_number': f'F-{i:06d}', 'issue_date': start.date(), 'due_date': start.date(),
+        'subtotal': 100, 'total_amount': 100, 'status': 'paid' if i % 3 else 'pending',
+        'created_by': nurse.id, 'created_at': start, 'updated_at': start
+    } for i in range(5000)])
+    db.session.commit()
+    return {
+        'doctor_id': doctors[0].id, 'nurse_id': nurse.id, 'patient_id': patients[0].id,
+        'doctor_ids': [doctor.id for doctor in doctors], 'appointment_id': 1
+    }
+
+
+def _sqlite_problems(plan):
+    problems = []
+    for detail in plan:
+        if re.match(rf"SCAN ({'|'.join(HOT_TABLES)})\b", detail):
+            problems.append(detail)
+    return problems
+
+
+def _captured(run):
+    """Sentencias SELECT sobre las tablas de citas que emite `run`"""
+    with QueryCounter() as counter:
+        run()
+    db.session.expunge_all()
+    return [(statement, parameters) for statement, parameters in zip(counter.statements, counter.parameters)
+            if statement.lstrip().upper().startswith('SELECT')
+            and re.search(rf"\b({'|'.join(HOT_TABLES)})\b", statement)]
+
+
+def _assert_plans(app, data, explain, problems_of):
+    failures = []
+    for name, run, ordered in _hot_paths(app, data):
+        statements = _captured(run)
+        if not statements:
+            failures.append(f"{name}: no emitió consultas sobre {HOT_TABLES}")
+        for statement, parameters in statements:
+            plan = explain(statement, parameters)
+            problems = problems_of(plan)
+            if ordered and 'ORDER BY' in statement and any('TEMP B-TREE' in detail for detail in plan):
+                problems.append('orden en tabla temporal')
+            if problems:
+                failures.append(f"{name}: {problems} | plan: {plan} | sql: {statement}")
+        if not any(failure.startswith(f'{name}:') for failure in failures):
+            print(f"✅ {name}: {len(statements)} consultas por índice")
+    assert not failures, '\n'.join(failures)
+
+
+def test_sqlite_query_plans():
+    """En SQLite ninguna consulta frecuente recorre una tabla completa"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        data = _populate()
+        db.session.execute(db.text('ANALYZE'))
+
+        def explain(statement, parameters):
+            return [row[3] for row in db.session.connection().exec_driver_sql(
+                f'EXPLAIN QUERY PLAN {statement}', parameters).all()]
+
+        _assert_plans(app, data, explain, _sqlite_problems)
+
+
+def test_postgres_query_plans():
+    """En PostgreSQL ninguna consulta frecuente usa Seq Scan sobre las tablas de citas"""
+    url = os.environ.get('TEST_POSTGRES_URL')
+    if not url:
+        print("⚠️  TEST_POSTGRES_URL no definido: se omite la prueba en PostgreSQL")
+        return
+    app = make_app(SQLALCHEMY_DATABASE_URI=url)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        data = _populate()
+        db.session.execute(db.text('ANALYZE'))
+        # Con tablas pequeñas el planificador prefiere Seq Scan: se desalienta
+        # para comprobar que existe un índice utilizable
+        db.session.execute(db.text('SET enable_seqscan = off'))
+
+        def explain(statement, parameters):
+            return [row[0] for row in db.session.connection().exec_driver_sql(
+                f'EXPLAIN {statement}', parameters).all()]
+
+        def problems_of(plan):
+            return [line.strip() for line in plan
+                    if re.search(rf"Seq Scan on ({'|'.join(HOT_TABLES)})\b", line)]
+
+        try:
+            _assert_plans(app, data, explain, problems_of)
+        finally:
+            db.session.rollback()
+            db.drop_all()
+
+
+if __name__ == '__main__':
+    test_sqlite_query_plans()
+    test_postgres_query_plans()
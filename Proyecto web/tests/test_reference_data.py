@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Prueba del formulario de citas con datos de referencia cacheados.
+
+Verifica que el formulario de nueva cita ya no incluye la lista completa de
+pacientes (se usa el autocompletado), que doctores y especialidades salen
+de la caché de referencia sin consultar en cada request, y que la caché se
+invalida cuando se editan usuarios o especialidades.
+"""
+
+from datetime import date, datetime
+
+from helpers import make_app, login, db, QueryCounter, create_specialty, create_user
+from app.models.patient import Patient
+from app.utils.reference_data import reference_data
+
+
+def _populate(patients):
+    specialty = create_specialty('Cardiología')
+    create_user('doctor1', 'doctor', specialty, first_name='Carlos')
+    create_user('doctor2', 'doctor', specialty, first_name='Diana')
+    receptionist = create_user('recepcion', 'receptionist')
+    if patients:
+        db.session.execute(Patient.__table__.insert(), [{
+            'first_name': f'Paciente{i:05d}', 'last_name': 'Prueba', 'dni': f'6{i:07d}',
+            'birth_date': date(1990, 1, 1), 'is_active': True,
+            'created_at': datetime.utcnow(), 'updated_at': datetime.utcnow()
+        } for i in range(patients)])
+    db.session.commit()
+    return receptionist
+
+
+def _count_form_queries(client, url='/receptionist/appointments/new'):
+    db.session.expire_all()
+    with QueryCounter() as counter:
+        response = client.get(url)
+    assert response.status_code == 200
+    return counter.count, response.get_data(as_text=True)
+
+
+def test_form_without_patient_list():
+    """El formulario no depende del número de pacientes y reutiliza la caché"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        receptionist = _populate(500)
+        client = app.test_client()
+        login(client, receptionist)
+
+        reference_data.invalidate()
+        first, html = _count_form_queries(client)
+        second, _ = _count_form_queries(client)
+        assert 'Paciente00001' not in html and 'Cardiología' in html
+        # La segunda carga no vuelve a consultar doctores ni especialidades
+        assert second == first - 2
+
+        patient_id = Patient.query.filter_by(dni='60000042').one().id
+        _, html = _count_form_queries(client, f'/receptionist/appointments/new?patient_id={patient_id}')
+        assert 'Paciente00042 Prueba - DNI: 60000042' in html and 'Paciente00041' not in html
+        print(f"✅ Formulario con 500 pacientes: {first} sentencias la primera vez, {second} con caché")
+
+
+def test_invalidation_on_admin_edits():
+    """Crear o editar doctores y especialidades invalida la caché al confirmar"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        _populate(0)
+        reference_data.invalidate()
+        assert [specialty.name for specialty in reference_data.specialties()] == ['Cardiología']
+        assert len(reference_data.doctors()) == 2
+
+        specialty = create_specialty('Pediatría')
+        doctor = create_user('doctor3', 'doctor', specialty, first_name='Elena')
+        db.session.commit()
+        assert [specialty.name for specialty in reference_data.specialties()] == ['Cardiología', 'Pediatría']
+        assert [doctor.full_name for doctor in reference_data.doctors()][-1] == 'Elena Doctor3'
+        assert reference_data.doctors()[-1].specialty_name == 'Pediatría'
+
+        doctor.is_active = False
+        db.session.commit()
+        assert len(reference_data.doctors()) == 2
+
+        # Tras recargarse, la lista vuelve a servirse desde la caché
+        with QueryCounter() as counter:
+            reference_data.doctors()
+        assert counter.count == 0
+        print("✅ Caché de referencia invalidada al crear/editar doctores y especialidades")
+
+
+if __name__ == '__main__':
+    test_form_without_patient_list()
+    test_invalidation_on_admin_edits()
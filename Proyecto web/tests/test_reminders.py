@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Prueba de los recordatorios de citas (bandeja de salida).
+
+Verifica que se encolan en lote sólo las citas programadas del día
+siguiente con email, que volver a encolar o a despachar no duplica
+mensajes, que los fallos del transporte se reintentan con espera
+exponencial hasta marcarse como fallidos, que una cita cancelada después
+de encolar no se recuerda, que el transporte de archivo escribe los
+mensajes y que un transporte sin send() no se puede instanciar.
+"""
+
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from helpers import (make_app, db, QueryCounter, at, create_specialty, create_user,
+                     create_patient, create_appointment)
+from app.models.reminder import ReminderMessage
+from app.utils.reminder_transports import ReminderTransport, FileTransport, get_transport
+
+NOW = datetime.now().replace(hour=18, minute=0, second=0, microsecond=0)
+TOMORROW = (NOW + timedelta(days=1)).date()
+
+
+class RecordingTransport(ReminderTransport):
+    """Registra los envíos y falla las primeras veces para los destinatarios indicados"""
+
+    def __init__(self, config, failures=None):
+        super().__init__(config)
+        self.failures = dict(failures or {})
+        self.sent = []
+
+    def send(self, message):
+        if self.failures.get(message.recipient, 0) > 0:
+            self.failures[message.recipient] -= 1
+            raise ConnectionError('Servidor no disponible')
+        self.sent.append(message.idempotency_key)
+
+
+def _populate(count):
+    specialty = create_specialty()
+    doctor = create_user('doctor', 'doctor', specialty, first_name='Laura', last_name='Gómez')
+    appointments = []
+    for i in range(count):
+        patient = create_patient(f'9{i:07d}', first_name=f'Paciente{i}', email=f'paciente{i}@correo.test')
+        appointments.append(create_appointment(patient, doctor, at(TOMORROW, 8, 0) + timedelta(minutes=2 * i)))
+    # Sin email, cancelada y de otro día: no se encolan
+    create_appointment(create_patient('80000001'), doctor, at(TOMORROW, 7, 0))
+    create_appointment(create_patient('80000002', email='cancelada@correo.test'), doctor, at(TOMORROW, 7, 30),
+                       status='cancelled')
+    create_appointment(create_patient('80000003', email='otro@correo.test'), doctor, at(TOMORROW + timedelta(days=1), 8, 0))
+    db.session.commit()
+    return appointments
+
+
+def test_enqueue_is_idempotent():
+    """Una consulta para las citas, INSERT en lote y sin duplicados al repetir"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        _populate(200)
+
+        with QueryCounter() as counter:
+            result = ReminderMessage.enqueue_for_day(now=NOW)
+            db.session.commit()
+        assert result == {'enqueued': 200, 'already_queued': 0, 'without_email': 1}
+        assert counter.count <= 4
+
+        message = ReminderMessage.query.order_by(ReminderMessage.appointment_time).first()
+        assert 'Paciente0' in message.body and 'Dr. Laura Gómez' in message.body and '08:00' in message.subject
+
+        again = ReminderMessage.enqueue_for_day(now=NOW)
+        db.session.commit()
+        assert again['enqueued'] == 0 and again['already_queued'] == 200
+        assert ReminderMessage.query.count() == 200
+        print(f"✅ 200 recordatorios encolados con {counter.count} sentencias SQL; repetir no duplica")
+
+
+def test_dispatch_retry_and_skip():
+    """Lotes, reintentos con espera exponencial, fallidos y citas canceladas"""
+    app = make_app(REMINDER_BATCH_SIZE=4, REMINDER_MAX_ATTEMPTS=3, REMINDER_RETRY_BASE_SECONDS=60)
+    with app.app_context():
+        db.create_all()
+        appointments = _populate(10)
+        ReminderMessage.enqueue_for_day(now=NOW)
+        db.session.commit()
+
+        # Cancelada después de encolar
+        appointments[9].status = 'cancelled'
+        db.session.commit()
+
+        transport = RecordingTransport(app.config, failures={'paciente1@correo.test': 1, 'paciente2@correo.test': 5})
+        totals = ReminderMessage.dispatch(transport, now=NOW)
+        assert totals == {'sent': 7, 'retried': 2, 'failed': 0, 'skipped': 1, 'batches': 3}
+
+        retry = ReminderMessage.query.filter_by(recipient='paciente2@correo.test').one()
+        assert retry.status == 'pending' and retry.attempts == 1 and retry.next_attempt_at == NOW + timedelta(seconds=60)
+
+        # Antes de vencer la espera no se reintenta; los enviados nunca se repiten
+        assert ReminderMessage.dispatch(transport, now=NOW + timedelta(seconds=30))['batches'] == 0
+        later = ReminderMessage.dispatch(transport, now=NOW + timedelta(minutes=1))
+        assert later['sent'] == 1 and later['retried'] == 1
+        retry = db.session.get(ReminderMessage, retry.id)
+        assert retry.next_attempt_at == NOW + timedelta(minutes=1) + timedelta(seconds=120)
+
+        last = ReminderMessage.dispatch(transport, now=NOW + timedelta(hours=1))
+        assert last['failed'] == 1
+        assert len(transport.sent) == len(set(transport.sent)) == 8
+        assert ReminderMessage.stats() == {'sent': 8, 'failed': 1, 'skipped': 1}
+        print("✅ Despacho por lotes con reintentos, fallidos y citas canceladas omitidas")
+
+
+def test_file_transport():
+    """El transporte de archivo escribe los mensajes; se elige por configuración"""
+    path = os.path.join(tempfile.mkdtemp(), 'recordatorios.txt')
+    app = make_app(REMINDER_TRANSPORT='file', REMINDER_FILE_PATH=path)
+    with app.app_context():
+        db.create_all()
+        _populate(3)
+        ReminderMessage.enqueue_for_day(now=NOW)
+        db.session.commit()
+
+        transport = get_transport(app.config)
+        assert isinstance(transport, FileTransport)
+        assert ReminderMessage.dispatch(transport, now=NOW)['sent'] == 3
+        with open(path, encoding='utf-8') as output:
+            content = output.read()
+        assert content.count('To: paciente') == 3 and 'Idempotency-Key: recordatorio-' in content
+
+        assert isinstance(get_transport(app.config, 'app.utils.reminder_transports:FileTransport'), FileTransport)
+
+        class IncompleteTransport(ReminderTransport):
+            pass
+        try:
+            IncompleteTransport(app.config)
+        except TypeError:
+            pass
+        else:
+            raise AssertionError('Un transporte sin send() no debe poder instanciarse')
+        print("✅ Transporte de archivo y selección por configuración")
+
+
+if __name__ == '__main__':
+    test_enqueue_is_idempotent()
+    test_dispatch_retry_and_skip()
+    test_file_transport()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Prueba de las plantillas de horarios recurrentes.
+
+Verifica la vista previa (dry-run) sin escrituras, la detección de bloques
+superpuestos del mismo doctor (existentes y entre rangos del lote), la
+aplicación en una sola transacción con inventario de slots regenerado y la
+interfaz de administración.
+"""
+
+from datetime import date, time, timedelta
+
+from helpers import make_app, login, db, QueryCounter, create_specialty, create_user, create_schedule
+from app.models.work_schedule import WorkSchedule
+from app.models.appointment_slot import AppointmentSlot
+from app.models.schedule_template import ScheduleTemplate
+
+
+def _template():
+    template = ScheduleTemplate(name='Mañana L-V', start_time=time(8, 0), end_time=time(14, 0),
+                                appointment_duration=20, break_start_time=time(10, 0), break_end_time=time(10, 15))
+    template.days = [0, 1, 2, 3, 4]
+    db.session.add(template)
+    db.session.flush()
+    return template
+
+
+def test_dry_run_conflicts_and_apply():
+    """Dry-run sin escrituras, conflictos por doctor y aplicación masiva"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        specialty = create_specialty()
+        doctors = [create_user(f'doctor{i}', 'doctor', specialty) for i in range(20)]
+        # doctor0 ya atiende los lunes 12:00-16:00 (se superpone con 08:00-14:00)
+        create_schedule(doctors[0], 0, start=time(12, 0), end=time(16, 0))
+        # doctor1 atiende los martes por la tarde: no se superpone
+        create_schedule(doctors[1], 1, start=time(15, 0), end=time(19, 0))
+        template = _template()
+        db.session.commit()
+        assert template.summary == 'Lun–Vie 08:00–14:00, 20 min, descanso 10:00–10:15'
+        assert template.validate() == []
+
+        doctor_ids = [doctor.id for doctor in doctors]
+        today = date.today()
+        periods = [(today, today + timedelta(days=89)), (today + timedelta(days=90), None)]
+
+        diff = template.apply(doctor_ids, periods, dry_run=True)
+        assert not diff['applied']
+        assert len(diff['create']) == 20 * 5 * 2 - 2
+        assert {(row['doctor_id'], row['day_of_week']) for row in diff['conflicts']} == {(doctors[0].id, 0)}
+        assert WorkSchedule.query.count() == 2
+
+        # Con conflictos no se escribe nada salvo que se pida omitirlos
+        assert not template.apply(doctor_ids, periods)['applied']
+        assert WorkSchedule.query.count() == 2
+
+        with QueryCounter() as counter:
+            diff = template.apply(doctor_ids, periods, skip_conflicts=True)
+        db.session.commit()
+        assert diff['applied']
+        assert WorkSchedule.query.count() == 2 + 198
+        print(f"✅ 198 horarios creados para 20 doctores con {counter.count} consultas")
+
+        # Inventario regenerado: 08:00-14:00 cada 20 min sin 10:00 = 17 slots por día
+        next_tuesday = today + timedelta(days=(1 - today.weekday()) % 7 or 7)
+        slots = AppointmentSlot.get_available_times(doctors[5].id, next_tuesday)
+        assert len(slots) == 17 and time(10, 0) not in slots
+
+        # Reaplicar la plantilla sólo produce conflictos
+        again = template.plan(doctor_ids, periods)
+        assert again['create'] == [] and len(again['conflicts']) == 200
+
+
+def test_overlapping_periods_within_batch():
+    """Dos rangos solapados en el mismo lote generan un conflicto"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        doctor = create_user('doctor1', 'doctor', create_specialty())
+        template = _template()
+        db.session.commit()
+        today = date.today()
+        diff = template.plan([doctor.id], [(today, today + timedelta(days=30)), (today + timedelta(days=10), None)])
+        assert len(diff['create']) == 5 and len(diff['conflicts']) == 5
+
+
+def test_admin_preview_and_apply():
+    """Vista previa y aplicación desde la administración"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        specialty = create_specialty()
+        admin = create_user('admin', 'admin')
+        doctors = [create_user(f'doctor{i}', 'doctor', specialty) for i in range(3)]
+        db.session.commit()
+        doctor_ids = [str(doctor.id) for doctor in doctors]
+
+        client = app.test_client()
+        login(client, admin)
+        assert client.get('/admin/work-schedules/templates').status_code == 200
+        response = client.post('/admin/work-schedules/templates/add', data={
+            'name': 'Tarde', 'days_of_week': ['0', '2', '4'], 'start_time': '14:00', 'end_time': '18:00',
+            'appointment_duration': '30'
+        })
+        assert response.status_code == 302
+        template = ScheduleTemplate.query.filter_by(name='Tarde').one()
+        assert template.days_label == 'Lun, Mié, Vie'
+
+        form = {'doctor_ids': doctor_ids, 'period_start': [date.today().isoformat()], 'period_end': ['']}
+        preview = client.post(f'/admin/work-schedules/templates/{template.id}/apply', data=dict(form, action='preview'))
+        assert preview.status_code == 200
+        assert '9 a crear' in preview.get_data(as_text=True)
+        assert WorkSchedule.query.count() == 0
+
+        applied = client.post(f'/admin/work-schedules/templates/{template.id}/apply', data=dict(form, action='apply'))
+        assert applied.status_code == 302
+        assert WorkSchedule.query.count() == 9
+
+
+if __name__ == '__main__':
+    test_dry_run_conflicts_and_apply()
+    test_overlapping_periods_within_batch()
+    test_admin_preview_and_apply()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Prueba y benchmark del motor de slots de WorkSchedule.
+
+Verifica que get_available_times devuelve la misma lista que el algoritmo
+anterior (una consulta por slot) y mide consultas SQL y latencia para
+1, 10 y 50 doctores.
+
+Uso:
+    python test_slot_engine.py      # benchmark completo
+    python -m pytest test_slot_engine.py
+"""
+
+import time as timer
+from datetime import datetime, date, time, timedelta
+
+from helpers import create_app, db, QueryCounter, next_weekday
+from app.models.user import User
+from app.models.patient import Patient
+from app.models.specialty import Specialty
+from app.models.appointment import Appointment
+from app.models.work_schedule import WorkSchedule
+
+
+def seed(num_doctors, target_date):
+    """Crear doctores con horario 08:00-20:00 (15 min) y algunas citas"""
+    specialty = Specialty(name='Medicina General', base_price=50)
+    db.session.add(specialty)
+    patient = Patient(first_name='Juan', last_name='Pérez', dni='70000001',
+                      birth_date=date(1990, 1, 1), gender='Masculino')
+    db.session.add(patient)
+    db.session.flush()
+
+    doctors = []
+    for i in range(num_doctors):
+        doctor = User(username=f'doctor{i}', email=f'doctor{i}@test.com', first_name='Ana',
+                      last_name=f'García {i}', role='doctor', specialty_id=specialty.id)
+        doctor.set_password('test')
+        db.session.add(doctor)
+        doctors.append(doctor)
+    db.session.flush()
+
+    for index, doctor in enumerate(doctors):
+        db.session.add(WorkSchedule(
+            doctor_id=doctor.id, specialty_id=specialty.id, day_of_week=target_date.weekday(),
+            start_time=time(8, 0), end_time=time(20, 0), appointment_duration=15,
+            break_start_time=time(13, 0), break_end_time=time(14, 0),
+            start_date=target_date - timedelta(days=30), end_date=target_date + timedelta(days=30)
+        ))
+        # Reservar algunos slots con distintos estados
+        for offset, status in ((0, 'scheduled'), (3, 'in_triage'), (5, 'cancelled'), (7 + index % 4, 'completed')):
+            db.session.add(Appointment(
+                patient_id=patient.id, doctor_id=doctor.id, specialty_id=specialty.id,
+                date_time=datetime.combine(target_date, time(8, 0)) + timedelta(minutes=15 * offset),
+                duration=15, status=status
+            ))
+    db.session.commit()
+    return [doctor.id for doctor in doctors], specialty.id
+
+
+def legacy_available_times(doctor_id, target_date):
+    """Algoritmo anterior: una consulta por cada slot candidato"""
+    available = []
+    schedules = WorkSchedule.get_doctor_schedule(doctor_id, target_date.weekday(), for_date=target_date)
+    for schedule in schedules:
+        for slot in schedule.get_slot_grid(target_date):
+            existing = Appointment.query.filter(
+                Appointment.doctor_id == doctor_id,
+                Appointment.date_time == slot,
+                Appointment.status.in_(['scheduled', 'in_triage', 'ready_for_doctor', 'in_consultation'])
+            ).first()
+            if not existing:
+                available.append(slot.time())
+    return sorted(set(available))
+
+
+def run_case(num_doctors):
+    """Ejecutar un caso del benchmark y devolver métricas"""
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        target_date = next_weekday(0)
+        doctor_ids, specialty_id = seed(num_doctors, target_date)
+
+        with QueryCounter() as legacy_counter:
+            started = timer.perf_counter()
+            legacy = {doctor_id: legacy_available_times(doctor_id, target_date) for doctor_id in doctor_ids}
+            legacy_ms = (timer.perf_counter() - started) * 1000
+
+        with QueryCounter() as engine_counter:
+            started = timer.perf_counter()
+            engine = {doctor_id: WorkSchedule.get_available_times(doctor_id, target_date, specialty_id)
+                      for doctor_id in doctor_ids}
+            engine_ms = (timer.perf_counter() - started) * 1000
+
+        with QueryCounter() as bulk_counter:
+            started = timer.perf_counter()
+            bulk = WorkSchedule.get_available_times_for_doctors(doctor_ids, target_date, specialty_id)
+            bulk_ms = (timer.perf_counter() - started) * 1000
+
+        db.session.remove()
+        db.drop_all()
+
+    return {
+        'doctors': num_doctors,
+        'same_result': legacy == engine == bulk,
+        'legacy': (legacy_counter.count, legacy_ms),
+        'engine': (engine_counter.count, engine_ms),
+        'bulk': (bulk_counter.count, bulk_ms),
+    }
+
+
+def test_slot_engine_matches_legacy_results():
+    """El motor devuelve los mismos horarios con consultas acotadas"""
+    result = run_case(10)
+    assert result['same_result']
+    # Por doctor: horarios + citas (sin depender del número de slots)
+    assert result['engine'][0] <= 2 * 10
+    # En lote: horarios + citas
+    assert result['bulk'][0] == 2
+
+
+def main():
+    """Benchmark para 1, 10 y 50 doctores"""
+    print("=== BENCHMARK MOTOR DE SLOTS (08:00-20:00, 15 min) ===\n")
+    print(f"{'Doctores':>8} | {'Anterior (q / ms)':>20} | {'Por doctor (q / ms)':>20} | {'En lote (q / ms)':>18} | Igual")
+    print("-" * 88)
+    for num_doctors in (1, 10, 50):
+        result = run_case(num_doctors)
+        legacy, engine, bulk = result['legacy'], result['engine'], result['bulk']
+        print(f"{num_doctors:>8} | {legacy[0]:>8} / {legacy[1]:>9.1f} | {engine[0]:>8} / {engine[1]:>9.1f} | "
+              f"{bulk[0]:>6} / {bulk[1]:>9.1f} | {'✅' if result['same_result'] else '❌'}")
+
+
+if __name__ == '__main__':
+    main()
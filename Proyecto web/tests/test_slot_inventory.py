@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Prueba del inventario materializado de slots (appointment_slots).
+
+Verifica la generación desde WorkSchedule, la actualización al crear,
+editar y cancelar citas desde recepción, que la consulta de
+disponibilidad es un único escaneo por rango, que los horarios de la
+especialidad tienen prioridad sobre los generales cuando se superponen y
+que una cita más larga que el paso de la grilla ocupa todos sus slots.
+"""
+
+from helpers import (make_app, login, db, QueryCounter, next_weekday, at, create_specialty,
+                     create_user, create_patient, create_schedule, create_appointment)
+from app.models.appointment import Appointment
+from app.models.appointment_slot import AppointmentSlot
+from app.models.work_schedule import WorkSchedule
+
+
+def setup_data():
+    specialty = create_specialty()
+    doctor = create_user('doctor1', 'doctor', specialty)
+    receptionist = create_user('recepcion', 'receptionist')
+    patient = create_patient('70000001')
+    monday = next_weekday(0)
+    create_schedule(doctor, 0)
+    create_appointment(patient, doctor, at(monday, 9, 0))
+    db.session.commit()
+    return doctor, receptionist, patient, monday
+
+
+def test_inventory_matches_live_availability():
+    """El inventario devuelve lo mismo que el cálculo en vivo con una sola consulta"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        doctor, _, _, monday = setup_data()
+
+        generated = AppointmentSlot.regenerate_for_doctor(doctor.id, weeks=4)
+        db.session.commit()
+        print(f"✅ Slots generados: {generated}")
+        assert generated == 4 * 8
+
+        doctor_id = doctor.id
+        with QueryCounter() as counter:
+            inventory_times = AppointmentSlot.get_available_times(doctor_id, monday)
+        assert counter.count == 1
+        assert inventory_times == WorkSchedule.get_available_times(doctor.id, monday)
+        assert at(monday, 9).time() not in inventory_times
+
+
+def test_receptionist_writes_update_inventory():
+    """Crear, editar y cancelar citas actualiza el inventario en la misma transacción"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        doctor, receptionist, patient, monday = setup_data()
+        AppointmentSlot.regenerate_for_doctor(doctor.id, weeks=4)
+        db.session.commit()
+
+        client = app.test_client()
+        login(client, receptionist)
+
+        form = {
+            'patient_id': patient.id, 'doctor_id': doctor.id, 'specialty_id': doctor.specialty_id,
+            'appointment_date': monday.strftime('%Y-%m-%d'), 'appointment_time': '10:00'
+        }
+        client.post('/receptionist/appointments/new', data=form)
+        appointment = Appointment.query.filter_by(date_time=at(monday, 10)).first()
+        slot = AppointmentSlot.query.filter_by(doctor_id=doctor.id, start_time=at(monday, 10)).first()
+        assert slot.state == 'booked' and slot.appointment_id == appointment.id
+
+        form['appointment_time'] = '11:00'
+        client.post(f'/receptionist/appointments/{appointment.id}/edit', data=form)
+        db.session.expire_all()
+        assert AppointmentSlot.query.filter_by(start_time=at(monday, 10)).first().state == 'available'
+        assert AppointmentSlot.query.filter_by(start_time=at(monday, 11)).first().state == 'booked'
+
+        client.post(f'/receptionist/appointments/{appointment.id}/cancel')
+        db.session.expire_all()
+        assert AppointmentSlot.query.filter_by(start_time=at(monday, 11)).first().state == 'available'
+
+        response = client.get(f'/receptionist/api/available-times?doctor_id={doctor.id}'
+                              f'&date={monday.strftime("%Y-%m-%d")}')
+        times = response.get_json()['available_times']
+        assert '09:00' not in times and '10:00' in times and '11:00' in times
+        print("✅ Inventario sincronizado con crear/editar/cancelar")
+
+
+def test_rebuild_repairs_drift():
+    """La reconstrucción repara un inventario desincronizado"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        doctor, _, patient, monday = setup_data()
+        AppointmentSlot.regenerate_for_doctor(doctor.id, weeks=4)
+        # Cita creada por fuera del flujo normal (p. ej. un script)
+        create_appointment(patient, doctor, at(monday, 11, 30))
+        db.session.commit()
+        assert at(monday, 11, 30).time() in AppointmentSlot.get_available_times(doctor.id, monday)
+
+        AppointmentSlot.rebuild(weeks=4)
+        db.session.commit()
+        assert at(monday, 11, 30).time() not in AppointmentSlot.get_available_times(doctor.id, monday)
+        print("✅ Reconstrucción corrige desvíos")
+
+
+def test_specialty_schedule_wins_overlaps():
+    """Los slots superpuestos toman la especialidad y duración del horario específico"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        specialty = create_specialty()
+        doctor = create_user('doctor1', 'doctor', specialty)
+        monday = next_weekday(0)
+        # El horario general se crea primero y comparte las 9:00 y 10:00
+        general = create_schedule(doctor, 0)
+        general.specialty_id = None
+        create_schedule(doctor, 0, start=at(monday, 9).time(), end=at(monday, 11).time(), duration=20)
+        db.session.commit()
+
+        AppointmentSlot.regenerate_for_doctor(doctor.id, weeks=1)
+        db.session.commit()
+
+        slot = AppointmentSlot.query.filter_by(doctor_id=doctor.id, start_time=at(monday, 9)).one()
+        assert slot.specialty_id == specialty.id and slot.end_time == at(monday, 9, 20)
+        inventory_times = AppointmentSlot.get_available_times(doctor.id, monday, specialty.id)
+        live_times = WorkSchedule.get_available_times_for_doctors([doctor.id], monday, specialty.id)[doctor.id]
+        assert inventory_times == live_times and len(inventory_times) == 6
+        print(f"✅ Horario de la especialidad prioritario en {len(inventory_times)} slots superpuestos")
+
+
+def test_long_appointment_books_overlapping_slots():
+    """Una cita de 40 minutos en una grilla de 20 ocupa y libera dos slots"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        doctor = create_user('doctor1', 'doctor', create_specialty())
+        patient = create_patient('70000001')
+        monday = next_weekday(0)
+        create_schedule(doctor, 0, duration=20)
+        db.session.commit()
+        AppointmentSlot.regenerate_for_doctor(doctor.id, weeks=1)
+        db.session.commit()
+
+        appointment = Appointment(patient_id=patient.id, doctor_id=doctor.id, specialty_id=doctor.specialty_id,
+                                  date_time=at(monday, 9), duration=40)
+        appointment.reserve()
+        db.session.commit()
+        taken = {at(monday, 9).time(), at(monday, 9, 20).time()}
+        assert not taken & set(AppointmentSlot.get_available_times(doctor.id, monday))
+        assert at(monday, 9, 40).time() in AppointmentSlot.get_available_times(doctor.id, monday)
+
+        AppointmentSlot.regenerate_for_doctor(doctor.id, weeks=1)
+        db.session.commit()
+        booked = AppointmentSlot.query.filter_by(appointment_id=appointment.id).all()
+        assert {slot.start_time.time() for slot in booked} == taken
+
+        AppointmentSlot.release(appointment)
+        db.session.commit()
+        assert taken <= set(AppointmentSlot.get_available_times(doctor.id, monday))
+        print(f"✅ Cita de 40 minutos ocupa {len(booked)} slots de 20 y los libera al cancelar")
+
+
+if __name__ == '__main__':
+    test_inventory_matches_live_availability()
+    test_receptionist_writes_update_inventory()
+    test_rebuild_repairs_drift()
+    test_specialty_schedule_wins_overlaps()
+    test_long_appointment_books_overlapping_slots()
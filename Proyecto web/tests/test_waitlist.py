@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Prueba de la lista de espera con reasignación automática al cancelar citas.
+
+Verifica la selección por prioridad, ventana y doctor, el descarte de
+pacientes con otra cita a esa hora (recorriendo la lista por tramos), que
+no se ofrece un horario que el doctor ya volvió a ocupar, las ofertas
+(aceptar/rechazar), el agendado automático desde la cancelación sin
+deshacer la cancelación si el horario se ocupa, que las entradas con la
+ventana vencida se cierran en el mantenimiento nocturno y que la consulta
+real de candidatos usa el índice ix_waitlist_match con paginación por
+clave en lugar de recorrer toda la lista.
+"""
+
+from datetime import date, datetime, time, timedelta
+
+from helpers import (make_app, login, db, QueryCounter, next_weekday, at, create_specialty,
+                     create_user, create_patient, create_schedule, create_appointment)
+from app.models.appointment import Appointment
+from app.models.housekeeping import HousekeepingRun
+from app.models.waitlist import WaitlistEntry
+
+
+def _entry(patient, specialty, doctor=None, priority=3, days=(0, 30), **fields):
+    entry = WaitlistEntry(patient_id=patient.id, specialty_id=specialty.id, doctor_id=doctor.id if doctor else None,
+                          earliest_date=date.today() + timedelta(days=days[0]),
+                          latest_date=date.today() + timedelta(days=days[1]), priority=priority, **fields)
+    db.session.add(entry)
+    db.session.flush()
+    return entry
+
+
+def test_cancel_backfills_by_priority():
+    """La cancelación agenda al candidato compatible de mayor prioridad"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        specialty = create_specialty()
+        other_specialty = create_specialty('Cardiología')
+        doctor = create_user('doctor1', 'doctor', specialty)
+        other_doctor = create_user('doctor2', 'doctor', specialty)
+        receptionist = create_user('recepcion', 'receptionist')
+        monday = next_weekday(0)
+        create_schedule(doctor, 0)
+        patients = [create_patient(f'7000000{i}', first_name=f'Paciente{i}') for i in range(7)]
+        cancelled = create_appointment(patients[0], doctor, at(monday, 9, 0))
+
+        _entry(patients[1], other_specialty, priority=1)                    # otra especialidad
+        _entry(patients[2], specialty, doctor=other_doctor, priority=1)     # otro doctor
+        _entry(patients[3], specialty, priority=1, days=(40, 60))           # fuera de la ventana
+        _entry(patients[4], specialty, priority=1, time_from=time(14, 0))   # otra franja horaria
+        _entry(patients[5], specialty, priority=2, auto_book=True)          # ocupado a esa hora
+        create_appointment(patients[5], other_doctor, at(monday, 9, 0))
+        winner = _entry(patients[6], specialty, doctor=doctor, priority=2, auto_book=True)
+        db.session.commit()
+        winner_id, cancelled_id, doctor_id = winner.id, cancelled.id, doctor.id
+
+        client = app.test_client()
+        login(client, receptionist)
+        data = client.post(f'/receptionist/appointments/{cancelled_id}/cancel').get_json()
+        assert data['success'] and data['waitlist_entry_id'] == winner_id
+        assert 'Paciente6' in data['message']
+
+        winner = db.session.get(WaitlistEntry, winner_id)
+        assert winner.status == 'booked'
+        booked = db.session.get(Appointment, winner.appointment_id)
+        assert (booked.doctor_id, booked.date_time, booked.status) == (doctor_id, at(monday, 9, 0), 'scheduled')
+        print("✅ Horario cancelado reasignado al paciente en espera compatible")
+
+
+def test_offer_accept_and_decline():
+    """Sin agendado automático se ofrece; rechazar pasa al siguiente"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        specialty = create_specialty()
+        doctor = create_user('doctor1', 'doctor', specialty)
+        receptionist = create_user('recepcion', 'receptionist')
+        monday = next_weekday(0)
+        patients = [create_patient(f'7000000{i}') for i in range(3)]
+        cancelled = create_appointment(patients[0], doctor, at(monday, 10, 0), status='cancelled')
+        first = _entry(patients[1], specialty, priority=1)
+        second = _entry(patients[2], specialty, priority=3)
+        db.session.commit()
+
+        assert WaitlistEntry.backfill(cancelled) is first
+        db.session.commit()
+        assert (first.status, first.offered_date_time) == ('offered', at(monday, 10, 0))
+
+        client = app.test_client()
+        login(client, receptionist)
+        assert client.get('/receptionist/waitlist').status_code == 200
+        client.post(f'/receptionist/waitlist/{first.id}/decline')
+        assert db.session.get(WaitlistEntry, first.id).status == 'waiting'
+        assert db.session.get(WaitlistEntry, second.id).status == 'offered'
+
+        client.post(f'/receptionist/waitlist/{second.id}/accept')
+        second = db.session.get(WaitlistEntry, second.id)
+        assert second.status == 'booked' and second.appointment.patient_id == patients[2].id
+
+
+def test_backfill_skips_taken_slots_and_pages():
+    """Horario ya ocupado por el doctor, candidatos en tramos y reserva fallida"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        specialty = create_specialty()
+        doctor = create_user('doctor1', 'doctor', specialty)
+        other_doctor = create_user('doctor2', 'doctor', specialty)
+        receptionist = create_user('recepcion', 'receptionist')
+        monday = next_weekday(0)
+        patients = [create_patient(f'7100{i:04d}') for i in range(30)]
+
+        # Los 25 primeros en la lista tienen otra cita a esa hora: el válido está en el tercer tramo
+        for i in range(25):
+            create_appointment(patients[i], other_doctor, at(monday, 9, 0) + timedelta(minutes=i))
+            _entry(patients[i], specialty, priority=1)
+        valid = _entry(patients[25], specialty, priority=3)
+        cancelled = create_appointment(patients[29], doctor, at(monday, 9, 0), status='cancelled')
+        db.session.commit()
+        assert WaitlistEntry.backfill(cancelled) is valid
+        db.session.commit()
+        print(f"✅ Candidato válido encontrado tras descartar 25 con conflicto (tramos de {WaitlistEntry.MATCH_CANDIDATES})")
+
+        # Rechazar cuando el doctor ya volvió a ocupar el horario: no se ofrece a nadie
+        create_appointment(patients[28], doctor, at(monday, 9, 0))
+        waiting = _entry(patients[26], specialty, priority=1)
+        db.session.commit()
+        assert valid.decline_offer() is None
+        db.session.commit()
+        assert waiting.status == 'waiting' and valid.status == 'waiting'
+
+        # Un horario que el doctor ya ocupa tampoco se ofrece al cancelar otra cita a esa hora
+        cancelled_again = create_appointment(patients[27], doctor, at(monday, 11, 0), status='cancelled')
+        create_appointment(patients[28], doctor, at(monday, 11, 0) - timedelta(minutes=15))
+        db.session.commit()
+        assert WaitlistEntry.backfill(cancelled_again) is None
+
+        # Otra transacción ocupó el horario entre la búsqueda y el agendado automático:
+        # se deshace sólo la reserva y la cancelación en curso sigue en pie
+        to_cancel = create_appointment(patients[29], doctor, at(monday, 16, 0))
+        create_appointment(patients[28], doctor, at(monday, 14, 0))
+        WaitlistEntry.query.filter_by(status='waiting').update({'status': 'cancelled'})
+        auto = _entry(patients[27], specialty, priority=1, auto_book=True)
+        db.session.commit()
+        to_cancel_id, auto_id = to_cancel.id, auto.id
+        to_cancel.status = 'cancelled'
+        freed = Appointment(doctor_id=doctor.id, specialty_id=specialty.id, date_time=at(monday, 14, 0), duration=30)
+        find_conflicts = Appointment.find_conflicts
+        Appointment.find_conflicts = classmethod(lambda cls, candidates, exclude_ids=(): [[] for _ in candidates])
+        try:
+            assert WaitlistEntry.backfill(freed) is None
+        finally:
+            Appointment.find_conflicts = find_conflicts
+        db.session.commit()
+        db.session.expire_all()
+        assert db.session.get(Appointment, to_cancel_id).status == 'cancelled'
+        auto = db.session.get(WaitlistEntry, auto_id)
+        assert (auto.status, auto.offered_date_time, auto.appointment_id) == ('waiting', None, None)
+        print("✅ Reserva fallida en savepoint: la cancelación se conserva y la entrada vuelve a la espera")
+
+        # Aceptar una oferta cuyo horario ya fue ocupado limpia la oferta
+        offered = _entry(patients[26], specialty, status='offered', offered_doctor_id=doctor.id,
+                         offered_date_time=at(monday, 14, 0), offered_duration=30,
+                         offered_at=datetime.utcnow())
+        db.session.commit()
+        client = app.test_client()
+        login(client, receptionist)
+        client.post(f'/receptionist/waitlist/{offered.id}/accept')
+        db.session.expire_all()
+        offered = db.session.get(WaitlistEntry, offered.id)
+        assert (offered.status, offered.offered_doctor_id, offered.offered_date_time) == ('waiting', None, None)
+
+
+def test_candidate_lookup_uses_index():
+    """La consulta real de candidatos usa el índice y no recorre entradas vencidas"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        specialty = create_specialty()
+        other_specialty = create_specialty('Cardiología')
+        doctor = create_user('doctor1', 'doctor', specialty)
+        other_doctor = create_user('doctor2', 'doctor', specialty)
+        patient = create_patient('70000001')
+        today = date.today()
+        slot = at(next_weekday(0), 9, 0)
+        created = datetime.utcnow()
+
+        # Ninguna fila coincide: ventanas vencidas, otra especialidad, otro doctor,
+        # ventana posterior al horario o franja horaria distinta
+        def entry(i):
+            row = {'patient_id': patient.id, 'specialty_id': specialty.id, 'doctor_id': None,
+                   'earliest_date': today, 'latest_date': today + timedelta(days=30), 'time_from': None,
+                   'time_to': None, 'priority': 1 + i % 3, 'auto_book': False, 'status': 'waiting',
+                   'created_at': created + timedelta(seconds=i)}
+            kind = i % 5
+            if kind == 0:
+                row.update(earliest_date=today - timedelta(days=60), latest_date=today - timedelta(days=1 + i % 20))
+            elif kind == 1:
+                row['specialty_id'] = other_specialty.id
+            elif kind == 2:
+                row['doctor_id'] = other_doctor.id
+            elif kind == 3:
+                row['earliest_date'] = slot.date() + timedelta(days=1)
+            else:
+                row.update(time_from=time(14, 0), time_to=time(18, 0))
+            return row
+        db.session.execute(WaitlistEntry.__table__.insert(), [entry(i) for i in range(20000)])
+        match = _entry(patient, specialty, doctor, priority=3)
+        db.session.commit()
+        doctor_id, specialty_id, match_id = doctor.id, specialty.id, match.id
+
+        # Las 4.000 entradas con la ventana vencida salen de la espera
+        run = HousekeepingRun.run_rule('expired_waitlist', chunk_size=1000)
+        assert run.rows_affected == 4000
+        assert WaitlistEntry.query.filter_by(status='expired').count() == 4000
+
+        with QueryCounter() as counter:
+            candidates = WaitlistEntry.find_candidates(doctor_id, specialty_id, slot)
+            WaitlistEntry.find_candidates(doctor_id, specialty_id, slot, after=(1, created, 1))
+        assert counter.count == 2 and [c.id for c in candidates] == [match_id]
+
+        for index in range(counter.count):
+            plan = counter.explain(index)
+            assert 'ix_waitlist_match' in plan and 'TEMP B-TREE' not in plan, plan
+            # SQLite siempre emite LIMIT ? OFFSET ?: el tramo siguiente no salta filas
+            assert counter.parameters[index][-1] == 0
+        print(f"✅ Plan de la consulta de find_candidates: {counter.explain(1)}")
+
+if __name__ == '__main__':
+    test_cancel_backfills_by_priority()
+    test_offer_accept_and_decline()
+    test_backfill_skips_taken_slots_and_pages()
+    test_candidate_lookup_uses_index()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Prueba de la agenda semanal de doctores (/receptionist/api/calendar).
+
+Verifica que se usan tres consultas sin importar el número de doctores, que
+la respuesta columnar contiene bloques, descansos, citas con iniciales y
+slots libres, y que el payload se mantiene compacto.
+"""
+
+import json
+from datetime import time, timedelta
+
+from helpers import (make_app, login, db, QueryCounter, next_weekday, at, create_specialty,
+                     create_user, create_patient, create_schedule, create_appointment)
+from app.models.work_schedule import WorkSchedule
+
+
+def _seed(doctor_count):
+    specialty = create_specialty()
+    doctors = [create_user(f'doctor{i:02d}', 'doctor', specialty, first_name=f'Doc{i:02d}')
+               for i in range(doctor_count)]
+    patient = create_patient('70000001', first_name='María', last_name='López')
+    for doctor in doctors:
+        for day in range(5):
+            create_schedule(doctor, day, start=time(8, 0), end=time(12, 0), duration=30,
+                            break_start_time=time(10, 0), break_end_time=time(10, 30))
+    return doctors, patient
+
+
+def test_week_calendar_queries_and_content():
+    """Tres consultas para 1 o 30 doctores; citas, bloques y slots libres"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        doctors, patient = _seed(30)
+        monday = next_weekday(0)
+        # Cita de 60 minutos: ocupa los slots 08:00 y 08:30
+        create_appointment(patient, doctors[0], at(monday, 8, 0), duration=60)
+        create_appointment(patient, doctors[0], at(monday + timedelta(days=1), 9, 0), status='in_triage')
+        create_appointment(patient, doctors[0], at(monday, 11, 0), status='cancelled')
+        db.session.commit()
+        doctor_ids = [doctor.id for doctor in doctors]
+
+        for ids in (doctor_ids[:1], doctor_ids):
+            with QueryCounter() as counter:
+                calendar = WorkSchedule.get_week_calendar(monday, ids)
+            assert counter.count == 3
+            assert len(calendar['doctors']['id']) == len(ids)
+            assert len(calendar['blocks']['day']) == 5 * len(ids)
+
+        appointments = calendar['appointments']
+        assert len(appointments['id']) == 2
+        assert appointments['patient'] == ['ML', 'ML']
+        assert [calendar['statuses'][status] for status in appointments['status']] == ['scheduled', 'in_triage']
+        assert (appointments['day'], appointments['start']) == ([0, 1], [480, 540])
+
+        blocks = calendar['blocks']
+        assert (blocks['start'][0], blocks['end'][0], blocks['break_start'][0], blocks['break_end'][0]) == (480, 720, 600, 630)
+
+        free = {(doctor, day): slots for doctor, day, slots in
+                zip(calendar['free']['doctor'], calendar['free']['day'], calendar['free']['slots'])}
+        first = calendar['doctors']['id'].index(doctors[0].id)
+        # Lunes: 08:00 y 08:30 ocupados por la cita de 60 min; 10:00 es descanso; 11:00 cancelada queda libre
+        assert free[(first, 0)] == [540, 570, 630, 660, 690]
+        assert 540 not in free[(first, 1)]
+
+        size = len(json.dumps(calendar, separators=(',', ':')))
+        print(f"✅ Agenda de 30 doctores: 3 consultas, {size} bytes")
+        assert size < 40000
+
+
+def test_calendar_endpoint():
+    """El endpoint acepta fecha o semana ISO y filtra doctores"""
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        doctors, _ = _seed(3)
+        receptionist = create_user('recepcion', 'receptionist')
+        db.session.commit()
+        monday = next_weekday(0)
+
+        client = app.test_client()
+        login(client, receptionist)
+        wednesday = monday + timedelta(days=2)
+        data = client.get(f'/receptionist/api/calendar?week={wednesday.isoformat()}&doctors={doctors[1].id}').get_json()
+        assert data['success'] and data['week_start'] == monday.isoformat()
+        assert data['doctors']['id'] == [doctors[1].id]
+
+        year, week, _ = monday.isocalendar()
+        with QueryCounter() as counter:
+            data = client.get(f'/receptionist/api/calendar?week={year}-W{week:02d}').get_json()
+        assert data['week_start'] == monday.isoformat() and len(data['doctors']['id']) == 3
+        # Usuario en sesión + 3 consultas de la agenda
+        assert counter.count <= 4
+
+        assert client.get('/receptionist/api/calendar?week=semana').status_code == 400
+
+
+if __name__ == '__main__':
+    test_week_calendar_queries_and_content()
+    test_calendar_endpoint()